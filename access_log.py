@@ -0,0 +1,307 @@
+"""
+Structured JSON access log with request IDs.
+
+init_app(app) writes one JSON line per request on the "mentorship.access"
+logger, once the response body has been sent:
+
+    {"ts": "2025-07-01T09:30:12.345Z", "request_id": "5f0c2e...", "method": "GET",
+     "route": "/mentor/<int:mentor_id>", "path": "/mentor/4", "endpoint": "mentor_detail",
+     "status": 200, "bytes": 18342, "duration_ms": 48.2, "db_ms": 12.4, "queries": 37,
+     "slowest_ms": 3.1, "slowest_fingerprint": "3f9a0c1b7e2d", "slowest_sql": "SELECT ... WHERE id = ?",
+     "cache_hits": 2, "cache_misses": 1, "school": "default", "remote_addr": "10.0.0.3",
+     "user": null, "user_agent": "Mozilla/5.0 ..."}
+
+"route" is the URL rule, so requests for different ids group together; "user"
+is REMOTE_USER, set by an authenticating proxy. db_ms, queries and the
+request's slowest statement come from query_stats; the statement is
+normalized like the slow-query log's, so slowest_fingerprint matches its
+entries. The cache figures come from every cache the request used.
+
+Request IDs: an incoming X-Request-ID (from a load balancer or the caller)
+is kept when it is up to 128 characters of [A-Za-z0-9._:-], otherwise a new
+one is made. It is returned in the response's X-Request-ID header, is
+available as request_id() while the request runs, and background jobs
+queued by the request log under it too. init_app() installs RequestIdFilter
+on the app, query, slow-query and job loggers (FILTERED_LOGGERS), so their
+records carry it as %(request_id)s; add the filter to any other logger or
+handler that should.
+
+Lines are written asynchronously: the request thread only puts the entry on
+a bounded queue (a QueueHandler), and a listener thread per process turns
+it into JSON and writes it. When the queue is full, entries are dropped and
+counted rather than making requests wait.
+
+Settings (app.config):
+    ACCESS_LOG_ENABLED    - master switch (default True)
+    ACCESS_LOG            - "-" for stdout (default) or a file path
+    ACCESS_LOG_QUEUE_SIZE - entries waiting to be written before new ones are dropped (default 10000)
+    REQUEST_ID_HEADER     - header carrying the request ID (default X-Request-ID)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+import cache
+import query_stats
+import slow_queries
+
+logger = logging.getLogger('mentorship.access')
+
+ENVIRON_KEY = 'mentorship.access'
+VALID_REQUEST_ID = re.compile(r'[A-Za-z0-9._:-]{1,128}')
+# Loggers whose records get request_id, besides the Flask app's own
+FILTERED_LOGGERS = ('mentorship.queries', 'mentorship.slow_queries', 'jobs')
+# werkzeug's own per-request line, which this log replaces on the dev server
+WERKZEUG_ACCESS_FORMAT = '"%s" %s %s'
+
+_request_id = ContextVar('request_id', default=None)
+
+
+def request_id():
+    """ID of the request (or the job it queued) being handled, or None"""
+    return _request_id.get()
+
+
+@contextmanager
+def use_request_id(value):
+    """Log the enclosed block under request ID value (a background job under the request that queued it)"""
+    token = _request_id.set(value)
+    try:
+        yield
+    finally:
+        _request_id.reset(token)
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds record.request_id, so any format string can include %(request_id)s"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get() or '-'
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats an access entry (a dict logged as the message) as one JSON line"""
+
+    def format(self, record):
+        entry = record.msg if isinstance(record.msg, dict) else {'message': record.getMessage()}
+        timestamp = datetime.fromtimestamp(record.created, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+        return json.dumps(dict(ts=timestamp, **entry), separators=(', ', ': '))
+
+
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """QueueListener whose stop() waits for room in a full queue instead of failing"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler with its own listener thread, restarted in each process and never blocking
+
+    The listener starts on the first record a process logs, so a gunicorn
+    master that preloads the app doesn't hand a dead thread to its workers.
+    """
+
+    def __init__(self, target, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.target = target
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self.queue = queue.Queue(self.maxsize)
+                self._listener = DrainingQueueListener(self.queue, self.target)
+                self._listener.start()
+                self._pid = os.getpid()
+
+    def prepare(self, record):
+        # The entry stays a dict: formatting happens on the listener thread
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Write everything logged so far (the listener restarts on the next record)"""
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+                self._listener = None
+                self._pid = None
+        self.target.flush()
+
+
+def target_handler(destination):
+    if destination in ('', '-'):
+        handler = logging.StreamHandler(sys.stdout)
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+        # Reopens the file after logrotate moves it
+        handler = logging.handlers.WatchedFileHandler(destination)
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+class LoggedBody:
+    """Response iterable that counts the bytes sent and logs the request when the server closes it"""
+
+    def __init__(self, result, access_log, environ, started):
+        self.result = result
+        self.access_log = access_log
+        self.environ = environ
+        self.started = started
+
+    def __iter__(self):
+        entry = self.environ[ENVIRON_KEY]
+        for chunk in self.result:
+            entry['bytes'] += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self.result, 'close'):
+                self.result.close()
+        finally:
+            self.access_log.write(self.environ, self.started)
+
+
+class AccessLogMiddleware:
+    """Assigns the request ID and logs each request once its body has been sent"""
+
+    def __init__(self, wsgi_app, access_log):
+        self.wsgi_app = wsgi_app
+        self.access_log = access_log
+        self.environ_header = 'HTTP_' + access_log.header.upper().replace('-', '_')
+
+    def __call__(self, environ, start_response):
+        started = time.perf_counter()
+        incoming = environ.get(self.environ_header, '')
+        rid = incoming if VALID_REQUEST_ID.fullmatch(incoming) else new_request_id()
+        entry = environ[ENVIRON_KEY] = {'request_id': rid, 'status': None, 'bytes': 0}
+        header = self.access_log.header
+
+        def logged_start_response(status, headers, exc_info=None):
+            entry['status'] = int(status.split(None, 1)[0])
+            headers = [(name, value) for name, value in headers if name.lower() != header.lower()]
+            return start_response(status, headers + [(header, rid)], exc_info)
+
+        token = _request_id.set(rid)
+        try:
+            result = self.wsgi_app(environ, logged_start_response)
+        except Exception:
+            entry['status'] = 500
+            self.access_log.write(environ, started)
+            raise
+        finally:
+            _request_id.reset(token)
+        return LoggedBody(result, self.access_log, environ, started)
+
+
+class AccessLog:
+    """Builds the access entries and owns the handler that writes them"""
+
+    def __init__(self, config):
+        self.header = config['REQUEST_ID_HEADER']
+        self.handler = AsyncQueueHandler(target_handler(config['ACCESS_LOG']), config['ACCESS_LOG_QUEUE_SIZE'])
+
+    def write(self, environ, started):
+        """Log a finished request from what the middleware and request hooks collected"""
+        duration = time.perf_counter() - started
+        entry = environ[ENVIRON_KEY]
+        stats = entry.get('query_stats')
+        lookups = entry.get('cache_lookups') or {}
+        slowest_sql = slow_queries.normalize(stats.slowest_sql) if stats and stats.slowest_sql else None
+        logger.info({
+            'request_id': entry['request_id'],
+            'method': environ.get('REQUEST_METHOD'),
+            'route': entry.get('route'),
+            'path': environ.get('PATH_INFO'),
+            'endpoint': entry.get('endpoint'),
+            'status': entry['status'],
+            'bytes': entry['bytes'],
+            'duration_ms': round(duration * 1000, 2),
+            'db_ms': round(stats.db_time * 1000, 2) if stats else None,
+            'queries': stats.count if stats else None,
+            'slowest_ms': round(stats.slowest_time * 1000, 2) if stats else None,
+            'slowest_fingerprint': slow_queries.fingerprint(slowest_sql) if slowest_sql else None,
+            'slowest_sql': slowest_sql[:query_stats.SLOWEST_SQL_LENGTH] if slowest_sql else None,
+            'cache_hits': lookups.get('hits'),
+            'cache_misses': lookups.get('misses'),
+            'school': entry.get('school'),
+            'remote_addr': environ.get('REMOTE_ADDR'),
+            'user': environ.get('REMOTE_USER'),
+            'user_agent': environ.get('HTTP_USER_AGENT'),
+        })
+
+    def flush(self):
+        self.handler.flush()
+
+
+def init_app(app, school_id=None):
+    """Log every request as JSON; school_id() names the school of the current request"""
+    from flask import request
+
+    app.config.setdefault('ACCESS_LOG_ENABLED', True)
+    app.config.setdefault('ACCESS_LOG', '-')
+    app.config.setdefault('ACCESS_LOG_QUEUE_SIZE', 10000)
+    app.config.setdefault('REQUEST_ID_HEADER', 'X-Request-ID')
+    if not app.config['ACCESS_LOG_ENABLED']:
+        return None
+    for target in (app.logger, *map(logging.getLogger, FILTERED_LOGGERS)):
+        if not any(isinstance(f, RequestIdFilter) for f in target.filters):
+            target.addFilter(RequestIdFilter())
+    access_log = AccessLog(app.config)
+    if not logger.handlers:
+        logger.addHandler(access_log.handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    logging.getLogger('werkzeug').addFilter(lambda record: record.msg != WERKZEUG_ACCESS_FORMAT)
+    app.extensions['access_log'] = access_log
+    app.wsgi_app = AccessLogMiddleware(app.wsgi_app, access_log)
+
+    # Registered after query_stats, so its figures for this request already exist
+    @app.before_request
+    def start_access_entry():
+        entry = request.environ.get(ENVIRON_KEY)
+        if entry is None:
+            return
+        entry['route'] = request.url_rule.rule if request.url_rule else None
+        entry['endpoint'] = request.endpoint
+        entry['school'] = school_id() if school_id else None
+        entry['query_stats'] = query_stats.current()
+        entry['cache_lookups'] = cache.count_lookups()
+
+    @app.teardown_request
+    def stop_counting_cache_lookups(exc):
+        cache.stop_counting_lookups()
+
+    return access_log
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Access Log Testing Suite
+Checks that each request is logged as one JSON line with its route, status,
+bytes sent and latency breakdown, that request IDs are kept or assigned and
+follow the request into its slow queries and background jobs, and that a
+full log queue drops entries instead of holding up requests.
+
+Runs against a throwaway SQLite database (never mentorship.db).
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from suite_support import SuiteLogger, scratch_environment
+
+# Point the app at a scratch database before it is imported
+WORK_DIR = scratch_environment('access')
+os.environ['ACCESS_LOG'] = os.path.join(WORK_DIR, 'access.log')
+
+import app as flask_app
+import access_log
+
+
+logger = SuiteLogger()
+log = flask_app.app.extensions['access_log']
+
+# Test-only route and job, registered before the first request
+job_request_ids = []
+
+
+@flask_app.app.route('/_access/stream')
+def stream():
+    return flask_app.app.response_class((b'x' * 1000 for _ in range(5)), mimetype='text/plain')
+
+
+@flask_app.app.route('/_access/job')
+def queue_job():
+    return str(flask_app.enqueue_job('access_log_test_job'))
+
+
+@flask_app.job_runner.register('access_log_test_job')
+def access_log_test_job(ctx):
+    job_request_ids.append(access_log.request_id())
+    return {'message': 'noted the request id'}
+
+
+client = flask_app.app.test_client()
+
+
+def get(path, **kwargs):
+    """GET path and close the response, as a WSGI server does once the body is sent"""
+    response = client.get(path, **kwargs)
+    response.get_data()
+    response.close()
+    return response
+
+
+def entries():
+    log.flush()
+    with open(os.environ['ACCESS_LOG']) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def entry_for(response):
+    return next((entry for entry in entries() if entry['request_id'] == response.headers.get('X-Request-ID')), None)
+
+
+def test_entries():
+    get('/api/statistics')
+    response = get('/api/statistics')
+    entry = entry_for(response) or {}
+    logger.log_result("Each request is logged as one JSON line with its route and status",
+                      entry.get('route') == '/api/statistics' and entry.get('endpoint') == 'api_statistics'
+                      and entry.get('method') == 'GET' and entry.get('status') == 200
+                      and entry.get('school') == 'default' and entry.get('ts', '').endswith('Z'), f"{entry}")
+    logger.log_result("The entry breaks down latency into database time, queries and cache use",
+                      entry.get('duration_ms', 0) > 0 and entry.get('db_ms') is not None
+                      and entry.get('queries') is not None and entry.get('cache_hits') == 1
+                      and entry.get('cache_misses') == 0 and entry.get('bytes') == len(response.data),
+                      f"{entry.get('duration_ms')}ms, db {entry.get('db_ms')}ms, {entry.get('queries')} queries, "
+                      f"cache {entry.get('cache_hits')}/{entry.get('cache_misses')}")
+
+    entry = entry_for(get('/mentor/999999')) or {}
+    logger.log_result("Requests for different ids share the route's rule",
+                      entry.get('route') == '/mentor/<int:id>' and entry.get('path') == '/mentor/999999'
+                      and entry.get('status') == 404, f"{entry.get('route')} -> {entry.get('status')}")
+    slowest_sql = entry.get('slowest_sql') or ''
+    logger.log_result("The entry names the request's slowest statement, normalized and fingerprinted",
+                      slowest_sql.startswith('SELECT') and '999999' not in slowest_sql
+                      and len(entry.get('slowest_fingerprint') or '') == 12
+                      and entry.get('slowest_ms') is not None and entry['slowest_ms'] <= entry.get('db_ms', 0),
+                      f"{entry.get('slowest_ms')}ms {entry.get('slowest_fingerprint')}: {slowest_sql[:80]}")
+
+    response = get('/_access/stream')
+    entry = entry_for(response) or {}
+    logger.log_result("Streamed responses are logged once the body is sent, with every byte counted",
+                      entry.get('bytes') == 5000 and len(response.data) == 5000, f"{entry.get('bytes')} bytes")
+
+
+def test_request_ids():
+    response = get('/mentors', headers={'X-Request-ID': 'lb-1234.abcd'})
+    logger.log_result("An incoming X-Request-ID is kept and echoed",
+                      response.headers.get('X-Request-ID') == 'lb-1234.abcd' and entry_for(response) is not None)
+
+    response = get('/mentors', headers={'X-Request-ID': 'not a valid idé'})
+    rid = response.headers.get('X-Request-ID', '')
+    logger.log_result("A malformed X-Request-ID is replaced by a new one",
+                      len(rid) == 32 and rid != 'not a valid id' and entry_for(response) is not None, rid)
+
+    records = []
+    handler = logging.Handler()
+    handler.addFilter(access_log.RequestIdFilter())
+    handler.emit = lambda record: records.append(record.request_id)
+    app_logger = logging.getLogger('mentorship.test')
+    app_logger.addHandler(handler)
+    view = flask_app.app.view_functions['mentors']
+    flask_app.app.view_functions['mentors'] = lambda: (app_logger.warning('in the view'), view())[1]
+    try:
+        response = get('/mentors', headers={'X-Request-ID': 'from-the-view'})
+    finally:
+        flask_app.app.view_functions['mentors'] = view
+        app_logger.removeHandler(handler)
+    logger.log_result("Log records made during the request carry its ID", records == ['from-the-view'], f"{records}")
+
+    records = []
+
+    def filtered(target):
+        record = target.makeRecord(target.name, logging.INFO, __file__, 0, 'in the view', None, None)
+        target.filter(record)
+        records.append((target.name, getattr(record, 'request_id', None)))
+
+    targets = [flask_app.app.logger, logging.getLogger('jobs'), logging.getLogger('mentorship.slow_queries')]
+    view = flask_app.app.view_functions['mentors']
+    flask_app.app.view_functions['mentors'] = lambda: ([filtered(t) for t in targets], view())[1]
+    try:
+        get('/mentors', headers={'X-Request-ID': 'app-loggers'})
+    finally:
+        flask_app.app.view_functions['mentors'] = view
+    logger.log_result("The app, job and slow-query loggers add the request ID to their records",
+                      [rid for _, rid in records] == ['app-loggers'] * 3, f"{records}")
+
+    flask_app.app.config['SLOW_QUERY_MS'] = 0
+    try:
+        get('/mentors', headers={'X-Request-ID': 'slow-one'})
+    finally:
+        flask_app.app.config['SLOW_QUERY_MS'] = 100
+    with open(os.environ['SLOW_QUERY_LOG']) as f:
+        slow = [json.loads(line) for line in f if line.strip()]
+    logger.log_result("Slow queries are logged under the request's ID",
+                      bool(slow) and all(entry['request_id'] == 'slow-one' for entry in slow), f"{len(slow)} entries")
+
+    get('/_access/job', headers={'X-Request-ID': 'queued-a-job'})
+    deadline = time.time() + 10
+    while not job_request_ids and time.time() < deadline:
+        time.sleep(0.05)
+    logger.log_result("Background jobs run under the ID of the request that queued them",
+                      job_request_ids == ['queued-a-job'] and access_log.request_id() is None, f"{job_request_ids}")
+
+
+def test_queue():
+    release = threading.Event()
+
+    class Stalled(logging.Handler):
+        def emit(self, record):
+            release.wait(10)
+
+    handler = access_log.AsyncQueueHandler(Stalled(), maxsize=10)
+    record = logging.LogRecord('mentorship.access', logging.INFO, __file__, 0, {'n': 1}, None, None)
+    started = time.perf_counter()
+    for _ in range(100):
+        handler.handle(record)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    release.set()
+    handler.flush()
+    logger.log_result("A full queue drops entries without making requests wait",
+                      elapsed_ms < 500 and handler.dropped >= 89, f"{handler.dropped} dropped in {elapsed_ms:.1f}ms")
+
+    logger.log_result("werkzeug's own per-request line is suppressed",
+                      not logging.getLogger('werkzeug').filter(logging.LogRecord(
+                          'werkzeug', logging.INFO, __file__, 0, access_log.WERKZEUG_ACCESS_FORMAT,
+                          ('GET / HTTP/1.1', '200', '-'), None)))
+
+    off = dict(flask_app.app.config, ACCESS_LOG_ENABLED=False)
+    logger.log_result("With ACCESS_LOG_ENABLED off no log is set up",
+                      access_log.init_app(type('App', (), {'config': off})()) is None)
+
+
+def main():
+    logger.log_header("ACCESS LOG TESTS")
+    print(f"📂 Scratch database: {os.environ['DATABASE_URL']}")
+    with flask_app.app.app_context():
+        flask_app.db.drop_all()
+        flask_app.db.create_all()
+
+    test_entries()
+    test_request_ids()
+    test_queue()
+    flask_app.job_runner.stop()
+
+    return logger.finish("every request is logged and traceable", "the access log is off")
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,242 @@
+"""
+Analytics aggregation for the statistics page.
+
+The per-row work behind /statistics (year levels parsed from roll_call,
+per-mentor success rates, subject coverage, monthly completions) is plain
+Python and bound to one core. Here the session and mentee tables are split
+into primary-key ranges, each range is aggregated into small partial counts
+- in-process for ordinary datasets, or on a ProcessPoolExecutor for large
+history - and the partials are merged in key order. Because merging keeps
+first-seen order, the result is identical whatever the number of workers.
+
+    summary = compute_statistics(connection, url, workers=4)
+
+Workers open their own read-only engine from the database URL, so only the
+ranges and the partial counts cross process boundaries. The pool is started
+on first use and kept for the life of the process (shut down at exit), so a
+request never pays for spawning interpreters and concurrent requests share
+the same bounded set of workers.
+"""
+
+import atexit
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from sqlalchemy import column, create_engine, func, select, table
+from sqlalchemy.pool import NullPool
+
+# Lightweight table definitions so worker processes don't import the app
+session_table = table('session', column('id'), column('mentor_id'), column('status'), column('date'))
+mentee_table = table('mentee', column('id'), column('subject'), column('roll_call'))
+mentor_table = table('mentor', column('id'), column('name'), column('subjects'))
+
+SESSION_STATUSES = ('completed', 'scheduled', 'canceled', 'missed', 'rescheduled')
+
+_worker_engines = {}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def roll_call_year(roll_call):
+    """Year level from a roll call (7A -> 7, 10/1 -> 10)"""
+    if '/' in roll_call:
+        return roll_call.split('/')[0]
+    return roll_call[0] if roll_call[0].isdigit() else roll_call[:2] if roll_call[:2].isdigit() else 'Unknown'
+
+
+def key_ranges(low, high, parts):
+    """Split the ids low..high into at most `parts` half-open ranges"""
+    if low is None:
+        return []
+    width = max(math.ceil((high - low + 1) / parts), 1)
+    return [(start, min(start + width, high + 1)) for start in range(low, high + 1, width)]
+
+
+def aggregate_partition(conn, session_range, mentee_range):
+    """Partial counts for one range of sessions and one range of mentees"""
+    statuses = {}
+    mentor_sessions = {}
+    monthly_completed = {}
+    if session_range:
+        rows = conn.execute(
+            select(session_table.c.mentor_id, session_table.c.status, session_table.c.date)
+            .where(session_table.c.id >= session_range[0], session_table.c.id < session_range[1])
+            .order_by(session_table.c.id))
+        for mentor_id, status, day in rows:
+            statuses[status] = statuses.get(status, 0) + 1
+            counts = mentor_sessions.get(mentor_id)
+            if counts is None:
+                counts = mentor_sessions[mentor_id] = [0, 0]
+            counts[0] += 1
+            if status == 'completed':
+                counts[1] += 1
+                # str() gives YYYY-MM-DD for both SQLite text and date objects
+                month = str(day)[:7]
+                monthly_completed[month] = monthly_completed.get(month, 0) + 1
+
+    subjects = {}
+    years = {}
+    if mentee_range:
+        rows = conn.execute(
+            select(mentee_table.c.subject, mentee_table.c.roll_call)
+            .where(mentee_table.c.id >= mentee_range[0], mentee_table.c.id < mentee_range[1])
+            .order_by(mentee_table.c.id))
+        for subject, roll_call in rows:
+            subjects[subject] = subjects.get(subject, 0) + 1
+            if roll_call:
+                year = roll_call_year(roll_call)
+                years[year] = years.get(year, 0) + 1
+
+    return {'statuses': statuses, 'mentor_sessions': mentor_sessions, 'monthly_completed': monthly_completed,
+            'subjects': subjects, 'years': years}
+
+
+def merge_partials(partials):
+    """Combine partial counts, keeping the order keys were first seen in"""
+    merged = {'statuses': {}, 'mentor_sessions': {}, 'monthly_completed': {}, 'subjects': {}, 'years': {}}
+    for partial in partials:
+        for field in ('statuses', 'monthly_completed', 'subjects', 'years'):
+            totals = merged[field]
+            for key, count in partial[field].items():
+                totals[key] = totals.get(key, 0) + count
+        for mentor_id, (total, completed) in partial['mentor_sessions'].items():
+            counts = merged['mentor_sessions'].setdefault(mentor_id, [0, 0])
+            counts[0] += total
+            counts[1] += completed
+    return merged
+
+
+def summarize(merged, mentors):
+    """Turn merged counts into the figures the statistics page shows"""
+    mentor_performance = []
+    active_mentors = 0
+    mentor_subjects = {}
+    for mentor_id, name, subjects in mentors:
+        for subject in (s.strip() for s in subjects.split(',') if s.strip()):
+            mentor_subjects[subject] = mentor_subjects.get(subject, 0) + 1
+        total, completed = merged['mentor_sessions'].get(mentor_id, (0, 0))
+        if total > 0:
+            active_mentors += 1
+            mentor_performance.append({
+                'name': name,
+                'subjects': subjects,
+                'session_count': total,
+                'success_rate': round(completed / total * 100, 1)
+            })
+
+    mentee_subjects = merged['subjects']
+    subject_coverage = []
+    for subject in sorted(set(mentor_subjects) | set(mentee_subjects)):
+        mentee_count = mentee_subjects.get(subject, 0)
+        mentor_count = mentor_subjects.get(subject, 0)
+        ratio = mentor_count / mentee_count if mentee_count > 0 else float('inf') if mentor_count > 0 else 0
+        subject_coverage.append({
+            'subject': subject,
+            'mentee_count': mentee_count,
+            'mentor_count': mentor_count,
+            'ratio': ratio
+        })
+
+    years = merged['years']
+    return {
+        'active_mentors': active_mentors,
+        'status_counts': {status: merged['statuses'].get(status, 0) for status in SESSION_STATUSES},
+        'popular_subjects': sorted(mentee_subjects.items(), key=lambda item: -item[1])[:10],
+        'year_distribution': sorted(years.items()),
+        'max_year_count': max(years.values()) if years else 1,
+        'top_mentors': sorted(mentor_performance, key=lambda x: (x['session_count'], x['success_rate']),
+                              reverse=True)[:5],
+        'monthly_completed': merged['monthly_completed'],
+        'subject_coverage': subject_coverage,
+    }
+
+
+def _worker_engine(url):
+    engine = _worker_engines.get(url)
+    if engine is None:
+        engine = _worker_engines[url] = create_engine(url, poolclass=NullPool)
+    return engine
+
+
+def process_pool(workers, start_method='spawn'):
+    """The process's shared pool for this size and start method, started on first use
+
+    A pool inherited across fork (gunicorn preload) is never reused.
+    """
+    key = (workers, start_method)
+    with _pools_lock:
+        pid, pool = _pools.get(key, (None, None))
+        if pool is None or pid != os.getpid():
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method))
+            _pools[key] = (os.getpid(), pool)
+        return pool
+
+
+def _discard_pool(pool):
+    with _pools_lock:
+        for key, (_, current) in list(_pools.items()):
+            if current is pool:
+                del _pools[key]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+@atexit.register
+def shutdown_pools():
+    """Stop this process's worker pools"""
+    with _pools_lock:
+        pools = [pool for pid, pool in _pools.values() if pid == os.getpid()]
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _aggregate_in_worker(url, schema_translate_map, session_range, mentee_range):
+    with _worker_engine(url).connect() as conn:
+        if schema_translate_map:
+            conn = conn.execution_options(schema_translate_map=schema_translate_map)
+        return aggregate_partition(conn, session_range, mentee_range)
+
+
+def compute_statistics(conn, url=None, workers=1, min_parallel_rows=200000, partitions_per_worker=4,
+                       start_method='spawn', schema_translate_map=None):
+    """Statistics page figures, aggregated across processes for large datasets
+
+    conn is used for the in-process path and the small lookups; url lets
+    worker processes connect on their own (pass None for in-memory databases),
+    and schema_translate_map points them at a school's schema.
+    """
+    session_low, session_high, session_rows = conn.execute(
+        select(func.min(session_table.c.id), func.max(session_table.c.id), func.count())).one()
+    mentee_low, mentee_high, mentee_rows = conn.execute(
+        select(func.min(mentee_table.c.id), func.max(mentee_table.c.id), func.count())).one()
+    mentors = conn.execute(select(mentor_table.c.id, mentor_table.c.name, mentor_table.c.subjects)
+                           .order_by(mentor_table.c.id)).all()
+
+    if workers <= 1 or url is None or session_rows + mentee_rows < min_parallel_rows:
+        session_range = (session_low, session_high + 1) if session_low is not None else None
+        mentee_range = (mentee_low, mentee_high + 1) if mentee_low is not None else None
+        partials = [aggregate_partition(conn, session_range, mentee_range)]
+    else:
+        # Several ranges per worker even out partitions of uneven density
+        parts = workers * partitions_per_worker
+        session_ranges = key_ranges(session_low, session_high, parts)
+        mentee_ranges = key_ranges(mentee_low, mentee_high, parts)
+        count = max(len(session_ranges), len(mentee_ranges))
+        session_ranges += [None] * (count - len(session_ranges))
+        mentee_ranges += [None] * (count - len(mentee_ranges))
+        pool = process_pool(workers, start_method)
+        try:
+            # map() returns results in submission (key) order, which the merge relies on
+            partials = list(pool.map(_aggregate_in_worker, [url] * count, [schema_translate_map] * count,
+                                     session_ranges, mentee_ranges))
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool on the next call
+            _discard_pool(pool)
+            raise
+
+    return summarize(merge_partials(partials), mentors)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Analytics Testing Suite
+Checks that the key-range partitioned statistics aggregation gives exactly
+the figures of the original per-row loops, and that the process-pool result
+is identical to the single-process one however the data is partitioned.
+
+Runs against a throwaway SQLite database (never mentorship.db).
+"""
+
+import os
+import random
+import sys
+from collections import Counter, defaultdict
+from datetime import date, time, timedelta
+
+from suite_support import SuiteLogger, scratch_environment
+
+# Point the app at a scratch database before it is imported
+scratch_environment('analytics')
+
+import app as flask_app
+import analytics
+from analytics import compute_statistics
+
+ROLL_CALLS = ['7A', '8B', '9/1', '10/2', '11C', '12/7', 'X1', '']
+STATUSES = ['completed', 'scheduled', 'canceled', 'missed', 'rescheduled', 'completed']
+SUBJECTS = ['English', 'Mathematics', 'Science', 'History', 'Chess']
+
+
+logger = SuiteLogger()
+
+
+def seed_database(mentors=12, mentees=400, sessions=3000):
+    rng = random.Random(7)
+    with flask_app.app.app_context():
+        flask_app.db.drop_all()
+        flask_app.db.create_all()
+        mentor_rows = [flask_app.Mentor(name=f'Mentor {i}', roll_call='12/7', max_mentees=50,
+                                        subjects=', '.join(rng.sample(SUBJECTS + ['Art'], rng.randint(1, 3))))
+                       for i in range(mentors)]
+        flask_app.db.session.add_all(mentor_rows)
+        flask_app.db.session.flush()
+        mentee_rows = [flask_app.Mentee(name=f'Student {i}', roll_call=rng.choice(ROLL_CALLS),
+                                        subject=rng.choice(SUBJECTS), lessons_remaining=5)
+                       for i in range(mentees)]
+        flask_app.db.session.add_all(mentee_rows)
+        flask_app.db.session.flush()
+        # The last two mentors never get sessions
+        for _ in range(sessions):
+            mentee = rng.choice(mentee_rows)
+            flask_app.db.session.add(flask_app.Session(
+                mentor_id=rng.choice(mentor_rows[:-2]).id, mentee_id=mentee.id,
+                date=date.today() - timedelta(days=rng.randint(0, 900)), start_time=time(12, 30),
+                end_time=time(13, 15), duration_minutes=45, subject=mentee.subject,
+                status=rng.choice(STATUSES)))
+        flask_app.db.session.commit()
+        # Gaps in the key ranges, as deletes leave in real history
+        flask_app.Session.query.filter((flask_app.Session.id % 17 == 0)
+                                       | flask_app.Session.mentee_id.between(100, 160)).delete()
+        flask_app.Mentee.query.filter(flask_app.Mentee.id.between(100, 160)).delete()
+        flask_app.db.session.commit()
+
+
+def reference_statistics():
+    """The original per-row loops from the statistics page"""
+    all_mentees = flask_app.Mentee.query.all()
+    all_mentors = flask_app.Mentor.query.all()
+    year_counts = defaultdict(int)
+    for mentee in all_mentees:
+        roll_call = mentee.roll_call
+        if roll_call:
+            if '/' in roll_call:
+                year = roll_call.split('/')[0]
+            else:
+                year = roll_call[0] if roll_call[0].isdigit() else roll_call[:2] if roll_call[:2].isdigit() else 'Unknown'
+            year_counts[year] += 1
+    mentor_performance = []
+    for mentor in all_mentors:
+        sessions = mentor.sessions
+        completed = len([s for s in sessions if s.status == 'completed'])
+        if sessions:
+            mentor_performance.append({'name': mentor.name, 'subjects': mentor.subjects,
+                                       'session_count': len(sessions),
+                                       'success_rate': round(completed / len(sessions) * 100, 1)})
+    monthly_counts = defaultdict(int)
+    for session in flask_app.Session.query.all():
+        if session.status == 'completed':
+            monthly_counts[session.date.strftime('%Y-%m')] += 1
+    mentor_subjects = defaultdict(int)
+    for mentor in all_mentors:
+        for subject in mentor.get_subjects_list():
+            mentor_subjects[subject.strip()] += 1
+    mentee_subjects = Counter([mentee.subject for mentee in all_mentees])
+    subject_coverage = []
+    for subject in sorted(set(mentor_subjects) | set(mentee_subjects)):
+        mentee_count, mentor_count = mentee_subjects.get(subject, 0), mentor_subjects.get(subject, 0)
+        subject_coverage.append({'subject': subject, 'mentee_count': mentee_count, 'mentor_count': mentor_count,
+                                 'ratio': mentor_count / mentee_count if mentee_count > 0
+                                 else float('inf') if mentor_count > 0 else 0})
+    return {
+        'active_mentors': len([m for m in all_mentors if len(m.sessions) > 0]),
+        'status_counts': {s: flask_app.Session.query.filter_by(status=s).count()
+                          for s in ('completed', 'scheduled', 'canceled', 'missed', 'rescheduled')},
+        'popular_subjects': mentee_subjects.most_common(10),
+        'year_distribution': sorted(year_counts.items()),
+        'max_year_count': max(year_counts.values()) if year_counts else 1,
+        'top_mentors': sorted(mentor_performance, key=lambda x: (x['session_count'], x['success_rate']),
+                              reverse=True)[:5],
+        'monthly_completed': dict(monthly_counts),
+        'subject_coverage': subject_coverage,
+    }
+
+
+def test_matches_original_loops():
+    with flask_app.app.app_context():
+        expected = reference_statistics()
+        summary = compute_statistics(flask_app.db.session.connection(), workers=1)
+    mismatched = [key for key in expected if summary[key] != expected[key]]
+    logger.log_result("Single-process aggregation matches the original per-row loops", not mismatched,
+                      f"mismatched fields: {mismatched}" if mismatched else f"{len(expected)} fields compared")
+
+
+def test_process_pool_identical():
+    url = os.environ['DATABASE_URL']
+    with flask_app.app.app_context():
+        conn = flask_app.db.session.connection()
+        single = compute_statistics(conn, url, workers=1)
+        for workers, per_worker in [(2, 1), (3, 4), (4, 7)]:
+            parallel = compute_statistics(conn, url, workers=workers, min_parallel_rows=0,
+                                          partitions_per_worker=per_worker)
+            logger.log_result(f"{workers} worker processes x {per_worker} partitions give the identical result",
+                              parallel == single)
+
+        pool = analytics.process_pool(2)
+        before = set(pool._processes)
+        compute_statistics(conn, url, workers=2, min_parallel_rows=0)
+        logger.log_result("Later calls reuse the process's pool instead of spawning a new one",
+                          analytics.process_pool(2) is pool and set(pool._processes) == before,
+                          f"{len(before)} worker processes")
+
+
+def test_empty_database():
+    with flask_app.app.app_context():
+        flask_app.db.drop_all()
+        flask_app.db.create_all()
+        summary = compute_statistics(flask_app.db.session.connection(), os.environ['DATABASE_URL'],
+                                     workers=2, min_parallel_rows=0)
+    logger.log_result("An empty database aggregates without errors",
+                      summary['active_mentors'] == 0 and summary['year_distribution'] == [])
+
+
+def test_statistics_page():
+    page = flask_app.app.test_client().get('/statistics')
+    logger.log_result("Statistics page renders from the aggregated figures", page.status_code == 200,
+                      f"status={page.status_code}")
+
+
+def main():
+    logger.log_header("ANALYTICS AGGREGATION TESTS")
+    print(f"📂 Scratch database: {os.environ['DATABASE_URL']}")
+    flask_app.init_db()
+    seed_database()
+
+    test_matches_original_loops()
+    test_process_pool_identical()
+    test_statistics_page()
+    test_empty_database()
+
+    return logger.finish("analytics aggregation is exact", "analytics aggregation differs")
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -5,13 +5,38 @@ A comprehensive web application for managing mentor-mentee relationships,
 scheduling sessions, and tracking progress in educational settings.
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
+from jinja2 import FileSystemBytecodeCache, TemplateError
+from sqlalchemy import event, func, insert, inspect, literal, or_, select, update
+from sqlalchemy.orm.exc import StaleDataError
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import csv
 import io
 import os
 
+import access_log
+from analytics import compute_statistics
+from cache import create_cache
+import compression
+from jobs import FINISHED_STATES, QUEUED, RUNNING, SUCCEEDED, JobQueue, JobRunner
+from database_profiles import (engine_options_from_env, install_sqlite_profile, normalize_database_url,
+                               pool_stats, read_only_sqlite_url, sqlite_pragmas_from_env)
+import db_maintenance
+import db_routing
+import health
+from db_routing import REPLICA_BIND, RoutingSession, primary_reads, use_replica
+import memory_profiling
+import metrics
+import profiler
+import query_stats
+import slow_queries
+import static_assets
+import tenancy
+import tracing
+from tenancy import TenantCache
+
 # Initialize Flask app
 app = Flask(__name__)
 
@@ -21,14 +46,239 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Database configuration
 basedir = os.path.abspath(os.path.dirname(__file__))
-database_url = os.environ.get('DATABASE_URL')
+database_url = normalize_database_url(os.environ.get('DATABASE_URL'))
 if database_url:
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
 else:
     app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(basedir, "mentorship.db")}'
 
+# SQLite performance profile (WAL, synchronous=NORMAL, busy timeout, ...),
+# applied to every new SQLite connection. Set SQLITE_PROFILE=False to use
+# SQLite's defaults.
+app.config['SQLITE_PROFILE'] = os.environ.get('SQLITE_PROFILE', 'True').lower() == 'true'
+app.config['SQLITE_PRAGMAS'] = sqlite_pragmas_from_env(os.environ)
+if app.config['SQLITE_PROFILE']:
+    install_sqlite_profile(app.config['SQLITE_PRAGMAS'])
+
+# Connection pool profile: pool size, overflow, recycle and pre-ping, plus
+# statement timeouts on PostgreSQL. Tune with the DB_* environment variables.
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options_from_env(
+    app.config['SQLALCHEMY_DATABASE_URI'], os.environ)
+
+# Read/write routing: GET requests and report jobs read through a read-only
+# bind (DATABASE_REPLICA_URL, or the SQLite file opened read-only) while
+# writes go to the primary. After a write the same browser keeps reading
+# from the primary for DB_STICKY_SECONDS so it sees its own change.
+app.config['DB_READ_ROUTING'] = os.environ.get('DB_READ_ROUTING', 'True').lower() == 'true'
+app.config['DATABASE_REPLICA_URL'] = normalize_database_url(os.environ.get('DATABASE_REPLICA_URL')) \
+    or read_only_sqlite_url(app.config['SQLALCHEMY_DATABASE_URI'])
+app.config['DB_STICKY_SECONDS'] = float(os.environ.get('DB_STICKY_SECONDS', 5))
+if app.config['DB_READ_ROUTING'] and app.config['DATABASE_REPLICA_URL']:
+    app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: app.config['DATABASE_REPLICA_URL']}
+
+# Cache configuration
+# CACHE_BACKEND=memory keeps a private LRU per worker, so it only suits a single
+# process; CACHE_BACKEND=sqlite (the default under gunicorn.conf.py) shares one
+# cache file between all workers on the node.
+app.config['CACHE_BACKEND'] = os.environ.get('CACHE_BACKEND', 'memory')
+app.config['CACHE_DIR'] = os.environ.get('CACHE_DIR', os.path.join(basedir, 'instance'))
+app.config['CACHE_DEFAULT_TTL'] = int(os.environ.get('CACHE_DEFAULT_TTL', 300))
+app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+app.config['CACHE_MAX_BYTES'] = int(os.environ.get('CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+# Template configuration
+# Compiled template bytecode is persisted so new workers skip the Jinja compile
+# step, and every template is compiled at boot so no user pays for it.
+app.config['TEMPLATE_CACHE_DIR'] = os.environ.get('TEMPLATE_CACHE_DIR', os.path.join(basedir, 'instance', 'jinja_cache'))
+app.config['TEMPLATE_WARMUP'] = os.environ.get('TEMPLATE_WARMUP', 'True').lower() == 'true'
+
+if app.config['TEMPLATE_CACHE_DIR']:
+    os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+
+# Background jobs
+# Heavy operations run on worker threads fed from a SQLite job queue shared by
+# every process on the node. JOBS_MODE=inline runs them inside the request.
+app.config['JOBS_MODE'] = os.environ.get('JOBS_MODE', 'thread')
+app.config['JOBS_DB'] = os.environ.get('JOBS_DB', os.path.join(basedir, 'instance', 'jobs.sqlite3'))
+app.config['JOBS_WORKERS'] = int(os.environ.get('JOBS_WORKERS', 2))
+app.config['JOBS_EXPORT_DIR'] = os.environ.get('JOBS_EXPORT_DIR', os.path.join(basedir, 'instance', 'exports'))
+# Exports with more rows than this are built by a background job
+app.config['EXPORT_BACKGROUND_ROWS'] = int(os.environ.get('EXPORT_BACKGROUND_ROWS', 5000))
+
+# Query instrumentation: every response reports its SQL query count and DB
+# time in Server-Timing/X-Query-Count; QUERY_STATS_LOG adds a JSON log line per request.
+app.config['QUERY_STATS_ENABLED'] = os.environ.get('QUERY_STATS_ENABLED', 'True').lower() == 'true'
+app.config['QUERY_STATS_HEADERS'] = os.environ.get('QUERY_STATS_HEADERS', 'True').lower() == 'true'
+app.config['QUERY_STATS_LOG'] = os.environ.get('QUERY_STATS_LOG', 'False').lower() == 'true'
+
+# Slow-query log: statements over SLOW_QUERY_MS are appended to SLOW_QUERY_LOG
+# with their normalized SQL, parameter types, route and query plan. Rank them
+# with `python slow_queries.py`.
+app.config['SLOW_QUERY_ENABLED'] = os.environ.get('SLOW_QUERY_ENABLED', 'True').lower() == 'true'
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 100))
+app.config['SLOW_QUERY_LOG'] = os.environ.get('SLOW_QUERY_LOG', os.path.join(basedir, 'instance', 'slow_queries.log'))
+app.config['SLOW_QUERY_EXPLAIN'] = os.environ.get('SLOW_QUERY_EXPLAIN', 'True').lower() == 'true'
+
+# Prometheus metrics at /metrics. With several worker processes, METRICS_DIR
+# must be a directory they all share so a scrape sees every worker.
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR') or None
+app.config['METRICS_FLUSH_SECONDS'] = float(os.environ.get('METRICS_FLUSH_SECONDS', 1))
+
+# Request profiler: a request carrying PROFILER_TOKEN in the X-Profile header
+# (or ?_profile=) is profiled and its flamegraph and summary saved in PROFILE_DIR.
+app.config['PROFILER_TOKEN'] = os.environ.get('PROFILER_TOKEN') or None
+app.config['PROFILER_MODE'] = os.environ.get('PROFILER_MODE', 'sample')
+app.config['PROFILER_INTERVAL_MS'] = float(os.environ.get('PROFILER_INTERVAL_MS', 1))
+app.config['PROFILER_TOP'] = int(os.environ.get('PROFILER_TOP', 30))
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', os.path.join(basedir, 'instance', 'profiles'))
+
+# Memory profiling (diagnostics only): tracemalloc snapshots around every request
+# and background job, with retained/peak memory per route at /admin/memory.
+app.config['MEMORY_PROFILING'] = os.environ.get('MEMORY_PROFILING', 'False').lower() == 'true'
+app.config['MEMORY_PROFILE_FRAMES'] = int(os.environ.get('MEMORY_PROFILE_FRAMES', 10))
+app.config['MEMORY_PROFILE_SAMPLE_RATE'] = float(os.environ.get('MEMORY_PROFILE_SAMPLE_RATE', 1.0))
+app.config['MEMORY_PROFILE_TOP'] = int(os.environ.get('MEMORY_PROFILE_TOP', 10))
+app.config['MEMORY_GROWTH_CALLS'] = int(os.environ.get('MEMORY_GROWTH_CALLS', 5))
+app.config['MEMORY_GROWTH_KB'] = float(os.environ.get('MEMORY_GROWTH_KB', 64))
+
+# Request tracing: each request is split into routing, python, db, orm, render
+# and response time, summarized per route at /admin/traces. TRACING_EXPORT
+# sends OTLP/JSON traces to a file or an http(s) collector URL.
+app.config['TRACING_ENABLED'] = os.environ.get('TRACING_ENABLED', 'True').lower() == 'true'
+app.config['TRACING_EXPORT'] = os.environ.get('TRACING_EXPORT', '')
+app.config['TRACING_SAMPLE_RATE'] = float(os.environ.get('TRACING_SAMPLE_RATE', 1.0))
+app.config['TRACING_SERVICE_NAME'] = os.environ.get('TRACING_SERVICE_NAME', 'mentorship')
+
+# Access log: one JSON line per request (request ID, route, status, bytes, time,
+# DB time, queries, cache hits), written off the request path. ACCESS_LOG is
+# "-" for stdout or a file; the request ID is taken from / returned in REQUEST_ID_HEADER.
+app.config['ACCESS_LOG_ENABLED'] = os.environ.get('ACCESS_LOG_ENABLED', 'True').lower() == 'true'
+app.config['ACCESS_LOG'] = os.environ.get('ACCESS_LOG', '-')
+app.config['ACCESS_LOG_QUEUE_SIZE'] = int(os.environ.get('ACCESS_LOG_QUEUE_SIZE', 10000))
+app.config['REQUEST_ID_HEADER'] = os.environ.get('REQUEST_ID_HEADER', 'X-Request-ID')
+
+# Health probes: /healthz (liveness) never touches the database; /readyz pings
+# it with a HEALTH_DB_TIMEOUT_MS budget and reuses the result for HEALTH_CACHE_SECONDS.
+app.config['HEALTH_DB_TIMEOUT_MS'] = float(os.environ.get('HEALTH_DB_TIMEOUT_MS', 500))
+app.config['HEALTH_CACHE_SECONDS'] = float(os.environ.get('HEALTH_CACHE_SECONDS', 2))
+app.config['HEALTH_POOL_MAX_UTILIZATION'] = float(os.environ.get('HEALTH_POOL_MAX_UTILIZATION', 1.0))
+
+# Database maintenance: instead of a full VACUUM, a db_maintenance job per
+# school runs incremental vacuum, ANALYZE of stale tables, PRAGMA optimize and
+# a WAL checkpoint every DB_MAINTENANCE_INTERVAL seconds, each slice stopping
+# after DB_MAINTENANCE_SLICE_MS. Figures at /admin/database.
+app.config['DB_MAINTENANCE_ENABLED'] = os.environ.get('DB_MAINTENANCE_ENABLED', 'True').lower() == 'true'
+app.config['DB_MAINTENANCE_INTERVAL'] = float(os.environ.get('DB_MAINTENANCE_INTERVAL', 900))
+app.config['DB_MAINTENANCE_SLICE_MS'] = float(os.environ.get('DB_MAINTENANCE_SLICE_MS', 250))
+app.config['DB_MAINTENANCE_VACUUM_PAGES'] = int(os.environ.get('DB_MAINTENANCE_VACUUM_PAGES', 256))
+app.config['DB_MAINTENANCE_ANALYSIS_LIMIT'] = int(os.environ.get('DB_MAINTENANCE_ANALYSIS_LIMIT', 1000))
+app.config['DB_MAINTENANCE_REPORT_SECONDS'] = float(os.environ.get('DB_MAINTENANCE_REPORT_SECONDS', 60))
+
+# Analytics
+# The statistics page aggregates sessions and mentees by key range across a
+# process pool once there are more than ANALYTICS_PARALLEL_ROWS rows.
+app.config['ANALYTICS_WORKERS'] = int(os.environ.get('ANALYTICS_WORKERS', os.cpu_count() or 1))
+app.config['ANALYTICS_PARALLEL_ROWS'] = int(os.environ.get('ANALYTICS_PARALLEL_ROWS', 200000))
+app.config['ANALYTICS_START_METHOD'] = os.environ.get('ANALYTICS_START_METHOD', 'spawn')
+
+# Multi-school tenancy: SCHOOLS lists the schools (JSON, or a JSON file) and
+# each gets its own database shard, connection pool and cache. Requests pick a
+# school by host (or by the SCHOOL_HEADER header, only when a trusted proxy
+# sets it); everything else uses the DEFAULT_SCHOOL, which is the DATABASE_URL above.
+app.config['SCHOOLS'] = os.environ.get('SCHOOLS', '')
+app.config['DEFAULT_SCHOOL'] = os.environ.get('DEFAULT_SCHOOL', 'default')
+app.config['SCHOOL_HEADER'] = os.environ.get('SCHOOL_HEADER', 'X-School-ID')
+app.config['SCHOOL_HEADER_TRUSTED'] = os.environ.get('SCHOOL_HEADER_TRUSTED', 'False').lower() == 'true'
+app.config['SCHOOL_BASE_DOMAIN'] = os.environ.get('SCHOOL_BASE_DOMAIN', '')
+app.config['SCHOOL_DATABASE_DIR'] = os.environ.get('SCHOOL_DATABASE_DIR', os.path.join(basedir, 'instance', 'schools'))
+
 # Initialize database
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+tenants = tenancy.init_app(app, db)
+db_routing.init_app(app, db)
+
+# Serve fingerprinted static assets when they have been built (python static_assets.py)
+static_assets.init_app(app)
+
+# Negotiated gzip/brotli compression of HTML, JSON and CSV responses
+compression.init_app(app)
+
+# Per-request query count and DB time (Server-Timing, X-Query-Count, log line)
+query_stats.init_app(app)
+
+# Request, query, pool, cache and job metrics in Prometheus format at /metrics
+metrics_registry = metrics.init_app(app)
+
+# Log statements slower than SLOW_QUERY_MS with their query plans
+slow_queries.init_app(app)
+
+# Profile single requests on demand (X-Profile: <PROFILER_TOKEN>)
+profiler.init_app(app)
+
+# Per-phase timing spans for every request (after the other request hooks)
+tracing.init_app(app)
+
+# Retained and peak memory per request and job when MEMORY_PROFILING is on
+memory_profiler = memory_profiling.init_app(app)
+
+# JSON access log with X-Request-ID, written through a queue
+access_log.init_app(app, tenants.current_school_id)
+
+# /healthz and /readyz, answered in front of every other wrapper
+health.init_app(app, db)
+
+# Initialize cache (one per school, each with the full size budget)
+def create_school_cache(school_id):
+    suffix = '' if school_id == app.config['DEFAULT_SCHOOL'] else f'-{school_id}'
+    return create_cache(
+        app.config['CACHE_BACKEND'],
+        path=os.path.join(app.config['CACHE_DIR'], f'cache{suffix}.sqlite3'),
+        default_ttl=app.config['CACHE_DEFAULT_TTL'],
+        max_entries=app.config['CACHE_MAX_ENTRIES'],
+        max_bytes=app.config['CACHE_MAX_BYTES']
+    )
+
+cache = TenantCache(create_school_cache, tenants.current_school_id)
+
+# Initialize background jobs (handlers are registered further down)
+@contextmanager
+def job_app_context(job):
+    """App context for a background job, with the school that queued it selected"""
+    with app.app_context(), memory_profiler.measure(f"job {job['type']}"), \
+            access_log.use_request_id(job['payload'].get('request_id')):
+        tenants.activate(job['payload'].get('school_id', app.config['DEFAULT_SCHOOL']))
+        yield
+
+job_queue = JobQueue(app.config['JOBS_DB'], files_dir=app.config['JOBS_EXPORT_DIR'])
+job_runner = JobRunner(job_queue, workers=app.config['JOBS_WORKERS'], context_factory=job_app_context)
+
+# Cached views that depend on database contents live under this namespace
+# and are dropped whenever a transaction that changed data commits.
+DATA_CACHE_NAMESPACE = 'data'
+
+@event.listens_for(db.session, 'after_flush')
+def mark_cache_dirty(session, flush_context):
+    """Remember that this transaction wrote rows"""
+    session.info['cache_dirty'] = True
+
+@event.listens_for(db.session, 'do_orm_execute')
+def mark_cache_dirty_bulk(orm_execute_state):
+    """Bulk and conditional INSERT/UPDATE/DELETE bypass the flush, so catch them here"""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['cache_dirty'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_data_cache(session):
+    """Invalidate cached data views after a committed write"""
+    if session.info.pop('cache_dirty', False):
+        cache.invalidate(DATA_CACHE_NAMESPACE)
+
+@event.listens_for(db.session, 'after_rollback')
+def reset_cache_dirty(session):
+    """Rolled back writes never reached the database"""
+    session.info.pop('cache_dirty', None)
 
 # Australian curriculum subjects
 AUSTRALIAN_SUBJECTS = [
@@ -112,6 +362,10 @@ def validate_roll_call(roll_call):
                 re.match(pattern3, roll_call))
 
 # Database Models
+def parse_subjects(subjects):
+    """Split a comma-separated subjects column into a list"""
+    return [s.strip() for s in subjects.split(',') if s.strip()]
+
 class Mentor(db.Model):
     """Mentor model representing tutors/teachers"""
     id = db.Column(db.Integer, primary_key=True)
@@ -127,7 +381,7 @@ class Mentor(db.Model):
     
     def get_subjects_list(self):
         """Return subjects as a list"""
-        return [s.strip() for s in self.subjects.split(',') if s.strip()]
+        return parse_subjects(self.subjects)
     
     def current_mentee_count(self):
         """Return current number of assigned mentees"""
@@ -149,10 +403,14 @@ class Mentee(db.Model):
     lessons_remaining = db.Column(db.Integer, default=0)
     mentor_id = db.Column(db.Integer, db.ForeignKey('mentor.id'), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     
     # Relationships
     sessions = db.relationship('Session', backref='mentee', lazy=True)
     
+    # Every ORM UPDATE checks and bumps the version (optimistic concurrency)
+    __mapper_args__ = {'version_id_col': version}
+    
     def get_total_lessons(self):
         """Get total lessons for the subject"""
         lesson_counts = {'Math': 7, 'English': 7, 'Science': 3, 'Chess': 6}
@@ -189,6 +447,9 @@ class Session(db.Model):
     status = db.Column(db.String(20), default='scheduled')  # scheduled, completed, cancelled
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    
+    __mapper_args__ = {'version_id_col': version}
     
     def get_datetime_start(self):
         """Get combined datetime for start"""
@@ -209,6 +470,474 @@ class Session(db.Model):
     def __repr__(self):
         return f'<Session {self.mentor.name} -> {self.mentee.name} on {self.date}>'
 
+# Capacity enforcement
+# Capacity checks and the writes they guard happen in one conditional
+# statement, so two concurrent requests can't both pass the check and
+# overfill a mentor. SQLite runs every write under its single writer lock;
+# on PostgreSQL the mentor row is locked first so the count the statement
+# sees includes every committed assignment, while writers for other
+# mentors proceed in parallel.
+MAX_SESSIONS_PER_MENTOR = 7
+
+def lock_mentor_row(mentor_id):
+    """Take a row lock on the mentor on databases that support it"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(select(Mentor.id).where(Mentor.id == mentor_id).with_for_update())
+
+def assign_within_capacity(mentee_id, mentor_id, only_unassigned=False):
+    """Assign a mentee to a mentor only if the mentor still has room
+
+    Returns True if the mentee was assigned, or already was assigned to this
+    mentor (re-saving an assignment on a full mentor is not over capacity).
+    The caller commits.
+    """
+    lock_mentor_row(mentor_id)
+    current_count = select(func.count(Mentee.id)).where(Mentee.mentor_id == mentor_id).scalar_subquery()
+    max_mentees = select(Mentor.max_mentees).where(Mentor.id == mentor_id).scalar_subquery()
+    stmt = update(Mentee).where(Mentee.id == mentee_id,
+                                or_(Mentee.mentor_id == mentor_id, current_count < max_mentees))
+    if only_unassigned:
+        stmt = stmt.where(Mentee.mentor_id.is_(None))
+    result = db.session.execute(
+        stmt.values(mentor_id=mentor_id, version=Mentee.version + 1),
+        execution_options={'synchronize_session': False}
+    )
+    return result.rowcount == 1
+
+def use_lesson(mentee_id):
+    """Decrement a mentee's remaining lessons if any are left; returns True on success"""
+    result = db.session.execute(
+        update(Mentee)
+        .where(Mentee.id == mentee_id, Mentee.lessons_remaining > 0)
+        .values(lessons_remaining=Mentee.lessons_remaining - 1, version=Mentee.version + 1),
+        execution_options={'synchronize_session': False}
+    )
+    return result.rowcount == 1
+
+def restore_lesson(mentee_id):
+    """Give a mentee back one lesson"""
+    db.session.execute(
+        update(Mentee)
+        .where(Mentee.id == mentee_id)
+        .values(lessons_remaining=Mentee.lessons_remaining + 1, version=Mentee.version + 1),
+        execution_options={'synchronize_session': False}
+    )
+
+def insert_session_within_cap(**values):
+    """Insert a session only if the mentor is below the session cap; returns True on success"""
+    lock_mentor_row(values['mentor_id'])
+    columns = list(values)
+    session_count = select(func.count(Session.id)) \
+        .where(Session.mentor_id == values['mentor_id']).scalar_subquery()
+    rows = select(*[literal(values[c], getattr(Session, c).type) for c in columns]) \
+        .where(session_count < MAX_SESSIONS_PER_MENTOR)
+    result = db.session.execute(insert(Session).from_select(columns, rows))
+    return result.rowcount == 1
+
+# Optimistic concurrency
+# Mentee and Session rows carry a version that every ORM UPDATE checks and
+# bumps (set-based UPDATEs bump it explicitly), so an edit based on a stale
+# read fails instead of silently overwriting someone else's change. Forms
+# and API clients send back the version they loaded; a mismatch, or a row
+# that changed between our read and our commit, becomes a 409 carrying the
+# current row so the client can retry against it. No row locks are taken.
+class EditConflict(Exception):
+    """An edit was made against an out-of-date version of a row"""
+    
+    def __init__(self, model, row_id):
+        super().__init__(f'This {model.__name__.lower()} was changed by someone else while you were editing it.')
+        self.model = model
+        self.row_id = row_id
+
+def edit_data():
+    """Submitted fields from a form post or a JSON body"""
+    return request.get_json(silent=True) or request.form
+
+def check_version(row, submitted):
+    """Raise EditConflict if the client edited an older version of the row"""
+    if submitted in (None, ''):
+        return  # Older clients that don't send a version still get the commit-time check
+    try:
+        submitted = int(submitted)
+    except (TypeError, ValueError):
+        submitted = None
+    if submitted != row.version:
+        raise EditConflict(type(row), row.id)
+
+def row_snapshot(row):
+    """The fields a client needs to retry an edit against the current row"""
+    if isinstance(row, Session):
+        return {'id': row.id, 'version': row.version, 'status': row.status, 'date': row.date.isoformat(),
+                'start_time': row.start_time.strftime('%H:%M'), 'end_time': row.end_time.strftime('%H:%M')}
+    return {'id': row.id, 'version': row.version, 'mentor_id': row.mentor_id,
+            'lessons_remaining': row.lessons_remaining}
+
+def wants_json():
+    return request.accept_mimetypes.best == 'application/json'
+
+def edit_saved(row, message, next_url):
+    """Respond to a successful versioned edit"""
+    if wants_json():
+        return jsonify(row_snapshot(row))
+    flash(message, 'success')
+    return redirect(next_url)
+
+# Reassignment engine
+def apply_reassignments(from_mentor_id, pairs):
+    """Move mentees off one mentor as a single set-based batch
+
+    Loads every submitted mentee, and every target mentor with its current
+    mentee count, in two queries. Subjects and capacity are checked against
+    an in-memory ledger so one batch can't overfill a mentor, and the
+    accepted moves are applied with one UPDATE per target mentor. That
+    UPDATE re-checks the target's capacity, like assign_within_capacity, so
+    a concurrent batch or assignment can't overfill it between our count
+    and our write; a target that filled up meanwhile gets its mentees moved
+    one at a time until it is full, and the rest become capacity warnings.
+
+    Returns (reassigned_count, warnings). The caller commits.
+    """
+    moves = {}
+    for mentee_id, to_mentor_id in pairs:
+        try:
+            moves[int(mentee_id)] = int(to_mentor_id)
+        except (TypeError, ValueError):
+            continue  # Skip invalid format
+    if not moves:
+        return 0, []
+    
+    mentees_by_id = {m.id: m for m in Mentee.query.filter(Mentee.id.in_(list(moves))).all()}
+    target_rows = db.session.query(Mentor, func.count(Mentee.id)) \
+        .outerjoin(Mentee, Mentee.mentor_id == Mentor.id) \
+        .filter(Mentor.id.in_(set(moves.values()))) \
+        .group_by(Mentor.id).all()
+    targets = {mentor.id: mentor for mentor, _ in target_rows}
+    free_slots = {mentor.id: mentor.max_mentees - count for mentor, count in target_rows}
+    subjects = {mentor.id: set(mentor.get_subjects_list()) for mentor, _ in target_rows}
+    
+    accepted = {}
+    warnings = []
+    for mentee_id, to_mentor_id in moves.items():
+        mentee = mentees_by_id.get(mentee_id)
+        to_mentor = targets.get(to_mentor_id)
+        if not mentee or not to_mentor or mentee.mentor_id != from_mentor_id or to_mentor_id == from_mentor_id:
+            continue
+        if mentee.subject not in subjects[to_mentor_id]:
+            warnings.append(f'Cannot reassign {mentee.name}: {to_mentor.name} cannot teach {mentee.subject}!')
+            continue
+        if free_slots[to_mentor_id] <= 0:
+            warnings.append(f'Cannot reassign {mentee.name}: {to_mentor.name} has reached capacity!')
+            continue
+        free_slots[to_mentor_id] -= 1
+        accepted[mentee_id] = to_mentor_id
+    
+    if not accepted:
+        return 0, warnings
+    
+    by_target = {}
+    for mentee_id, to_mentor_id in accepted.items():
+        by_target.setdefault(to_mentor_id, []).append(mentee_id)
+    reassigned_count = 0
+    # Lock targets in id order so two batches can't deadlock on PostgreSQL
+    for to_mentor_id in sorted(by_target):
+        mentee_ids = by_target[to_mentor_id]
+        lock_mentor_row(to_mentor_id)
+        moved = move_within_capacity(mentee_ids, from_mentor_id, to_mentor_id)
+        if moved == 0 and len(mentee_ids) > 1:
+            # Filled up since we counted: take what still fits, one by one
+            for mentee_id in mentee_ids:
+                moved += move_within_capacity([mentee_id], from_mentor_id, to_mentor_id)
+        if moved < len(mentee_ids):
+            # The mentor_id guard makes a mentee moved by someone else since we loaded it a no-op
+            still_here = db.session.execute(
+                select(Mentee.id).where(Mentee.id.in_(mentee_ids), Mentee.mentor_id == from_mentor_id)
+            ).scalars().all()
+            for mentee_id in still_here:
+                warnings.append(f'Cannot reassign {mentees_by_id[mentee_id].name}: '
+                                f'{targets[to_mentor_id].name} has reached capacity!')
+        reassigned_count += moved
+    return reassigned_count, warnings
+
+def move_within_capacity(mentee_ids, from_mentor_id, to_mentor_id):
+    """Move mentees still with from_mentor_id to to_mentor_id if all of them fit; returns the number moved"""
+    current_count = select(func.count(Mentee.id)).where(Mentee.mentor_id == to_mentor_id).scalar_subquery()
+    max_mentees = select(Mentor.max_mentees).where(Mentor.id == to_mentor_id).scalar_subquery()
+    result = db.session.execute(
+        update(Mentee)
+        .where(Mentee.id.in_(mentee_ids), Mentee.mentor_id == from_mentor_id,
+               current_count + len(mentee_ids) <= max_mentees)
+        .values(mentor_id=to_mentor_id, version=Mentee.version + 1),
+        execution_options={'synchronize_session': False}
+    )
+    return result.rowcount
+
+# Heavy operations
+# Shared by the routes and the background jobs that run them. Each takes an
+# optional progress(done, total) callback; the caller commits.
+def auto_assign_unassigned(progress=None):
+    """Assign every unassigned mentee to the least-loaded mentor who teaches their subject
+
+    Returns the number of mentees assigned.
+    """
+    unassigned_mentees = Mentee.query.filter_by(mentor_id=None).all()
+    assigned_count = 0
+    
+    # Load every mentor with its mentee count once, then keep the
+    # counts current in memory as this batch assigns
+    mentor_rows = db.session.query(Mentor, func.count(Mentee.id)) \
+        .outerjoin(Mentee, Mentee.mentor_id == Mentor.id) \
+        .group_by(Mentor.id).all()
+    mentor_counts = {mentor.id: count for mentor, count in mentor_rows}
+    mentor_subjects = {mentor.id: set(mentor.get_subjects_list()) for mentor, _ in mentor_rows}
+    all_mentors = [mentor for mentor, _ in mentor_rows]
+    
+    for index, mentee in enumerate(unassigned_mentees):
+        if progress:
+            progress(index, len(unassigned_mentees))
+        # Find available mentors who can teach this subject
+        available_mentors = [
+            mentor for mentor in all_mentors
+            if mentee.subject in mentor_subjects[mentor.id]
+            and mentor_counts[mentor.id] < mentor.max_mentees
+        ]
+        
+        # Try mentors with the fewest current mentees first; the
+        # atomic assignment fails if another request filled one
+        for best_mentor in sorted(available_mentors, key=lambda m: mentor_counts[m.id]):
+            if assign_within_capacity(mentee.id, best_mentor.id, only_unassigned=True):
+                mentor_counts[best_mentor.id] += 1
+                assigned_count += 1
+                break
+            mentor_counts[best_mentor.id] = best_mentor.max_mentees
+    return assigned_count
+
+def delete_mentors(mentor_ids, progress=None):
+    """Delete mentors, their sessions and their assignments; returns the number deleted"""
+    deleted_count = 0
+    for index, mentor_id in enumerate(mentor_ids):
+        if progress:
+            progress(index, len(mentor_ids))
+        mentor = Mentor.query.get(mentor_id)
+        if mentor:
+            # Unassign all mentees
+            for mentee in mentor.mentees:
+                mentee.mentor_id = None
+            
+            # Delete associated sessions
+            Session.query.filter_by(mentor_id=mentor_id).delete()
+            
+            # Delete mentor
+            db.session.delete(mentor)
+            deleted_count += 1
+    return deleted_count
+
+def clear_all_records(progress=None):
+    """Delete every session, mentee and mentor"""
+    for index, model in enumerate([Session, Mentee, Mentor]):
+        if progress:
+            progress(index, 3)
+        model.query.delete()
+
+EXPORT_MODELS = {'mentors': Mentor, 'mentees': Mentee, 'sessions': Session}
+
+def write_export_csv(data_type, writer, progress=None):
+    """Write one table as CSV rows; returns the download filename, or None for an unknown type"""
+    if data_type == 'mentors':
+        # Export mentors
+        writer.writerow(['ID', 'Name', 'Roll Call', 'Subjects', 'Max Mentees', 'Current Mentees', 'Created At'])
+        mentors = Mentor.query.all()
+        for index, mentor in enumerate(mentors):
+            if progress:
+                progress(index, len(mentors))
+            writer.writerow([
+                mentor.id,
+                mentor.name,
+                mentor.roll_call,
+                mentor.subjects,
+                mentor.max_mentees,
+                mentor.current_mentee_count(),
+                mentor.created_at.strftime('%Y-%m-%d %H:%M:%S') if mentor.created_at else ''
+            ])
+        return 'mentors_export.csv'
+        
+    elif data_type == 'mentees':
+        # Export mentees
+        writer.writerow(['ID', 'Name', 'Roll Call', 'Subject', 'Lessons Remaining', 'Assigned Mentor', 'Progress %', 'Created At'])
+        mentees = Mentee.query.all()
+        for index, mentee in enumerate(mentees):
+            if progress:
+                progress(index, len(mentees))
+            mentor_name = mentee.assigned_mentor.name if mentee.assigned_mentor else 'Not Assigned'
+            writer.writerow([
+                mentee.id,
+                mentee.name,
+                mentee.roll_call,
+                mentee.subject,
+                mentee.lessons_remaining,
+                mentor_name,
+                mentee.get_progress_percentage(),
+                mentee.created_at.strftime('%Y-%m-%d %H:%M:%S') if mentee.created_at else ''
+            ])
+        return 'mentees_export.csv'
+        
+    elif data_type == 'sessions':
+        # Export sessions
+        writer.writerow(['ID', 'Mentor', 'Mentee', 'Date', 'Start Time', 'End Time', 'Duration (min)', 'Subject', 'Status', 'Notes', 'Created At'])
+        sessions = Session.query.all()
+        for index, session in enumerate(sessions):
+            if progress:
+                progress(index, len(sessions))
+            writer.writerow([
+                session.id,
+                session.mentor.name,
+                session.mentee.name,
+                session.date.strftime('%Y-%m-%d') if session.date else '',
+                session.start_time.strftime('%H:%M') if session.start_time else '',
+                session.end_time.strftime('%H:%M') if session.end_time else '',
+                session.duration_minutes,
+                session.subject,
+                session.status,
+                session.notes or '',
+                session.created_at.strftime('%Y-%m-%d %H:%M:%S') if session.created_at else ''
+            ])
+        return 'sessions_export.csv'
+    
+    return None
+
+# Background job handlers
+# Each runs inside an app context on a job worker thread. Uncommitted work is
+# rolled back when the context closes, so a cancelled or failed job leaves
+# the database untouched.
+JOB_TITLES = {
+    'auto_assign': 'Auto-assign mentees',
+    'bulk_delete_mentors': 'Delete mentors',
+    'clear_all_data': 'Clear all data',
+    'export_data': 'Export data',
+    'rebuild_statistics': 'Rebuild statistics',
+    'db_maintenance': 'Database maintenance',
+}
+
+@job_runner.register('auto_assign', concurrency=1)
+def auto_assign_job(ctx):
+    assigned_count = auto_assign_unassigned(ctx.progress)
+    db.session.commit()
+    enqueue_job('rebuild_statistics', dedupe_key='rebuild_statistics')
+    return {'assigned': assigned_count, 'message': f'Successfully auto-assigned {assigned_count} mentee(s)!'}
+
+@job_runner.register('bulk_delete_mentors', concurrency=1)
+def bulk_delete_mentors_job(ctx):
+    deleted_count = delete_mentors(ctx.payload['mentor_ids'], ctx.progress)
+    db.session.commit()
+    enqueue_job('rebuild_statistics', dedupe_key='rebuild_statistics')
+    return {'deleted': deleted_count, 'message': f'Successfully deleted {deleted_count} mentor(s)!'}
+
+@job_runner.register('clear_all_data', concurrency=1, max_attempts=1)
+def clear_all_data_job(ctx):
+    clear_all_records(ctx.progress)
+    db.session.commit()
+    enqueue_job('rebuild_statistics', dedupe_key='rebuild_statistics')
+    return {'message': 'All data cleared successfully!'}
+
+@job_runner.register('export_data', concurrency=2)
+def export_data_job(ctx):
+    use_replica()
+    data_type = ctx.payload['data_type']
+    os.makedirs(app.config['JOBS_EXPORT_DIR'], exist_ok=True)
+    stored_name = f'{ctx.id}.csv'
+    path = os.path.join(app.config['JOBS_EXPORT_DIR'], stored_name)
+    with open(path, 'w', newline='') as output:
+        filename = write_export_csv(data_type, csv.writer(output), ctx.progress)
+    return {'file': stored_name, 'filename': filename,
+            'message': f'{data_type.capitalize()} export is ready to download.'}
+
+@job_runner.register('rebuild_statistics', concurrency=1)
+def rebuild_statistics_job(ctx):
+    # Reads the primary: the shared cache must never hold a lagging replica's figures
+    generation = cache.generation(DATA_CACHE_NAMESPACE)
+    cache.set(f'{DATA_CACHE_NAMESPACE}:api_statistics', build_api_statistics(), generation=generation)
+    return {'message': 'Statistics rebuilt.'}
+
+@job_runner.register('db_maintenance', concurrency=1, max_attempts=1)
+def db_maintenance_job(ctx):
+    school_id = tenants.current_school_id()
+    try:
+        done = db_maintenance.engine_slice(tenants.primary_engine(school_id), app.config)
+    finally:
+        # Scheduled slices queue the next one even when this one failed
+        if ctx.payload.get('scheduled'):
+            schedule_db_maintenance([school_id], delay=app.config['DB_MAINTENANCE_INTERVAL'])
+    done['message'] = (f"Freed {done.get('vacuumed_pages', 0)} page(s), analyzed {len(done['analyzed'])} "
+                       f"table(s) in {done['duration_ms']:.0f}ms.")
+    return done
+
+def schedule_db_maintenance(school_ids=None, delay=0):
+    """Queue the next maintenance slice for each school, unless one is already waiting"""
+    if not app.config['DB_MAINTENANCE_ENABLED'] or app.config['JOBS_MODE'] != 'thread':
+        return
+    for school_id in school_ids or tenants.school_ids():
+        job_queue.enqueue('db_maintenance', {'school_id': school_id, 'scheduled': True}, max_attempts=1,
+                          dedupe_key=f'{school_id}:db_maintenance', delay=delay)
+
+@job_runner.on_start
+def reseed_db_maintenance():
+    """Restart the slice chain if a killed worker took the slice that would have queued the next one"""
+    schedule_db_maintenance(delay=app.config['DB_MAINTENANCE_INTERVAL'])
+
+def db_maintenance_runs(limit=20):
+    """The latest maintenance slices of the current school"""
+    school_id = tenants.current_school_id()
+    return [{'id': job['id'], 'status': job['status'], 'started_at': job['started_at'],
+             'finished_at': job['finished_at'], 'result': job['result'], 'error': job['error']}
+            for job in job_queue.list(limit=limit + 1, job_type='db_maintenance', school_id=school_id)
+            if job['status'] != QUEUED][:limit]
+
+# Bloat and statistics figures at /api/database and /admin/database
+db_maintenance.init_app(app, lambda: tenants.primary_engine(tenants.current_school_id()), db_maintenance_runs)
+
+def enqueue_job(job_type, payload=None, dedupe_key=None):
+    """Hand work to the job runner; returns the job id"""
+    school_id = tenants.current_school_id()
+    payload = dict(payload or {}, school_id=school_id, request_id=access_log.request_id())
+    if app.config['JOBS_MODE'] == 'inline':
+        return job_runner.run_inline(job_type, payload)
+    if dedupe_key:
+        dedupe_key = f'{school_id}:{dedupe_key}'
+    return job_runner.submit(job_type, payload, dedupe_key=dedupe_key)
+
+def school_job(job_id):
+    """A job, if it belongs to the current school"""
+    job = job_queue.get(job_id)
+    if job is None or job['payload'].get('school_id', app.config['DEFAULT_SCHOOL']) != tenants.current_school_id():
+        return None
+    return job
+
+def job_accepted(job_id, next_url):
+    """Respond to a request whose work was handed to a background job
+
+    API clients get 202 with the job id; browsers go to the job's progress
+    page, or straight back to next_url if the job has already finished.
+    """
+    if wants_json():
+        response = jsonify({'job_id': job_id, 'status_url': url_for('api_job', job_id=job_id)})
+        response.status_code = 202
+        response.headers['Location'] = url_for('api_job', job_id=job_id)
+        return response
+    
+    job = job_queue.get(job_id)
+    if job['status'] in FINISHED_STATES and not (job['result'] or {}).get('file'):
+        if job['status'] == SUCCEEDED:
+            flash(job['message'], 'success')
+        else:
+            flash(f"{JOB_TITLES[job['type']]} failed: {job['error'] or job['message']}", 'error')
+        return redirect(next_url)
+    return redirect(url_for('job_status', job_id=job_id, next=next_url))
+
+def safe_next_url(url, default):
+    """Only follow redirects back into this site"""
+    if url and url.startswith('/') and not url.startswith('//'):
+        return url
+    return default
+
 # Routes
 @app.route('/')
 def dashboard():
@@ -550,13 +1279,12 @@ def assign_mentor():
             flash(f'Mentor {mentor.name} cannot teach {mentee.subject}!', 'error')
             return redirect(url_for('assign_mentor'))
         
-        # Check mentor capacity
-        if not mentor.can_take_more_mentees():
-            flash(f'Mentor {mentor.name} has reached maximum capacity!', 'error')
-            return redirect(url_for('assign_mentor'))
-        
         try:
-            mentee.mentor_id = mentor_id
+            # Capacity is checked in the same statement that assigns
+            if not assign_within_capacity(mentee.id, mentor.id):
+                db.session.rollback()
+                flash(f'Mentor {mentor.name} has reached maximum capacity!', 'error')
+                return redirect(url_for('assign_mentor'))
             db.session.commit()
             flash(f'Successfully assigned {mentor.name} to {mentee.name}!', 'success')
         except Exception as e:
@@ -630,38 +1358,38 @@ def schedule_session():
             flash(f'Error: {mentor.name} cannot teach {mentee.subject}!', 'error')
             return redirect(url_for('schedule_session'))
         
-        # Validation: Check mentor session limit
-        session_count = Session.query.filter_by(mentor_id=mentor.id).count()
-        if session_count >= 7:
-            flash(f'Error: {mentor.name} has reached the maximum of 7 sessions!', 'error')
-            return redirect(url_for('schedule_session'))
-        
-        # Validation: Check mentee lesson limit
-        if mentee.lessons_remaining <= 0:
-            flash(f'Error: {mentee.name} has no lessons remaining!', 'error')
-            return redirect(url_for('schedule_session'))
-        
-        session = Session(
-            mentor_id=mentor_id,
-            mentee_id=mentee_id,
-            date=date,
-            start_time=start_time,
-            end_time=end_time,
-            duration_minutes=duration,
-            subject=mentee.subject
-        )
-        
         try:
-            db.session.add(session)
+            # Validation: Check mentor session limit in the same statement that inserts
+            if not insert_session_within_cap(
+                mentor_id=mentor_id,
+                mentee_id=mentee_id,
+                date=date,
+                start_time=start_time,
+                end_time=end_time,
+                duration_minutes=duration,
+                subject=mentee.subject,
+                status='scheduled',
+                created_at=datetime.utcnow()
+            ):
+                db.session.rollback()
+                flash(f'Error: {mentor.name} has reached the maximum of {MAX_SESSIONS_PER_MENTOR} sessions!', 'error')
+                return redirect(url_for('schedule_session'))
             
-            # If mentee wasn't assigned to this mentor, assign them automatically
+            # Validation: Check mentee lesson limit (and use up one lesson atomically)
+            if not use_lesson(mentee.id):
+                db.session.rollback()
+                flash(f'Error: {mentee.name} has no lessons remaining!', 'error')
+                return redirect(url_for('schedule_session'))
+            
+            # If mentee wasn't assigned to this mentor, assign them automatically,
+            # within the mentor's mentee cap
             if mentee.mentor_id != mentor_id:
-                mentee.mentor_id = mentor_id
+                if not assign_within_capacity(mentee.id, mentor_id):
+                    db.session.rollback()
+                    flash(f'Error: {mentor.name} has reached maximum capacity and cannot take {mentee.name}!', 'error')
+                    return redirect(url_for('schedule_session'))
                 flash(f'Note: {mentee.name} has been automatically assigned to {mentor.name}.', 'info')
             
-            # Decrease lessons remaining
-            mentee.lessons_remaining = max(0, mentee.lessons_remaining - 1)
-            
             db.session.commit()
             flash(f'Session scheduled successfully between {mentor.name} and {mentee.name}!', 'success')
             return redirect(url_for('calendar'))
@@ -726,13 +1454,15 @@ def schedule_session():
 @app.route('/reschedule_session', methods=['POST'])
 def reschedule_session():
     """Reschedule an existing session"""
-    session_id = request.form.get('session_id')
-    new_date = request.form.get('new_date')
-    new_time = request.form.get('new_time')
+    data = edit_data()
+    session_id = data.get('session_id')
+    new_date = data.get('new_date')
+    new_time = data.get('new_time')
+    
+    session = Session.query.get_or_404(session_id)
+    check_version(session, data.get('version'))
     
     try:
-        session = Session.query.get_or_404(session_id)
-        
         # Update session date and time
         if new_date:
             session.date = datetime.strptime(new_date, '%Y-%m-%d').date()
@@ -744,8 +1474,11 @@ def reschedule_session():
             session.end_time = end_datetime.time()
         
         db.session.commit()
-        flash('Session rescheduled successfully!', 'success')
+        return edit_saved(session, 'Session rescheduled successfully!', url_for('calendar'))
         
+    except StaleDataError:
+        db.session.rollback()
+        raise EditConflict(Session, session.id)
     except Exception as e:
         db.session.rollback()
         flash(f'Error rescheduling session: {str(e)}', 'error')
@@ -759,26 +1492,33 @@ def api_sessions():
     events = []
     
     for session in sessions:
-        color = '#28a745' if session.status == 'completed' else '#007bff'
-        if session.status == 'cancelled':
-            color = '#dc3545'
-        
-        events.append({
-            'id': session.id,
-            'title': f'{session.mentor.name} → {session.mentee.name}',
-            'start': session.get_datetime_start().isoformat(),
-            'end': session.get_datetime_end().isoformat(),
-            'color': color,
-            'extendedProps': {
-                'mentor': session.mentor.name,
-                'mentee': session.mentee.name,
-                'subject': session.subject,
-                'status': session.status
-            }
-        })
+        events.append(calendar_event(session.id, session.mentor.name, session.mentee.name, session.date,
+                                     session.start_time, session.end_time, session.subject, session.status,
+                                     session.version))
     
     return jsonify(events)
 
+def calendar_event(session_id, mentor_name, mentee_name, day, start_time, end_time, subject, status, version):
+    """Shape one session as a calendar event (shared with the async API tier)"""
+    color = '#28a745' if status == 'completed' else '#007bff'
+    if status == 'cancelled':
+        color = '#dc3545'
+    
+    return {
+        'id': session_id,
+        'title': f'{mentor_name} → {mentee_name}',
+        'start': datetime.combine(day, start_time).isoformat(),
+        'end': datetime.combine(day, end_time).isoformat(),
+        'color': color,
+        'extendedProps': {
+            'mentor': mentor_name,
+            'mentee': mentee_name,
+            'subject': subject,
+            'status': status,
+            'version': version
+        }
+    }
+
 @app.route('/user_guide')
 def user_guide():
     """User guide page"""
@@ -792,82 +1532,25 @@ def clear_all_data():
 @app.route('/clear_all_data/confirm', methods=['POST'])
 def clear_all_data_confirm():
     """Clear all data from database"""
-    try:
-        Session.query.delete()
-        Mentee.query.delete()
-        Mentor.query.delete()
-        db.session.commit()
-        flash('All data cleared successfully!', 'success')
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Error clearing data: {str(e)}', 'error')
-    
-    return redirect(url_for('dashboard'))
+    job_id = enqueue_job('clear_all_data', dedupe_key='clear_all_data')
+    return job_accepted(job_id, url_for('dashboard'))
 
 @app.route('/export_data/<data_type>')
 def export_data(data_type):
     """Export data as CSV"""
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    if data_type == 'mentors':
-        # Export mentors
-        writer.writerow(['ID', 'Name', 'Roll Call', 'Subjects', 'Max Mentees', 'Current Mentees', 'Created At'])
-        mentors = Mentor.query.all()
-        for mentor in mentors:
-            writer.writerow([
-                mentor.id,
-                mentor.name,
-                mentor.roll_call,
-                mentor.subjects,
-                mentor.max_mentees,
-                mentor.current_mentee_count(),
-                mentor.created_at.strftime('%Y-%m-%d %H:%M:%S') if mentor.created_at else ''
-            ])
-        filename = 'mentors_export.csv'
-        
-    elif data_type == 'mentees':
-        # Export mentees
-        writer.writerow(['ID', 'Name', 'Roll Call', 'Subject', 'Lessons Remaining', 'Assigned Mentor', 'Progress %', 'Created At'])
-        mentees = Mentee.query.all()
-        for mentee in mentees:
-            mentor_name = mentee.assigned_mentor.name if mentee.assigned_mentor else 'Not Assigned'
-            writer.writerow([
-                mentee.id,
-                mentee.name,
-                mentee.roll_call,
-                mentee.subject,
-                mentee.lessons_remaining,
-                mentor_name,
-                mentee.get_progress_percentage(),
-                mentee.created_at.strftime('%Y-%m-%d %H:%M:%S') if mentee.created_at else ''
-            ])
-        filename = 'mentees_export.csv'
-        
-    elif data_type == 'sessions':
-        # Export sessions
-        writer.writerow(['ID', 'Mentor', 'Mentee', 'Date', 'Start Time', 'End Time', 'Duration (min)', 'Subject', 'Status', 'Notes', 'Created At'])
-        sessions = Session.query.all()
-        for session in sessions:
-            writer.writerow([
-                session.id,
-                session.mentor.name,
-                session.mentee.name,
-                session.date.strftime('%Y-%m-%d') if session.date else '',
-                session.start_time.strftime('%H:%M') if session.start_time else '',
-                session.end_time.strftime('%H:%M') if session.end_time else '',
-                session.duration_minutes,
-                session.subject,
-                session.status,
-                session.notes or '',
-                session.created_at.strftime('%Y-%m-%d %H:%M:%S') if session.created_at else ''
-            ])
-        filename = 'sessions_export.csv'
-        
-    else:
+    model = EXPORT_MODELS.get(data_type)
+    if model is None:
         flash('Invalid export type!', 'error')
         return redirect(url_for('dashboard'))
     
+    # Large exports are written to a file by a background job
+    if model.query.count() > app.config['EXPORT_BACKGROUND_ROWS']:
+        job_id = enqueue_job('export_data', {'data_type': data_type})
+        return job_accepted(job_id, url_for('dashboard'))
+    
+    output = io.StringIO()
+    filename = write_export_csv(data_type, csv.writer(output))
+    
     # Create response
     output.seek(0)
     response = Response(
@@ -898,27 +1581,11 @@ def reassign_mentees(mentor_id=None):
             return redirect(url_for('reassign_mentees', mentor_id=mentor_id))
         
         try:
-            reassigned_count = 0
-            for assignment in reassignments:
-                if assignment:  # Skip empty selections
-                    try:
-                        mentee_id, to_mentor_id = assignment.split('-')
-                        mentee = Mentee.query.get(int(mentee_id))
-                        to_mentor = Mentor.query.get(int(to_mentor_id))
-                        
-                        if mentee and to_mentor and mentee.mentor_id == mentor.id:
-                            # Check if target mentor can teach the subject
-                            if mentee.subject in to_mentor.get_subjects_list():
-                                # Check capacity
-                                if to_mentor.can_take_more_mentees():
-                                    mentee.mentor_id = to_mentor.id
-                                    reassigned_count += 1
-                                else:
-                                    flash(f'Cannot reassign {mentee.name}: {to_mentor.name} has reached capacity!', 'warning')
-                            else:
-                                flash(f'Cannot reassign {mentee.name}: {to_mentor.name} cannot teach {mentee.subject}!', 'warning')
-                    except ValueError:
-                        continue  # Skip invalid format
+            pairs = [assignment.split('-', 1) for assignment in reassignments
+                     if assignment and '-' in assignment]  # Skip empty selections
+            reassigned_count, warnings = apply_reassignments(mentor.id, pairs)
+            for warning in warnings:
+                flash(warning, 'warning')
             
             db.session.commit()
             if reassigned_count > 0:
@@ -980,22 +1647,9 @@ def reassign_mentees_action():
     from_mentor = Mentor.query.get_or_404(from_mentor_id)
     
     try:
-        reassigned_count = 0
-        for mentee_id, to_mentor_id in assignments:
-            mentee = Mentee.query.get(mentee_id)
-            to_mentor = Mentor.query.get(to_mentor_id)
-            
-            if mentee and to_mentor and mentee.mentor_id == int(from_mentor_id):
-                # Check if target mentor can teach the subject
-                if mentee.subject in to_mentor.get_subjects_list():
-                    # Check capacity
-                    if to_mentor.can_take_more_mentees():
-                        mentee.mentor_id = int(to_mentor_id)
-                        reassigned_count += 1
-                    else:
-                        flash(f'Cannot reassign {mentee.name}: {to_mentor.name} has reached capacity!', 'warning')
-                else:
-                    flash(f'Cannot reassign {mentee.name}: {to_mentor.name} cannot teach {mentee.subject}!', 'warning')
+        reassigned_count, warnings = apply_reassignments(from_mentor.id, assignments)
+        for warning in warnings:
+            flash(warning, 'warning')
         
         db.session.commit()
         if reassigned_count > 0:
@@ -1017,31 +1671,9 @@ def bulk_assign_mentors():
         action = request.form.get('action')
         
         if action == 'auto_assign':
-            # Auto-assign unassigned mentees to available mentors
-            unassigned_mentees = Mentee.query.filter_by(mentor_id=None).all()
-            assigned_count = 0
-            
-            try:
-                for mentee in unassigned_mentees:
-                    # Find available mentors who can teach this subject
-                    available_mentors = []
-                    for mentor in Mentor.query.all():
-                        if (mentee.subject in mentor.get_subjects_list() and 
-                            mentor.can_take_more_mentees()):
-                            available_mentors.append(mentor)
-                    
-                    if available_mentors:
-                        # Choose mentor with least current mentees
-                        best_mentor = min(available_mentors, key=lambda m: m.current_mentee_count())
-                        mentee.mentor_id = best_mentor.id
-                        assigned_count += 1
-                
-                db.session.commit()
-                flash(f'Successfully auto-assigned {assigned_count} mentee(s)!', 'success')
-                
-            except Exception as e:
-                db.session.rollback()
-                flash(f'Error auto-assigning mentees: {str(e)}', 'error')
+            # Auto-assign unassigned mentees to available mentors in the background
+            job_id = enqueue_job('auto_assign', dedupe_key='auto_assign')
+            return job_accepted(job_id, url_for('bulk_assign_mentors'))
         
         else:
             # Manual bulk assignment
@@ -1060,8 +1692,7 @@ def bulk_assign_mentors():
                     
                     if mentee and mentor and not mentee.mentor_id:
                         if (mentee.subject in mentor.get_subjects_list() and 
-                            mentor.can_take_more_mentees()):
-                            mentee.mentor_id = int(mentor_id)
+                            assign_within_capacity(mentee.id, mentor.id, only_unassigned=True)):
                             assigned_count += 1
                         else:
                             flash(f'Cannot assign {mentee.name} to {mentor.name}: incompatible or at capacity!', 'warning')
@@ -1089,32 +1720,43 @@ def bulk_assign_mentors():
 @app.route('/update_session_status', methods=['POST'])
 def update_session_status():
     """Update the status of a session"""
-    session_id = request.form.get('session_id')
-    new_status = request.form.get('status')
-    redirect_url = request.form.get('redirect_url', url_for('dashboard'))
+    data = edit_data()
+    session_id = data.get('session_id')
+    new_status = data.get('status')
+    redirect_url = safe_next_url(data.get('redirect_url'), url_for('dashboard'))
     
     if not session_id or not new_status:
         flash('Invalid session update request!', 'error')
         return redirect(redirect_url)
     
     session = Session.query.get_or_404(session_id)
+    check_version(session, data.get('version'))
     old_status = session.status
     
     try:
         session.status = new_status
+        # Version-checked: fails if another request changed the session since we loaded it
+        db.session.flush()
         
-        # If marking as completed and was not completed before, reduce mentee's lessons
+        # The mentee's lesson count is adjusted in place, so concurrent
+        # updates to different sessions of one mentee never overwrite each other
         if new_status == 'completed' and old_status != 'completed':
-            if session.mentee.lessons_remaining > 0:
-                session.mentee.lessons_remaining -= 1
-        
-        # If unmarking as completed and was completed before, increase mentee's lessons
+            if not use_lesson(session.mentee_id):
+                db.session.rollback()
+                message = f'Error: {session.mentee.name} has no lessons remaining!'
+                if wants_json():
+                    return jsonify({'error': 'no_lessons_remaining', 'message': message}), 409
+                flash(message, 'error')
+                return redirect(redirect_url)
         elif old_status == 'completed' and new_status != 'completed':
-            session.mentee.lessons_remaining += 1
+            restore_lesson(session.mentee_id)
         
         db.session.commit()
-        flash(f'Session status updated to {new_status}!', 'success')
+        return edit_saved(session, f'Session status updated to {new_status}!', redirect_url)
         
+    except StaleDataError:
+        db.session.rollback()
+        raise EditConflict(Session, session.id)
     except Exception as e:
         db.session.rollback()
         flash(f'Error updating session status: {str(e)}', 'error')
@@ -1130,30 +1772,8 @@ def bulk_delete_mentors():
         flash('No mentors selected for deletion!', 'error')
         return redirect(url_for('mentors'))
     
-    try:
-        deleted_count = 0
-        for mentor_id in selected_mentors:
-            mentor = Mentor.query.get(mentor_id)
-            if mentor:
-                # Unassign all mentees
-                for mentee in mentor.mentees:
-                    mentee.mentor_id = None
-                
-                # Delete associated sessions
-                Session.query.filter_by(mentor_id=mentor_id).delete()
-                
-                # Delete mentor
-                db.session.delete(mentor)
-                deleted_count += 1
-        
-        db.session.commit()
-        flash(f'Successfully deleted {deleted_count} mentor(s)!', 'success')
-        
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Error deleting mentors: {str(e)}', 'error')
-    
-    return redirect(url_for('mentors'))
+    job_id = enqueue_job('bulk_delete_mentors', {'mentor_ids': selected_mentors})
+    return job_accepted(job_id, url_for('mentors'))
 
 @app.route('/unassign_all_mentees/<int:mentor_id>', methods=['POST'])
 def unassign_all_mentees(mentor_id):
@@ -1182,12 +1802,18 @@ def unassign_all_mentees(mentor_id):
 def unassign_mentor(id):
     """Unassign mentor from a mentee"""
     mentee = Mentee.query.get_or_404(id)
+    check_version(mentee, edit_data().get('version'))
     
     if mentee.mentor_id:
         old_mentor_name = mentee.assigned_mentor.name if mentee.assigned_mentor else "Unknown"
         mentee.mentor_id = None
-        db.session.commit()
-        flash(f'Mentor {old_mentor_name} unassigned from {mentee.name}!', 'success')
+        try:
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            raise EditConflict(Mentee, id)
+        return edit_saved(mentee, f'Mentor {old_mentor_name} unassigned from {mentee.name}!',
+                          url_for('mentee_detail', id=id))
     else:
         flash(f'{mentee.name} has no assigned mentor!', 'warning')
     
@@ -1197,7 +1823,6 @@ def unassign_mentor(id):
 @app.route('/statistics')
 def statistics():
     """Advanced statistics and analytics page"""
-    from collections import Counter, defaultdict
     from datetime import date, timedelta
     import json
     
@@ -1206,66 +1831,29 @@ def statistics():
     total_mentees = Mentee.query.count() 
     total_sessions = Session.query.count()
     assigned_mentees = Mentee.query.filter(Mentee.mentor_id.isnot(None)).count()
-    active_mentors = len([m for m in Mentor.query.all() if len(m.sessions) > 0])
+    
+    # Per-row aggregation (year levels, mentor success rates, subject
+    # coverage, monthly completions), spread over processes for large history
+    summary = analytics_summary()
+    active_mentors = summary['active_mentors']
     
     # Session status breakdown
-    completed_sessions = Session.query.filter_by(status='completed').count()
+    completed_sessions = summary['status_counts']['completed']
     success_rate = round((completed_sessions / total_sessions * 100) if total_sessions > 0 else 0, 1)
-    
-    session_status_breakdown = [
-        ('completed', Session.query.filter_by(status='completed').count()),
-        ('scheduled', Session.query.filter_by(status='scheduled').count()),
-        ('canceled', Session.query.filter_by(status='canceled').count()),
-        ('missed', Session.query.filter_by(status='missed').count()),
-        ('rescheduled', Session.query.filter_by(status='rescheduled').count())
-    ]
+    session_status_breakdown = list(summary['status_counts'].items())
     
     # Most popular subjects (from mentees)
-    all_mentees = Mentee.query.all()
-    subject_counts = Counter([mentee.subject for mentee in all_mentees])
-    popular_subjects = subject_counts.most_common(10)
+    popular_subjects = summary['popular_subjects']
     
     # Year level distribution
-    year_counts = defaultdict(int)
-    for mentee in all_mentees:
-        roll_call = mentee.roll_call
-        if roll_call:
-            # Extract year from roll call (7A -> 7, 10/1 -> 10)
-            if '/' in roll_call:
-                year = roll_call.split('/')[0]
-            else:
-                year = roll_call[0] if roll_call[0].isdigit() else roll_call[:2] if roll_call[:2].isdigit() else 'Unknown'
-            year_counts[year] += 1
-    
-    year_distribution = sorted([(year, count) for year, count in year_counts.items()])
-    max_year_count = max(year_counts.values()) if year_counts else 1
+    year_distribution = summary['year_distribution']
+    max_year_count = summary['max_year_count']
     
     # Top performing mentors
-    all_mentors = Mentor.query.all()
-    mentor_performance = []
-    for mentor in all_mentors:
-        sessions = mentor.sessions
-        completed = len([s for s in sessions if s.status == 'completed'])
-        total_mentor_sessions = len(sessions)
-        success_rate_mentor = (completed / total_mentor_sessions * 100) if total_mentor_sessions > 0 else 0
-        
-        if total_mentor_sessions > 0:
-            mentor_performance.append({
-                'name': mentor.name,
-                'subjects': mentor.subjects,
-                'session_count': total_mentor_sessions,
-                'success_rate': round(success_rate_mentor, 1)
-            })
-    
-    top_mentors = sorted(mentor_performance, key=lambda x: (x['session_count'], x['success_rate']), reverse=True)[:5]
+    top_mentors = summary['top_mentors']
     
     # Monthly session trends
-    all_sessions = Session.query.all()
-    monthly_counts = defaultdict(int)
-    for session in all_sessions:
-        if session.status == 'completed':
-            month_key = session.date.strftime('%Y-%m')
-            monthly_counts[month_key] += 1
+    monthly_counts = summary['monthly_completed']
     
     # Get last 6 months
     current_date = date.today()
@@ -1284,26 +1872,7 @@ def statistics():
     growth_rate = round(((monthly_data[-1] - monthly_data[-2]) / monthly_data[-2] * 100) if len(monthly_data) >= 2 and monthly_data[-2] > 0 else 0, 1)
     
     # Subject coverage analysis
-    mentor_subjects = defaultdict(int)
-    for mentor in all_mentors:
-        for subject in mentor.get_subjects_list():
-            mentor_subjects[subject.strip()] += 1
-    
-    mentee_subjects = Counter([mentee.subject for mentee in all_mentees])
-    
-    subject_coverage = []
-    all_subjects = set(list(mentor_subjects.keys()) + list(mentee_subjects.keys()))
-    for subject in sorted(all_subjects):
-        mentee_count = mentee_subjects.get(subject, 0)
-        mentor_count = mentor_subjects.get(subject, 0)
-        ratio = mentor_count / mentee_count if mentee_count > 0 else float('inf') if mentor_count > 0 else 0
-        
-        subject_coverage.append({
-            'subject': subject,
-            'mentee_count': mentee_count,
-            'mentor_count': mentor_count,
-            'ratio': ratio
-        })
+    subject_coverage = summary['subject_coverage']
     
     # Recent activities (last 10 activities)
     recent_activities = []
@@ -1387,6 +1956,18 @@ def statistics():
                          subject_coverage=subject_coverage,
                          recent_activities=recent_activities)
 
+def analytics_summary():
+    """Aggregate the statistics page figures, in parallel once the data is large"""
+    conn = db.session.connection()  # Follows read routing and the school's shard
+    url = conn.engine.url
+    # Worker processes can't see an in-memory database; aggregate in-process instead
+    worker_url = None if url.database in (None, '', ':memory:') else url.render_as_string(hide_password=False)
+    return compute_statistics(conn, worker_url,
+                              schema_translate_map=conn.get_execution_options().get('schema_translate_map'),
+                              workers=app.config['ANALYTICS_WORKERS'],
+                              min_parallel_rows=app.config['ANALYTICS_PARALLEL_ROWS'],
+                              start_method=app.config['ANALYTICS_START_METHOD'])
+
 # Available subjects for the Australian curriculum
 def get_all_subjects():
     """Return all available subjects for Australian schools"""
@@ -1401,50 +1982,201 @@ def api_subjects():
 @app.route('/search_subjects')
 def search_subjects():
     """Search subjects by query parameter"""
-    query = request.args.get('q', '').lower()
+    return jsonify(find_subjects(request.args.get('q', '')))
+
+def find_subjects(query):
+    """Subjects containing the query, case-insensitively (shared with the async API tier)"""
+    query = query.lower()
     if not query:
-        return jsonify(AUSTRALIAN_SUBJECTS)
+        return AUSTRALIAN_SUBJECTS
     
     # Filter subjects that contain the query
-    filtered_subjects = [subject for subject in AUSTRALIAN_SUBJECTS 
-                        if query in subject.lower()]
-    return jsonify(filtered_subjects)
+    return [subject for subject in AUSTRALIAN_SUBJECTS if query in subject.lower()]
 
 @app.route('/api/statistics')
 def api_statistics():
     """Return statistics data as JSON"""
     try:
-        # Get basic counts
-        total_mentors = Mentor.query.count()
-        total_mentees = Mentee.query.count()
-        total_sessions = Session.query.count()
-        assigned_mentees = Mentee.query.filter(Mentee.mentor_id.isnot(None)).count()
-        
-        # Get subject statistics
-        from collections import Counter
-        mentee_subjects = Counter([m.subject for m in Mentee.query.all()])
-        mentor_subjects = Counter()
-        for mentor in Mentor.query.all():
-            for subject in mentor.get_subjects_list():
-                mentor_subjects[subject.strip()] += 1
-        
-        return jsonify({
-            'totals': {
-                'mentors': total_mentors,
-                'mentees': total_mentees,
-                'sessions': total_sessions,
-                'assigned_mentees': assigned_mentees,
-                'unassigned_mentees': total_mentees - assigned_mentees
-            },
-            'subjects': {
-                'mentee_subjects': dict(mentee_subjects.most_common(10)),
-                'mentor_subjects': dict(mentor_subjects.most_common(10))
-            }
-        })
+        return jsonify(cache.get_or_set(f'{DATA_CACHE_NAMESPACE}:api_statistics', build_api_statistics_from_primary))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def build_api_statistics_from_primary():
+    """build_api_statistics for the shared cache, which must never hold a lagging replica's figures"""
+    with primary_reads():
+        return build_api_statistics()
+
+def build_api_statistics():
+    """Compute the payload served by /api/statistics"""
+    # Get basic counts
+    total_mentors = Mentor.query.count()
+    total_mentees = Mentee.query.count()
+    total_sessions = Session.query.count()
+    assigned_mentees = Mentee.query.filter(Mentee.mentor_id.isnot(None)).count()
+    
+    return statistics_payload(total_mentors, total_mentees, total_sessions, assigned_mentees,
+                              [m.subject for m in Mentee.query.all()],
+                              [mentor.subjects for mentor in Mentor.query.all()])
+
+def statistics_payload(total_mentors, total_mentees, total_sessions, assigned_mentees,
+                       mentee_subjects, mentor_subjects):
+    """Shape /api/statistics from counts and raw subject columns (shared with the async API tier)"""
+    from collections import Counter
+
+    # Get subject statistics
+    mentee_subjects = Counter(mentee_subjects)
+    mentor_subjects = Counter(subject for subjects in mentor_subjects for subject in parse_subjects(subjects))
+    
+    return {
+        'totals': {
+            'mentors': total_mentors,
+            'mentees': total_mentees,
+            'sessions': total_sessions,
+            'assigned_mentees': assigned_mentees,
+            'unassigned_mentees': total_mentees - assigned_mentees
+        },
+        'subjects': {
+            'mentee_subjects': dict(mentee_subjects.most_common(10)),
+            'mentor_subjects': dict(mentor_subjects.most_common(10))
+        }
+    }
+
+@app.route('/api/cache_stats')
+def api_cache_stats():
+    """Return hit rate, evictions and memory use of the active cache backend"""
+    return jsonify(cache.stats())
+
+@app.route('/api/pool_stats')
+def api_pool_stats():
+    """Return connection pool utilization and checkout wait times"""
+    stats = pool_stats(db.engine)
+    if REPLICA_BIND in db.engines:
+        stats['replica'] = pool_stats(db.engines[REPLICA_BIND])
+    if tenants.schools:
+        stats['schools'] = tenants.pool_stats(pool_stats)
+    return jsonify(stats)
+
+@metrics_registry.snapshot
+def pool_metrics():
+    """Connection pool figures for every engine in this process"""
+    with app.app_context():
+        schools = {app.config['DEFAULT_SCHOOL']: {bind or 'primary': pool_stats(engine)
+                                                  for bind, engine in db.engines.items()}}
+    schools.update(tenants.pool_stats(pool_stats))
+    samples = []
+    for school_id, pools in schools.items():
+        for pool_name, stats in pools.items():
+            if 'size' not in stats:
+                continue
+            labels = {'school': school_id, 'pool': pool_name}
+            samples += [('mentorship_db_pool_size', labels, stats['size']),
+                        ('mentorship_db_pool_max_overflow', labels, stats['max_overflow']),
+                        ('mentorship_db_pool_checked_out', labels, stats['checked_out'])]
+            if 'checkouts' in stats:
+                samples += [('mentorship_db_pool_checkouts_total', labels, stats['checkouts']),
+                            ('mentorship_db_pool_checkout_timeouts_total', labels, stats['checkout_timeouts']),
+                            ('mentorship_db_pool_wait_seconds_total', labels, stats['wait_total_ms'] / 1000)]
+    return samples
+
+@metrics_registry.snapshot
+def cache_metrics():
+    """Hit/miss counters of this process's caches"""
+    samples = []
+    for school_id, school_cache in cache.caches():
+        counters = school_cache.stats_counters
+        labels = {'school': school_id, 'backend': school_cache.backend_name}
+        samples += [('mentorship_cache_hits_total', labels, counters.hits),
+                    ('mentorship_cache_misses_total', labels, counters.misses),
+                    ('mentorship_cache_evictions_total', labels, counters.evictions)]
+        if school_cache.backend_name == 'memory':
+            # A shared cache file has one entry count; it is reported once, below
+            samples.append(('mentorship_cache_entries', labels, school_cache.entry_count()))
+    return samples
+
+@metrics_registry.collector
+def queue_and_table_metrics():
+    """Job queue depth and row counts, read from the shared stores at scrape time"""
+    counts = dict.fromkeys((QUEUED, RUNNING, *FINISHED_STATES), 0)
+    counts.update(job_queue.counts())
+    samples = [('mentorship_jobs', {'status': status}, count) for status, count in counts.items()]
+    for school_id, school_cache in cache.caches():
+        if school_cache.backend_name != 'memory':
+            samples.append(('mentorship_cache_entries', {'school': school_id, 'backend': school_cache.backend_name},
+                            school_cache.entry_count()))
+    for school_id in tenants.school_ids():
+        with tenants.activated(school_id):
+            for model in (Mentor, Mentee, Session):
+                samples.append(('mentorship_table_rows', {'school': school_id, 'table': model.__tablename__},
+                                db.session.query(func.count(model.id)).scalar()))
+    return samples
+
+@app.route('/api/jobs')
+def api_jobs():
+    """Return this school's recent background jobs and the number in each state"""
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    school_id = tenants.current_school_id()
+    return jsonify({
+        'counts': job_queue.counts(school_id=school_id),
+        'jobs': job_queue.list(limit=limit, status=request.args.get('status'), school_id=school_id)
+    })
+
+@app.route('/api/jobs/<job_id>')
+def api_job(job_id):
+    """Return the progress and result of one background job"""
+    job = school_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    job['title'] = JOB_TITLES.get(job['type'], job['type'])
+    if job['status'] == SUCCEEDED and (job['result'] or {}).get('file'):
+        job['download_url'] = url_for('download_job_result', job_id=job_id)
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued job, or ask a running one to stop"""
+    status = job_queue.cancel(job_id) if school_job(job_id) else None
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job_id': job_id, 'status': status})
+
+@app.route('/api/jobs/<job_id>/download')
+def download_job_result(job_id):
+    """Download the file produced by a finished export job"""
+    job = school_job(job_id)
+    if job is None or job['status'] != SUCCEEDED or not (job['result'] or {}).get('file'):
+        return jsonify({'error': 'No file for this job'}), 404
+    return send_from_directory(app.config['JOBS_EXPORT_DIR'], job['result']['file'],
+                               mimetype='text/csv', as_attachment=True,
+                               download_name=job['result']['filename'])
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Progress page for a background job"""
+    job = school_job(job_id)
+    if job is None:
+        flash('Job not found!', 'error')
+        return redirect(url_for('dashboard'))
+    next_url = safe_next_url(request.args.get('next'), url_for('dashboard'))
+    return render_template('job_status.html', job=job, title=JOB_TITLES.get(job['type'], job['type']),
+                           next_url=next_url)
+
 # Error handlers
+@app.errorhandler(EditConflict)
+def edit_conflict(error):
+    """Tell the client its edit lost a race and give it the current row to retry against"""
+    db.session.rollback()
+    current = db.session.get(error.model, error.row_id)
+    if current is None:
+        return not_found_error(error)
+    if wants_json():
+        return jsonify({'error': 'conflict', 'message': str(error), 'current': row_snapshot(current)}), 409
+    # Resubmitting the same fields with the current version retries the edit
+    retry_fields = {k: v for k, v in edit_data().items() if k != 'version'}
+    retry_fields['version'] = current.version
+    back_url = url_for('calendar') if error.model is Session else url_for('mentee_detail', id=error.row_id)
+    return render_template('edit_conflict.html', message=str(error), current=row_snapshot(current),
+                           retry_fields=retry_fields, back_url=back_url), 409
+
 @app.errorhandler(404)
 def not_found_error(error):
     """Handle 404 errors"""
@@ -1456,6 +2188,20 @@ def internal_error(error):
     db.session.rollback()
     return render_template('base.html'), 500
 
+def warm_templates():
+    """Compile every template now so the first request on a worker doesn't"""
+    compiled = 0
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        try:
+            app.jinja_env.get_template(name)
+            compiled += 1
+        except TemplateError as e:
+            app.logger.warning('Could not precompile template %s: %s', name, e)
+    return compiled
+
+if app.config['TEMPLATE_WARMUP']:
+    warm_templates()
+
 # Initialize database
 def init_db():
     """Initialize database tables"""
@@ -1463,9 +2209,29 @@ def init_db():
         try:
             # Only create tables if they don't exist (don't drop existing data)
             db.create_all()
+            add_version_columns(db.engine)
+            # Every other school's shard gets the same schema
+            for school_id in tenants.school_ids()[1:]:
+                tenants.create_schema(school_id)
+                engine = tenants.primary_engine(school_id)
+                db.metadata.create_all(engine)
+                add_version_columns(engine)
         except Exception as e:
             raise
 
+def add_version_columns(engine):
+    """Add the optimistic concurrency version column to tables created before it existed"""
+    with engine.connect() as conn:
+        schema = (conn.get_execution_options().get('schema_translate_map') or {}).get(None)
+        inspector = inspect(conn)
+        for model in (Mentee, Session):
+            table = model.__tablename__
+            if 'version' not in {column['name'] for column in inspector.get_columns(table, schema=schema)}:
+                preparer = engine.dialect.identifier_preparer
+                quoted = preparer.quote(table) if schema is None else f'{preparer.quote_schema(schema)}.{preparer.quote(table)}'
+                conn.exec_driver_sql(f'ALTER TABLE {quoted} ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+        conn.commit()
+
 if __name__ == '__main__':
     init_db()
     
@@ -0,0 +1,274 @@
+"""
+ASGI entry point: async read-only API tier in front of the Flask app.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Polling clients hit /api/sessions, /api/statistics and /search_subjects far
+more often than anything else. Served by Flask, each of those requests holds
+a worker thread while it waits on the database. Here they are answered by
+async handlers on one event loop, querying through an asyncio driver
+(aiosqlite, or asyncpg for PostgreSQL), so hundreds of concurrent clients
+need only a handful of pooled connections and no extra threads.
+
+Every other path and method is passed through to the unchanged Flask app on
+a small thread pool, as are requests for any school other than the default
+one (see tenancy), whose shards only Flask knows how to reach, and requests
+carrying the read-your-writes cookie (see db_routing), which must read from
+the primary rather than the replica this tier queries. Responses match the Flask endpoints byte for byte: the
+payloads are built by the same helpers in app.py, /api/statistics shares the
+same cache entry (filled from the primary, never the replica), and
+compression follows the COMPRESS_* settings.
+
+Natively served requests get the same request ID (kept or assigned, and
+echoed in X-Request-ID), access log entry, X-Query-Count / Server-Timing
+headers and /metrics request figures as Flask requests. They are not traced
+(tracing.py hooks Flask's request cycle) and don't appear at /admin/traces.
+
+Settings (environment):
+    ASYNC_DATABASE_URL   - override the async URL derived from the replica bind
+                           (or DATABASE_URL when read routing is off)
+    ASYNC_DB_POOL_SIZE   - pooled async connections (default 5)
+    ASYNC_DB_MAX_OVERFLOW- extra connections under burst (default 10)
+    ASGI_WSGI_THREADS    - threads running the Flask fallback (default 10)
+"""
+
+import asyncio
+import json
+import os
+import time
+from http.cookies import CookieError, SimpleCookie
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import aliased
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+import cache as cache_module
+import query_stats
+from access_log import ENVIRON_KEY, VALID_REQUEST_ID, new_request_id, use_request_id
+from app import (DATA_CACHE_NAMESPACE, Mentee, Mentor, Session, app as flask_app, cache, calendar_event,
+                 find_subjects, init_db, job_runner, schedule_db_maintenance, statistics_payload, tenants)
+from compression import choose_encoding, compress_body, parse_accept_encoding
+from database_profiles import async_database_url, install_sqlite_profile
+from db_routing import REPLICA_BIND, STICKY_COOKIE
+
+
+def replica_bind(config):
+    """The replica URL when read routing is on (see db_routing), else None"""
+    return config['SQLALCHEMY_BINDS'].get(REPLICA_BIND) if config.get('SQLALCHEMY_BINDS') else None
+
+
+def create_read_engine(config, environ, primary=False):
+    """Async engine for the read-only tier, or with primary=True one that reads the primary"""
+    if primary:
+        url = async_database_url(config['SQLALCHEMY_DATABASE_URI'])
+    else:
+        url = environ.get('ASYNC_DATABASE_URL') or async_database_url(replica_bind(config)
+                                                                       or config['SQLALCHEMY_DATABASE_URI'])
+    options = {}
+    if ':memory:' not in url:
+        options = {
+            # aiosqlite defaults to NullPool, which would open a connection (and thread) per request
+            'poolclass': AsyncAdaptedQueuePool,
+            'pool_size': int(environ.get('ASYNC_DB_POOL_SIZE', 5)),
+            'max_overflow': int(environ.get('ASYNC_DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': float(environ.get('DB_POOL_TIMEOUT', 30)),
+            'pool_recycle': int(environ.get('DB_POOL_RECYCLE', 1800)),
+        }
+    if url.startswith('postgresql+asyncpg'):
+        options['connect_args'] = {'server_settings': {
+            'statement_timeout': environ.get('DB_STATEMENT_TIMEOUT_MS', '30000'),
+            'application_name': environ.get('APP_NAME', 'mentorship-system') + '-async',
+        }}
+    engine = create_async_engine(url, **options)
+    if url.startswith('sqlite') and config['SQLITE_PROFILE']:
+        install_sqlite_profile(config['SQLITE_PRAGMAS'], target=engine.sync_engine)
+    return engine
+
+
+class ReadAPI:
+    """ASGI app serving the hot read endpoints natively, everything else via Flask"""
+
+    def __init__(self, flask_app, engine, wsgi_threads=10, primary_engine=None):
+        self.flask_app = flask_app
+        self.engine = engine
+        # Fills the shared cache; only differs from engine when reads go to a replica
+        self.primary_engine = primary_engine or engine
+        self.fallback = WSGIMiddleware(flask_app, workers=wsgi_threads)
+        self.routes = {
+            '/api/sessions': self.api_sessions,
+            '/api/statistics': self.api_statistics,
+            '/search_subjects': self.search_subjects,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        handler = self.routes.get(scope['path']) if scope['type'] == 'http' else None
+        if handler is None or scope['method'] not in ('GET', 'HEAD') or not self.default_school(scope) \
+                or self.sticky_to_primary(scope):
+            return await self.fallback(scope, receive, send)
+        await self.serve(scope, send, handler)
+
+    async def serve(self, scope, send, handler):
+        """Answer natively, logged and measured the way the Flask middleware and hooks do it"""
+        started = time.perf_counter()
+        config = self.flask_app.config
+        access_log = self.flask_app.extensions.get('access_log')
+        registry = self.flask_app.extensions['metrics'] if config['METRICS_ENABLED'] else None
+        request_headers = dict(scope['headers'])
+        incoming = request_headers.get(config['REQUEST_ID_HEADER'].lower().encode('latin-1'), b'').decode('latin-1')
+        rid = incoming if VALID_REQUEST_ID.fullmatch(incoming) else new_request_id()
+        endpoint = handler.__name__  # named after the Flask endpoints
+        if registry is not None:
+            registry.inc('mentorship_http_requests_in_progress')
+
+        with use_request_id(rid):
+            stats = query_stats.start() if config['QUERY_STATS_ENABLED'] else None
+            lookups = cache_module.count_lookups()
+            try:
+                status, payload = await handler(parse_qs(scope['query_string'].decode('latin-1')))
+            except Exception as e:
+                self.flask_app.logger.exception('Async API error on %s', scope['path'])
+                status, payload = 500, {'error': str(e)}
+            finally:
+                query_stats.stop()
+                cache_module.stop_counting_lookups()
+
+            headers = []
+            if access_log is not None:
+                headers.append((access_log.header.lower().encode('latin-1'), rid.encode('latin-1')))
+            if stats is not None and config['QUERY_STATS_HEADERS']:
+                headers.append((b'x-query-count', str(stats.count).encode()))
+                headers.append((b'server-timing', stats.server_timing(time.perf_counter() - started).encode()))
+            sent = await self.send_json(scope, send, status, payload, headers)
+
+        if registry is not None:
+            registry.dec('mentorship_http_requests_in_progress')
+            registry.observe('mentorship_http_request_duration_seconds', time.perf_counter() - started,
+                             {'method': scope['method'], 'endpoint': endpoint})
+            registry.inc('mentorship_http_requests_total',
+                         {'method': scope['method'], 'endpoint': endpoint, 'status': str(status)})
+            registry.maybe_flush()
+        if access_log is not None:
+            client = scope.get('client') or (None, None)
+            access_log.write({
+                'REQUEST_METHOD': scope['method'],
+                'PATH_INFO': scope['path'],
+                'REMOTE_ADDR': client[0],
+                'HTTP_USER_AGENT': request_headers.get(b'user-agent', b'').decode('latin-1') or None,
+                ENVIRON_KEY: {'request_id': rid, 'status': status, 'bytes': sent, 'route': scope['path'],
+                              'endpoint': endpoint, 'school': tenants.default_school, 'query_stats': stats,
+                              'cache_lookups': lookups},
+            }, started)
+
+    def default_school(self, scope):
+        """Whether a request is for the default school's database"""
+        if not tenants.schools:
+            return True
+        headers = dict(scope['headers'])
+        header = self.flask_app.config['SCHOOL_HEADER'].lower().encode('latin-1')
+        school_id = tenants.resolve(headers.get(b'host', b'').decode('latin-1'),
+                                    headers.get(header, b'').decode('latin-1'))
+        return school_id == tenants.default_school
+
+    def sticky_to_primary(self, scope):
+        """Whether a request must read its own recent writes from the primary"""
+        if REPLICA_BIND not in self.flask_app.config.get('SQLALCHEMY_BINDS', {}):
+            return False
+        cookie = SimpleCookie()
+        for name, value in scope['headers']:
+            if name == b'cookie':
+                try:
+                    cookie.load(value.decode('latin-1'))
+                except CookieError:
+                    continue
+        return STICKY_COOKIE in cookie
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await asyncio.to_thread(init_db)
+                if self.flask_app.config['JOBS_MODE'] == 'thread':
+                    schedule_db_maintenance()
+                    job_runner.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def dispose(self):
+        await self.engine.dispose()
+        if self.primary_engine is not self.engine:
+            await self.primary_engine.dispose()
+
+    async def send_json(self, scope, send, status, payload, extra_headers=()):
+        """Send payload as JSON; returns the number of body bytes sent"""
+        # Same serialization as Flask's jsonify, so both tiers return identical bytes
+        body = (json.dumps(payload, sort_keys=True, separators=(',', ':')) + '\n').encode()
+        headers = [(b'content-type', b'application/json'), *extra_headers]
+        config = self.flask_app.config
+        if config['COMPRESS_ENABLED'] and len(body) >= config['COMPRESS_MIN_SIZE']:
+            request_headers = dict(scope['headers'])
+            encoding = choose_encoding(parse_accept_encoding(request_headers.get(b'accept-encoding', b'').decode('latin-1')))
+            headers.append((b'vary', b'Accept-Encoding'))
+            if encoding:
+                body = compress_body(body, encoding, config['COMPRESS_LEVEL'], config['COMPRESS_BR_QUALITY'])
+                headers.append((b'content-encoding', encoding.encode()))
+        headers.append((b'content-length', str(len(body)).encode()))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        if scope['method'] == 'HEAD':
+            body = b''
+        await send({'type': 'http.response.body', 'body': body})
+        return len(body)
+
+    async def api_sessions(self, query):
+        """Calendar events, fetched with one joined query"""
+        mentor, mentee = aliased(Mentor), aliased(Mentee)
+        stmt = select(Session.id, mentor.name, mentee.name, Session.date, Session.start_time,
+                      Session.end_time, Session.subject, Session.status, Session.version) \
+            .join(mentor, Session.mentor_id == mentor.id) \
+            .join(mentee, Session.mentee_id == mentee.id) \
+            .order_by(Session.id)
+        async with self.engine.connect() as conn:
+            rows = (await conn.execute(stmt)).all()
+        return 200, [calendar_event(*row) for row in rows]
+
+    async def api_statistics(self, query):
+        """Dashboard statistics, sharing the Flask endpoint's cache entry"""
+        key = f'{DATA_CACHE_NAMESPACE}:api_statistics'
+        missing = object()
+        # The sqlite backend does file I/O (and may wait on its lock), so keep it off the event loop
+        generation = await asyncio.to_thread(cache.generation, DATA_CACHE_NAMESPACE)
+        payload = await asyncio.to_thread(cache.get, key, missing)
+        if payload is missing:
+            async with self.primary_engine.connect() as conn:
+                totals = (await conn.execute(select(
+                    select(func.count(Mentor.id)).scalar_subquery(),
+                    select(func.count(Mentee.id)).scalar_subquery(),
+                    select(func.count(Session.id)).scalar_subquery(),
+                    select(func.count(Mentee.id)).where(Mentee.mentor_id.isnot(None)).scalar_subquery(),
+                ))).one()
+                mentee_subjects = (await conn.execute(select(Mentee.subject).order_by(Mentee.id))).scalars().all()
+                mentor_subjects = (await conn.execute(select(Mentor.subjects).order_by(Mentor.id))).scalars().all()
+            payload = statistics_payload(*totals, mentee_subjects, mentor_subjects)
+            # Not stored if a write invalidated the namespace while we were counting
+            await asyncio.to_thread(cache.set, key, payload, None, generation)
+        return 200, payload
+
+    async def search_subjects(self, query):
+        """Subject search; no database access at all"""
+        return 200, find_subjects(query.get('q', [''])[0])
+
+
+app = ReadAPI(
+    flask_app,
+    create_read_engine(flask_app.config, os.environ),
+    wsgi_threads=int(os.environ.get('ASGI_WSGI_THREADS', 10)),
+    primary_engine=create_read_engine(flask_app.config, os.environ, primary=True)
+    if replica_bind(flask_app.config) else None,
+)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Async API Tier Testing Suite
+Checks that the async read endpoints in asgi.py return exactly what the Flask
+endpoints return, that they are logged and measured like Flask requests,
+and that every other request still reaches Flask.
+
+Runs against a throwaway SQLite database (never mentorship.db).
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import sys
+import threading
+from datetime import date, time, timedelta
+
+from suite_support import SuiteLogger, scratch_environment
+
+# Point the app at a scratch database before it is imported
+WORK_DIR = scratch_environment('asgi')
+os.environ['ACCESS_LOG'] = os.path.join(WORK_DIR, 'access.log')
+
+import app as flask_app
+import asgi
+
+
+logger = SuiteLogger()
+
+
+def seed_database():
+    with flask_app.app.app_context():
+        flask_app.db.drop_all()
+        flask_app.db.create_all()
+        mentors = [flask_app.Mentor(name=f'Mentor {i}', roll_call='12/7', subjects='English, Mathematics',
+                                    max_mentees=5) for i in range(3)]
+        flask_app.db.session.add_all(mentors)
+        flask_app.db.session.flush()
+        mentees = [flask_app.Mentee(name=f'Student {i}', roll_call='7A', subject='English' if i % 2 else 'Mathematics',
+                                    lessons_remaining=5, mentor_id=mentors[i % 3].id if i < 10 else None)
+                   for i in range(15)]
+        flask_app.db.session.add_all(mentees)
+        flask_app.db.session.flush()
+        for i, mentee in enumerate(mentees[:10]):
+            flask_app.db.session.add(flask_app.Session(
+                mentor_id=mentee.mentor_id, mentee_id=mentee.id, date=date.today() + timedelta(days=i),
+                start_time=time(12, 30), end_time=time(13, 15), duration_minutes=45, subject=mentee.subject,
+                status=['scheduled', 'completed', 'cancelled'][i % 3]))
+        flask_app.db.session.commit()
+
+
+async def asgi_get(path, query=b'', headers=(), method='GET'):
+    """Call the ASGI app directly and collect the response"""
+    scope = {'type': 'http', 'method': method, 'path': path, 'raw_path': path.encode(), 'query_string': query,
+             'headers': list(headers), 'http_version': '1.1', 'scheme': 'http', 'root_path': '',
+             'server': ('testserver', 80), 'client': ('127.0.0.1', 1234)}
+    response = {'body': b''}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = dict(message['headers'])
+        else:
+            response['body'] += message.get('body', b'')
+
+    await asgi.app(scope, receive, send)
+    return response
+
+
+async def run_checks():
+    client = flask_app.app.test_client()
+
+    for path, query in [('/api/sessions', b''), ('/api/statistics', b''), ('/search_subjects', b'q=math')]:
+        flask_app.cache.clear()
+        async_response = await asgi_get(path, query)
+        flask_app.cache.clear()
+        sync_response = client.get(path, query_string=query.decode())
+        logger.log_result(f"{path} matches the Flask endpoint byte for byte",
+                          async_response['status'] == 200 and async_response['body'] == sync_response.data,
+                          f"{len(async_response['body'])} bytes")
+
+    compressed = await asgi_get('/api/sessions', headers=[(b'accept-encoding', b'gzip')])
+    logger.log_result("Async responses honour Accept-Encoding",
+                      compressed['headers'].get(b'content-encoding') == b'gzip'
+                      and gzip.decompress(compressed['body']) == client.get('/api/sessions').data)
+
+    head = await asgi_get('/api/statistics', method='HEAD')
+    logger.log_result("HEAD requests get headers without a body", head['status'] == 200 and head['body'] == b'')
+
+    loop_thread = threading.get_ident()
+    cache_threads = []
+    get, set_ = flask_app.cache.get, flask_app.cache.set
+    flask_app.cache.clear()
+    flask_app.cache.get = lambda *args: cache_threads.append(threading.get_ident()) or get(*args)
+    flask_app.cache.set = lambda *args: cache_threads.append(threading.get_ident()) or set_(*args)
+    try:
+        await asgi_get('/api/statistics')
+    finally:
+        del flask_app.cache.get, flask_app.cache.set
+    logger.log_result("Cache lookups for /api/statistics run off the event loop",
+                      len(cache_threads) == 2 and loop_thread not in cache_threads, f"{len(cache_threads)} calls")
+
+    response = await asgi_get('/api/sessions', headers=[(b'x-request-id', b'poller-42')])
+    access_log = flask_app.app.extensions['access_log']
+    access_log.flush()
+    with open(os.environ['ACCESS_LOG']) as f:
+        entry = next((json.loads(line) for line in f if '"poller-42"' in line), {})
+    logger.log_result("Native responses echo the request ID and are written to the access log",
+                      response['headers'].get(b'x-request-id') == b'poller-42'
+                      and entry.get('endpoint') == 'api_sessions' and entry.get('status') == 200
+                      and entry.get('bytes') == len(response['body']) and entry.get('queries', 0) > 0,
+                      f"{ {key: entry.get(key) for key in ('endpoint', 'status', 'bytes', 'queries', 'db_ms')} }")
+    logger.log_result("Native responses carry the query count headers",
+                      int(response['headers'].get(b'x-query-count', b'0')) > 0
+                      and b'db;dur=' in response['headers'].get(b'server-timing', b''))
+    scrape = flask_app.app.test_client().get('/metrics').get_data(as_text=True)
+    logger.log_result("Native requests are counted in /metrics",
+                      'mentorship_http_requests_total{endpoint="api_sessions",method="GET",status="200"}' in scrape
+                      and 'mentorship_http_request_duration_seconds_count{endpoint="api_sessions",method="GET"}' in scrape)
+
+    page = await asgi_get('/mentors')
+    logger.log_result("Other paths fall through to Flask", page['status'] == 200 and b'Mentor 0' in page['body'],
+                      f"status={page['status']}")
+
+    await asgi.app.dispose()
+
+
+def main():
+    logger.log_header("ASYNC API TIER TESTS")
+    print(f"📂 Scratch database: {os.environ['DATABASE_URL']}")
+    seed_database()
+    asyncio.run(run_checks())
+
+    return logger.finish("async API tier matches Flask", "async API tier differs from Flask")
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
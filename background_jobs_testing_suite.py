@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Background Jobs Testing Suite
+Checks that heavy routes hand their work to the job runner, and that the
+queue's progress reporting, retries, cancellation and per-type concurrency
+limits behave.
+
+Runs against a throwaway SQLite database and job queue (never mentorship.db).
+"""
+
+import os
+import sys
+import threading
+import time
+
+from suite_support import SuiteLogger, scratch_environment
+
+# Point the app at scratch files before it is imported
+WORK_DIR = scratch_environment('jobs')
+os.environ['JOBS_EXPORT_DIR'] = os.path.join(WORK_DIR, 'exports')
+os.environ['JOBS_MODE'] = 'thread'
+os.environ['EXPORT_BACKGROUND_ROWS'] = '10'
+
+import app as flask_app
+from jobs import JobCancelled, JobQueue, JobRunner
+
+
+logger = SuiteLogger()
+client = flask_app.app.test_client()
+
+
+def reset_database(mentors=2, mentees=20):
+    with flask_app.app.app_context():
+        flask_app.db.drop_all()
+        flask_app.db.create_all()
+        for i in range(mentors):
+            flask_app.db.session.add(flask_app.Mentor(name=f'Mentor {i}', roll_call='12/7',
+                                                      subjects='English', max_mentees=5))
+        for i in range(mentees):
+            flask_app.db.session.add(flask_app.Mentee(name=f'Student {i}', roll_call='7A',
+                                                      subject='English', lessons_remaining=5))
+        flask_app.db.session.commit()
+
+
+def job_id_from(response):
+    return response.headers['Location'].split('/jobs/')[1].split('?')[0]
+
+
+def test_auto_assign_route():
+    reset_database()
+    response = client.post('/bulk_assign_mentors', data={'action': 'auto_assign'})
+    logger.log_result("Auto-assign returns immediately with a job page redirect",
+                      response.status_code == 302 and '/jobs/' in response.headers['Location'],
+                      response.headers.get('Location', ''))
+    job = flask_app.job_queue.wait(job_id_from(response))
+    with flask_app.app.app_context():
+        assigned = flask_app.Mentee.query.filter(flask_app.Mentee.mentor_id.isnot(None)).count()
+    logger.log_result("Auto-assign job succeeds and fills both mentors",
+                      job['status'] == 'succeeded' and assigned == 10 and job['result']['assigned'] == 10,
+                      f"status={job['status']}, assigned={assigned}, message={job['message']!r}")
+    page = client.get(response.headers['Location'])
+    logger.log_result("Job progress page renders", page.status_code == 200, f"status={page.status_code}")
+
+
+def test_api_clients_get_202():
+    reset_database()
+    response = client.post('/clear_all_data/confirm', headers={'Accept': 'application/json'})
+    body = response.get_json()
+    logger.log_result("API clients get 202 with a job id", response.status_code == 202 and 'job_id' in body,
+                      f"status={response.status_code}, body={body}")
+    flask_app.job_queue.wait(body['job_id'])
+    status = client.get(body['status_url']).get_json()
+    with flask_app.app.app_context():
+        remaining = flask_app.Mentor.query.count() + flask_app.Mentee.query.count()
+    logger.log_result("/api/jobs/<id> reports the finished job", status['status'] == 'succeeded' and remaining == 0,
+                      f"status={status['status']}, progress={status['progress']}, rows left={remaining}")
+    missing = client.get('/api/jobs/does-not-exist')
+    logger.log_result("Unknown job ids return 404", missing.status_code == 404)
+
+
+def test_large_export():
+    reset_database(mentees=25)
+    small = client.get('/export_data/mentors')
+    logger.log_result("Small exports still download directly",
+                      small.status_code == 200 and small.mimetype == 'text/csv')
+    response = client.get('/export_data/mentees')
+    job = flask_app.job_queue.wait(job_id_from(response))
+    download = client.get(f"/api/jobs/{job['id']}/download")
+    lines = download.data.decode().strip().splitlines()
+    logger.log_result("Large exports run as a job and offer a download",
+                      job['status'] == 'succeeded' and download.status_code == 200 and len(lines) == 26,
+                      f"status={job['status']}, csv lines={len(lines)}")
+
+    path = os.path.join(os.environ['JOBS_EXPORT_DIR'], job['result']['file'])
+    existed = os.path.exists(path)
+    flask_app.job_queue.purge(-1)
+    logger.log_result("Purging a finished export job deletes its file",
+                      existed and not os.path.exists(path) and flask_app.job_queue.get(job['id']) is None)
+
+
+def test_bulk_delete():
+    reset_database()
+    with flask_app.app.app_context():
+        mentor_ids = [str(m.id) for m in flask_app.Mentor.query.all()]
+    response = client.post('/bulk_delete_mentors', data={'mentor_ids': mentor_ids})
+    job = flask_app.job_queue.wait(job_id_from(response))
+    with flask_app.app.app_context():
+        left = flask_app.Mentor.query.count()
+    logger.log_result("Bulk delete runs as a job", job['status'] == 'succeeded' and left == 0,
+                      f"status={job['status']}, mentors left={left}")
+
+
+def test_retries():
+    queue = JobQueue(os.path.join(WORK_DIR, 'retry.sqlite3'))
+    runner = JobRunner(queue, workers=1, poll_interval=0.05)
+    attempts = []
+
+    @runner.register('flaky', max_attempts=3, retry_delay=0.05)
+    def flaky(ctx):
+        attempts.append(ctx.attempt)
+        if ctx.attempt < 3:
+            raise RuntimeError('temporary failure')
+        return {'message': 'done'}
+
+    @runner.register('broken', max_attempts=2, retry_delay=0.05)
+    def broken(ctx):
+        raise RuntimeError('always fails')
+
+    flaky_job = queue.wait(runner.submit('flaky'), timeout=10)
+    broken_job = queue.wait(runner.submit('broken'), timeout=10)
+    runner.stop()
+    logger.log_result("Failed jobs are retried with backoff until they succeed",
+                      flaky_job['status'] == 'succeeded' and attempts == [1, 2, 3], f"attempts={attempts}")
+    logger.log_result("Jobs that exhaust their retries are marked failed",
+                      broken_job['status'] == 'failed' and broken_job['attempts'] == 2
+                      and 'always fails' in broken_job['error'], f"error={broken_job['error']!r}")
+
+
+def test_heartbeat():
+    queue = JobQueue(os.path.join(WORK_DIR, 'heartbeat.sqlite3'))
+    runner = JobRunner(queue, workers=1, poll_interval=0.05, stale_after=0.5)
+    started = threading.Event()
+
+    @runner.register('quiet', max_attempts=1)
+    def quiet(ctx):
+        started.set()
+        time.sleep(1.5)
+        return {'message': 'finished without reporting progress'}
+
+    job_id = runner.submit('quiet')
+    started.wait(5)
+    time.sleep(1.0)
+    requeued = queue.requeue_stale(0.5)
+    job = queue.wait(job_id, timeout=10)
+    runner.stop()
+    logger.log_result("A running job that never reports progress is not requeued as stale",
+                      requeued == 0 and job['status'] == 'succeeded' and job['attempts'] == 1,
+                      f"requeued={requeued}, status={job['status']}, attempts={job['attempts']}")
+
+
+def test_cancellation():
+    queue = JobQueue(os.path.join(WORK_DIR, 'cancel.sqlite3'))
+    runner = JobRunner(queue, workers=1, poll_interval=0.05)
+    started = threading.Event()
+
+    @runner.register('slow')
+    def slow(ctx):
+        started.set()
+        for step in range(200):
+            ctx.progress(step, 200, force=True)
+            time.sleep(0.01)
+        return {'message': 'finished'}
+
+    running_id = runner.submit('slow')
+    waiting_id = runner.submit('slow')
+    started.wait(5)
+    waiting_status = queue.cancel(waiting_id)
+    queue.cancel(running_id)
+    running_job = queue.wait(running_id, timeout=10)
+    runner.stop()
+    logger.log_result("Queued jobs are cancelled immediately", waiting_status == 'cancelled')
+    logger.log_result("Running jobs stop at their next progress check",
+                      running_job['status'] == 'cancelled' and running_job['progress'] < 100,
+                      f"status={running_job['status']}, progress={running_job['progress']}")
+
+
+def test_concurrency_limit():
+    queue = JobQueue(os.path.join(WORK_DIR, 'limits.sqlite3'))
+    runner = JobRunner(queue, workers=6, poll_interval=0.05)
+    lock = threading.Lock()
+    active = {'limited': 0, 'peak': 0}
+
+    @runner.register('limited', concurrency=2)
+    def limited(ctx):
+        with lock:
+            active['limited'] += 1
+            active['peak'] = max(active['peak'], active['limited'])
+        time.sleep(0.1)
+        with lock:
+            active['limited'] -= 1
+
+    job_ids = [runner.submit('limited') for _ in range(8)]
+    jobs = [queue.wait(job_id, timeout=15) for job_id in job_ids]
+    runner.stop()
+    logger.log_result("Per-type concurrency limit holds with 6 worker threads",
+                      active['peak'] == 2 and all(j['status'] == 'succeeded' for j in jobs),
+                      f"peak concurrent={active['peak']}")
+
+
+def main():
+    logger.log_header("BACKGROUND JOBS TESTS")
+    print(f"📂 Scratch database: {os.environ['DATABASE_URL']}")
+    flask_app.init_db()
+
+    test_auto_assign_route()
+    test_api_clients_get_202()
+    test_large_export()
+    test_bulk_delete()
+    test_retries()
+    test_heartbeat()
+    test_cancellation()
+    test_concurrency_limit()
+
+    return logger.finish("background jobs behave", "background job checks failed")
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
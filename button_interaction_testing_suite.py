@@ -1098,6 +1098,41 @@ class InteractionTester:
                 {"target": form.target}
             )
     
+    def test_query_budgets(self) -> List[InteractionTest]:
+        """Check the SQL each route runs on small and large datasets against its budget"""
+        print("📏 Checking per-route query budgets...")
+        start_time = time.time()
+        try:
+            import query_budget
+            results = query_budget.run()
+        except Exception as e:
+            self._add_test_result("query_budget", "Query Budget Check", "query_budget",
+                                  "Every route stays within its query budget", f"Harness error: {e}",
+                                  "ERROR", time.time() - start_time, str(e), {})
+            return self.test_results
+
+        execution_time = (time.time() - start_time) / max(len(results), 1)
+        for result in results:
+            actual = f"{result['small']} -> {result['large']} queries (budget {result['budget']})"
+            if result['n_plus_one']:
+                actual += "; grows with row count (N+1)"
+            if result['errored']:
+                actual += f"; HTTP {result['small_status']} -> {result['status']}"
+            self._add_test_result(
+                result['route'],
+                "Query Budget Check",
+                "query_budget",
+                f"At most {result['budget']} queries on the large dataset",
+                actual,
+                "FAIL" if result['failed'] else "PASS",
+                execution_time,
+                "",
+                {"grown": [f"{small} -> {large} x {query_budget.brief(sql)}" for small, large, sql in result['grown']]}
+            )
+        flagged = sum(result['n_plus_one'] for result in results)
+        print(f"   Checked {len(results)} routes, {flagged} flagged as N+1")
+        return self.test_results
+
     def _create_test_form_data(self, form: InteractiveElement) -> Dict[str, str]:
         """Create test data for form submission"""
         # Basic test data based on common form patterns
@@ -1336,6 +1371,7 @@ def main():
     print("\n🧪 PHASE 2: Testing Interactions")
     tester = InteractionTester(elements)
     test_results = tester.test_all_interactions()
+    test_results = tester.test_query_budgets()
     
     # Phase 3: Generate report
     print("\n📊 PHASE 3: Generating Report")
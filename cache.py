@@ -0,0 +1,362 @@
+"""
+Cache backends for the Mentorship System.
+
+Two interchangeable backends share one small interface (get/set/delete/
+invalidate/get_or_set/stats):
+
+* LRUCache    - in-process, bounded by entry count and approximate bytes,
+                with per-entry TTL. Fast, but private to one worker.
+* SQLiteCache - a shared file on local disk that every worker on the node
+                reads and writes, so an invalidation issued by one worker is
+                seen by all of them on their next lookup.
+
+Select a backend with create_cache(), normally driven by the CACHE_* settings.
+
+invalidate(namespace) also bumps that namespace's generation. A caller that
+reads from the database to fill the cache takes generation() first and passes
+it to set(), which then refuses to store the value if the namespace was
+invalidated while it was being computed; get_or_set() does this itself.
+Otherwise a value read before a write could be stored after the write's
+invalidation and served for a full TTL.
+
+count_lookups() starts counting the hits and misses made in the current
+context (one request), across every cache, for the access log.
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+_lookups = ContextVar('cache_lookups', default=None)
+
+
+def count_lookups():
+    """Count hits and misses in the current context from now on; returns the live counts"""
+    counts = {'hits': 0, 'misses': 0}
+    _lookups.set(counts)
+    return counts
+
+
+def stop_counting_lookups():
+    _lookups.set(None)
+
+
+class CacheStats:
+    """Hit/miss/eviction counters for a cache backend"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def record(self, field, amount=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+        counts = _lookups.get()
+        if counts is not None and field in counts:
+            counts[field] += amount
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return round(self.hits / lookups, 4) if lookups else 0.0
+
+    def as_dict(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'sets': self.sets,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': self.hit_rate,
+        }
+
+
+def namespace_of(key):
+    """The namespace invalidate() drops key with ('data' for 'data:sessions')"""
+    return key.partition(':')[0]
+
+
+class BaseCache:
+    """Common behaviour shared by all cache backends"""
+
+    backend_name = 'base'
+
+    def __init__(self, default_ttl=300, max_entries=1024, max_bytes=32 * 1024 * 1024):
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats_counters = CacheStats()
+
+    def get(self, key, default=None):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None, generation=None):
+        """Store value; with generation, only if the key's namespace is still at that generation"""
+        raise NotImplementedError
+
+    def generation(self, namespace):
+        """How many times namespace has been invalidated"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def invalidate(self, namespace):
+        """Drop every key that starts with '<namespace>:'"""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def entry_count(self):
+        raise NotImplementedError
+
+    def memory_bytes(self):
+        raise NotImplementedError
+
+    def get_or_set(self, key, factory, ttl=None):
+        """Return the cached value for key, computing and storing it on a miss"""
+        sentinel = object()
+        generation = self.generation(namespace_of(key))
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = factory()
+            self.set(key, value, ttl, generation)
+        return value
+
+    def stats(self):
+        """Return hit rate, evictions and memory use for this backend"""
+        data = self.stats_counters.as_dict()
+        data.update({
+            'backend': self.backend_name,
+            'entries': self.entry_count(),
+            'memory_bytes': self.memory_bytes(),
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+        })
+        return data
+
+    def _expiry(self, ttl):
+        ttl = self.default_ttl if ttl is None else ttl
+        return time.time() + ttl if ttl else None
+
+
+class LRUCache(BaseCache):
+    """In-process least-recently-used cache with TTL and size bounds"""
+
+    backend_name = 'memory'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._generations = {}  # namespace -> invalidation count
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats_counters.record('misses')
+                return default
+            value, expires_at, size = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(key)
+                self.stats_counters.record('expirations')
+                self.stats_counters.record('misses')
+                return default
+            self._data.move_to_end(key)
+        self.stats_counters.record('hits')
+        return value
+
+    def set(self, key, value, ttl=None, generation=None):
+        size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            if generation is not None and self._generations.get(namespace_of(key), 0) != generation:
+                return False
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, self._expiry(ttl), size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.stats_counters.record('evictions')
+        self.stats_counters.record('sets')
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def generation(self, namespace):
+        return self._generations.get(namespace, 0)
+
+    def invalidate(self, namespace):
+        prefix = f'{namespace}:'
+        with self._lock:
+            top = namespace_of(namespace)
+            self._generations[top] = self._generations.get(top, 0) + 1
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def entry_count(self):
+        return len(self._data)
+
+    def memory_bytes(self):
+        return self._bytes
+
+    def _remove(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+
+class SQLiteCache(BaseCache):
+    """Node-local cache shared by all workers through one SQLite file"""
+
+    backend_name = 'sqlite'
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache_entry ('
+            ' key TEXT PRIMARY KEY,'
+            ' value BLOB NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' expires_at REAL,'
+            ' accessed_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_entry_accessed ON cache_entry (accessed_at)')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache_generation ('
+            ' namespace TEXT PRIMARY KEY,'
+            ' generation INTEGER NOT NULL)'
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # A connection inherited across fork (gunicorn preload) must not be reused
+        if conn is None or self._local.pid != os.getpid():
+            # Autocommit mode: every statement is its own short transaction,
+            # so workers never hold the file lock between requests.
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key, default=None):
+        conn = self._connection()
+        row = conn.execute('SELECT value, expires_at FROM cache_entry WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.stats_counters.record('misses')
+            return default
+        value, expires_at = row
+        now = time.time()
+        if expires_at is not None and expires_at <= now:
+            conn.execute('DELETE FROM cache_entry WHERE key = ? AND expires_at <= ?', (key, now))
+            self.stats_counters.record('expirations')
+            self.stats_counters.record('misses')
+            return default
+        conn.execute('UPDATE cache_entry SET accessed_at = ? WHERE key = ?', (now, key))
+        self.stats_counters.record('hits')
+        return pickle.loads(value)
+
+    def set(self, key, value, ttl=None, generation=None):
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_bytes:
+            return False
+        conn = self._connection()
+        row = (key, sqlite3.Binary(payload), len(payload), self._expiry(ttl), time.time())
+        if generation is None:
+            conn.execute('INSERT OR REPLACE INTO cache_entry (key, value, size, expires_at, accessed_at) '
+                         'VALUES (?, ?, ?, ?, ?)', row)
+        else:
+            # Checked in the same statement, so an invalidation from another worker can't slip in between
+            stored = conn.execute(
+                'INSERT OR REPLACE INTO cache_entry (key, value, size, expires_at, accessed_at) '
+                'SELECT ?, ?, ?, ?, ? WHERE COALESCE((SELECT generation FROM cache_generation '
+                'WHERE namespace = ?), 0) = ?', row + (namespace_of(key), generation)
+            ).rowcount
+            if not stored:
+                return False
+        self.stats_counters.record('sets')
+        self._enforce_bounds(conn)
+        return True
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM cache_entry WHERE key = ?', (key,))
+
+    def generation(self, namespace):
+        row = self._connection().execute('SELECT generation FROM cache_generation WHERE namespace = ?',
+                                         (namespace,)).fetchone()
+        return row[0] if row else 0
+
+    def invalidate(self, namespace):
+        conn = self._connection()
+        # Bump first: a set() checked before this still lands before the DELETE below
+        conn.execute('INSERT INTO cache_generation (namespace, generation) VALUES (?, 1) '
+                     'ON CONFLICT (namespace) DO UPDATE SET generation = generation + 1', (namespace_of(namespace),))
+        # Range scan on the primary key instead of LIKE, which cannot use the index
+        prefix = f'{namespace}:'
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        conn.execute('DELETE FROM cache_entry WHERE key >= ? AND key < ?', (prefix, upper))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entry')
+
+    def entry_count(self):
+        return self._connection().execute('SELECT COUNT(*) FROM cache_entry').fetchone()[0]
+
+    def memory_bytes(self):
+        return self._connection().execute('SELECT COALESCE(SUM(size), 0) FROM cache_entry').fetchone()[0]
+
+    def _enforce_bounds(self, conn):
+        conn.execute('DELETE FROM cache_entry WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),))
+        count, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entry').fetchone()
+        evicted = 0
+        while count > self.max_entries or total > self.max_bytes:
+            row = conn.execute(
+                'SELECT key, size FROM cache_entry ORDER BY accessed_at LIMIT 1'
+            ).fetchone()
+            if row is None:
+                break
+            conn.execute('DELETE FROM cache_entry WHERE key = ?', (row[0],))
+            count -= 1
+            total -= row[1]
+            evicted += 1
+        if evicted:
+            self.stats_counters.record('evictions', evicted)
+
+
+def create_cache(backend='memory', path=None, **kwargs):
+    """Build a cache backend by name ('memory' or 'sqlite')"""
+    if backend == 'memory':
+        return LRUCache(**kwargs)
+    if backend == 'sqlite':
+        if not path:
+            raise ValueError('The sqlite cache backend requires a path')
+        return SQLiteCache(path, **kwargs)
+    raise ValueError(f'Unknown cache backend: {backend}')
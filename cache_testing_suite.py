@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Cache Testing Suite
+Checks LRU eviction by entry count and size, TTL expiry and namespace
+invalidation on both cache backends (including values computed across an
+invalidation), and that the SQLite backend is shared
+between processes, so a write committed by one worker drops the cached views
+another worker would otherwise keep serving.
+
+Runs against a throwaway SQLite database and cache file (never mentorship.db).
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from suite_support import SuiteLogger, scratch_environment
+
+# Point the app at scratch files before it is imported
+WORK_DIR = scratch_environment('cache')
+os.environ['CACHE_BACKEND'] = 'sqlite'
+os.environ['CACHE_DIR'] = WORK_DIR
+
+import app as flask_app
+from cache import LRUCache, SQLiteCache, create_cache
+
+
+logger = SuiteLogger()
+missing = object()
+
+
+def backends(**kwargs):
+    """A fresh cache of each backend"""
+    path = tempfile.mktemp(suffix='.sqlite3', dir=WORK_DIR)
+    return [create_cache('memory', **kwargs), create_cache('sqlite', path=path, **kwargs)]
+
+
+def test_lru_eviction():
+    for cache in backends(max_entries=3):
+        for key in 'abc':
+            cache.set(key, key)
+            time.sleep(0.01)  # distinct access times for the SQLite backend
+        cache.get('a')
+        cache.set('d', 'd')
+        kept = [key for key in 'abcd' if cache.get(key, missing) is not missing]
+        logger.log_result(f"{cache.backend_name}: the least recently used entry is evicted past max_entries",
+                          kept == ['a', 'c', 'd'] and cache.stats_counters.evictions == 1, f"kept {kept}")
+
+    for cache in backends(max_bytes=1000):
+        for i in range(5):
+            cache.set(f'blob:{i}', 'x' * 300)
+            time.sleep(0.01)
+        logger.log_result(f"{cache.backend_name}: entries are evicted to stay within max_bytes",
+                          cache.memory_bytes() <= 1000 and cache.get('blob:4') is not None
+                          and cache.get('blob:0', missing) is missing,
+                          f"{cache.entry_count()} entries, {cache.memory_bytes()} bytes")
+        logger.log_result(f"{cache.backend_name}: a value larger than max_bytes is not stored",
+                          cache.set('huge', 'x' * 5000) is False and cache.get('huge', missing) is missing)
+
+
+def test_ttl():
+    for cache in backends(default_ttl=0.2):
+        cache.set('short', 1)
+        cache.set('long', 2, ttl=60)
+        cache.set('forever', 3, ttl=0)
+        fresh = cache.get('short')
+        time.sleep(0.3)
+        logger.log_result(f"{cache.backend_name}: entries expire after their TTL",
+                          fresh == 1 and cache.get('short', missing) is missing and cache.get('long') == 2
+                          and cache.get('forever') == 3 and cache.stats_counters.expirations == 1)
+
+
+def test_invalidation():
+    for cache in backends():
+        for key in ('data:statistics', 'data:sessions', 'database:size', 'other:key'):
+            cache.set(key, key)
+        cache.invalidate('data')
+        kept = sorted(key for key in ('data:statistics', 'data:sessions', 'database:size', 'other:key')
+                      if cache.get(key, missing) is not missing)
+        logger.log_result(f"{cache.backend_name}: invalidating a namespace drops only its keys",
+                          kept == ['database:size', 'other:key'], f"kept {kept}")
+
+    cache = LRUCache()
+    calls = []
+    values = [cache.get_or_set('data:x', lambda: calls.append(1) or 'value') for _ in range(3)]
+    logger.log_result("get_or_set computes a value once and then serves it from the cache",
+                      values == ['value'] * 3 and len(calls) == 1 and cache.stats()['hit_rate'] > 0.5)
+
+    for cache in backends():
+        def stale_read():
+            cache.invalidate('data')  # a write commits while the value is being computed
+            return 'stale'
+        value = cache.get_or_set('data:statistics', stale_read)
+        generation = cache.generation('data')
+        cache.invalidate('data')
+        refused = cache.set('data:sessions', 'stale', generation=generation)
+        logger.log_result(f"{cache.backend_name}: a value computed across an invalidation is not stored",
+                          value == 'stale' and cache.get('data:statistics', missing) is missing
+                          and refused is False and cache.get('data:sessions', missing) is missing
+                          and cache.set('data:sessions', 'fresh', generation=cache.generation('data')),
+                          f"generation {cache.generation('data')}")
+
+
+def _set_in_child(path):
+    SQLiteCache(path).set('data:shared', os.getpid())
+
+
+def _get_in_child(path):
+    return SQLiteCache(path).get('data:shared', 'gone')
+
+
+def _serve_statistics(conn):
+    """A second 'worker': answer /api/statistics until told to stop"""
+    with flask_app.app.app_context():
+        flask_app.db.engine.dispose(close=False)  # don't share pooled connections across fork
+    client = flask_app.app.test_client()
+    while conn.recv():
+        conn.send(client.get('/api/statistics').get_json()['totals']['mentors'])
+
+
+def test_cross_process():
+    path = os.path.join(WORK_DIR, 'shared.sqlite3')
+    cache = SQLiteCache(path)
+    context = multiprocessing.get_context('fork')
+    with context.Pool(1) as pool:
+        pool.apply(_set_in_child, (path,))
+        written = cache.get('data:shared')
+        cache.invalidate('data')
+        seen = pool.apply(_get_in_child, (path,))
+    logger.log_result("The SQLite cache is shared between processes, invalidations included",
+                      written not in (None, os.getpid()) and seen == 'gone', f"child wrote pid {written}")
+
+    client = flask_app.app.test_client()
+    before = client.get('/api/statistics').get_json()['totals']['mentors']
+    with flask_app.app.app_context():
+        flask_app.db.engine.dispose()
+    parent_conn, child_conn = context.Pipe()
+    worker = context.Process(target=_serve_statistics, args=(child_conn,))
+    worker.start()
+    try:
+        parent_conn.send(True)
+        cached = parent_conn.recv()
+        client.post('/add_mentor', data={'first_name': 'Shared', 'last_name': 'Cache', 'roll_call': '12/7',
+                                         'subjects': 'English', 'max_mentees': '2'})
+        parent_conn.send(True)
+        after = parent_conn.recv()
+    finally:
+        parent_conn.send(False)
+        worker.join(10)
+    logger.log_result("A write committed in one worker invalidates the view another worker serves",
+                      cached == before and after == before + 1, f"other worker saw {cached} then {after} mentors")
+
+
+def main():
+    logger.log_header("CACHE TESTS")
+    print(f"📂 Scratch database: {os.environ['DATABASE_URL']}")
+    flask_app.init_db()
+
+    test_lru_eviction()
+    test_ttl()
+    test_invalidation()
+    if sys.platform != 'win32':
+        test_cross_process()
+
+    return logger.finish("the caches evict, expire and invalidate correctly", "cache checks failed")
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
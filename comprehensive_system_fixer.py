@@ -10,6 +10,8 @@ import sqlite3
 import shutil
 from datetime import datetime
 
+import db_maintenance
+
 def print_header(title):
     """Print a formatted header"""
     print("\n" + "="*60)
@@ -302,11 +304,11 @@ def optimize_database():
         conn = sqlite3.connect('mentorship.db')
         cursor = conn.cursor()
         
-        # Run VACUUM to optimize database
-        cursor.execute("VACUUM")
-        
-        # Analyze tables for better query planning
-        cursor.execute("ANALYZE")
+        # A time-boxed slice (incremental vacuum, ANALYZE of stale tables,
+        # PRAGMA optimize, WAL checkpoint) instead of a full VACUUM, which
+        # would lock and rewrite the whole file
+        done = db_maintenance.run_slice(conn, budget_ms=2000)
+        print(f"   Freed {done.get('vacuumed_pages', 0)} page(s), analyzed {len(done['analyzed'])} table(s)")
         
         # Check database integrity
         cursor.execute("PRAGMA integrity_check")
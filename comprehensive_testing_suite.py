@@ -530,6 +530,33 @@ class PerformanceTester:
         
         return all_passed
 
+    @staticmethod
+    def test_query_budgets():
+        """Test SQL statements per route on small and large datasets (N+1 detection)"""
+        logger.log_section("Query Budget Testing (Grey-Box)", "grey")
+        
+        all_passed = True
+        
+        try:
+            import query_budget
+            
+            for result in query_budget.run():
+                details = f"{result['small']} -> {result['large']} queries, budget {result['budget']}"
+                if result['n_plus_one']:
+                    small, large, sql = result['grown'][0]
+                    details += f"; N+1: {small} -> {large} x {query_budget.brief(sql, 100)}"
+                if result['errored']:
+                    details += f"; HTTP {result['small_status']} -> {result['status']}"
+                passed = not result['failed']
+                logger.log_result(f"Query budget: {result['route']}", passed, details, "grey")
+                all_passed = all_passed and passed
+            
+        except Exception as e:
+            logger.log_result("Query budget testing", False, str(e), "grey")
+            all_passed = False
+        
+        return all_passed
+
 def test_flask_routes():
     """Test Flask routes and application structure"""
     logger.log_section("Flask Routes Testing (Grey-Box)", "grey")
@@ -659,6 +686,7 @@ def main():
     test_results['Data Validation'] = DatabaseIntegrityTester.test_data_validation()
     test_results['Flask Routes'] = test_flask_routes()
     test_results['Database Performance'] = PerformanceTester.test_database_performance()
+    test_results['Query Budgets'] = PerformanceTester.test_query_budgets()
     
     # Black-box testing (external behavior only)
     test_results['Form Field Validation'] = FormTester.test_form_field_validation()
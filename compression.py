@@ -0,0 +1,155 @@
+"""
+Negotiated gzip/brotli compression of dynamic responses.
+
+init_app(app) registers an after_request hook that compresses HTML, JSON,
+CSV and other text responses when the client accepts it and the body is
+at least COMPRESS_MIN_SIZE bytes. Streamed responses are compressed chunk by
+chunk (each chunk is flushed so the client can render progressively) when
+COMPRESS_STREAMS is enabled.
+
+Brotli is used when the optional `brotli` package is installed and the
+client prefers it; gzip is always available.
+
+Settings (app.config):
+    COMPRESS_ENABLED    - master switch (default True)
+    COMPRESS_MIN_SIZE   - skip bodies smaller than this many bytes (default 500)
+    COMPRESS_LEVEL      - gzip level 1-9 (default 6)
+    COMPRESS_BR_QUALITY - brotli quality 0-11 (default 4)
+    COMPRESS_STREAMS    - compress streamed responses too (default True)
+    COMPRESS_MIMETYPES  - mimetypes eligible for compression
+"""
+
+import gzip
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+DEFAULT_MIMETYPES = [
+    'text/html',
+    'text/css',
+    'text/csv',
+    'text/plain',
+    'text/xml',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+]
+
+
+def accepted_encodings():
+    """Encodings the current request accepts"""
+    return parse_accept_encoding(request.headers.get('Accept-Encoding', ''))
+
+
+def parse_accept_encoding(header):
+    """Parse an Accept-Encoding header into the set of encodings with a non-zero q value"""
+    accepted = set()
+    for part in header.split(','):
+        token, _, params = part.strip().partition(';')
+        if not token:
+            continue
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+def choose_encoding(accepted):
+    """Pick the best encoding this server can produce for the client"""
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress_body(data, encoding, level=6, br_quality=4):
+    """Compress a complete response body"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=br_quality)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress_stream(chunks, encoding, level=6, br_quality=4):
+    """Compress an iterable of chunks, flushing after each so output is not held back"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=br_quality)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            output = compressor.process(chunk) + compressor.flush()
+            if output:
+                yield output
+        yield compressor.finish()
+        return
+
+    # wbits=31 selects the gzip container
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        output = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if output:
+            yield output
+    yield compressor.flush()
+
+
+def init_app(app):
+    """Register the response compression hook"""
+    app.config.setdefault('COMPRESS_ENABLED', True)
+    app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BR_QUALITY', 4)
+    app.config.setdefault('COMPRESS_STREAMS', True)
+    app.config.setdefault('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)
+
+    @app.after_request
+    def compress_response(response):
+        config = app.config
+        if not config['COMPRESS_ENABLED']:
+            return response
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return response
+        if response.mimetype not in config['COMPRESS_MIMETYPES']:
+            return response
+        if 'Content-Encoding' in response.headers or response.direct_passthrough:
+            return response
+        if 'no-transform' in response.headers.get('Cache-Control', ''):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(accepted_encodings())
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            if not config['COMPRESS_STREAMS']:
+                return response
+            response.response = compress_stream(
+                response.response, encoding, config['COMPRESS_LEVEL'], config['COMPRESS_BR_QUALITY'])
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < config['COMPRESS_MIN_SIZE']:
+                return response
+            response.set_data(compress_body(
+                data, encoding, config['COMPRESS_LEVEL'], config['COMPRESS_BR_QUALITY']))
+
+        response.headers['Content-Encoding'] = encoding
+        # A strong ETag identifies the uncompressed bytes, so downgrade it
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
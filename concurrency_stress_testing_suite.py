@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Concurrency Stress Testing Suite
+Fires hundreds of parallel assignment and scheduling requests at one mentor
+and verifies the mentee cap (including mentees a booking assigns) and the
+7-session cap are never exceeded, and that racing session edits are caught
+by the version check instead of overwriting each other.
+
+Runs against a throwaway SQLite database (never mentorship.db), from threads
+(like the threaded dev server) and from separate processes (like gunicorn
+workers sharing one database file).
+"""
+
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time as time_of_day, timedelta
+
+from suite_support import SuiteLogger, scratch_environment
+
+# Point the app at a scratch database before it is imported
+scratch_environment('stress', 'stress.db')
+# Run auto-assign jobs in the request threads so they race each other
+os.environ['JOBS_MODE'] = 'inline'
+
+import app as flask_app
+
+THREADS = 64
+REQUESTS = 300
+PROCESSES = 4
+
+
+logger = SuiteLogger()
+
+
+def reset_database():
+    with flask_app.app.app_context():
+        flask_app.db.drop_all()
+        flask_app.db.create_all()
+
+
+def create_mentor(max_mentees, subjects='English'):
+    with flask_app.app.app_context():
+        mentor = flask_app.Mentor(name='Stress Mentor', roll_call='12/7', subjects=subjects, max_mentees=max_mentees)
+        flask_app.db.session.add(mentor)
+        flask_app.db.session.commit()
+        return mentor.id
+
+
+def create_mentees(count, lessons=5, subject='English'):
+    with flask_app.app.app_context():
+        mentees = [flask_app.Mentee(name=f'Student {i}', roll_call='7A', subject=subject, lessons_remaining=lessons)
+                   for i in range(count)]
+        flask_app.db.session.add_all(mentees)
+        flask_app.db.session.commit()
+        return [m.id for m in mentees]
+
+
+def count_where(model, **filters):
+    with flask_app.app.app_context():
+        return model.query.filter_by(**filters).count()
+
+
+def fire(requests, threads=THREADS):
+    """POST every (path, form) pair from a thread pool; return status codes"""
+    def send(item):
+        path, form = item
+        return flask_app.app.test_client().post(path, data=form).status_code
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(send, requests))
+
+
+def test_parallel_assign_mentor():
+    reset_database()
+    mentor_id = create_mentor(max_mentees=5)
+    mentee_ids = create_mentees(REQUESTS)
+    start = time.perf_counter()
+    statuses = fire([('/assign_mentor', {'mentee_id': m, 'mentor_id': mentor_id}) for m in mentee_ids])
+    elapsed = time.perf_counter() - start
+    assigned = count_where(flask_app.Mentee, mentor_id=mentor_id)
+    logger.log_result(f"{REQUESTS} parallel assign_mentor requests respect max_mentees=5", assigned == 5,
+                      f"assigned={assigned}, {elapsed:.2f}s")
+    logger.log_result("assign_mentor requests never error", all(s < 500 for s in statuses),
+                      f"status codes: {sorted(set(statuses))}")
+
+
+def test_parallel_bulk_assign():
+    reset_database()
+    mentor_id = create_mentor(max_mentees=8)
+    mentee_ids = create_mentees(REQUESTS)
+    batches = [mentee_ids[i:i + 10] for i in range(0, len(mentee_ids), 10)]
+    statuses = fire([('/bulk_assign_mentors', {f'mentee_{m}': mentor_id for m in batch}) for batch in batches])
+    assigned = count_where(flask_app.Mentee, mentor_id=mentor_id)
+    logger.log_result(f"{len(batches)} parallel bulk assignments of 10 respect max_mentees=8", assigned == 8,
+                      f"assigned={assigned}")
+    logger.log_result("bulk_assign_mentors requests never error", all(s < 500 for s in statuses),
+                      f"status codes: {sorted(set(statuses))}")
+
+
+def test_parallel_auto_assign():
+    reset_database()
+    mentor_ids = [create_mentor(max_mentees=3) for _ in range(4)]
+    create_mentees(REQUESTS)
+    fire([('/bulk_assign_mentors', {'action': 'auto_assign'})] * 50)
+    counts = [count_where(flask_app.Mentee, mentor_id=m) for m in mentor_ids]
+    logger.log_result("50 parallel auto-assign runs never overfill any mentor", counts == [3, 3, 3, 3],
+                      f"per-mentor counts={counts}")
+
+
+def test_resave_on_full_mentor():
+    reset_database()
+    mentor_id = create_mentor(max_mentees=2)
+    mentee_ids = create_mentees(3)
+    fire([('/assign_mentor', {'mentee_id': m, 'mentor_id': mentor_id}) for m in mentee_ids[:2]])
+    # Saving an existing assignment again is not over capacity; a new mentee still is
+    client = flask_app.app.test_client()
+    resave = client.post('/assign_mentor', data={'mentee_id': mentee_ids[0], 'mentor_id': mentor_id},
+                         follow_redirects=True).get_data(as_text=True)
+    extra = client.post('/assign_mentor', data={'mentee_id': mentee_ids[2], 'mentor_id': mentor_id},
+                        follow_redirects=True).get_data(as_text=True)
+    assigned = count_where(flask_app.Mentee, mentor_id=mentor_id)
+    logger.log_result("Re-saving a mentee already with a full mentor succeeds",
+                      'Successfully assigned' in resave and 'maximum capacity' not in resave)
+    logger.log_result("A new mentee is still refused by the full mentor",
+                      'maximum capacity' in extra and assigned == 2, f"assigned={assigned}")
+
+
+def test_parallel_reassignments():
+    reset_database()
+    target_id = create_mentor(max_mentees=6)
+    sources = []
+    for _ in range(20):
+        source_id = create_mentor(max_mentees=5)
+        mentee_ids = create_mentees(5)
+        with flask_app.app.app_context():
+            flask_app.Mentee.query.filter(flask_app.Mentee.id.in_(mentee_ids)) \
+                .update({flask_app.Mentee.mentor_id: source_id}, synchronize_session=False)
+            flask_app.db.session.commit()
+        sources.append((source_id, mentee_ids))
+    loose = create_mentees(40)
+    requests = [(f'/reassign_mentees/{source_id}', {'reassignments': [f'{m}-{target_id}' for m in mentee_ids]})
+                for source_id, mentee_ids in sources]
+    requests += [('/assign_mentor', {'mentee_id': m, 'mentor_id': target_id}) for m in loose]
+    # A refused batch re-renders the reassignment form, so only the capacity is checked
+    fire(requests)
+    assigned = count_where(flask_app.Mentee, mentor_id=target_id)
+    logger.log_result("Reassignment batches racing each other and assign_mentor respect max_mentees=6",
+                      assigned == 6, f"assigned={assigned}")
+
+
+def test_parallel_schedule_session():
+    reset_database()
+    mentor_id = create_mentor(max_mentees=REQUESTS)
+    mentee_ids = create_mentees(REQUESTS, lessons=5)
+    session_day = (date.today() + timedelta(days=1)).isoformat()
+    statuses = fire([('/schedule_session', {'mentor_id': mentor_id, 'mentee_id': m, 'date': session_day,
+                                            'start_time': '12:30', 'duration': '45'}) for m in mentee_ids])
+    sessions = count_where(flask_app.Session, mentor_id=mentor_id)
+    logger.log_result(f"{REQUESTS} parallel schedule_session requests respect the 7-session cap",
+                      sessions == flask_app.MAX_SESSIONS_PER_MENTOR, f"sessions={sessions}")
+    with flask_app.app.app_context():
+        lessons_used = sum(5 - m.lessons_remaining for m in flask_app.Mentee.query.all())
+    logger.log_result("Only scheduled sessions use up lessons", lessons_used == sessions,
+                      f"lessons used={lessons_used}")
+    logger.log_result("schedule_session requests never error", all(s < 500 for s in statuses),
+                      f"status codes: {sorted(set(statuses))}")
+
+
+def test_parallel_schedule_session_mentee_cap():
+    reset_database()
+    mentor_id = create_mentor(max_mentees=3)
+    mentee_ids = create_mentees(REQUESTS, lessons=5)
+    session_day = (date.today() + timedelta(days=1)).isoformat()
+    statuses = fire([('/schedule_session', {'mentor_id': mentor_id, 'mentee_id': m, 'date': session_day,
+                                            'start_time': '12:30', 'duration': '45'}) for m in mentee_ids])
+    assigned = count_where(flask_app.Mentee, mentor_id=mentor_id)
+    sessions = count_where(flask_app.Session, mentor_id=mentor_id)
+    with flask_app.app.app_context():
+        lessons_used = sum(5 - m.lessons_remaining for m in flask_app.Mentee.query.all())
+    logger.log_result(f"{REQUESTS} parallel bookings that auto-assign respect max_mentees=3",
+                      assigned == 3 and sessions == 3 and lessons_used == 3,
+                      f"assigned={assigned}, sessions={sessions}, lessons used={lessons_used}")
+    logger.log_result("Bookings refused by the mentee cap never error", all(s < 500 for s in statuses),
+                      f"status codes: {sorted(set(statuses))}")
+
+
+def test_parallel_lessons_remaining():
+    reset_database()
+    mentor_id = create_mentor(max_mentees=5)
+    mentee_id = create_mentees(1, lessons=3)[0]
+    session_day = (date.today() + timedelta(days=1)).isoformat()
+    fire([('/schedule_session', {'mentor_id': mentor_id, 'mentee_id': mentee_id, 'date': session_day,
+                                 'start_time': '12:30', 'duration': '45'})] * 100)
+    sessions = count_where(flask_app.Session, mentee_id=mentee_id)
+    logger.log_result("100 parallel bookings for one mentee stop at lessons_remaining=3", sessions == 3,
+                      f"sessions={sessions}")
+
+
+def create_sessions(mentor_id, mentee_id, count):
+    with flask_app.app.app_context():
+        sessions = [flask_app.Session(mentor_id=mentor_id, mentee_id=mentee_id,
+                                      date=date.today() + timedelta(days=i), start_time=time_of_day(12, 30),
+                                      end_time=time_of_day(13, 15), duration_minutes=45, subject='English')
+                    for i in range(count)]
+        flask_app.db.session.add_all(sessions)
+        flask_app.db.session.commit()
+        return [s.id for s in sessions]
+
+
+def test_parallel_stale_edits():
+    reset_database()
+    mentor_id = create_mentor(max_mentees=5)
+    mentee_id = create_mentees(1, lessons=5)[0]
+    session_id = create_sessions(mentor_id, mentee_id, 1)[0]
+    statuses = fire([('/update_session_status', {'session_id': session_id, 'version': 1,
+                                                 'status': ['completed', 'cancelled'][i % 2]}) for i in range(50)])
+    with flask_app.app.app_context():
+        session = flask_app.db.session.get(flask_app.Session, session_id)
+        version = session.version
+    logger.log_result("50 parallel edits of one session version: one wins, the rest get 409",
+                      statuses.count(302) == 1 and statuses.count(409) == 49 and version == 2,
+                      f"302s={statuses.count(302)}, 409s={statuses.count(409)}, version={version}")
+
+
+def test_parallel_session_completions():
+    reset_database()
+    mentor_id = create_mentor(max_mentees=5)
+    mentee_id = create_mentees(1, lessons=20)[0]
+    session_ids = create_sessions(mentor_id, mentee_id, 20)
+    statuses = fire([('/update_session_status', {'session_id': s, 'version': 1, 'status': 'completed'})
+                     for s in session_ids])
+    with flask_app.app.app_context():
+        lessons = flask_app.db.session.get(flask_app.Mentee, mentee_id).lessons_remaining
+    logger.log_result("Completing 20 sessions of one mentee in parallel uses exactly 20 lessons",
+                      lessons == 0 and all(s == 302 for s in statuses),
+                      f"lessons_remaining={lessons}, status codes: {sorted(set(statuses))}")
+
+
+def test_completions_without_lessons():
+    reset_database()
+    mentor_id = create_mentor(max_mentees=5)
+    mentee_id = create_mentees(1, lessons=3)[0]
+    session_ids = create_sessions(mentor_id, mentee_id, 10)
+    fire([('/update_session_status', {'session_id': s, 'version': 1, 'status': 'completed'})
+          for s in session_ids[:-1]])
+    response = flask_app.app.test_client().post('/update_session_status', json={
+        'session_id': session_ids[-1], 'version': 1, 'status': 'completed'}, headers={'Accept': 'application/json'})
+    completed = count_where(flask_app.Session, mentee_id=mentee_id, status='completed')
+    with flask_app.app.app_context():
+        lessons = flask_app.db.session.get(flask_app.Mentee, mentee_id).lessons_remaining
+    logger.log_result("Completing 10 sessions of a mentee with 3 lessons completes only 3",
+                      completed == 3 and lessons == 0, f"completed={completed}, lessons_remaining={lessons}")
+    logger.log_result("A completion with no lessons left gets 409 over JSON", response.status_code == 409,
+                      f"status={response.status_code}")
+
+
+def _process_worker(args):
+    mentor_id, mentee_ids = args
+    client = flask_app.app.test_client()
+    return [client.post('/assign_mentor', data={'mentee_id': m, 'mentor_id': mentor_id}).status_code
+            for m in mentee_ids]
+
+
+def test_multi_process_assign():
+    reset_database()
+    mentor_id = create_mentor(max_mentees=10)
+    mentee_ids = create_mentees(REQUESTS)
+    with flask_app.app.app_context():
+        flask_app.db.engine.dispose()  # don't share pooled connections across fork
+    chunks = [(mentor_id, mentee_ids[i::PROCESSES]) for i in range(PROCESSES)]
+    context = multiprocessing.get_context('fork')
+    with context.Pool(PROCESSES) as pool:
+        statuses = [s for chunk in pool.map(_process_worker, chunks) for s in chunk]
+    assigned = count_where(flask_app.Mentee, mentor_id=mentor_id)
+    logger.log_result(f"{PROCESSES} worker processes x {REQUESTS // PROCESSES} assignments respect max_mentees=10",
+                      assigned == 10, f"assigned={assigned}")
+    logger.log_result("multi-process assignments never error", all(s < 500 for s in statuses),
+                      f"status codes: {sorted(set(statuses))}")
+
+
+def main():
+    logger.log_header("CONCURRENCY STRESS TESTS - CAPACITY ENFORCEMENT")
+    print(f"📂 Scratch database: {os.environ['DATABASE_URL']}")
+    flask_app.init_db()
+
+    test_parallel_assign_mentor()
+    test_parallel_bulk_assign()
+    test_parallel_auto_assign()
+    test_resave_on_full_mentor()
+    test_parallel_reassignments()
+    test_parallel_schedule_session()
+    test_parallel_schedule_session_mentee_cap()
+    test_parallel_lessons_remaining()
+    test_parallel_stale_edits()
+    test_parallel_session_completions()
+    test_completions_without_lessons()
+    if sys.platform != 'win32':
+        test_multi_process_assign()
+
+    return logger.finish("capacity limits hold under concurrency", "capacity limits violated")
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
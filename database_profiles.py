@@ -0,0 +1,230 @@
+"""
+Database performance profiles.
+
+SQLite (the default when DATABASE_URL is unset) ships with settings tuned for
+a single writer on slow disks: rollback journal, fsync on every commit, a 2 MB
+page cache and no busy timeout. The profile below is applied to every new
+SQLite connection through an engine 'connect' hook:
+
+    journal_mode=WAL        readers never block the writer and vice versa
+    synchronous=NORMAL      fsync at checkpoints only; safe in WAL mode
+    mmap_size               memory-mapped reads
+    cache_size              negative = KiB of page cache per connection
+    temp_store=MEMORY       sorts and temp tables stay off disk
+    busy_timeout            wait for the write lock instead of "database is locked"
+    foreign_keys=ON         enforce the declared foreign keys
+    auto_vacuum=INCREMENTAL new files only; lets db_maintenance.py free pages in slices
+
+Every value can be overridden with an SQLITE_* environment variable.
+
+PostgreSQL (DATABASE_URL=postgresql://...) gets a production pool profile
+instead: sized QueuePool with pre-ping and recycle, plus server-side statement
+and idle-in-transaction timeouts. Set with the DB_* environment variables.
+The timeouts are psycopg2 connect arguments, so they are only set for the
+default driver (postgresql:// or postgresql+psycopg2://).
+
+Both use InstrumentedQueuePool, which records how long requests wait for a
+connection and how much of the pool is in use (see pool_stats()).
+"""
+
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+TEMP_STORES = {'DEFAULT', 'FILE', 'MEMORY'}
+AUTO_VACUUM_MODES = {'NONE', 'FULL', 'INCREMENTAL'}
+
+SQLITE_DEFAULTS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,
+    'foreign_keys': 'ON',
+    'auto_vacuum': 'INCREMENTAL',
+}
+
+
+def _choice(value, allowed, name):
+    value = str(value).upper()
+    if value not in allowed:
+        raise ValueError(f'Invalid SQLite {name}: {value} (expected one of {sorted(allowed)})')
+    return value
+
+
+def sqlite_pragmas_from_env(environ):
+    """Build the ordered list of (pragma, value) pairs from SQLITE_* settings"""
+    get = lambda key: environ.get(f'SQLITE_{key.upper()}') or SQLITE_DEFAULTS[key]
+    return [
+        # busy_timeout first so the journal_mode switch itself waits for the lock
+        ('busy_timeout', int(get('busy_timeout'))),
+        # Before journal_mode, whose switch to WAL writes the file header; it only
+        # takes effect on a file without tables (or after a VACUUM)
+        ('auto_vacuum', _choice(get('auto_vacuum'), AUTO_VACUUM_MODES, 'auto_vacuum')),
+        ('journal_mode', _choice(get('journal_mode'), JOURNAL_MODES, 'journal_mode')),
+        ('synchronous', _choice(get('synchronous'), SYNCHRONOUS_MODES, 'synchronous')),
+        ('mmap_size', int(get('mmap_size'))),
+        ('cache_size', int(get('cache_size'))),
+        ('temp_store', _choice(get('temp_store'), TEMP_STORES, 'temp_store')),
+        ('foreign_keys', _choice(get('foreign_keys'), {'ON', 'OFF'}, 'foreign_keys')),
+    ]
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    """Run (pragma, value) pairs on a raw SQLite connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas:
+            try:
+                cursor.execute(f'PRAGMA {name}={value}')
+            except sqlite3.OperationalError:
+                # Read-only connections (the replica bind) can't switch the
+                # journal or auto_vacuum mode; the primary's connections set
+                # them on the file
+                if name not in ('journal_mode', 'auto_vacuum'):
+                    raise
+    finally:
+        cursor.close()
+
+
+def install_sqlite_profile(pragmas, target=Engine):
+    """Apply the given PRAGMAs to every new SQLite DBAPI connection
+
+    By default this hooks every Engine and skips non-SQLite connections; pass
+    a specific engine (e.g. an async engine's sync_engine) to hook only that.
+    """
+
+    @event.listens_for(target, 'connect')
+    def apply_sqlite_profile(dbapi_connection, connection_record):
+        if target is Engine and not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
+
+    return apply_sqlite_profile
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records checkout wait times and timeouts"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.peak_checked_out = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.checkout_timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            self.peak_checked_out = max(self.peak_checked_out, self.checkedout())
+        return connection
+
+
+def pool_stats(engine):
+    """Return size, utilization and checkout wait figures for an engine's pool"""
+    pool = engine.pool
+    stats = {'pool_class': type(pool).__name__, 'status': pool.status()}
+    if not isinstance(pool, QueuePool):
+        return stats
+
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    checked_out = pool.checkedout()
+    stats.update({
+        'size': pool.size(),
+        'max_overflow': pool._max_overflow,
+        'checked_out': checked_out,
+        'checked_in': pool.checkedin(),
+        'overflow': pool.overflow(),
+        'utilization': round(checked_out / capacity, 4) if capacity > 0 else 0.0,
+    })
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update({
+            'checkouts': pool.checkouts,
+            'checkout_timeouts': pool.checkout_timeouts,
+            'peak_checked_out': pool.peak_checked_out,
+            'wait_avg_ms': round(pool.wait_total / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+            'wait_total_ms': round(pool.wait_total * 1000, 3),
+            'wait_max_ms': round(pool.wait_max * 1000, 3),
+        })
+    return stats
+
+
+def normalize_database_url(url):
+    """Heroku/Render hand out postgres:// URLs, which SQLAlchemy no longer accepts"""
+    if url and url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def read_only_sqlite_url(url):
+    """Open the same SQLite file through a read-only URI, or None if url isn't a SQLite file
+
+    In WAL mode read-only connections see every committed write immediately,
+    so this acts as a zero-lag local replica.
+    """
+    if not url.startswith('sqlite:///') or ':memory:' in url or url.startswith('sqlite:///file:'):
+        return None
+    path, _, query = url[len('sqlite:///'):].partition('?')
+    extra = f'&{query}' if query else ''
+    return f'sqlite:///file:{path}?mode=ro&uri=true{extra}'
+
+
+def async_database_url(url):
+    """The asyncio-driver form of a database URL (aiosqlite / asyncpg)"""
+    for prefix, async_prefix in [('sqlite:', 'sqlite+aiosqlite:'), ('postgresql:', 'postgresql+asyncpg:'),
+                                 ('postgresql+psycopg2:', 'postgresql+asyncpg:')]:
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+
+def engine_options_from_env(database_url, environ):
+    """SQLAlchemy engine options for the configured database"""
+    if database_url.startswith('sqlite') and (':memory:' in database_url or database_url.rstrip('/') == 'sqlite:'):
+        # Flask-SQLAlchemy picks a StaticPool for in-memory databases
+        return {}
+
+    is_sqlite = database_url.startswith('sqlite')
+    options = {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': int(environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': float(environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(environ.get('DB_POOL_RECYCLE', 1800)),
+        # A local SQLite file can't go stale, so only ping network databases by default
+        'pool_pre_ping': environ.get('DB_POOL_PRE_PING', str(not is_sqlite)).lower() == 'true',
+        # LIFO keeps a small hot set of connections; idle extras age out via recycle
+        'pool_use_lifo': True,
+    }
+
+    # connect_timeout and the libpq "options" string are psycopg2 connect() arguments;
+    # other drivers (asyncpg, pg8000, ...) reject them, so they only get the pool profile
+    if database_url.startswith(('postgresql://', 'postgresql+psycopg2://')):
+        statement_timeout = int(environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+        idle_timeout = int(environ.get('DB_IDLE_IN_TRANSACTION_TIMEOUT_MS', 60000))
+        options['connect_args'] = {
+            'connect_timeout': int(environ.get('DB_CONNECT_TIMEOUT', 10)),
+            'options': f'-c statement_timeout={statement_timeout} '
+                       f'-c idle_in_transaction_session_timeout={idle_timeout}',
+            'application_name': environ.get('APP_NAME', 'mentorship-system'),
+        }
+    return options
@@ -0,0 +1,376 @@
+"""
+Database bloat monitoring and time-boxed maintenance.
+
+A full VACUUM rewrites the whole SQLite file under an exclusive lock, so it
+can't run on a live system. Instead the db_maintenance background job (see
+app.py) runs a short slice every DB_MAINTENANCE_INTERVAL seconds for each
+school, stopping once DB_MAINTENANCE_SLICE_MS is used up:
+
+    incremental vacuum  hand free pages back to the filesystem, at most
+                        DB_MAINTENANCE_VACUUM_PAGES per write transaction
+    ANALYZE             tables whose planner statistics are stale, one at a
+                        time, with analysis_limit bounding each
+    PRAGMA optimize     whatever else SQLite thinks needs re-analyzing
+    wal_checkpoint      PASSIVE: copies what it can without waiting on readers
+
+Incremental vacuum needs auto_vacuum=INCREMENTAL, which the SQLite profile
+sets on new databases (database_profiles.py). An existing file keeps its
+mode until it is rebuilt once, offline:
+
+    python db_maintenance.py convert mentorship.db
+
+(python db_maintenance.py report|slice <file> prints the figures or runs a slice.)
+
+database_report() returns the figures the slice works from: file, page and
+freelist sizes, WAL size, per-table and per-index sizes (dbstat) and, per
+table, the row count the statistics were gathered at against an estimate of
+the current one (the highest rowid, read from the end of the table's b-tree
+instead of counting every row). A table is stale when they differ by more
+than STALE_RATIO or it was never analyzed. The dbstat scan reads every page,
+so /admin/database and /api/database reuse a report for
+DB_MAINTENANCE_REPORT_SECONDS. On PostgreSQL the report comes from pg_stat_user_tables
+(dead tuples, last vacuum and analyze) and a slice only ANALYZEs stale
+tables; autovacuum handles the rest.
+
+Settings (app.config):
+    DB_MAINTENANCE_ENABLED        - schedule the job (default True)
+    DB_MAINTENANCE_INTERVAL       - seconds between slices (default 900)
+    DB_MAINTENANCE_SLICE_MS       - time budget of one slice (default 250)
+    DB_MAINTENANCE_VACUUM_PAGES   - pages freed per incremental vacuum step (default 256)
+    DB_MAINTENANCE_ANALYSIS_LIMIT - rows sampled per index by ANALYZE (default 1000)
+    DB_MAINTENANCE_REPORT_SECONDS - how long the web pages reuse a report (default 60)
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+STALE_RATIO = 0.2
+
+
+def is_sqlite(dbapi_connection):
+    return isinstance(dbapi_connection, sqlite3.Connection)
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def pragma(conn, name):
+    return conn.execute(f'PRAGMA {name}').fetchone()[0]
+
+
+def sqlite_file_path(conn):
+    """Path of the main database file, or None for an in-memory database"""
+    for _, name, path in conn.execute('PRAGMA database_list').fetchall():
+        if name == 'main':
+            return path or None
+    return None
+
+
+def object_sizes(conn):
+    """{name: (bytes, pages)} for every table and index, or None without the dbstat table"""
+    try:
+        rows = conn.execute('SELECT name, SUM(pgsize), COUNT(*) FROM dbstat GROUP BY name').fetchall()
+    except sqlite3.OperationalError:
+        return None
+    return {name: (size, pages) for name, size, pages in rows}
+
+
+def analyzed_rows(conn):
+    """{table: row count when last analyzed} from sqlite_stat1"""
+    try:
+        rows = conn.execute('SELECT tbl, stat FROM sqlite_stat1').fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    counts = {}
+    for table, stat in rows:
+        if stat:
+            counts[table] = max(counts.get(table, 0), int(stat.split()[0]))
+    return counts
+
+
+def is_stale(rows, analyzed):
+    if analyzed is None:
+        return rows > 0
+    return abs(rows - analyzed) > STALE_RATIO * max(analyzed, 1)
+
+
+def table_names(conn):
+    return [name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                                           "AND name NOT LIKE 'sqlite_%' ORDER BY name").fetchall()]
+
+
+def estimated_rows(conn, name, analyzed=None):
+    """Highest rowid, a cheap stand-in for COUNT(*); the analyzed count for WITHOUT ROWID tables"""
+    try:
+        return conn.execute(f'SELECT MAX(rowid) FROM {quote(name)}').fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        return analyzed or 0
+
+
+def sqlite_table(conn, name, analyzed):
+    """Estimated rows and statistics age of one table, plus its indexes"""
+    rows = estimated_rows(conn, name, analyzed.get(name))
+    indexes = [index for index, in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? ORDER BY name", (name,))]
+    return {'name': name, 'rows': rows, 'analyzed_rows': analyzed.get(name),
+            'stale': is_stale(rows, analyzed.get(name)), 'indexes': indexes}
+
+
+def sqlite_tables(conn):
+    """sqlite_table() for every table"""
+    analyzed = analyzed_rows(conn)
+    return [sqlite_table(conn, name, analyzed) for name in table_names(conn)]
+
+
+def sqlite_report(conn):
+    page_size = pragma(conn, 'page_size')
+    page_count = pragma(conn, 'page_count')
+    freelist = pragma(conn, 'freelist_count')
+    path = sqlite_file_path(conn)
+    wal_path = f'{path}-wal' if path else None
+    sizes = object_sizes(conn)
+    tables = sqlite_tables(conn)
+    for table in tables:
+        names = [table['name']] + table['indexes']
+        table['bytes'] = sizes.get(table['name'], (0, 0))[0] if sizes is not None else None
+        table['indexes'] = [{'name': name, 'bytes': sizes.get(name, (0, 0))[0] if sizes is not None else None}
+                            for name in names[1:]]
+        table['total_bytes'] = sum(sizes.get(name, (0, 0))[0] for name in names) if sizes is not None else None
+    return {
+        'dialect': 'sqlite',
+        'file_bytes': page_size * page_count,
+        'wal_bytes': os.path.getsize(wal_path) if wal_path and os.path.exists(wal_path) else 0,
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_pages': freelist,
+        'free_percent': round(100.0 * freelist / page_count, 1) if page_count else 0.0,
+        'reclaimable_bytes': freelist * page_size,
+        'auto_vacuum': AUTO_VACUUM_MODES.get(pragma(conn, 'auto_vacuum'), 'unknown'),
+        'tables': tables,
+        'stale_tables': [table['name'] for table in tables if table['stale']],
+    }
+
+
+def postgresql_tables(conn, schema):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            'SELECT relname, n_live_tup, n_dead_tup, n_mod_since_analyze,'
+            ' pg_relation_size(relid), pg_indexes_size(relid), pg_total_relation_size(relid),'
+            ' GREATEST(last_vacuum, last_autovacuum), GREATEST(last_analyze, last_autoanalyze)'
+            ' FROM pg_stat_user_tables WHERE schemaname = %s ORDER BY relname', (schema,))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    return [{
+        'name': name, 'rows': live, 'dead_rows': dead, 'modified_since_analyze': modified,
+        'bytes': size, 'index_bytes': index_size, 'total_bytes': total,
+        'dead_percent': round(100.0 * dead / (live + dead), 1) if live + dead else 0.0,
+        'last_vacuum': vacuumed.isoformat() if vacuumed else None,
+        'last_analyze': analyzed.isoformat() if analyzed else None,
+        'stale': (analyzed is None and live > 0) or modified > STALE_RATIO * max(live, 1),
+    } for name, live, dead, modified, size, index_size, total, vacuumed, analyzed in rows]
+
+
+def postgresql_report(conn, schema):
+    tables = postgresql_tables(conn, schema)
+    return {
+        'dialect': 'postgresql',
+        'schema': schema,
+        'total_bytes': sum(table['total_bytes'] for table in tables),
+        'dead_rows': sum(table['dead_rows'] for table in tables),
+        'tables': tables,
+        'stale_tables': [table['name'] for table in tables if table['stale']],
+    }
+
+
+def database_report(dbapi_connection, schema=None):
+    """Size, bloat and statistics figures for the database behind a DBAPI connection"""
+    if is_sqlite(dbapi_connection):
+        return sqlite_report(dbapi_connection)
+    return postgresql_report(dbapi_connection, schema or 'public')
+
+
+def sqlite_slice(conn, deadline, vacuum_pages, analysis_limit):
+    done = {'vacuumed_pages': 0, 'analyzed': [], 'optimized': False, 'checkpoint': None}
+    # Each step is its own short write transaction, so requests get the lock in between
+    if conn.in_transaction:
+        conn.commit()
+    if pragma(conn, 'auto_vacuum') == 2:
+        while time.perf_counter() < deadline:
+            before = pragma(conn, 'freelist_count')
+            if not before:
+                break
+            # executescript steps the pragma to completion; execute() would free one page
+            conn.executescript(f'PRAGMA incremental_vacuum({vacuum_pages})')
+            done['vacuumed_pages'] += before - pragma(conn, 'freelist_count')
+
+    conn.execute(f'PRAGMA analysis_limit={int(analysis_limit)}')
+    analyzed = analyzed_rows(conn)
+    for name in table_names(conn):
+        if time.perf_counter() >= deadline:
+            break
+        if is_stale(estimated_rows(conn, name, analyzed.get(name)), analyzed.get(name)):
+            conn.execute(f'ANALYZE {quote(name)}')
+            conn.commit()
+            done['analyzed'].append(name)
+    if time.perf_counter() < deadline:
+        conn.execute('PRAGMA optimize').fetchall()
+        done['optimized'] = True
+
+    busy, wal_frames, checkpointed = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+    if wal_frames >= 0:
+        done['checkpoint'] = {'busy': bool(busy), 'wal_frames': wal_frames, 'checkpointed': checkpointed}
+    return done
+
+
+def postgresql_slice(conn, deadline, schema):
+    done = {'analyzed': []}
+    cursor = conn.cursor()
+    try:
+        for table in postgresql_tables(conn, schema):
+            if time.perf_counter() >= deadline:
+                break
+            if table['stale']:
+                cursor.execute(f'ANALYZE {quote(schema)}.{quote(table["name"])}')
+                conn.commit()
+                done['analyzed'].append(table['name'])
+    finally:
+        cursor.close()
+    return done
+
+
+def run_slice(dbapi_connection, budget_ms=250, vacuum_pages=256, analysis_limit=1000, schema=None):
+    """One time-boxed round of maintenance; returns what it did
+
+    The budget is checked between steps, so a slice can overrun it by about
+    one incremental vacuum step or one ANALYZE.
+    """
+    started = time.perf_counter()
+    deadline = started + budget_ms / 1000
+    if is_sqlite(dbapi_connection):
+        done = sqlite_slice(dbapi_connection, deadline, vacuum_pages, analysis_limit)
+    else:
+        done = postgresql_slice(dbapi_connection, deadline, schema or 'public')
+    done['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return done
+
+
+def engine_schema(engine):
+    return (engine.get_execution_options().get('schema_translate_map') or {}).get(None)
+
+
+def engine_report(engine):
+    """database_report() for an engine's database, on one of its pooled connections"""
+    conn = engine.raw_connection()
+    try:
+        return database_report(conn.driver_connection, engine_schema(engine))
+    finally:
+        conn.close()
+
+
+def engine_slice(engine, config):
+    """run_slice() on an engine's database with the DB_MAINTENANCE_* settings"""
+    conn = engine.raw_connection()
+    try:
+        return run_slice(conn.driver_connection, config['DB_MAINTENANCE_SLICE_MS'],
+                         config['DB_MAINTENANCE_VACUUM_PAGES'], config['DB_MAINTENANCE_ANALYSIS_LIMIT'],
+                         engine_schema(engine))
+    finally:
+        conn.close()
+
+
+class ReportCache:
+    """engine_report() results reused for max_age seconds per engine"""
+
+    def __init__(self):
+        self._reports = {}  # engine -> (checked_at, report)
+        self._lock = threading.Lock()
+
+    def get(self, engine, max_age):
+        with self._lock:
+            checked_at, report = self._reports.get(engine, (0.0, None))
+        age = time.monotonic() - checked_at
+        if report is None or age >= max_age:
+            report = engine_report(engine)
+            checked_at, age = time.monotonic(), 0.0
+            with self._lock:
+                self._reports[engine] = (checked_at, report)
+        return dict(report, age_seconds=round(age, 1))
+
+
+def convert_to_incremental(path):
+    """Switch an existing SQLite file to auto_vacuum=INCREMENTAL (rewrites it; run offline)"""
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('VACUUM')
+        return AUTO_VACUUM_MODES[pragma(conn, 'auto_vacuum')]
+    finally:
+        conn.close()
+
+
+def init_app(app, engine_for_school, recent_runs=None):
+    """Serve the figures at /api/database and /admin/database
+
+    engine_for_school() returns the current school's primary engine and
+    recent_runs() the latest maintenance job results.
+    """
+    from flask import jsonify, render_template
+
+    app.config.setdefault('DB_MAINTENANCE_ENABLED', True)
+    app.config.setdefault('DB_MAINTENANCE_INTERVAL', 900)
+    app.config.setdefault('DB_MAINTENANCE_SLICE_MS', 250)
+    app.config.setdefault('DB_MAINTENANCE_VACUUM_PAGES', 256)
+    app.config.setdefault('DB_MAINTENANCE_ANALYSIS_LIMIT', 1000)
+    app.config.setdefault('DB_MAINTENANCE_REPORT_SECONDS', 60)
+    reports = app.extensions['db_maintenance'] = ReportCache()
+
+    def report():
+        return reports.get(engine_for_school(), app.config['DB_MAINTENANCE_REPORT_SECONDS'])
+
+    @app.route('/api/database')
+    def api_database():
+        """Size, bloat and statistics staleness of this school's database"""
+        return jsonify({'database': report(), 'runs': recent_runs() if recent_runs else []})
+
+    @app.route('/admin/database')
+    def admin_database():
+        """Database bloat and the latest maintenance slices"""
+        return render_template('database.html', report=report(),
+                               runs=recent_runs() if recent_runs else [],
+                               interval=app.config['DB_MAINTENANCE_INTERVAL'],
+                               slice_ms=app.config['DB_MAINTENANCE_SLICE_MS'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='SQLite bloat report and maintenance')
+    parser.add_argument('command', choices=['report', 'slice', 'convert'])
+    parser.add_argument('path', nargs='?', default='mentorship.db')
+    parser.add_argument('--budget-ms', type=float, default=250)
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.path):
+        print(f"❌ No database at {args.path}")
+        return 1
+    if args.command == 'convert':
+        print(f"🔧 Rebuilding {args.path} (takes an exclusive lock; stop the app first)")
+        print(f"✅ auto_vacuum is now {convert_to_incremental(args.path)}")
+        return 0
+    conn = sqlite3.connect(args.path)
+    try:
+        result = database_report(conn) if args.command == 'report' else run_slice(conn, args.budget_ms)
+    finally:
+        conn.close()
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Database Maintenance Testing Suite
+Checks that new SQLite files use incremental auto-vacuum, that the bloat
+report finds free pages, table sizes and stale statistics, that a
+maintenance slice frees pages and re-analyzes within its time budget, and
+that the scheduled job keeps one slice per school queued.
+
+Runs against a throwaway SQLite database (never mentorship.db).
+"""
+
+import os
+import sqlite3
+import sys
+import time
+
+from suite_support import SuiteLogger, scratch_environment
+
+# Point the app at a scratch database before it is imported
+WORK_DIR = scratch_environment('maintenance')
+os.environ['ACCESS_LOG_ENABLED'] = 'False'
+
+import app as flask_app
+import db_maintenance
+
+
+logger = SuiteLogger()
+client = flask_app.app.test_client()
+
+
+def seed_and_delete():
+    """Add mentors, then delete most of them so the file has free pages"""
+    with flask_app.app.app_context():
+        for i in range(3000):
+            flask_app.db.session.add(flask_app.Mentor(name=f'Mentor {i} ' * 10, roll_call='12/7',
+                                                      subjects='English', max_mentees=3))
+        flask_app.db.session.commit()
+        flask_app.Mentor.query.filter(flask_app.Mentor.id > 100).delete()
+        flask_app.db.session.commit()
+
+
+def report():
+    with flask_app.app.app_context():
+        return db_maintenance.engine_report(flask_app.db.engine)
+
+
+def maintenance_jobs(status=None):
+    return flask_app.job_queue.list(status=status, job_type='db_maintenance')
+
+
+def test_report():
+    seed_and_delete()
+    figures = report()
+    mentor = next((table for table in figures['tables'] if table['name'] == 'mentor'), {})
+    logger.log_result("New database files use incremental auto-vacuum", figures['auto_vacuum'] == 'incremental')
+    logger.log_result("The report finds the free pages left by deleted rows",
+                      figures['freelist_pages'] > 50 and figures['free_percent'] > 50
+                      and figures['reclaimable_bytes'] == figures['freelist_pages'] * figures['page_size'],
+                      f"{figures['freelist_pages']} of {figures['page_count']} pages free")
+    logger.log_result("Tables are listed with their rows, sizes and indexes",
+                      mentor.get('rows') == 100 and mentor.get('bytes', 0) > 0
+                      and mentor.get('total_bytes', 0) >= mentor.get('bytes', 0) and isinstance(mentor.get('indexes'), list),
+                      f"{mentor}")
+    logger.log_result("Tables never analyzed are reported as stale", 'mentor' in figures['stale_tables'],
+                      f"{figures['stale_tables']}")
+
+
+def test_row_estimate():
+    with flask_app.app.app_context():
+        conn = flask_app.db.engine.raw_connection()
+        try:
+            statements = []
+            conn.driver_connection.set_trace_callback(statements.append)
+            db_maintenance.sqlite_tables(conn.driver_connection)
+            conn.driver_connection.set_trace_callback(None)
+        finally:
+            conn.close()
+    logger.log_result("Row figures come from the highest rowid, never a full COUNT(*)",
+                      not any('COUNT(' in sql.upper() for sql in statements)
+                      and any('MAX(ROWID)' in sql.upper() for sql in statements), f"{len(statements)} statements")
+
+
+def test_slice():
+    with flask_app.app.app_context():
+        engine = flask_app.db.engine
+        config = dict(flask_app.app.config, DB_MAINTENANCE_SLICE_MS=0)
+        idle = db_maintenance.engine_slice(engine, config)
+    logger.log_result("A slice with no time left only checkpoints the WAL",
+                      idle['vacuumed_pages'] == 0 and idle['analyzed'] == [] and not idle['optimized']
+                      and idle['checkpoint'] is not None, f"{idle}")
+
+    before = report()['freelist_pages']
+    with flask_app.app.app_context():
+        config = dict(flask_app.app.config, DB_MAINTENANCE_VACUUM_PAGES=10, DB_MAINTENANCE_SLICE_MS=5000)
+        done = db_maintenance.engine_slice(flask_app.db.engine, config)
+    after = report()
+    logger.log_result("A slice frees the pages in small steps and re-analyzes stale tables",
+                      done['vacuumed_pages'] == before and after['freelist_pages'] == 0
+                      and 'mentor' in done['analyzed'] and after['stale_tables'] == [],
+                      f"freed {done['vacuumed_pages']} of {before} pages, analyzed {done['analyzed']}")
+
+
+def test_schedule():
+    # As gunicorn's on_starting does, before the workers start
+    flask_app.schedule_db_maintenance()
+    flask_app.schedule_db_maintenance()
+    flask_app.job_runner.start()
+    deadline = time.time() + 10
+    while not maintenance_jobs('succeeded') and time.time() < deadline:
+        time.sleep(0.05)
+    queued = maintenance_jobs('queued')
+    delay = queued[0]['run_after'] - time.time() if queued else 0
+    logger.log_result("A scheduled slice runs once and queues the next one an interval later",
+                      len(maintenance_jobs('succeeded')) == 1 and len(queued) == 1
+                      and flask_app.app.config['DB_MAINTENANCE_INTERVAL'] - 30 < delay,
+                      f"next slice in {delay:.0f}s")
+
+    flask_app.schedule_db_maintenance()
+    logger.log_result("Scheduling again keeps a single slice waiting per school", len(maintenance_jobs('queued')) == 1)
+
+    def locked(engine, config):
+        raise sqlite3.OperationalError('database is locked')
+
+    engine_slice, db_maintenance.engine_slice = db_maintenance.engine_slice, locked
+    try:
+        flask_app.job_runner.run_inline('db_maintenance', {'school_id': 'default', 'scheduled': True})
+    finally:
+        db_maintenance.engine_slice = engine_slice
+    logger.log_result("A failed slice still leaves the next one scheduled",
+                      len(maintenance_jobs('failed')) == 1 and len(maintenance_jobs('queued')) == 1)
+    flask_app.job_runner.stop()
+
+    # A worker killed mid-slice never queues the next one
+    for job in maintenance_jobs('queued'):
+        flask_app.job_queue.cancel(job['id'])
+    flask_app.job_runner.start()
+    queued = maintenance_jobs('queued')
+    flask_app.job_runner.stop()
+    delay = queued[0]['run_after'] - time.time() if queued else 0
+    logger.log_result("Starting the job workers re-seeds a broken slice chain",
+                      len(queued) == 1 and flask_app.app.config['DB_MAINTENANCE_INTERVAL'] - 30 < delay,
+                      f"next slice in {delay:.0f}s")
+
+
+def test_endpoints():
+    data = client.get('/api/database').get_json()
+    runs = data['runs']
+    logger.log_result("/api/database returns the figures and the latest slices",
+                      data['database']['dialect'] == 'sqlite' and len(runs) == 3
+                      and runs[-1]['result']['message'].startswith('Freed'), f"{[run['status'] for run in runs]}")
+
+    calls = []
+    engine_report = db_maintenance.engine_report
+    db_maintenance.engine_report = lambda engine: calls.append(engine) or engine_report(engine)
+    try:
+        page = client.get('/admin/database')
+        client.get('/api/database')
+        flask_app.app.config['DB_MAINTENANCE_REPORT_SECONDS'] = 0
+        client.get('/api/database')
+    finally:
+        db_maintenance.engine_report = engine_report
+        flask_app.app.config['DB_MAINTENANCE_REPORT_SECONDS'] = 60
+    logger.log_result("/admin/database shows tables and maintenance runs",
+                      page.status_code == 200 and b'mentor' in page.data and b'database is locked' in page.data)
+    logger.log_result("Views reuse a recent report instead of scanning the database again",
+                      len(calls) == 1, f"{len(calls)} report(s) built for 3 views")
+
+
+def test_convert():
+    path = os.path.join(WORK_DIR, 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE note (body TEXT)')
+    conn.executemany('INSERT INTO note VALUES (?)', [('x' * 500,)] * 2000)
+    conn.commit()
+    conn.execute('DELETE FROM note')
+    conn.commit()
+    legacy = db_maintenance.database_report(conn)
+    conn.close()
+    mode = db_maintenance.convert_to_incremental(path)
+    conn = sqlite3.connect(path)
+    converted = db_maintenance.database_report(conn)
+    conn.close()
+    logger.log_result("An existing file can be converted to incremental once, offline",
+                      legacy['auto_vacuum'] == 'none' and legacy['freelist_pages'] > 0 and mode == 'incremental'
+                      and converted['auto_vacuum'] == 'incremental' and converted['freelist_pages'] == 0)
+
+
+def main():
+    logger.log_header("DATABASE MAINTENANCE TESTS")
+    print(f"📂 Scratch database: {os.environ['DATABASE_URL']}")
+    with flask_app.app.app_context():
+        flask_app.db.drop_all()
+        flask_app.db.create_all()
+
+    test_report()
+    test_row_estimate()
+    test_slice()
+    test_schedule()
+    test_endpoints()
+    test_convert()
+
+    return logger.finish("the database is maintained in small slices", "database maintenance is off")
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
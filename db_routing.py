@@ -0,0 +1,110 @@
+"""
+Read/write routing between the primary database and a read-only replica.
+
+The replica is DATABASE_REPLICA_URL when set (e.g. a PostgreSQL streaming
+replica), otherwise the primary SQLite file opened read-only. It is
+registered as the 'replica' Flask-SQLAlchemy bind, and RoutingSession picks
+the engine per statement:
+
+* GET/HEAD requests read from the replica.
+* Flushes and INSERT/UPDATE/DELETE statements always go to the primary, and
+  once a request has written, the rest of it reads from the primary too.
+* Background jobs opt in with use_replica() (reports, exports).
+* Values stored in a cache shared with other requests are computed inside
+  primary_reads(), so a lagging replica's answer is never cached.
+* Read-your-writes: a request that wrote sets a short-lived cookie, and GETs
+  carrying it read from the primary until the replica has caught up
+  (DB_STICKY_SECONDS), so the page after a POST redirect shows the change.
+"""
+
+import math
+from contextlib import contextmanager
+
+from flask import g, has_app_context, request
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_BIND = 'replica'
+STICKY_COOKIE = 'db_primary'
+READ_METHODS = ('GET', 'HEAD')
+
+
+class RoutingSession(FlaskSession):
+    """Session that sends reads to the replica when the current context allows it"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            read = not self._flushing and not isinstance(clause, UpdateBase) and g.get('_db_route') == REPLICA_BIND
+            # A school with its own shard (see tenancy) brings its own engines
+            engines = g.get('_tenant_engines')
+            if engines is not None:
+                return engines[REPLICA_BIND] if read and REPLICA_BIND in engines else engines[None]
+            if read:
+                replica = self._db.engines.get(REPLICA_BIND)
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def use_replica():
+    """Read from the replica for the rest of this app context"""
+    g._db_route = REPLICA_BIND
+
+
+def use_primary():
+    """Read from the primary for the rest of this app context"""
+    g._db_route = None
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside the block (e.g. to fill a shared cache), then restore the route"""
+    route = g.get('_db_route')
+    g._db_route = None
+    try:
+        yield
+    finally:
+        if not g.get('_db_wrote'):
+            g._db_route = route
+
+
+def current_route():
+    """'replica' or 'primary' for the current app context"""
+    return REPLICA_BIND if has_app_context() and g.get('_db_route') == REPLICA_BIND else 'primary'
+
+
+def _mark_write():
+    if has_app_context():
+        g._db_route = None
+        g._db_wrote = True
+
+
+def init_app(app, db):
+    """Register the request hooks and write detection for read/write routing"""
+    app.config.setdefault('DB_STICKY_SECONDS', 5.0)
+
+    @event.listens_for(db.session, 'after_flush')
+    def pin_to_primary_after_flush(session, flush_context):
+        _mark_write()
+
+    @event.listens_for(db.session, 'do_orm_execute')
+    def pin_to_primary_on_bulk_write(orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            _mark_write()
+
+    @app.before_request
+    def route_reads_to_replica():
+        if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+            return
+        if request.method in READ_METHODS and request.endpoint != 'static' \
+                and STICKY_COOKIE not in request.cookies:
+            use_replica()
+
+    @app.after_request
+    def stick_to_primary_after_write(response):
+        if g.get('_db_wrote') and REPLICA_BIND in app.config.get('SQLALCHEMY_BINDS', {}):
+            sticky = app.config['DB_STICKY_SECONDS']
+            response.set_cookie(STICKY_COOKIE, '1', max_age=max(math.ceil(sticky), 1),
+                                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,79 @@
+"""
+Gunicorn configuration for the Mentorship System (production launch mode).
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Every setting can be overridden from the environment, so Render/Railway
+dashboards can tune it without a code change.
+
+The app is preloaded in the master: templates are compiled and init_db()
+runs exactly once there, then workers fork with that state already in
+memory. Each worker drops the master's database connections after the
+fork so no socket is shared between processes. Workers share their
+Prometheus metrics through METRICS_DIR, so /metrics covers all of them, and
+their cache through the SQLite backend, so a write in one worker invalidates
+cached views in all of them.
+"""
+
+import multiprocessing
+import os
+import tempfile
+
+# Network
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '5000')}"
+backlog = int(os.environ.get('GUNICORN_BACKLOG', 2048))
+
+# Workers: (2 x cores) + 1 processes, each with a small thread pool so a
+# worker waiting on the database can still serve other requests
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread' if threads > 1 else 'sync')
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+# Cache: a per-worker memory cache never hears about another worker's writes,
+# so several workers share the node-local SQLite cache instead
+os.environ.setdefault('CACHE_BACKEND', 'sqlite')
+if os.environ['CACHE_BACKEND'] == 'memory' and workers > 1:
+    raise RuntimeError(f'CACHE_BACKEND=memory would leave {workers} workers serving each other\'s stale data; '
+                       'use CACHE_BACKEND=sqlite or WEB_CONCURRENCY=1')
+
+# Connection handling
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+# Recycle workers periodically so slow leaks can't accumulate; the jitter
+# stops every worker restarting at the same moment
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Metrics: every worker writes its figures here and /metrics merges them
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), f"mentorship-metrics-{bind.rsplit(':', 1)[1]}"))
+
+# Logging: the app writes its own JSON access log (access_log.py), so gunicorn's
+# is off unless GUNICORN_ACCESS_LOG is set
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+errorlog = os.environ.get('GUNICORN_ERROR_LOG', '-')
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    """Create database tables once, in the master, before any worker starts"""
+    from app import init_db, metrics_registry, schedule_db_maintenance
+    init_db()
+    server.log.info("Database initialized")
+    # Workers pick the first maintenance slice up once their job threads start
+    schedule_db_maintenance()
+    # Figures left by a previous run would otherwise be merged into this one
+    metrics_registry.clear_directory()
+
+
+def post_fork(server, worker):
+    """Give each worker its own database connections and job worker threads"""
+    from app import app, job_runner, tenants
+    with app.app_context():
+        # close=False: leave the master's sockets alone, just forget them here
+        for engine in tenants.all_engines():
+            engine.dispose(close=False)
+    if app.config['JOBS_MODE'] == 'thread':
+        job_runner.start()
@@ -0,0 +1,164 @@
+"""
+Liveness and readiness probes for load balancers and orchestrators.
+
+    GET /healthz  200 {"status": "ok"}
+    GET /readyz   200 {"status": "ready", "checks": {...}} or 503 {"status": "unavailable", ...}
+
+Both are answered by WSGI middleware in front of the Flask app, so probes
+skip the request hooks (tenancy, metrics, tracing, query stats) and never
+show up in the access figures. /healthz only says the process can serve a
+request: it touches nothing and answers in microseconds.
+
+/readyz says whether this instance should get traffic. It checks, for the
+default school's primary (and replica, if configured) database:
+
+    database  SELECT 1 answers within HEALTH_DB_TIMEOUT_MS
+    pool      the connection pool isn't fully checked out
+    schema    every table and column the models expect exists (init_db has run)
+
+The checks run on a helper thread and the probe waits at most
+HEALTH_DB_TIMEOUT_MS for them, so a hung database makes /readyz fail fast
+rather than hang. The result is cached for HEALTH_CACHE_SECONDS, and only
+one check runs at a time, so any number of probes cost at most one
+SELECT 1 per interval per worker.
+
+Settings (app.config):
+    HEALTH_DB_TIMEOUT_MS         - ping budget in milliseconds (default 500)
+    HEALTH_CACHE_SECONDS         - how long a readiness result is reused (default 2)
+    HEALTH_POOL_MAX_UTILIZATION  - share of the pool in use that counts as saturated (default 1.0)
+"""
+
+import json
+import threading
+import time
+
+from sqlalchemy import inspect
+
+from database_profiles import pool_stats
+
+LIVENESS_BODY = b'{"status": "ok"}\n'
+HEADERS = [('Content-Type', 'application/json'), ('Cache-Control', 'no-store')]
+
+
+def schema_problems(conn, metadata):
+    """Tables or columns the models expect but the database lacks"""
+    schema = (conn.get_execution_options().get('schema_translate_map') or {}).get(None)
+    inspector = inspect(conn)
+    problems = []
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name, schema=schema):
+            problems.append(f'table {table.name} missing')
+            continue
+        present = {column['name'] for column in inspector.get_columns(table.name, schema=schema)}
+        problems.extend(f'column {table.name}.{column.name} missing'
+                        for column in table.columns if column.name not in present)
+    return problems
+
+
+class ReadinessCheck:
+    """Runs the readiness checks off the request thread and caches the result"""
+
+    def __init__(self, app, db):
+        self.app = app
+        self.db = db
+        self.result = None
+        self.checked_at = 0.0
+        self._running = None  # Event set when the check in flight finishes
+        self._lock = threading.Lock()
+        self._schema_ok = False
+
+    def check_engine(self, name, engine, max_utilization):
+        started = time.perf_counter()
+        with engine.connect() as conn:
+            conn.exec_driver_sql('SELECT 1').scalar()
+            ping_ms = (time.perf_counter() - started) * 1000
+            # The schema only ever gains columns, so once it matches it isn't inspected again
+            problems = [] if self._schema_ok or name != 'primary' else schema_problems(conn, self.db.metadata)
+        stats = pool_stats(engine)
+        check = {'ping_ms': round(ping_ms, 3), 'pool_utilization': stats.get('utilization', 0.0)}
+        if name == 'primary':
+            check['schema'] = problems or 'current'
+            self._schema_ok = not problems
+        saturated = stats.get('utilization', 0.0) >= max_utilization
+        if saturated:
+            check['pool'] = f"{stats['checked_out']} of {stats['size'] + max(stats['max_overflow'], 0)} connections in use"
+        check['ok'] = not problems and not saturated
+        return check
+
+    def run_checks(self):
+        config = self.app.config
+        checks = {}
+        with self.app.app_context():
+            for bind, engine in sorted(self.db.engines.items(), key=lambda item: item[0] is not None):
+                name = bind or 'primary'
+                try:
+                    checks[name] = self.check_engine(name, engine, config['HEALTH_POOL_MAX_UTILIZATION'])
+                except Exception as e:
+                    checks[name] = {'ok': False, 'error': f'{type(e).__name__}: {e}'[:300]}
+        return checks
+
+    def _refresh(self, finished):
+        try:
+            checks = self.run_checks()
+        except Exception as e:
+            checks = {'primary': {'ok': False, 'error': f'{type(e).__name__}: {e}'[:300]}}
+        budget_ms = self.app.config['HEALTH_DB_TIMEOUT_MS']
+        slow = [name for name, check in checks.items() if check.get('ping_ms', 0) > budget_ms]
+        for name in slow:
+            checks[name].update(ok=False, error=f'ping slower than {budget_ms:g}ms')
+        with self._lock:
+            self.result = {'status': 'ready' if all(check['ok'] for check in checks.values()) else 'unavailable',
+                           'checks': checks}
+            self.checked_at = time.monotonic()
+            self._running = None
+        finished.set()
+
+    def status(self):
+        """(ready, result dict), from the cache when it is fresh enough"""
+        config = self.app.config
+        with self._lock:
+            age = time.monotonic() - self.checked_at
+            if self.result is not None and age < config['HEALTH_CACHE_SECONDS']:
+                return self.result['status'] == 'ready', dict(self.result, age_ms=round(age * 1000, 1))
+            finished = self._running
+            if finished is None:
+                finished = self._running = threading.Event()
+                threading.Thread(target=self._refresh, args=(finished,), name='readiness-check',
+                                 daemon=True).start()
+        if not finished.wait(config['HEALTH_DB_TIMEOUT_MS'] / 1000):
+            return False, {'status': 'unavailable',
+                           'error': f"database checks took longer than {config['HEALTH_DB_TIMEOUT_MS']:g}ms"}
+        with self._lock:
+            return self.result['status'] == 'ready', dict(self.result, age_ms=0.0)
+
+
+class HealthMiddleware:
+    """Answers /healthz and /readyz before the request reaches Flask"""
+
+    def __init__(self, wsgi_app, readiness):
+        self.wsgi_app = wsgi_app
+        self.readiness = readiness
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO')
+        if path == '/healthz':
+            start_response('200 OK', HEADERS + [('Content-Length', str(len(LIVENESS_BODY)))])
+            return [LIVENESS_BODY]
+        if path == '/readyz':
+            ready, result = self.readiness.status()
+            body = json.dumps(result).encode() + b'\n'
+            start_response('200 OK' if ready else '503 Service Unavailable',
+                           HEADERS + [('Content-Length', str(len(body)))])
+            return [body]
+        return self.wsgi_app(environ, start_response)
+
+
+def init_app(app, db):
+    """Serve /healthz and /readyz; call last so the probes bypass every other wrapper"""
+    app.config.setdefault('HEALTH_DB_TIMEOUT_MS', 500)
+    app.config.setdefault('HEALTH_CACHE_SECONDS', 2)
+    app.config.setdefault('HEALTH_POOL_MAX_UTILIZATION', 1.0)
+    readiness = ReadinessCheck(app, db)
+    app.extensions['health'] = readiness
+    app.wsgi_app = HealthMiddleware(app.wsgi_app, readiness)
+    return readiness
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Health Probe Testing Suite
+Checks that /healthz answers without touching the database or the request
+hooks, and that /readyz pings the database within its time budget, caches
+the result so frequent probes cost one query per interval, and reports 503
+when the schema is behind the models, the pool is saturated or the
+database is slow.
+
+Runs against a throwaway SQLite database (never mentorship.db).
+"""
+
+import os
+import sys
+import threading
+import time
+
+from suite_support import SuiteLogger, scratch_environment
+
+# Point the app at a scratch database before it is imported
+scratch_environment('health')
+
+from sqlalchemy import event, text
+
+import app as flask_app
+import query_stats
+
+
+logger = SuiteLogger()
+client = flask_app.app.test_client()
+readiness = flask_app.app.extensions['health']
+statements = []
+query_stats.add_observer(lambda statement, *args: statements.append(statement))
+
+
+def expire():
+    """Forget the cached readiness result so the next probe checks again"""
+    readiness.checked_at = 0.0
+
+
+def test_liveness():
+    del statements[:]
+    tracer = flask_app.app.extensions['tracing']
+    traced = sum(row['requests'] for row in tracer.summary.rows())
+    response = client.get('/healthz')
+    logger.log_result("/healthz returns 200 without touching the database",
+                      response.status_code == 200 and response.get_json() == {'status': 'ok'} and statements == [],
+                      f"{len(statements)} statements")
+    logger.log_result("Probes skip the request hooks (no X-Query-Count, not traced)",
+                      'X-Query-Count' not in response.headers
+                      and sum(row['requests'] for row in tracer.summary.rows()) == traced)
+
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/healthz'}
+    started = time.perf_counter()
+    for _ in range(10000):
+        flask_app.app.wsgi_app(environ, lambda status, headers: None)
+    per_call_us = (time.perf_counter() - started) / 10000 * 1e6
+    logger.log_result("/healthz answers in microseconds", per_call_us < 50, f"{per_call_us:.2f}us per probe")
+
+
+def test_readiness():
+    expire()
+    del statements[:]
+    response = client.get('/readyz')
+    body = response.get_json()
+    primary = body.get('checks', {}).get('primary', {})
+    logger.log_result("/readyz pings the database and checks pool and schema",
+                      response.status_code == 200 and body['status'] == 'ready' and primary.get('ok')
+                      and primary.get('schema') == 'current' and 'pool_utilization' in primary
+                      and 'SELECT 1' in statements, f"{body}")
+
+    del statements[:]
+    for _ in range(50):
+        response = client.get('/readyz')
+    logger.log_result("Repeated probes reuse the cached result",
+                      response.status_code == 200 and statements == [] and response.get_json()['age_ms'] >= 0,
+                      f"{len(statements)} statements for 50 probes")
+
+    expire()
+    del statements[:]
+    codes = []
+    threads = [threading.Thread(target=lambda: codes.append(flask_app.app.test_client().get('/readyz').status_code))
+               for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pings = statements.count('SELECT 1')
+    with flask_app.app.app_context():
+        engines = len(flask_app.db.engines)
+    logger.log_result("Concurrent probes share one check per engine",
+                      codes == [200] * 20 and pings == engines, f"{pings} pings for 20 probes")
+
+
+def test_not_ready():
+    with flask_app.app.app_context():
+        engine = flask_app.db.engine
+        with engine.begin() as conn:
+            conn.execute(text('ALTER TABLE session DROP COLUMN version'))
+    readiness._schema_ok = False
+    expire()
+    response = client.get('/readyz')
+    schema = response.get_json().get('checks', {}).get('primary', {}).get('schema')
+    logger.log_result("A missing migration makes /readyz return 503",
+                      response.status_code == 503 and schema == ['column session.version missing'], f"{schema}")
+    flask_app.add_version_columns(engine)
+    expire()
+    logger.log_result("It is ready again once the migration runs", client.get('/readyz').status_code == 200)
+
+    flask_app.app.config['HEALTH_POOL_MAX_UTILIZATION'] = 0.0
+    expire()
+    try:
+        response = client.get('/readyz')
+    finally:
+        flask_app.app.config['HEALTH_POOL_MAX_UTILIZATION'] = 1.0
+    logger.log_result("A saturated connection pool makes /readyz return 503",
+                      response.status_code == 503 and 'pool' in response.get_json()['checks']['primary'])
+
+
+def test_slow_database():
+    def stall(conn, cursor, statement, parameters, context, executemany):
+        if statement == 'SELECT 1':
+            time.sleep(0.5)
+
+    with flask_app.app.app_context():
+        engine = flask_app.db.engine
+    flask_app.app.config['HEALTH_DB_TIMEOUT_MS'] = 100
+    event.listen(engine, 'before_cursor_execute', stall)
+    expire()
+    try:
+        started = time.perf_counter()
+        response = client.get('/readyz')
+        waited_ms = (time.perf_counter() - started) * 1000
+    finally:
+        time.sleep(0.6)
+        event.remove(engine, 'before_cursor_execute', stall)
+        flask_app.app.config['HEALTH_DB_TIMEOUT_MS'] = 500
+    logger.log_result("A slow database fails the probe within its time budget",
+                      response.status_code == 503 and waited_ms < 300, f"{waited_ms:.0f}ms, {response.get_json()}")
+    expire()
+    logger.log_result("The next check after the database recovers is ready", client.get('/readyz').status_code == 200)
+
+
+def main():
+    logger.log_header("HEALTH PROBE TESTS")
+    print(f"📂 Scratch database: {os.environ['DATABASE_URL']}")
+    with flask_app.app.app_context():
+        flask_app.db.drop_all()
+        flask_app.db.create_all()
+
+    test_liveness()
+    test_readiness()
+    test_not_ready()
+    test_slow_database()
+    flask_app.job_runner.stop()
+
+    return logger.finish("health probes are cheap and honest", "health probes are off")
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,507 @@
+"""
+Background jobs for the Mentorship System.
+
+Heavy operations (auto-assign, large exports, clearing or bulk-deleting data,
+statistics rebuilds) run outside the request thread so they never tie up a web
+worker or hit a proxy timeout. No broker is needed:
+
+* JobQueue  - jobs live in a local SQLite file shared by every worker process
+              on the node, so any worker can report on any job.
+* JobRunner - a small pool of threads in each process that claims queued jobs,
+              runs the registered handler and records progress and results.
+
+Each job type is registered with a handler, a concurrency limit (enforced
+across all processes when the job is claimed), a retry budget and a backoff.
+A handler receives a JobContext; calling ctx.progress() also raises
+JobCancelled once cancellation has been requested.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler once its job has been cancelled"""
+
+
+class JobType:
+    """Handler and limits for one kind of job"""
+
+    def __init__(self, name, handler, concurrency=1, max_attempts=3, retry_delay=2.0):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+
+class JobQueue:
+    """Durable job table in a node-local SQLite file
+
+    A job whose payload names a school_id is stored with it in its own
+    indexed column, so list() and counts() can select one school's jobs in
+    SQL. files_dir, if given, is where handlers store the files named in a job's
+    result['file']; purge() deletes them along with the job.
+    """
+
+    def __init__(self, path, files_dir=None):
+        self.path = path
+        self.files_dir = files_dir
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS job ('
+            ' id TEXT PRIMARY KEY,'
+            ' type TEXT NOT NULL,'
+            ' payload TEXT NOT NULL,'
+            ' status TEXT NOT NULL,'
+            ' progress REAL NOT NULL DEFAULT 0,'
+            ' message TEXT,'
+            ' result TEXT,'
+            ' error TEXT,'
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            ' max_attempts INTEGER NOT NULL,'
+            ' cancel_requested INTEGER NOT NULL DEFAULT 0,'
+            ' dedupe_key TEXT,'
+            ' school_id TEXT,'
+            ' worker TEXT,'
+            ' created_at REAL NOT NULL,'
+            ' run_after REAL NOT NULL,'
+            ' started_at REAL,'
+            ' heartbeat_at REAL,'
+            ' finished_at REAL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_job_status_run_after ON job (status, run_after)')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_job_dedupe ON job (dedupe_key, status)')
+        self._add_school_column(conn)
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_job_school_created ON job (school_id, created_at)')
+
+    @staticmethod
+    def _add_school_column(conn):
+        """Add school_id to a job table created before it existed, filled from the payloads"""
+        if any(column[1] == 'school_id' for column in conn.execute('PRAGMA table_info(job)')):
+            return
+        try:
+            conn.execute('ALTER TABLE job ADD COLUMN school_id TEXT')
+        except sqlite3.OperationalError:
+            return  # another worker added it first
+        conn.execute("UPDATE job SET school_id = json_extract(payload, '$.school_id')")
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # A connection inherited across fork (gunicorn preload) must not be reused
+        if conn is None or self._local.pid != os.getpid():
+            # Autocommit mode; claim() opens its own IMMEDIATE transaction
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def enqueue(self, job_type, payload=None, max_attempts=3, dedupe_key=None, delay=0):
+        """Add a job and return its id
+
+        With a dedupe_key, an identical job that is still waiting is reused
+        instead of queueing a second copy.
+        """
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if dedupe_key:
+                row = conn.execute(
+                    'SELECT id FROM job WHERE dedupe_key = ? AND status = ?', (dedupe_key, QUEUED)
+                ).fetchone()
+                if row is not None:
+                    conn.execute('COMMIT')
+                    return row['id']
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                'INSERT INTO job (id, type, payload, status, max_attempts, dedupe_key, school_id, created_at,'
+                ' run_after) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, job_type, json.dumps(payload or {}), QUEUED, max_attempts, dedupe_key,
+                 (payload or {}).get('school_id'), now, now + delay)
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return job_id
+
+    def claim(self, limits, worker, job_id=None):
+        """Atomically move the oldest runnable job (or job_id) to 'running'
+
+        limits maps job type -> max jobs of that type running at once; types
+        not in limits are left for a process that knows how to run them.
+        """
+        if not limits:
+            return None
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            running = dict(conn.execute(
+                'SELECT type, COUNT(*) FROM job WHERE status = ? GROUP BY type', (RUNNING,)
+            ).fetchall())
+            open_types = [t for t, limit in limits.items() if running.get(t, 0) < limit]
+            job = None
+            if open_types:
+                placeholders = ', '.join('?' * len(open_types))
+                only_job = ' AND id = ?' if job_id else ''
+                job = conn.execute(
+                    f'SELECT * FROM job WHERE status = ? AND run_after <= ? AND type IN ({placeholders})'
+                    f'{only_job} ORDER BY run_after, created_at LIMIT 1',
+                    (QUEUED, now, *open_types, *([job_id] if job_id else []))
+                ).fetchone()
+            if job is not None:
+                conn.execute(
+                    'UPDATE job SET status = ?, attempts = attempts + 1, worker = ?, started_at = ?,'
+                    ' heartbeat_at = ?, error = NULL WHERE id = ?',
+                    (RUNNING, worker, now, now, job['id'])
+                )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return self.get(job['id']) if job is not None else None
+
+    def get(self, job_id):
+        """Return a job as a dict, or None"""
+        row = self._connection().execute('SELECT * FROM job WHERE id = ?', (job_id,)).fetchone()
+        return self._as_dict(row) if row is not None else None
+
+    @staticmethod
+    def _where(**filters):
+        """WHERE clause and parameters matching every filter that is set"""
+        filters = [(column, value) for column, value in filters.items() if value]
+        where = ' AND '.join(f'{column} = ?' for column, _ in filters)
+        return (' WHERE ' + where if where else ''), tuple(value for _, value in filters)
+
+    def list(self, limit=50, status=None, job_type=None, school_id=None):
+        """Most recent jobs first, optionally only those in one state, of one type or of one school"""
+        where, params = self._where(status=status, type=job_type, school_id=school_id)
+        rows = self._connection().execute(f'SELECT * FROM job{where} ORDER BY created_at DESC LIMIT ?',
+                                          (*params, limit))
+        return [self._as_dict(row) for row in rows.fetchall()]
+
+    def counts(self, school_id=None):
+        """Number of jobs in each state, optionally of one school only"""
+        where, params = self._where(school_id=school_id)
+        rows = self._connection().execute(f'SELECT status, COUNT(*) FROM job{where} GROUP BY status',
+                                          params).fetchall()
+        return {status: count for status, count in rows}
+
+    def update_progress(self, job_id, progress, message=None):
+        """Record progress and return True if cancellation has been requested"""
+        conn = self._connection()
+        conn.execute(
+            'UPDATE job SET progress = ?, message = COALESCE(?, message), heartbeat_at = ? WHERE id = ?',
+            (progress, message, time.time(), job_id)
+        )
+        row = conn.execute('SELECT cancel_requested FROM job WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def heartbeat(self, job_id):
+        """Mark a running job as alive without touching its progress"""
+        self._connection().execute(
+            'UPDATE job SET heartbeat_at = ? WHERE id = ? AND status = ?', (time.time(), job_id, RUNNING)
+        )
+
+    def complete(self, job_id, result=None, message=None):
+        self._connection().execute(
+            'UPDATE job SET status = ?, progress = 100, result = ?, message = COALESCE(?, message),'
+            ' finished_at = ? WHERE id = ?',
+            (SUCCEEDED, json.dumps(result), message, time.time(), job_id)
+        )
+
+    def fail(self, job_id, error, retry_at=None):
+        """Record a failed attempt; requeue it if retry_at is given"""
+        if retry_at is not None:
+            self._connection().execute(
+                'UPDATE job SET status = ?, error = ?, run_after = ?, worker = NULL WHERE id = ?',
+                (QUEUED, error, retry_at, job_id)
+            )
+        else:
+            self._connection().execute(
+                'UPDATE job SET status = ?, error = ?, finished_at = ? WHERE id = ?',
+                (FAILED, error, time.time(), job_id)
+            )
+
+    def mark_cancelled(self, job_id):
+        self._connection().execute(
+            'UPDATE job SET status = ?, message = ?, finished_at = ? WHERE id = ?',
+            (CANCELLED, 'Cancelled', time.time(), job_id)
+        )
+
+    def cancel(self, job_id):
+        """Cancel a job: waiting jobs stop at once, running ones at their next progress check
+
+        Returns the job's status afterwards, or None if it does not exist.
+        """
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            'UPDATE job SET status = ?, message = ?, cancel_requested = 1, finished_at = ?'
+            ' WHERE id = ? AND status = ?',
+            (CANCELLED, 'Cancelled', now, job_id, QUEUED)
+        )
+        conn.execute('UPDATE job SET cancel_requested = 1 WHERE id = ? AND status = ?', (job_id, RUNNING))
+        job = self.get(job_id)
+        return job['status'] if job else None
+
+    def requeue_stale(self, older_than):
+        """Put back running jobs whose worker stopped reporting (crashed or killed)"""
+        cutoff = time.time() - older_than
+        cursor = self._connection().execute(
+            'UPDATE job SET status = CASE WHEN attempts >= max_attempts THEN ? ELSE ? END,'
+            ' error = ?, worker = NULL, finished_at = CASE WHEN attempts >= max_attempts THEN ? END'
+            ' WHERE status = ? AND heartbeat_at < ?',
+            (FAILED, QUEUED, 'Worker stopped responding', time.time(), RUNNING, cutoff)
+        )
+        return cursor.rowcount
+
+    def purge(self, older_than):
+        """Delete finished jobs older than the given number of seconds, and their files"""
+        placeholders = ', '.join('?' * len(FINISHED_STATES))
+        where = f'status IN ({placeholders}) AND finished_at < ?'
+        params = (*FINISHED_STATES, time.time() - older_than)
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            results = conn.execute(f'SELECT result FROM job WHERE {where} AND result IS NOT NULL', params).fetchall()
+            cursor = conn.execute(f'DELETE FROM job WHERE {where}', params)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if self.files_dir:
+            for row in results:
+                result = json.loads(row['result'])
+                name = result.get('file') if isinstance(result, dict) else None
+                if not name:
+                    continue
+                try:
+                    os.remove(os.path.join(self.files_dir, os.path.basename(name)))
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    logger.warning('Could not delete %s of a purged job', name, exc_info=True)
+        return cursor.rowcount
+
+    def wait(self, job_id, timeout=30, interval=0.05):
+        """Block until a job finishes (used by scripts and tests)"""
+        deadline = time.time() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] in FINISHED_STATES or time.time() >= deadline:
+                return job
+            time.sleep(interval)
+
+    @staticmethod
+    def _as_dict(row):
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        job.pop('dedupe_key', None)
+        return job
+
+
+class JobContext:
+    """Handed to every job handler: payload plus progress reporting"""
+
+    def __init__(self, queue, job):
+        self.queue = queue
+        self.job = job
+        self.id = job['id']
+        self.payload = job['payload']
+        self.attempt = job['attempts']
+        self._last_report = 0.0
+
+    def progress(self, done, total=None, message=None, force=False):
+        """Report progress (a percentage, or done/total); raises JobCancelled if cancelled
+
+        Writes are throttled to a few per second so tight loops can call this freely.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_report < 0.25:
+            return
+        self._last_report = now
+        percent = round(100.0 * done / total, 1) if total else float(done)
+        if self.queue.update_progress(self.id, min(percent, 100.0), message):
+            raise JobCancelled(self.id)
+
+    def check_cancelled(self):
+        job = self.queue.get(self.id)
+        if job is None or job['cancel_requested']:
+            raise JobCancelled(self.id)
+
+
+class JobRunner:
+    """Worker threads that claim and execute jobs from a JobQueue
+
+    context_factory(job), if given, is entered around every job (the Flask
+    app context, so handlers can use the database session).
+
+    While a job runs, its heartbeat is refreshed every heartbeat_interval
+    seconds (a fifth of stale_after by default) whether or not the handler
+    reports progress, so only jobs of a dead worker are ever requeued.
+
+    Callbacks registered with on_start() run each time a process starts its
+    workers, e.g. to re-queue recurring jobs whose chain a killed worker broke.
+    """
+
+    def __init__(self, queue, workers=2, poll_interval=1.0, stale_after=300, retention=7 * 24 * 3600,
+                 context_factory=None, heartbeat_interval=None):
+        self.queue = queue
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.heartbeat_interval = heartbeat_interval or stale_after / 5
+        self.retention = retention
+        self.context_factory = context_factory
+        self.job_types = {}
+        self.start_callbacks = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def register(self, name, concurrency=1, max_attempts=3, retry_delay=2.0):
+        """Decorator registering a handler(ctx) for a job type"""
+        def decorator(handler):
+            self.job_types[name] = JobType(name, handler, concurrency, max_attempts, retry_delay)
+            return handler
+        return decorator
+
+    def on_start(self, callback):
+        """Decorator registering a callback() run whenever this process starts its workers"""
+        self.start_callbacks.append(callback)
+        return callback
+
+    def submit(self, name, payload=None, dedupe_key=None):
+        """Queue a job of a registered type and wake a worker"""
+        job_type = self.job_types[name]
+        job_id = self.queue.enqueue(name, payload, max_attempts=job_type.max_attempts, dedupe_key=dedupe_key)
+        self.start()
+        self._wakeup.set()
+        return job_id
+
+    def run_inline(self, name, payload=None):
+        """Queue a job and run it in the calling thread (JOBS_MODE=inline)"""
+        job_id = self.queue.enqueue(name, payload, max_attempts=1)
+        job = self.queue.claim({name: float('inf')}, self._worker_name(), job_id=job_id)
+        self._execute(job)
+        return job_id
+
+    @property
+    def running(self):
+        return self._pid == os.getpid() and any(t.is_alive() for t in self._threads)
+
+    def start(self):
+        """Start the worker threads for this process (idempotent, fork-aware)"""
+        if self.running:
+            return
+        with self._start_lock:
+            if self.running:
+                return
+            self._stopping.clear()
+            self._pid = os.getpid()
+            self.queue.requeue_stale(self.stale_after)
+            self.queue.purge(self.retention)
+            for callback in self.start_callbacks:
+                try:
+                    callback()
+                except Exception:
+                    logger.exception('Job runner start callback %s failed', getattr(callback, '__name__', callback))
+            self._threads = [
+                threading.Thread(target=self._loop, name=f'job-worker-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _worker_name(self):
+        return f'{os.getpid()}:{threading.current_thread().name}'
+
+    def _loop(self):
+        limits = {name: job_type.concurrency for name, job_type in self.job_types.items()}
+        while not self._stopping.is_set():
+            try:
+                job = self.queue.claim(limits, self._worker_name())
+            except sqlite3.Error:
+                logger.exception('Could not claim a job')
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._execute(job)
+
+    def _beat(self, job_id, done):
+        """Refresh a running job's heartbeat until done is set"""
+        while not done.wait(self.heartbeat_interval):
+            try:
+                self.queue.heartbeat(job_id)
+            except sqlite3.Error:
+                logger.warning('Could not record the heartbeat of job %s', job_id, exc_info=True)
+
+    def _execute(self, job):
+        done = threading.Event()
+        beat = threading.Thread(target=self._beat, args=(job['id'], done), name=f'job-heartbeat-{job["id"][:8]}',
+                                daemon=True)
+        beat.start()
+        try:
+            self._run(job)
+        finally:
+            done.set()
+            beat.join()
+
+    def _run(self, job):
+        job_type = self.job_types[job['type']]
+        ctx = JobContext(self.queue, job)
+        try:
+            if job['cancel_requested']:
+                raise JobCancelled(job['id'])
+            if self.context_factory is not None:
+                with self.context_factory(job):
+                    result = job_type.handler(ctx)
+            else:
+                result = job_type.handler(ctx)
+        except JobCancelled:
+            self.queue.mark_cancelled(job['id'])
+        except Exception as e:
+            logger.exception('Job %s (%s) failed on attempt %s', job['id'], job['type'], job['attempts'])
+            error = f'{type(e).__name__}: {e}'
+            retry_at = None
+            if job['attempts'] < job['max_attempts']:
+                retry_at = time.time() + job_type.retry_delay * 2 ** (job['attempts'] - 1)
+            self.queue.fail(job['id'], error, retry_at)
+        else:
+            message = result.get('message') if isinstance(result, dict) else None
+            self.queue.complete(job['id'], result, message)
@@ -212,7 +212,24 @@ def main():
     test_suites = [
         ('simple_system_test.py', 'Core System Functionality Tests'),
         ('comprehensive_ui_test.py', 'UI & Button Interaction Tests'),
-        ('manual_system_test.py', 'Advanced Manual System Tests')
+        ('manual_system_test.py', 'Advanced Manual System Tests'),
+        ('concurrency_stress_testing_suite.py', 'Concurrency Stress Tests (capacity limits)'),
+        ('background_jobs_testing_suite.py', 'Background Job Tests'),
+        ('async_api_testing_suite.py', 'Async API Tier Tests'),
+        ('read_routing_testing_suite.py', 'Read/Write Routing Tests'),
+        ('analytics_testing_suite.py', 'Analytics Aggregation Tests'),
+        ('tenancy_testing_suite.py', 'Multi-School Tenancy Tests'),
+        ('query_stats_testing_suite.py', 'Query Instrumentation Tests'),
+        ('metrics_testing_suite.py', 'Prometheus Metrics Tests'),
+        ('slow_query_testing_suite.py', 'Slow-Query Log Tests'),
+        ('profiler_testing_suite.py', 'Request Profiler Tests'),
+        ('query_budget.py', 'Query Budget (N+1) Checks'),
+        ('tracing_testing_suite.py', 'Request Tracing Tests'),
+        ('health_testing_suite.py', 'Health Probe Tests'),
+        ('memory_profiling_testing_suite.py', 'Memory Profiling Tests'),
+        ('access_log_testing_suite.py', 'Access Log Tests'),
+        ('db_maintenance_testing_suite.py', 'Database Maintenance Tests'),
+        ('cache_testing_suite.py', 'Cache Tests')
     ]
     
     # Run all test suites
@@ -0,0 +1,302 @@
+"""
+Opt-in memory profiling of requests and background jobs with tracemalloc.
+
+With MEMORY_PROFILING=True requests and background jobs are measured:
+
+    start tracemalloc  ->  run the request / job  ->  gc, snapshot, stop
+
+Only what was allocated during the call is traced, so the snapshot holds
+exactly the allocations that survived it, which gives for each call
+
+    retained  memory allocated by the call and still alive after a gc pass
+              (the response body handed to the server doesn't count)
+    peak      the high-water mark of memory allocated by the call
+    growth    the allocation sites (file:line, with the app frame that led
+              there) holding the retained memory
+    at peak   the sites holding the most memory at the high-water mark, from
+              a snapshot a helper thread takes as memory climbs
+
+/admin/memory (and /api/memory as JSON) lists every route and job type with
+its calls, mean retained and worst peak, and the sites from its latest call.
+A route or job is flagged as "rising" when each of its last
+MEMORY_GROWTH_CALLS calls retained at least MEMORY_GROWTH_KB: a cache that
+fills once isn't flagged, memory that piles up on every export is.
+
+tracemalloc records a traceback for every allocation, which makes a
+measured call several times slower (more with more MEMORY_PROFILE_FRAMES),
+so this is for diagnosing a worker, not for production traffic. It only
+runs while a call is measured, and MEMORY_PROFILE_SAMPLE_RATE measures a
+share of calls instead of all of them. Measured calls run one at a time in
+each process, so their allocations aren't mixed up; unmeasured calls that
+overlap one still count towards it.
+
+Settings (app.config):
+    MEMORY_PROFILING           - master switch (default False)
+    MEMORY_PROFILE_FRAMES      - frames stored per allocation (default 10)
+    MEMORY_PROFILE_SAMPLE_RATE - share of requests and jobs measured (default 1.0)
+    MEMORY_PROFILE_TOP         - allocation sites kept per report (default 10)
+    MEMORY_GROWTH_CALLS        - consecutive calls that must retain memory to flag (default 5)
+    MEMORY_GROWTH_KB           - memory each of those calls must retain (default 64)
+"""
+
+import gc
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+from profiler import STDLIB, Sampler
+
+logger = logging.getLogger('mentorship.memory')
+
+ENVIRON_KEY = 'mentorship.memory_unit'
+PEAK_POLL_SECONDS = 0.001
+PEAK_STEP_BYTES = 256 * 1024
+
+# Allocations made by the profiler itself, not by what it measures
+IGNORED = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__),
+           tracemalloc.Filter(False, '<unknown>'))
+
+
+def site_label(frame):
+    """"jinja2/runtime.py:540" for libraries, "app.py:812" for the app itself"""
+    filename = frame.filename.replace('\\', '/')
+    if '/site-packages/' in filename:
+        filename = filename.rsplit('/site-packages/', 1)[1]
+    elif filename.startswith(STDLIB + '/'):
+        filename = filename[len(STDLIB) + 1:]
+    else:
+        filename = os.path.basename(filename)
+    return f"{filename}:{frame.lineno}"
+
+
+def is_app_frame(frame):
+    filename = frame.filename.replace('\\', '/')
+    return not ('/site-packages/' in filename or filename.startswith((STDLIB + '/', '<')))
+
+
+def top_sites(snapshot, limit, app_file=None):
+    """[{site, via, kb, count}] of the sites holding the most memory in snapshot
+
+    Allocations are grouped by the line that made them and the innermost line
+    of app_file (the views and jobs) that led there, or failing that of any
+    application module, so a row in sqlalchemy still says which view it was
+    loaded for.
+    """
+    sites = {}
+    for stat in snapshot.statistics('traceback'):
+        frames = list(stat.traceback)  # oldest first
+        via = next((frame for frame in reversed(frames) if frame.filename == app_file), None) \
+            or next((frame for frame in reversed(frames) if is_app_frame(frame)), None)
+        key = (site_label(frames[-1]), site_label(via) if via is not None and via is not frames[-1] else '')
+        size, count = sites.get(key, (0, 0))
+        sites[key] = (size + stat.size, count + stat.count)
+    ranked = sorted(sites.items(), key=lambda item: -item[1][0])[:limit]
+    return [{'site': site, 'via': via, 'kb': round(size / 1024, 1), 'count': count}
+            for (site, via), (size, count) in ranked]
+
+
+class PeakWatcher:
+    """Helper thread that snapshots the traces whenever traced memory reaches a new high
+
+    Like profiler.Sampler it can only look when the measured thread lets go
+    of the GIL, so it shortens the switch interval through Sampler.enter/exit,
+    which keeps overlapping samplers and watchers from restoring it early.
+    """
+
+    def __init__(self):
+        self.snapshot = None
+        self.snapshot_bytes = 0
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='memory-peak-watcher', daemon=True)
+
+    def start(self):
+        Sampler.enter(PEAK_POLL_SECONDS)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join()
+        Sampler.exit(PEAK_POLL_SECONDS)
+
+    def _run(self):
+        while not self._stopping.wait(PEAK_POLL_SECONDS):
+            traced = tracemalloc.get_traced_memory()[0]
+            # A new snapshot only after a clear rise, so a call takes a handful at most
+            if traced >= max(PEAK_STEP_BYTES, self.snapshot_bytes * 1.25):
+                self.snapshot = tracemalloc.take_snapshot().filter_traces(IGNORED)
+                self.snapshot_bytes = traced
+
+
+class MemorySummary:
+    """Per-route and per-job retained and peak memory for this process"""
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._units = {}
+
+    def add(self, name, report):
+        with self._lock:
+            unit = self._units.get(name)
+            if unit is None:
+                unit = self._units[name] = {
+                    'name': name, 'calls': 0, 'retained': 0, 'peak': 0, 'rising': False,
+                    'recent': deque(maxlen=max(self.config['MEMORY_GROWTH_CALLS'], 1)),
+                }
+            unit['calls'] += 1
+            unit['retained'] += report['retained_kb']
+            unit['peak'] = max(unit['peak'], report['peak_kb'])
+            unit['recent'].append(report['retained_kb'])
+            unit['last'] = report
+            recent = unit['recent']
+            rising = len(recent) == recent.maxlen and min(recent) >= self.config['MEMORY_GROWTH_KB']
+            if rising and not unit['rising']:
+                logger.warning('Memory rising on %s: %.0f KB retained over the last %d calls (%s)', name,
+                               sum(recent), len(recent),
+                               ', '.join(f"{site['site']} +{site['kb']}KB" for site in report['growth'][:3]))
+            unit['rising'] = rising
+
+    def rows(self):
+        """One dict per route or job, rising first, then by total retained memory"""
+        with self._lock:
+            units = [dict(unit, recent=list(unit['recent'])) for unit in self._units.values()]
+        return [{
+            'name': unit['name'],
+            'calls': unit['calls'],
+            'rising': unit['rising'],
+            'mean_retained_kb': round(unit['retained'] / unit['calls'], 1),
+            'total_retained_kb': round(unit['retained'], 1),
+            'max_peak_kb': unit['peak'],
+            'recent_retained_kb': unit['recent'],
+            'last': unit['last'],
+        } for unit in sorted(units, key=lambda unit: (not unit['rising'], -unit['retained']))]
+
+    def clear(self):
+        with self._lock:
+            self._units.clear()
+
+
+class MemoryProfiler:
+    """Measures requests and jobs when MEMORY_PROFILING is on, does nothing otherwise"""
+
+    def __init__(self, config, app_file=None):
+        self.config = config
+        self.app_file = app_file
+        self.enabled = config['MEMORY_PROFILING']
+        self.summary = MemorySummary(config)
+        self._lock = threading.Lock()
+        self._active = threading.local()
+
+    @contextmanager
+    def measure(self, name):
+        """Measure the enclosed block as one call of `name`
+
+        Yields a dict whose 'name' the block may change once it knows better
+        (a request learns its route after URL matching). Blocks nested in a
+        measured one, like an inline job inside a request, count towards it.
+        """
+        unit = {'name': name}
+        if (not self.enabled or getattr(self._active, 'unit', None) is not None
+                or random.random() >= self.config['MEMORY_PROFILE_SAMPLE_RATE']):
+            yield unit
+            return
+        with self._lock:
+            self._active.unit = unit
+            # Tracing started elsewhere (PYTHONTRACEMALLOC) is left running, with its traces cleared
+            already_tracing = tracemalloc.is_tracing()
+            try:
+                if already_tracing:
+                    tracemalloc.clear_traces()
+                else:
+                    tracemalloc.start(self.config['MEMORY_PROFILE_FRAMES'])
+                tracemalloc.reset_peak()
+                watcher = PeakWatcher()
+                started = time.perf_counter()
+                watcher.start()
+                try:
+                    yield unit
+                finally:
+                    watcher.stop()
+                    duration = time.perf_counter() - started
+                    peak_snapshot, watcher = watcher.snapshot, None
+                    peak = tracemalloc.get_traced_memory()[1]
+                    gc.collect()
+                    after = tracemalloc.take_snapshot().filter_traces(IGNORED)
+                    retained = sum(trace.size for trace in after.traces)
+                    top = self.config['MEMORY_PROFILE_TOP']
+                    self.summary.add(unit['name'], {
+                        'retained_kb': round(retained / 1024, 1),
+                        'peak_kb': round(peak / 1024, 1),
+                        'duration_ms': round(duration * 1000, 1),
+                        'growth': top_sites(after, top, self.app_file),
+                        'at_peak': top_sites(peak_snapshot, top, self.app_file) if peak_snapshot else [],
+                    })
+            finally:
+                if not already_tracing:
+                    tracemalloc.stop()
+                self._active.unit = None
+
+
+class MemoryMiddleware:
+    """Measures each request from WSGI entry until its body has been produced"""
+
+    def __init__(self, wsgi_app, profiler):
+        self.wsgi_app = wsgi_app
+        self.profiler = profiler
+
+    def __call__(self, environ, start_response):
+        with self.profiler.measure(f"{environ.get('REQUEST_METHOD', 'GET')} unmatched") as unit:
+            environ[ENVIRON_KEY] = unit
+            result = self.wsgi_app(environ, start_response)
+            # The whole body is produced inside the measurement, so streamed responses are
+            # buffered. It is copied into a buffer allocated here, which isn't counted as
+            # retained, and the response object itself is released before the snapshot
+            try:
+                body = bytearray().join(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+                del result
+        return [bytes(body)]
+
+
+def init_app(app):
+    """Measure every request when MEMORY_PROFILING is on; returns the MemoryProfiler for jobs to use"""
+    from flask import jsonify, render_template, request
+
+    app.config.setdefault('MEMORY_PROFILING', False)
+    app.config.setdefault('MEMORY_PROFILE_FRAMES', 10)
+    app.config.setdefault('MEMORY_PROFILE_SAMPLE_RATE', 1.0)
+    app.config.setdefault('MEMORY_PROFILE_TOP', 10)
+    app.config.setdefault('MEMORY_GROWTH_CALLS', 5)
+    app.config.setdefault('MEMORY_GROWTH_KB', 64)
+    profiler = MemoryProfiler(app.config, getattr(sys.modules.get(app.import_name), '__file__', None))
+    app.extensions['memory_profiling'] = profiler
+    if not profiler.enabled:
+        return profiler
+    app.wsgi_app = MemoryMiddleware(app.wsgi_app, profiler)
+
+    @app.before_request
+    def name_memory_unit():
+        unit = request.environ.get(ENVIRON_KEY)
+        if unit is not None:
+            unit['name'] = f"{request.method} {request.url_rule.rule if request.url_rule else 'unmatched'}"
+
+    @app.route('/api/memory')
+    def api_memory():
+        """Retained and peak memory per route and job for this worker"""
+        return jsonify({'pid': os.getpid(), 'units': profiler.summary.rows()})
+
+    @app.route('/admin/memory')
+    def admin_memory():
+        """Which routes and jobs keep memory, and where it was allocated"""
+        return render_template('memory.html', rows=profiler.summary.rows(), pid=os.getpid(),
+                               growth_calls=app.config['MEMORY_GROWTH_CALLS'])
+
+    return profiler
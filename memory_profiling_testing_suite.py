@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Memory Profiling Testing Suite
+Checks that with MEMORY_PROFILING on, requests and background jobs report
+the memory they retained and their peak with the allocation sites behind
+them, that routes which keep memory on every call are flagged while a
+cache filled once is not, that tracemalloc only runs while a call is
+measured, and that the peak watcher shares the profiler's switch interval.
+
+Runs against a throwaway SQLite database (never mentorship.db).
+"""
+
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+
+from suite_support import SuiteLogger, scratch_environment
+
+# Point the app at a scratch database before it is imported
+scratch_environment('memory')
+os.environ['MEMORY_PROFILING'] = 'True'
+
+import app as flask_app
+import memory_profiling
+from profiler import Sampler
+
+
+logger = SuiteLogger()
+profiler = flask_app.app.extensions['memory_profiling']
+
+# Test-only routes and job, registered before the first request
+kept = []
+cache = {}
+
+
+@flask_app.app.route('/_memory/leak')
+def leak():
+    kept.append(bytearray(200 * 1024))
+    return 'ok'
+
+
+@flask_app.app.route('/_memory/cached')
+def cached():
+    if 'table' not in cache:
+        cache['table'] = [str(i) * 10 for i in range(20000)]
+    return str(len(cache['table']))
+
+
+@flask_app.app.route('/_memory/spike')
+def spike():
+    scratch = [bytearray(1024) for _ in range(4000)]
+    total = sum(len(block) for block in scratch)
+    return str(total)
+
+
+@flask_app.app.route('/_memory/big_body')
+def big_body():
+    return 'x' * (512 * 1024)
+
+
+@flask_app.job_runner.register('memory_test_job')
+def memory_test_job(ctx):
+    kept.append(bytearray(100 * 1024))
+    return {'message': 'kept 100 KB'}
+
+
+client = flask_app.app.test_client()
+
+
+def unit(name):
+    return next((row for row in profiler.summary.rows() if row['name'] == name), None)
+
+
+def test_requests():
+    client.get('/_memory/leak')
+    logger.log_result("tracemalloc only runs while a call is measured", not tracemalloc.is_tracing())
+
+    warnings = []
+    handler = logging.Handler()
+    handler.emit = lambda record: warnings.append(record.getMessage())
+    memory_profiling.logger.addHandler(handler)
+    try:
+        for _ in range(5):
+            client.get('/_memory/leak')
+            client.get('/_memory/cached')
+    finally:
+        memory_profiling.logger.removeHandler(handler)
+    leaky = unit('GET /_memory/leak')
+    top = leaky['last']['growth'][0] if leaky and leaky['last']['growth'] else {}
+    logger.log_result("Each call reports the memory it retained and where it was allocated",
+                      leaky is not None and leaky['calls'] == 6 and 195 <= leaky['last']['retained_kb'] <= 230
+                      and top.get('site', '').startswith('memory_profiling_testing_suite.py:') and top['kb'] >= 199,
+                      f"{leaky['last']['retained_kb'] if leaky else None} KB, top site {top}")
+    logger.log_result("A route that keeps memory on every call is flagged as rising",
+                      leaky['rising'] and any('GET /_memory/leak' in message for message in warnings),
+                      f"recent {leaky['recent_retained_kb']}")
+
+    warm = unit('GET /_memory/cached')
+    logger.log_result("A cache filled on the first call is not flagged",
+                      warm is not None and not warm['rising'] and warm['recent_retained_kb'][0] > 500
+                      and max(warm['recent_retained_kb'][1:]) < 64, f"recent {warm and warm['recent_retained_kb']}")
+
+    client.get('/_memory/spike')
+    spiky = unit('GET /_memory/spike')
+    at_peak = spiky['last']['at_peak'] if spiky else []
+    logger.log_result("Peak memory is reported even when it is all freed again",
+                      spiky is not None and spiky['max_peak_kb'] > 4000 and spiky['last']['retained_kb'] < 64,
+                      f"peak {spiky and spiky['max_peak_kb']} KB, retained {spiky and spiky['last']['retained_kb']} KB")
+    logger.log_result("The sites holding memory at the peak are listed",
+                      bool(at_peak) and at_peak[0]['site'].startswith('memory_profiling_testing_suite.py:')
+                      and at_peak[0]['kb'] > 1000, f"{at_peak[:1]}")
+
+    client.get('/_memory/big_body')
+    body = unit('GET /_memory/big_body')
+    logger.log_result("The response body handed to the server is not counted as retained",
+                      body is not None and body['last']['retained_kb'] < 64 and body['max_peak_kb'] > 512,
+                      f"retained {body and body['last']['retained_kb']} KB, peak {body and body['max_peak_kb']} KB")
+
+
+def test_jobs():
+    for _ in range(5):
+        flask_app.job_runner.run_inline('memory_test_job', {})
+    job = unit('job memory_test_job')
+    logger.log_result("Background jobs are measured and flagged the same way",
+                      job is not None and job['calls'] == 5 and job['rising'] and job['last']['retained_kb'] >= 99,
+                      f"recent {job and job['recent_retained_kb']}")
+
+
+def test_report():
+    data = client.get('/api/memory').get_json()
+    logger.log_result("/api/memory lists rising routes first",
+                      data['units'][0]['rising'] and {'name', 'calls', 'mean_retained_kb', 'max_peak_kb'} <= set(data['units'][0]))
+    page = client.get('/admin/memory')
+    logger.log_result("/admin/memory shows the routes with their allocation sites",
+                      page.status_code == 200 and b'GET /_memory/leak' in page.data and b'rising' in page.data
+                      and b'memory_profiling_testing_suite.py' in page.data)
+
+    off = memory_profiling.MemoryProfiler(dict(flask_app.app.config, MEMORY_PROFILING=False))
+    with off.measure('GET /'):
+        tracing = tracemalloc.is_tracing()
+    logger.log_result("With MEMORY_PROFILING off nothing is measured", not tracing and off.summary.rows() == [])
+
+
+def test_switch_interval():
+    original = sys.getswitchinterval()
+    watcher = memory_profiling.PeakWatcher()
+    sampler = Sampler(threading.get_ident(), interval=0.0005)
+    tracemalloc.start()
+    try:
+        watcher.start()
+        sampler.start()
+        watcher.stop()  # stops first, while the sampler still needs the short interval
+        during = sys.getswitchinterval()
+        sampler.stop()
+    finally:
+        tracemalloc.stop()
+    logger.log_result("An overlapping profiler sample keeps its switch interval and the original comes back last",
+                      during == 0.0005 and sys.getswitchinterval() == original,
+                      f"{during * 1000:.2f}ms while sampling, {sys.getswitchinterval() * 1000:.2f}ms after")
+
+
+def main():
+    logger.log_header("MEMORY PROFILING TESTS")
+    print(f"📂 Scratch database: {os.environ['DATABASE_URL']}")
+    with flask_app.app.app_context():
+        flask_app.db.drop_all()
+        flask_app.db.create_all()
+
+    test_requests()
+    test_jobs()
+    test_report()
+    test_switch_interval()
+    flask_app.job_runner.stop()
+
+    return logger.finish("memory is measured per route and job", "memory profiling is off")
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,358 @@
+"""
+Prometheus metrics for the Mentorship System.
+
+init_app(app) records request latency, in-flight requests and SQL statement
+latency, and serves everything in the Prometheus text format at /metrics:
+
+    mentorship_http_request_duration_seconds  histogram {method, endpoint}
+    mentorship_http_requests_total            counter   {method, endpoint, status}
+    mentorship_http_requests_in_progress      gauge
+    mentorship_db_query_duration_seconds      histogram {operation}
+    mentorship_db_pool_*                      pool size, checked out, checkouts, waits
+    mentorship_cache_*                        hits, misses, hit ratio, entries
+    mentorship_jobs                           gauge     {status}   (queue depth)
+    mentorship_table_rows                     gauge     {school, table}
+
+Values are kept in memory per process. With several gunicorn workers, set
+METRICS_DIR to a directory shared by all of them: each worker writes its
+values there (at most every METRICS_FLUSH_SECONDS) and a scrape of any
+worker merges every file. Counters and histograms from workers that have
+exited are folded into an archive file so totals never go backwards;
+gauges only count workers that are still alive.
+
+The app adds its own figures with two hooks:
+
+    @registry.snapshot      # per-process values, written with the worker's file
+    def pool_metrics(): return [('mentorship_db_pool_size', {'pool': 'primary'}, 5), ...]
+
+    @registry.collector     # shared values, computed by the scraping worker
+    def job_metrics(): return [('mentorship_jobs', {'status': 'queued'}, 3), ...]
+
+Settings (app.config):
+    METRICS_ENABLED       - master switch (default True)
+    METRICS_DIR           - shared directory for multi-process mode (default: single process)
+    METRICS_FLUSH_SECONDS - how stale another worker's figures may be (default 1)
+"""
+
+import json
+import os
+import threading
+import time
+
+from flask import Response, request
+
+import query_stats
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+# name: (type, help, histogram buckets)
+FAMILIES = {
+    'mentorship_http_request_duration_seconds': ('histogram', 'Request latency', REQUEST_BUCKETS),
+    'mentorship_http_requests_total': ('counter', 'Requests handled', None),
+    'mentorship_http_requests_in_progress': ('gauge', 'Requests being handled', None),
+    'mentorship_db_query_duration_seconds': ('histogram', 'SQL statement latency', QUERY_BUCKETS),
+    'mentorship_db_pool_size': ('gauge', 'Connections kept in the pool', None),
+    'mentorship_db_pool_max_overflow': ('gauge', 'Extra connections allowed under load', None),
+    'mentorship_db_pool_checked_out': ('gauge', 'Connections in use', None),
+    'mentorship_db_pool_checkouts_total': ('counter', 'Connections handed out', None),
+    'mentorship_db_pool_checkout_timeouts_total': ('counter', 'Checkouts that timed out', None),
+    'mentorship_db_pool_wait_seconds_total': ('counter', 'Time spent waiting for a connection', None),
+    'mentorship_cache_hits_total': ('counter', 'Cache lookups that found an entry', None),
+    'mentorship_cache_misses_total': ('counter', 'Cache lookups that missed', None),
+    'mentorship_cache_evictions_total': ('counter', 'Entries evicted to stay within bounds', None),
+    'mentorship_cache_entries': ('gauge', 'Entries held in the cache', None),
+    'mentorship_cache_hit_ratio': ('gauge', 'Hits / lookups since start', None),
+    'mentorship_jobs': ('gauge', 'Background jobs by status', None),
+    'mentorship_table_rows': ('gauge', 'Rows per table', None),
+}
+
+ARCHIVE_FILE = 'archive.json'
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def pid_alive(pid):
+    """Whether a process with this pid is still running"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Registry:
+    """Metric values for this process, optionally shared through a directory"""
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._snapshots = []
+        self._collectors = []
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self._values = {}  # (family, suffix, labels) -> value
+        self._last_flush = 0.0
+        self._timer = None
+
+    def _check_fork(self):
+        # A forked worker starts from zero rather than repeating the master's counts
+        if os.getpid() != self.pid:
+            self._reset()
+
+    # -- recording -----------------------------------------------------------
+
+    def inc(self, family, labels=None, amount=1):
+        key = (family, '', _labels(labels))
+        with self._lock:
+            self._check_fork()
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, family, labels=None, amount=1):
+        self.inc(family, labels, -amount)
+
+    def observe(self, family, value, labels=None):
+        labels = _labels(labels)
+        buckets = FAMILIES[family][2]
+        with self._lock:
+            self._check_fork()
+            values = self._values
+            # Buckets are cumulative, and every one is written even while still 0
+            for bound in buckets:
+                key = (family, '_bucket', labels + (('le', str(bound)),))
+                values[key] = values.get(key, 0) + (value <= bound)
+            for suffix, amount in (('_bucket', 1), ('_sum', value), ('_count', 1)):
+                key = (family, suffix, labels + (('le', '+Inf'),) if suffix == '_bucket' else labels)
+                values[key] = values.get(key, 0) + amount
+
+    def snapshot(self, func):
+        """Register a function returning this process's (family, labels, value) samples"""
+        self._snapshots.append(func)
+        return func
+
+    def collector(self, func):
+        """Register a function returning shared (family, labels, value) samples at scrape time"""
+        self._collectors.append(func)
+        return func
+
+    def _take_snapshots(self):
+        values = {}
+        for func in self._snapshots:
+            for family, labels, value in func():
+                values[(family, '', _labels(labels))] = value
+        return values
+
+    def _local_values(self):
+        snapshot = self._take_snapshots()
+        with self._lock:
+            self._check_fork()
+            values = dict(self._values)
+        values.update(snapshot)
+        return values
+
+    # -- sharing between processes -------------------------------------------
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'metrics-{pid}.json')
+
+    def maybe_flush(self):
+        """Write this process's values if the last write is older than flush_interval"""
+        if not self.directory:
+            return
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+        elif self._timer is None:
+            # Make sure the last requests before a quiet spell are written too
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        if not self.directory:
+            return
+        self._timer = None
+        self._last_flush = time.monotonic()
+        values = self._local_values()
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(self.pid)
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'pid': self.pid, 'values': self._serialize(values)}, f)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _serialize(values):
+        return [[family, suffix, [list(label) for label in labels], value]
+                for (family, suffix, labels), value in values.items()]
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        data['values'] = {(family, suffix, tuple(tuple(label) for label in labels)): value
+                          for family, suffix, labels, value in data['values']}
+        return data
+
+    def _merge_files(self):
+        """Values from every process sharing the directory, this one included"""
+        import fcntl
+        self.flush()
+        merged = {}
+
+        def add(values, include_gauges):
+            for key, value in values.items():
+                if include_gauges or FAMILIES[key[0]][0] != 'gauge':
+                    merged[key] = merged.get(key, 0) + value
+
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive_path = os.path.join(self.directory, ARCHIVE_FILE)
+            archive = self._read(archive_path) or {'values': {}}
+            archived = False
+            for name in os.listdir(self.directory):
+                if not (name.startswith('metrics-') and name.endswith('.json')):
+                    continue
+                path = os.path.join(self.directory, name)
+                data = self._read(path)
+                if data is None:
+                    continue
+                if pid_alive(data['pid']):
+                    add(data['values'], include_gauges=True)
+                    continue
+                # Keep an exited worker's counters, forget its gauges
+                for key, value in data['values'].items():
+                    if FAMILIES[key[0]][0] != 'gauge':
+                        archive['values'][key] = archive['values'].get(key, 0) + value
+                os.remove(path)
+                archived = True
+            if archived:
+                with open(archive_path + '.tmp', 'w') as f:
+                    json.dump({'pid': 0, 'values': self._serialize(archive['values'])}, f)
+                os.replace(archive_path + '.tmp', archive_path)
+            add(archive['values'], include_gauges=False)
+        return merged
+
+    def clear_directory(self):
+        """Remove every worker's file (call once, before the workers start)"""
+        if self.directory and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.json') or name.endswith('.tmp'):
+                    os.remove(os.path.join(self.directory, name))
+
+    # -- exposition ----------------------------------------------------------
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format"""
+        values = self._merge_files() if self.directory else self._local_values()
+        for func in self._collectors:
+            for family, labels, value in func():
+                values[(family, '', _labels(labels))] = value
+
+        # Hit ratio from the merged totals, so it covers every worker
+        hits, misses = {}, {}
+        for (family, suffix, labels), value in values.items():
+            if family == 'mentorship_cache_hits_total':
+                hits[labels] = value
+            elif family == 'mentorship_cache_misses_total':
+                misses[labels] = value
+        for labels, hit_count in hits.items():
+            lookups = hit_count + misses.get(labels, 0)
+            values[('mentorship_cache_hit_ratio', '', labels)] = round(hit_count / lookups, 4) if lookups else 0.0
+
+        by_family = {}
+        for (family, suffix, labels), value in values.items():
+            by_family.setdefault(family, []).append((suffix, labels, value))
+        lines = []
+        for family, (kind, help_text, buckets) in FAMILIES.items():
+            samples = by_family.get(family)
+            if not samples:
+                continue
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {kind}')
+            if kind == 'histogram':
+                order = {str(bound): i for i, bound in enumerate(buckets)}
+                order['+Inf'] = len(buckets)
+                samples.sort(key=lambda s: ([l for l in s[1] if l[0] != 'le'], s[0] != '_bucket', s[0],
+                                            order.get(dict(s[1]).get('le'), 0)))
+            else:
+                samples.sort(key=lambda s: s[1])
+            for suffix, labels, value in samples:
+                lines.append(f'{family}{suffix}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _operation(statement):
+    verb = statement.lstrip()[:6].upper()
+    return verb if verb in ('SELECT', 'INSERT', 'UPDATE', 'DELETE') else 'OTHER'
+
+
+def init_app(app):
+    """Record request and query metrics and serve /metrics; returns the Registry"""
+    app.config.setdefault('METRICS_ENABLED', True)
+    app.config.setdefault('METRICS_DIR', None)
+    app.config.setdefault('METRICS_FLUSH_SECONDS', 1.0)
+
+    registry = Registry(app.config['METRICS_DIR'], app.config['METRICS_FLUSH_SECONDS'])
+    app.extensions['metrics'] = registry
+    if not app.config['METRICS_ENABLED']:
+        return registry
+
+    query_stats.add_observer(
+        lambda statement, elapsed, *details: registry.observe('mentorship_db_query_duration_seconds', elapsed,
+                                                              {'operation': _operation(statement)}))
+
+    @app.before_request
+    def start_request_metrics():
+        request.environ['metrics.started'] = time.perf_counter()
+        registry.inc('mentorship_http_requests_in_progress')
+
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        started = request.environ.pop('metrics.started', None)
+        if started is None:
+            return
+        registry.dec('mentorship_http_requests_in_progress')
+        endpoint = request.endpoint or 'unmatched'
+        registry.observe('mentorship_http_request_duration_seconds', time.perf_counter() - started,
+                         {'method': request.method, 'endpoint': endpoint})
+        status = request.environ.get('metrics.status', 500 if exc is not None else 200)
+        registry.inc('mentorship_http_requests_total',
+                     {'method': request.method, 'endpoint': endpoint, 'status': str(status)})
+        registry.maybe_flush()
+
+    @app.after_request
+    def remember_status(response):
+        request.environ['metrics.status'] = response.status_code
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+    return registry
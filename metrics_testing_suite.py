@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Prometheus Metrics Testing Suite
+Checks the /metrics exposition format, the request, query, pool, cache, job
+and table figures, and that several worker processes sharing METRICS_DIR
+add up correctly (including workers that have exited).
+
+Runs against a throwaway SQLite database (never mentorship.db).
+"""
+
+import multiprocessing
+import os
+import re
+import sys
+
+from suite_support import SuiteLogger, scratch_environment
+
+# Point the app at a scratch database before it is imported
+WORK_DIR = scratch_environment('metrics')
+
+import app as flask_app
+import metrics
+
+SAMPLE_LINE = re.compile(r'^([a-z_]+)(\{[^}]*\})? (-?[0-9.e+-]+|\+Inf)$')
+
+
+logger = SuiteLogger()
+client = flask_app.app.test_client()
+
+
+def seed_database():
+    with flask_app.app.app_context():
+        flask_app.db.drop_all()
+        flask_app.db.create_all()
+        for i in range(4):
+            flask_app.db.session.add(flask_app.Mentor(name=f'Mentor {i}', roll_call='12/7',
+                                                      subjects='English', max_mentees=3))
+        for i in range(7):
+            flask_app.db.session.add(flask_app.Mentee(name=f'Student {i}', roll_call='7A',
+                                                      subject='English', lessons_remaining=5))
+        flask_app.db.session.commit()
+
+
+def parse(text):
+    """{(name, labels): value} from the exposition format"""
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith('#') or not line:
+            continue
+        match = SAMPLE_LINE.match(line)
+        if match is None:
+            raise ValueError(f'bad sample line: {line!r}')
+        name, labels, value = match.groups()
+        samples[(name, labels or '')] = float('inf') if value == '+Inf' else float(value)
+    return samples
+
+
+def value(samples, name, **labels):
+    wanted = {f'{key}="{val}"' for key, val in labels.items()}
+    return sum(v for (n, l), v in samples.items() if n == name and wanted <= set(l.strip('{}').split(',')))
+
+
+def test_exposition():
+    for _ in range(3):
+        client.get('/mentors')
+    client.get('/api/statistics')
+    client.get('/api/statistics')
+    client.get('/no-such-page')
+    response = client.get('/metrics')
+    try:
+        samples = parse(response.get_data(as_text=True))
+        parsed = True
+    except ValueError as e:
+        samples, parsed = {}, str(e)
+    logger.log_result("/metrics is valid Prometheus text format",
+                      response.status_code == 200 and response.content_type.startswith('text/plain')
+                      and parsed is True and '# TYPE mentorship_http_requests_total counter' in response.get_data(as_text=True),
+                      f"{len(samples)} samples, content type {response.content_type}" if parsed is True else parsed)
+    return samples
+
+
+def test_request_metrics(samples):
+    mentors = value(samples, 'mentorship_http_requests_total', endpoint='mentors', status='200')
+    unmatched = value(samples, 'mentorship_http_requests_total', endpoint='unmatched', status='404')
+    logger.log_result("Requests are counted per endpoint and status", mentors == 3 and unmatched == 1,
+                      f"mentors={mentors}, unmatched 404={unmatched}")
+    buckets = [v for (n, l), v in samples.items()
+               if n == 'mentorship_http_request_duration_seconds_bucket' and 'endpoint="mentors"' in l]
+    count = value(samples, 'mentorship_http_request_duration_seconds_count', endpoint='mentors')
+    logger.log_result("Latency histogram buckets are cumulative and end at the count",
+                      len(buckets) == len(metrics.REQUEST_BUCKETS) + 1 and buckets == sorted(buckets)
+                      and buckets[-1] == count == 3, f"buckets={buckets}")
+    logger.log_result("The scrape itself is the only request in progress",
+                      value(samples, 'mentorship_http_requests_in_progress') == 1)
+
+
+def test_app_metrics(samples):
+    selects = value(samples, 'mentorship_db_query_duration_seconds_count', operation='SELECT')
+    logger.log_result("SQL statements are timed by operation", selects > 0, f"SELECT count={selects}")
+    logger.log_result("Connection pool figures are reported",
+                      value(samples, 'mentorship_db_pool_size', pool='primary') > 0
+                      and ('mentorship_db_pool_checkouts_total', '{pool="primary",school="default"}') in samples)
+    ratio = value(samples, 'mentorship_cache_hit_ratio', school='default')
+    logger.log_result("Cache hit ratio covers the statistics cache", ratio == 0.5, f"hit ratio={ratio}")
+    logger.log_result("Job queue depth is reported for every state",
+                      ('mentorship_jobs', '{status="queued"}') in samples
+                      and ('mentorship_jobs', '{status="running"}') in samples)
+    rows = (value(samples, 'mentorship_table_rows', table='mentor'), value(samples, 'mentorship_table_rows', table='mentee'))
+    logger.log_result("Row counts are reported per table", rows == (4, 7), f"mentor, mentee = {rows}")
+
+
+def worker_process(directory, requests):
+    """Stand-in for a gunicorn worker: serve some requests, flush, exit"""
+    registry = metrics.Registry(directory)
+    for _ in range(requests):
+        registry.inc('mentorship_http_requests_total', {'method': 'GET', 'endpoint': 'mentors', 'status': '200'})
+        registry.observe('mentorship_http_request_duration_seconds', 0.02, {'method': 'GET', 'endpoint': 'mentors'})
+    registry.inc('mentorship_http_requests_in_progress', amount=5)
+    registry.flush()
+
+
+def test_multiprocess():
+    directory = os.path.join(WORK_DIR, 'shared')
+    registry = metrics.Registry(directory)
+    registry.inc('mentorship_http_requests_total', {'method': 'GET', 'endpoint': 'mentors', 'status': '200'}, 2)
+    registry.inc('mentorship_http_requests_in_progress')
+
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=worker_process, args=(directory, n)) for n in (3, 4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    samples = parse(registry.render())
+    total = value(samples, 'mentorship_http_requests_total', endpoint='mentors')
+    observed = value(samples, 'mentorship_http_request_duration_seconds_count', endpoint='mentors')
+    logger.log_result("Counters from every worker add up, including exited ones", total == 9 and observed == 7,
+                      f"requests={total}, histogram count={observed}")
+    logger.log_result("Gauges only count live workers",
+                      value(samples, 'mentorship_http_requests_in_progress') == 1)
+    files = sorted(os.listdir(directory))
+    again = value(parse(registry.render()), 'mentorship_http_requests_total', endpoint='mentors')
+    logger.log_result("Exited workers are folded into the archive exactly once",
+                      'archive.json' in files and again == 9, f"files={files}, second scrape={again}")
+
+
+def main():
+    logger.log_header("PROMETHEUS METRICS TESTS")
+    print(f"📂 Scratch database: {os.environ['DATABASE_URL']}")
+    seed_database()
+    flask_app.cache.clear()
+
+    samples = test_exposition()
+    test_request_metrics(samples)
+    test_app_metrics(samples)
+    test_multiprocess()
+
+    return logger.finish("metrics are correct", "metrics are off")
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,945 @@
+#!/usr/bin/env python3
+"""
+Performance Benchmarks for the Enterprise Mentorship Management System
+
+Each benchmark seeds a throwaway SQLite database (never mentorship.db),
+drives the app through the Flask test client and prints a results table.
+
+Usage:
+    python performance_benchmark.py <benchmark> [--mentors N] [--mentees N] [--sessions N] [--repeat N]
+    python performance_benchmark.py --list
+"""
+
+import argparse
+import asyncio
+import contextlib
+import http.client
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, time as dtime, timedelta
+
+# Add the current directory to the path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+BENCHMARKS = {}
+
+SEED_SUBJECTS = ['English', 'Mathematics', 'Science', 'History', 'Geography', 'Music', 'Drama', 'Chemistry']
+SEED_ROLL_CALLS = ['7A', '8B', '9C', '10/1', '11/2', '12/7', '12ENG1', '11MAT2']
+SESSION_STATUSES = ['scheduled', 'completed', 'cancelled']
+
+
+def benchmark(name, description):
+    """Register a benchmark function under a command-line name"""
+    def register(func):
+        BENCHMARKS[name] = (func, description)
+        return func
+    return register
+
+
+def print_header(title):
+    print("\n" + "="*78)
+    print(f"📈 {title}")
+    print("="*78)
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) if rows else len(str(h))
+              for i, h in enumerate(headers)]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(row, widths)))
+
+
+def timed(func, repeat):
+    """Run func repeat times, returning (median seconds, last result)"""
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def load_app(database_path=None, database_url=None, **env):
+    """Import app.py against a scratch database and create its tables
+
+    With database_url (e.g. a local PostgreSQL) the tables are dropped and
+    recreated, so only ever point it at a throwaway database.
+    """
+    if database_url is None:
+        if database_path is None:
+            database_path = os.path.join(tempfile.mkdtemp(prefix='mentorship-bench-'), 'bench.db')
+        database_url = f'sqlite:///{database_path}'
+        os.environ.setdefault('CACHE_DIR', os.path.dirname(database_path))
+    else:
+        os.environ.setdefault('CACHE_DIR', tempfile.mkdtemp(prefix='mentorship-bench-'))
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('JOBS_DB', os.path.join(os.environ['CACHE_DIR'], 'jobs.sqlite3'))
+    os.environ.update({key: str(value) for key, value in env.items()})
+    import app as app_module
+    if database_path is None:
+        with app_module.app.app_context():
+            app_module.db.drop_all()
+    app_module.init_db()
+    return app_module
+
+
+def seed_database(app_module, mentors=40, mentees=400, sessions=2000, seed=42):
+    """Fill the database with a realistic spread of mentors, mentees and sessions"""
+    rng = random.Random(seed)
+    Mentor, Mentee, Session, db = app_module.Mentor, app_module.Mentee, app_module.Session, app_module.db
+
+    with app_module.app.app_context():
+        mentor_rows = []
+        for i in range(mentors):
+            mentor_rows.append(Mentor(
+                name=f'Mentor {i}',
+                roll_call=rng.choice(SEED_ROLL_CALLS),
+                subjects=', '.join(rng.sample(SEED_SUBJECTS, 3)),
+                max_mentees=rng.randint(3, 12)
+            ))
+        db.session.add_all(mentor_rows)
+        db.session.flush()
+
+        mentee_rows = []
+        for i in range(mentees):
+            mentor = rng.choice(mentor_rows) if rng.random() < 0.7 else None
+            mentee_rows.append(Mentee(
+                name=f'Student {i}',
+                roll_call=rng.choice(SEED_ROLL_CALLS),
+                subject=rng.choice(mentor.get_subjects_list()) if mentor else rng.choice(SEED_SUBJECTS),
+                lessons_remaining=rng.randint(0, 7),
+                mentor_id=mentor.id if mentor else None
+            ))
+        db.session.add_all(mentee_rows)
+        db.session.flush()
+
+        start_day = date.today() - timedelta(days=180)
+        session_rows = []
+        for _ in range(sessions):
+            mentee = rng.choice(mentee_rows)
+            mentor_id = mentee.mentor_id or rng.choice(mentor_rows).id
+            start = dtime(hour=rng.randint(8, 15), minute=rng.choice([0, 15, 30, 45]))
+            session_rows.append(Session(
+                mentor_id=mentor_id,
+                mentee_id=mentee.id,
+                date=start_day + timedelta(days=rng.randint(0, 240)),
+                start_time=start,
+                end_time=(datetime.combine(date.today(), start) + timedelta(minutes=45)).time(),
+                duration_minutes=45,
+                subject=mentee.subject,
+                status=rng.choice(SESSION_STATUSES)
+            ))
+        db.session.add_all(session_rows)
+        db.session.commit()
+    return {'mentors': mentors, 'mentees': mentees, 'sessions': sessions}
+
+
+# Routes exercised by the per-route benchmarks
+READ_ROUTES = [
+    '/',
+    '/mentors',
+    '/mentees',
+    '/calendar',
+    '/statistics',
+    '/schedule_session',
+    '/assign_mentor',
+    '/api/sessions',
+    '/api/statistics',
+    '/export_data/sessions',
+]
+
+
+@benchmark('compression', 'Bytes on the wire and transfer time with and without compression, per route')
+def bench_compression(args):
+    app_module = load_app()
+    seed_database(app_module, args.mentors, args.mentees, args.sessions)
+    app = app_module.app
+    client = app.test_client()
+    bandwidth = args.bandwidth_mbit * 1_000_000 / 8  # bytes per second
+
+    import compression
+    encodings = ['gzip'] if compression.brotli is None else ['gzip', 'br']
+
+    print_header(f"Response compression (link: {args.bandwidth_mbit} Mbit/s)")
+    if compression.brotli is None:
+        print("⚠️  brotli is not installed; skipping the br case (pip install brotli)")
+    rows = []
+    for route in READ_ROUTES:
+        app_module.cache.clear()
+        server_plain, plain = timed(lambda: client.get(route, headers={'Accept-Encoding': 'identity'}), args.repeat)
+        raw_bytes = len(plain.get_data())
+        total_plain = server_plain + raw_bytes / bandwidth
+        for encoding in encodings:
+            server_encoded, encoded = timed(lambda: client.get(route, headers={'Accept-Encoding': encoding}),
+                                            args.repeat)
+            wire_bytes = len(encoded.get_data())
+            total_encoded = server_encoded + wire_bytes / bandwidth
+            rows.append([
+                route,
+                encoding,
+                raw_bytes,
+                wire_bytes,
+                f"{(1 - wire_bytes / raw_bytes) * 100:.1f}%" if raw_bytes else '-',
+                f"{server_plain * 1000:.1f}",
+                f"{server_encoded * 1000:.1f}",
+                f"{total_plain * 1000:.1f}",
+                f"{total_encoded * 1000:.1f}",
+            ])
+    print_table(['route', 'enc', 'raw B', 'enc B', 'saved', 'srv ms', 'srv+enc ms', 'total ms', 'total+enc ms'],
+                rows)
+    print("\n'total' = median server time + body size / link bandwidth")
+
+
+TEMPLATE_ROUTES = ['/', '/calendar', '/statistics', '/schedule_session', '/user_guide']
+LARGE_TEMPLATES = ['calendar.html', 'statistics.html', 'schedule_session.html', 'dashboard.html', 'base.html']
+
+
+@benchmark('_template_probe', 'Internal: time boot, template loads and first/warm requests in a fresh process')
+def bench_template_probe(args):
+    boot_start = time.perf_counter()
+    import app as app_module
+    boot = time.perf_counter() - boot_start
+    result = {'boot_ms': boot * 1000, 'templates': {}, 'routes': {}}
+
+    if os.environ.get('BENCH_PROBE') == 'templates':
+        # Template load time in isolation: compile (or bytecode load) on a cold worker
+        for name in LARGE_TEMPLATES:
+            elapsed, _ = timed(lambda: app_module.app.jinja_env.get_template(name), 1)
+            result['templates'][name] = elapsed * 1000
+        print(json.dumps(result))
+        return
+
+    client = app_module.app.test_client()
+    client.get('/user_guide')  # open the first DB connection outside the timings
+    for route in TEMPLATE_ROUTES:
+        first, _ = timed(lambda: client.get(route), 1)
+        warm, _ = timed(lambda: client.get(route), max(1, args.repeat))
+        result['routes'][route] = {'first_ms': first * 1000, 'warm_ms': warm * 1000}
+    print(json.dumps(result))
+
+
+@benchmark('templates', 'Cold first-request latency per worker with and without bytecode cache and warm-up')
+def bench_templates(args):
+    workdir = tempfile.mkdtemp(prefix='mentorship-bench-')
+    database_path = os.path.join(workdir, 'bench.db')
+    app_module = load_app(database_path, TEMPLATE_WARMUP='False')
+    seed_database(app_module, args.mentors, args.mentees, args.sessions)
+    bytecode_dir = os.path.join(workdir, 'jinja_cache')
+
+    def run_probe(kind, env):
+        child_env = dict(os.environ, DATABASE_URL=f'sqlite:///{database_path}', CACHE_DIR=workdir,
+                         BENCH_PROBE=kind, **env)
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '_template_probe', '--repeat', str(args.repeat)],
+            env=child_env, capture_output=True, text=True, check=True
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def probe(**env):
+        result = run_probe('templates', env)
+        result['routes'] = run_probe('requests', env)['routes']
+        return result
+
+    shutil.rmtree(bytecode_dir, ignore_errors=True)
+    scenarios = [
+        ('lazy compile (old behaviour)', probe(TEMPLATE_WARMUP='False', TEMPLATE_CACHE_DIR='')),
+        ('lazy, populated bytecode cache', None),
+        ('warm-up at boot', None),
+    ]
+    # The first lazy run with a cache dir populates it for the second scenario
+    probe(TEMPLATE_WARMUP='False', TEMPLATE_CACHE_DIR=bytecode_dir)
+    scenarios[1] = (scenarios[1][0], probe(TEMPLATE_WARMUP='False', TEMPLATE_CACHE_DIR=bytecode_dir))
+    scenarios[2] = (scenarios[2][0], probe(TEMPLATE_WARMUP='True', TEMPLATE_CACHE_DIR=bytecode_dir))
+
+    print_header("Template load time on a fresh worker (ms)")
+    print_table(['template'] + [label for label, _ in scenarios],
+                [[name] + [f"{result['templates'][name]:.2f}" for _, result in scenarios] for name in LARGE_TEMPLATES])
+
+    print_header("First request vs warm request on a fresh worker (ms)")
+    rows = []
+    for label, result in scenarios:
+        for route, timing in result['routes'].items():
+            rows.append([label, route, f"{timing['first_ms']:.1f}", f"{timing['warm_ms']:.1f}",
+                         f"{timing['first_ms'] - timing['warm_ms']:+.1f}"])
+    print_table(['scenario', 'route', 'first', 'warm', 'cold penalty'], rows)
+    print("\nAny remaining penalty on '/' is SQLAlchemy compiling its first statements, not Jinja.\n")
+    print_table(['scenario', 'worker boot ms'], [[label, f"{r['boot_ms']:.1f}"] for label, r in scenarios])
+
+
+def run_probe(name, args, env, extra_args=()):
+    """Run a benchmark probe in a fresh interpreter and return its JSON result"""
+    child_env = dict(os.environ, **{key: str(value) for key, value in env.items()})
+    command = [sys.executable, os.path.abspath(__file__), name,
+               '--repeat', str(args.repeat), '--mentors', str(args.mentors),
+               '--mentees', str(args.mentees), '--sessions', str(args.sessions),
+               '--writers', str(args.writers), '--readers', str(args.readers),
+               '--writes', str(args.writes), *extra_args]
+    output = subprocess.run(command, env=child_env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@benchmark('_sqlite_probe', 'Internal: concurrent writers and readers against one SQLite file')
+def bench_sqlite_probe(args):
+    from sqlalchemy.exc import OperationalError
+
+    app_module = load_app(os.environ['BENCH_DATABASE'])
+    seed_database(app_module, args.mentors, args.mentees, args.sessions)
+    app, db = app_module.app, app_module.db
+    Mentee, Session = app_module.Mentee, app_module.Session
+
+    lock = threading.Lock()
+    committed = [0]
+    lock_errors = [0]
+    read_samples = []
+    writers_done = threading.Event()
+
+    def writer(worker):
+        for i in range(args.writes):
+            with app.app_context():
+                db.session.add(Mentee(name=f'Writer {worker}-{i}', roll_call='7A', subject='English', lessons_remaining=5))
+                try:
+                    db.session.commit()
+                    with lock:
+                        committed[0] += 1
+                except OperationalError:
+                    db.session.rollback()
+                    with lock:
+                        lock_errors[0] += 1
+
+    def reader():
+        while not writers_done.is_set():
+            with app.app_context():
+                start = time.perf_counter()
+                Session.query.filter_by(status='completed').count()
+                Mentee.query.filter(Mentee.mentor_id.isnot(None)).limit(50).all()
+                elapsed = time.perf_counter() - start
+            with lock:
+                read_samples.append(elapsed)
+
+    writers = [threading.Thread(target=writer, args=(n,)) for n in range(args.writers)]
+    readers = [threading.Thread(target=reader) for _ in range(args.readers)]
+    start = time.perf_counter()
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    writers_done.set()
+    for thread in readers:
+        thread.join()
+
+    print(json.dumps({
+        'commits_per_sec': committed[0] / elapsed,
+        'committed': committed[0],
+        'lock_errors': lock_errors[0],
+        'reads': len(read_samples),
+        'read_p50_ms': percentile(read_samples, 50) * 1000,
+        'read_p99_ms': percentile(read_samples, 99) * 1000,
+    }))
+
+
+@benchmark('_routing_probe', 'Internal: POST writers and heavy GET readers through the Flask app')
+def bench_routing_probe(args):
+    app_module = load_app(os.environ['BENCH_DATABASE'])
+    seed_database(app_module, args.mentors, args.mentees, args.sessions)
+    app, db = app_module.app, app_module.db
+
+    lock = threading.Lock()
+    write_samples, read_samples, errors = [], [], [0]
+    writers_done = threading.Event()
+
+    def writer(worker):
+        client = app.test_client()
+        for i in range(args.writes):
+            start = time.perf_counter()
+            response = client.post('/add_mentee', data={'name': f'Writer {worker}-{i}', 'roll_call': '7A',
+                                                        'subject': 'English'})
+            elapsed = time.perf_counter() - start
+            with lock:
+                write_samples.append(elapsed)
+                errors[0] += response.status_code >= 500
+
+    def reader():
+        client = app.test_client()
+        while not writers_done.is_set():
+            for route in ('/statistics', '/calendar', '/export_data/sessions'):
+                start = time.perf_counter()
+                response = client.get(route)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    read_samples.append(elapsed)
+                    errors[0] += response.status_code >= 500
+
+    writers = [threading.Thread(target=writer, args=(n,)) for n in range(args.writers)]
+    readers = [threading.Thread(target=reader) for _ in range(args.readers)]
+    start = time.perf_counter()
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    writers_done.set()
+    for thread in readers:
+        thread.join()
+
+    with app.app_context():
+        primary = app_module.pool_stats(db.engine)
+    print(json.dumps({
+        'writes_per_sec': len(write_samples) / elapsed,
+        'write_p50_ms': percentile(write_samples, 50) * 1000,
+        'write_p99_ms': percentile(write_samples, 99) * 1000,
+        'reads': len(read_samples),
+        'read_p50_ms': percentile(read_samples, 50) * 1000,
+        'primary_wait_max_ms': primary.get('wait_max_ms', 0),
+        'primary_peak': primary.get('peak_checked_out', 0),
+        'errors': errors[0],
+    }))
+
+
+@benchmark('routing', 'POST latency while heavy GETs run, with read/write routing off and on')
+def bench_routing(args):
+    rows = []
+    for label, enabled in [('single engine', 'False'), ('read/write routing', 'True')]:
+        workdir = tempfile.mkdtemp(prefix='mentorship-bench-')
+        result = run_probe('_routing_probe', args, {
+            'BENCH_DATABASE': os.path.join(workdir, 'bench.db'),
+            'CACHE_DIR': workdir,
+            'DB_READ_ROUTING': enabled,
+            # A tight production-sized pool budget makes contention visible
+            'DB_POOL_SIZE': str(args.pool_size),
+            'DB_MAX_OVERFLOW': '0',
+            'TEMPLATE_WARMUP': 'True',
+        })
+        rows.append([label, f"{result['writes_per_sec']:.1f}", f"{result['write_p50_ms']:.1f}",
+                     f"{result['write_p99_ms']:.1f}", result['reads'], f"{result['read_p50_ms']:.1f}",
+                     result['primary_peak'], f"{result['primary_wait_max_ms']:.1f}", result['errors']])
+
+    print_header(f"Read/write routing: {args.writers} POST writers x {args.writes}, {args.readers} heavy GET readers, "
+                 f"pool {args.pool_size}")
+    print_table(['mode', 'writes/s', 'write p50 ms', 'write p99 ms', 'reads', 'read p50 ms',
+                 'primary peak', 'primary wait max ms', '5xx'], rows)
+
+
+@benchmark('sqlite', 'Write throughput and read latency with the SQLite profile on and off')
+def bench_sqlite(args):
+    rows = []
+    for label, enabled in [('SQLite defaults', 'False'), ('performance profile', 'True')]:
+        workdir = tempfile.mkdtemp(prefix='mentorship-bench-')
+        result = run_probe('_sqlite_probe', args, {
+            'BENCH_DATABASE': os.path.join(workdir, 'bench.db'),
+            'CACHE_DIR': workdir,
+            'SQLITE_PROFILE': enabled,
+            'TEMPLATE_WARMUP': 'False',
+        })
+        rows.append([label, f"{result['commits_per_sec']:.0f}", result['committed'], result['lock_errors'],
+                     result['reads'], f"{result['read_p50_ms']:.2f}", f"{result['read_p99_ms']:.2f}"])
+
+    print_header(f"SQLite profile: {args.writers} writers x {args.writes} commits, {args.readers} concurrent readers")
+    print_table(['mode', 'commits/s', 'committed', 'locked', 'reads', 'read p50 ms', 'read p99 ms'], rows)
+
+
+POOL_PROFILES = [
+    ('SQLAlchemy defaults', {'DB_POOL_SIZE': 5, 'DB_MAX_OVERFLOW': 10, 'DB_POOL_PRE_PING': 'False', 'DB_POOL_RECYCLE': -1}),
+    ('production profile', {}),
+]
+
+
+@benchmark('_pool_probe', 'Internal: request latency and pool wait at increasing concurrency')
+def bench_pool_probe(args):
+    app_module = load_app(database_url=os.environ['BENCH_DATABASE_URL'])
+    seed_database(app_module, args.mentors, args.mentees, args.sessions)
+    app = app_module.app
+    from database_profiles import pool_stats
+
+    results = []
+    for concurrency in args.concurrency:
+        with app.app_context():
+            app_module.db.engine.dispose()
+        latencies = []
+        lock = threading.Lock()
+
+        def worker():
+            client = app.test_client()
+            local = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                client.get('/api/sessions')
+                local.append(time.perf_counter() - start)
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        with app.app_context():
+            stats = pool_stats(app_module.db.engine)
+        results.append({
+            'concurrency': concurrency,
+            'rps': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'wait_avg_ms': stats.get('wait_avg_ms', 0.0),
+            'wait_max_ms': stats.get('wait_max_ms', 0.0),
+            'peak_checked_out': stats.get('peak_checked_out', 0),
+            'timeouts': stats.get('checkout_timeouts', 0),
+        })
+    print(json.dumps(results))
+
+
+@benchmark('pool', 'Load test: p99 latency and pool wait as concurrency grows (use --database-url for PostgreSQL)')
+def bench_pool(args):
+    database_url = args.database_url
+    if not database_url:
+        workdir = tempfile.mkdtemp(prefix='mentorship-bench-')
+        database_url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        print("⚠️  No --database-url given; running against SQLite. "
+              "Pass a scratch PostgreSQL URL to load test the production profile.")
+
+    rows = []
+    for label, env in POOL_PROFILES:
+        results = run_probe('_pool_probe', args, dict(env, BENCH_DATABASE_URL=database_url, TEMPLATE_WARMUP='False'),
+                            ['--concurrency', *map(str, args.concurrency)])
+        for result in results:
+            rows.append([label, result['concurrency'], f"{result['rps']:.0f}", f"{result['p50_ms']:.1f}",
+                         f"{result['p99_ms']:.1f}", f"{result['wait_avg_ms']:.2f}", f"{result['wait_max_ms']:.1f}",
+                         result['peak_checked_out'], result['timeouts']])
+
+    print_header(f"Connection pool under load: GET /api/sessions x {args.repeat} per client")
+    print_table(['profile', 'clients', 'req/s', 'p50 ms', 'p99 ms', 'wait avg ms', 'wait max ms', 'peak conns',
+                 'timeouts'], rows)
+
+
+@benchmark('jobs', 'Request latency of heavy operations run in the request vs as background jobs')
+def bench_jobs(args):
+    app_module = load_app()
+    seed_database(app_module, args.mentors, args.mentees, args.sessions)
+    app, Mentee, db = app_module.app, app_module.Mentee, app_module.db
+    client = app.test_client()
+
+    def unassign_all():
+        with app.app_context():
+            Mentee.query.update({Mentee.mentor_id: None})
+            db.session.commit()
+
+    operations = [
+        ('auto-assign', unassign_all,
+         lambda: client.post('/bulk_assign_mentors', data={'action': 'auto_assign'})),
+        ('export sessions', lambda: None,
+         lambda: client.get('/export_data/sessions')),
+    ]
+    rows = []
+    for label, reset, request_fn in operations:
+        for mode in ['inline', 'thread']:
+            app.config['JOBS_MODE'] = mode
+            # Inline mode keeps exports in the request, as before background jobs
+            app.config['EXPORT_BACKGROUND_ROWS'] = 10 ** 9 if mode == 'inline' else 0
+            reset()
+            start = time.perf_counter()
+            response = request_fn()
+            responded = time.perf_counter() - start
+            location = response.headers.get('Location', '')
+            if '/jobs/' in location:
+                app_module.job_queue.wait(location.split('/jobs/')[1].split('?')[0], timeout=300)
+            done = time.perf_counter() - start
+            rows.append([label, 'in request' if mode == 'inline' else 'background job',
+                         f"{responded * 1000:.1f}", f"{done * 1000:.1f}"])
+    app_module.job_runner.stop()
+
+    print_header(f"Heavy operations ({args.mentees} mentees, {args.sessions} sessions)")
+    print_table(['operation', 'runs', 'response ms', 'finished ms'], rows)
+    print("\n'response' is how long a web worker is tied up; 'finished' is when the work is done")
+
+
+@benchmark('_queries_probe', 'Internal: per-route query counts and latency in a fresh process')
+def bench_queries_probe(args):
+    app_module = load_app(TEMPLATE_WARMUP='False', QUERY_STATS_LOG='False')
+    seed_database(app_module, args.mentors, args.mentees, args.sessions)
+    app_module.app.config['EXPORT_BACKGROUND_ROWS'] = 10 ** 9
+    client = app_module.app.test_client()
+    result = {}
+    for route in READ_ROUTES:
+        client.get(route)
+        # Fastest run: the overhead is small next to scheduling noise
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            response = client.get(route)
+            samples.append(time.perf_counter() - start)
+        result[route] = {'ms': min(samples) * 1000, 'queries': response.headers.get('X-Query-Count')}
+
+    # Cost per statement, away from template rendering noise
+    import query_stats
+    from sqlalchemy import text
+    with app_module.app.app_context():
+        conn = app_module.db.engine.connect()
+        query_stats.start()
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for _ in range(2000):
+                conn.execute(text('SELECT 1'))
+            samples.append((time.perf_counter() - start) / 2000)
+        query_stats.stop()
+        conn.close()
+    result['per_query_us'] = min(samples) * 1e6
+    print(json.dumps(result))
+
+
+@benchmark('queries', 'SQL queries per route, and the cost of counting them')
+def bench_queries(args):
+    runs = {}
+    for label, enabled in [('off', 'False'), ('on', 'True')]:
+        workdir = tempfile.mkdtemp(prefix='mentorship-bench-')
+        runs[label] = run_probe('_queries_probe', args, {'CACHE_DIR': workdir, 'QUERY_STATS_ENABLED': enabled})
+    rows = []
+    for route in READ_ROUTES:
+        off, on = runs['off'][route]['ms'], runs['on'][route]['ms']
+        rows.append([route, runs['on'][route]['queries'], f"{off:.1f}", f"{on:.1f}", f"{(on - off) / off * 100:+.1f}%"])
+
+    print_header(f"Query instrumentation ({args.mentees} mentees, {args.sessions} sessions)")
+    print_table(['route', 'queries', 'off ms', 'on ms', 'overhead'], rows)
+    print(f"\nSELECT 1: {runs['off']['per_query_us']:.1f}us per statement off, {runs['on']['per_query_us']:.1f}us on")
+    print("Fastest of --repeat runs per route; 'on' adds Server-Timing and X-Query-Count")
+
+SERVER_ROUTES = ['/api/statistics', '/', '/mentees']
+
+
+def generate_history(database_path, mentors, mentees, sessions, seed=42):
+    """Bulk-load a large synthetic history straight through sqlite3"""
+    import sqlite3
+    rng = random.Random(seed)
+    conn = sqlite3.connect(database_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    now = datetime.now().isoformat(sep=' ')
+    conn.executemany(
+        'INSERT INTO mentor (name, roll_call, subjects, max_mentees, created_at) VALUES (?, ?, ?, ?, ?)',
+        ((f'Mentor {i}', rng.choice(SEED_ROLL_CALLS), ', '.join(rng.sample(SEED_SUBJECTS, 3)), 12, now)
+         for i in range(mentors)))
+    conn.executemany(
+        'INSERT INTO mentee (name, roll_call, subject, lessons_remaining, mentor_id, created_at, version) '
+        'VALUES (?, ?, ?, ?, ?, ?, 1)',
+        ((f'Student {i}', rng.choice(SEED_ROLL_CALLS), rng.choice(SEED_SUBJECTS), 5, rng.randint(1, mentors), now)
+         for i in range(mentees)))
+    statuses = ['scheduled', 'completed', 'completed', 'canceled', 'missed']
+    start = date.today() - timedelta(days=5 * 365)
+    days = [(start + timedelta(days=d)).isoformat() for d in range(5 * 365)]
+    conn.executemany(
+        'INSERT INTO session (mentor_id, mentee_id, date, start_time, end_time, duration_minutes, subject, '
+        'status, created_at, version) VALUES (?, ?, ?, \'12:30:00.000000\', \'13:15:00.000000\', 45, ?, ?, ?, 1)',
+        ((rng.randint(1, mentors), rng.randint(1, mentees), rng.choice(days), rng.choice(SEED_SUBJECTS),
+          rng.choice(statuses), now) for _ in range(sessions)))
+    conn.commit()
+    conn.close()
+
+
+@benchmark('analytics', 'Statistics aggregation over a large synthetic history with 1..N worker processes')
+def bench_analytics(args):
+    from analytics import compute_statistics
+
+    workdir = tempfile.mkdtemp(prefix='mentorship-bench-')
+    path = os.path.join(workdir, 'history.db')
+    app_module = load_app(path, TEMPLATE_WARMUP='False')
+    print(f"⏳ Generating {args.history:,} sessions and {args.history // 25:,} mentees...")
+    start = time.perf_counter()
+    generate_history(path, args.mentors, args.history // 25, args.history)
+    print(f"   done in {time.perf_counter() - start:.1f}s")
+
+    url = f'sqlite:///{path}'
+    rows = []
+    baseline = baseline_seconds = None
+    with app_module.app.app_context():
+        conn = app_module.db.session.connection()
+        for workers in args.workers:
+            start = time.perf_counter()
+            result = compute_statistics(conn, url, workers=workers, min_parallel_rows=0)
+            elapsed = time.perf_counter() - start
+            if baseline is None:
+                baseline, baseline_seconds = result, elapsed
+            rows.append([workers, f"{elapsed:.2f}", f"{baseline_seconds / elapsed:.2f}x",
+                         '✅' if result == baseline else '❌'])
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    print_header(f"Statistics aggregation: {args.history:,} sessions, {os.cpu_count()} CPU core(s)")
+    print_table(['workers', 'seconds', 'speedup', 'identical to 1 worker'], rows)
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/api/subjects')
+            connection.getresponse().read()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+@contextlib.contextmanager
+def running_server(command, port, env):
+    """Start a server process from the repo root; yields None if it never listens"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    process = subprocess.Popen(command, cwd=root, env=dict(env, PORT=str(port), HOST='127.0.0.1'),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        yield process if wait_for_port(port) else None
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def process_tree_threads(pid):
+    """Total OS threads in a process and all of its descendants (Linux /proc)"""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+            except OSError:
+                continue
+    tree, frontier = {pid}, [pid]
+    while frontier:
+        parent = frontier.pop()
+        children = [child for child, ppid in parents.items() if ppid == parent]
+        tree.update(children)
+        frontier.extend(children)
+    return sum(len(os.listdir(f'/proc/{p}/task')) for p in tree if os.path.exists(f'/proc/{p}/task'))
+
+
+async def _async_client(port, route, deadline, latencies, errors):
+    request_bytes = f'GET {route} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: keep-alive\r\n\r\n'.encode()
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            start = time.perf_counter()
+            writer.write(request_bytes)
+            head = await reader.readuntil(b'\r\n\r\n')
+            headers = {}
+            for line in head.decode('latin-1').split('\r\n')[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            await reader.readexactly(int(headers.get('content-length', 0)))
+            if int(head.split(b' ', 2)[1]) >= 500:
+                raise OSError('server error')
+            latencies.append(time.perf_counter() - start)
+            if headers.get('connection', '').lower() == 'close':
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            errors.append(1)
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.05)
+    if writer is not None:
+        writer.close()
+
+
+def async_http_load(port, route, connections, duration, server_pid=None):
+    """Hold `connections` concurrent keep-alive connections open against one route
+
+    Returns (req/s, latencies, errors, peak server threads).
+    """
+    latencies, errors, peak_threads = [], [], [0]
+    stop = threading.Event()
+
+    def sample_threads():
+        while server_pid and not stop.is_set():
+            peak_threads[0] = max(peak_threads[0], process_tree_threads(server_pid))
+            stop.wait(0.5)
+
+    sampler = threading.Thread(target=sample_threads)
+    sampler.start()
+
+    async def run():
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*[_async_client(port, route, deadline, latencies, errors) for _ in range(connections)])
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    stop.set()
+    sampler.join()
+    return len(latencies) / elapsed, latencies, len(errors), peak_threads[0]
+
+
+def http_load(port, route, clients, duration):
+    """Hammer one route from keep-alive client threads; return (req/s, latencies)"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                connection.request('GET', route, headers={'Accept-Encoding': 'gzip'})
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 500:
+                    raise OSError(response.status)
+                if response.getheader('Connection', '').lower() == 'close':
+                    connection.close()
+            except (OSError, http.client.HTTPException):
+                with lock:
+                    errors[0] += 1
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(latencies) / (time.perf_counter() - start), latencies, errors[0]
+
+
+@benchmark('server', 'Requests per second: Werkzeug dev server vs gunicorn with gunicorn.conf.py')
+def bench_server(args):
+    workdir = tempfile.mkdtemp(prefix='mentorship-bench-')
+    database_path = os.path.join(workdir, 'bench.db')
+    app_module = load_app(database_path, TEMPLATE_WARMUP='False')
+    seed_database(app_module, args.mentors, args.mentees, args.sessions)
+    root = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database_path}', CACHE_DIR=workdir,
+               JOBS_DB=os.path.join(workdir, 'jobs.sqlite3'), GUNICORN_ACCESS_LOG='/dev/null', PYTHONUNBUFFERED='1')
+
+    servers = [
+        ('dev server (threaded)', [sys.executable, '-c',
+            'import os; from app import app; app.run(host="127.0.0.1", port=int(os.environ["PORT"]), threaded=True)']),
+        ('gunicorn.conf.py', [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app']),
+    ]
+    rows = []
+    for index, (label, command) in enumerate(servers):
+        port = args.port + index
+        with running_server(command, port, env) as process:
+            if process is None:
+                print(f"❌ {label} did not start on port {port}")
+                continue
+            for route in SERVER_ROUTES:
+                http_load(port, route, args.clients, 1)  # warm every worker
+                rps, latencies, errors = http_load(port, route, args.clients, args.duration)
+                rows.append([label, route, f"{rps:.0f}", f"{percentile(latencies, 50) * 1000:.1f}",
+                             f"{percentile(latencies, 99) * 1000:.1f}", errors])
+
+    print_header(f"HTTP throughput: {args.clients} keep-alive clients x {args.duration}s per route "
+                 f"({os.cpu_count()} CPUs)")
+    print_table(['server', 'route', 'req/s', 'p50 ms', 'p99 ms', 'errors'], rows)
+
+
+ASYNC_ROUTES = ['/api/sessions', '/api/statistics', '/search_subjects?q=math']
+
+
+@benchmark('asgi', 'Polling endpoints under many concurrent connections: sync Flask vs the async ASGI tier')
+def bench_asgi(args):
+    workdir = tempfile.mkdtemp(prefix='mentorship-bench-')
+    database_path = os.path.join(workdir, 'bench.db')
+    app_module = load_app(database_path, TEMPLATE_WARMUP='False')
+    seed_database(app_module, args.mentors, args.mentees, args.sessions)
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database_path}', CACHE_DIR=workdir,
+               JOBS_DB=os.path.join(workdir, 'jobs.sqlite3'), GUNICORN_ACCESS_LOG='/dev/null',
+               PYTHONUNBUFFERED='1')
+
+    servers = [
+        ('flask dev server', [sys.executable, '-c',
+            'import os; from app import app; app.run(host="127.0.0.1", port=int(os.environ["PORT"]), threaded=True)']),
+        ('gunicorn (sync)', [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app']),
+        ('uvicorn asgi:app', [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1',
+                              '--port', str(args.port + 2), '--no-access-log', '--log-level', 'warning']),
+    ]
+    rows = []
+    for index, (label, command) in enumerate(servers):
+        port = args.port + index
+        with running_server(command, port, env) as process:
+            if process is None:
+                print(f"❌ {label} did not start on port {port}")
+                continue
+            for route in ASYNC_ROUTES:
+                async_http_load(port, route, 20, 1)  # warm up
+                rps, latencies, errors, threads = async_http_load(port, route, args.connections, args.duration,
+                                                                  process.pid)
+                rows.append([label, route, f"{rps:.0f}", f"{percentile(latencies, 50) * 1000:.0f}",
+                             f"{percentile(latencies, 99) * 1000:.0f}", errors, threads])
+
+    print_header(f"Polling endpoints: {args.connections} concurrent connections x {args.duration}s per route "
+                 f"({args.sessions} sessions, {os.cpu_count()} CPUs)")
+    print_table(['server', 'route', 'req/s', 'p50 ms', 'p99 ms', 'errors', 'threads'], rows)
+    print("\n'threads' = peak OS threads across the server's processes during the run")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mentorship System performance benchmarks')
+    parser.add_argument('benchmark', nargs='?', choices=sorted(BENCHMARKS))
+    parser.add_argument('--list', action='store_true', help='list available benchmarks')
+    parser.add_argument('--mentors', type=int, default=40)
+    parser.add_argument('--mentees', type=int, default=400)
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--writers', type=int, default=4, help='concurrent writer threads')
+    parser.add_argument('--readers', type=int, default=4, help='concurrent reader threads')
+    parser.add_argument('--writes', type=int, default=200, help='commits per writer thread')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[8, 16, 32, 64, 128],
+                        help='client counts for the pool load test')
+    parser.add_argument('--database-url', help='scratch database for the pool load test (tables are dropped!)')
+    parser.add_argument('--clients', type=int, default=32, help='concurrent HTTP clients for the server benchmark')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per route for the server benchmark')
+    parser.add_argument('--pool-size', type=int, default=4, help='primary pool size for the routing benchmark')
+    parser.add_argument('--history', type=int, default=1000000, help='sessions generated for the analytics benchmark')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='worker process counts for the analytics benchmark')
+    parser.add_argument('--connections', type=int, default=500, help='concurrent connections for the asgi benchmark')
+    parser.add_argument('--port', type=int, default=5055, help='first port used by the server benchmark')
+    parser.add_argument('--bandwidth-mbit', type=float, default=5.0,
+                        help='link speed used to estimate transfer time (default: 5 Mbit/s school Wi-Fi)')
+    args = parser.parse_args()
+
+    if args.list or not args.benchmark:
+        for name, (_, description) in sorted(BENCHMARKS.items()):
+            if name.startswith('_'):
+                continue
+            print(f"  {name:<14} {description}")
+        return 0
+
+    func, _ = BENCHMARKS[args.benchmark]
+    func(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+On-demand profiling of single requests.
+
+With PROFILER_TOKEN set, any request that carries the token
+
+    curl -H "X-Profile: $PROFILER_TOKEN" https://.../statistics
+    curl -H "X-Profile: $PROFILER_TOKEN" -H "X-Profile-Mode: cprofile" https://.../schedule_session
+    https://.../statistics?_profile=<token>        (ends up in access logs; prefer the header)
+
+is profiled, and the result is written to PROFILE_DIR:
+
+    20250701-093012-statistics-3fa2c1.collapsed  folded stacks for flamegraph.pl / speedscope
+    20250701-093012-statistics-3fa2c1.txt        top functions, and time by category
+    20250701-093012-statistics-3fa2c1.prof       pstats dump (PROFILER_MODE=cprofile only)
+
+The response carries an X-Profile-Id header naming the files. The default
+"sample" mode takes a stack sample of the request's thread every
+PROFILER_INTERVAL_MS from a helper thread, which adds little overhead and
+attributes time to SQL, ORM row loading, Jinja rendering or plain Python.
+"cprofile" mode traces every call instead, which is exact but slows the
+request down; X-Profile-Mode picks the mode for one request. Requests
+without the token are passed straight through.
+
+Settings (app.config):
+    PROFILER_TOKEN       - secret that enables profiling (default: profiling off)
+    PROFILER_MODE        - sample or cprofile (default sample)
+    PROFILER_INTERVAL_MS - sampling interval (default 1)
+    PROFILE_DIR          - where profiles are written (default instance/profiles)
+    PROFILER_TOP         - functions listed in the summary (default 30)
+"""
+
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import sysconfig
+import threading
+import time
+import uuid
+from datetime import datetime
+from urllib.parse import parse_qs
+
+HEADER = 'HTTP_X_PROFILE'
+MODE_HEADER = 'HTTP_X_PROFILE_MODE'
+MODES = ('sample', 'cprofile')
+QUERY_FLAG = '_profile'
+
+STDLIB = sysconfig.get_paths()['stdlib'].replace('\\', '/')
+
+# (category, substrings of a frame's file path), most specific first
+CATEGORIES = [
+    ('sql', ('sqlalchemy/engine/default.py', 'sqlite3', 'psycopg', 'asyncpg')),
+    ('orm hydration', ('sqlalchemy/orm/loading.py', 'sqlalchemy/engine/result.py', 'sqlalchemy/orm/strategies.py')),
+    ('sqlalchemy', ('sqlalchemy/',)),
+    ('jinja', ('jinja2/', 'templates/', '<template>')),
+    ('framework', ('flask/', 'werkzeug/', 'flask_sqlalchemy/')),
+]
+
+
+def frame_label(code):
+    """"flask/app.py:wsgi_app" for libraries, "app.py:mentors" for the app itself"""
+    filename = code.co_filename.replace('\\', '/')
+    if '/site-packages/' in filename:
+        filename = filename.rsplit('/site-packages/', 1)[1]
+    elif filename.startswith(STDLIB + '/'):
+        filename = filename[len(STDLIB) + 1:]
+    else:
+        filename = os.path.basename(filename)
+    return f"{filename}:{code.co_name}"
+
+
+def classify(filenames):
+    """Category of a stack sample, given its frames' file names leaf first
+
+    Only the library frames below the innermost application frame count, so
+    a loop in app.py is "python" even though Flask is further up the stack.
+    """
+    found = set()
+    for filename in filenames:
+        matched = {category for category, markers in CATEGORIES if any(marker in filename for marker in markers)}
+        if matched:
+            found |= matched
+        elif not (filename.startswith(STDLIB) or filename.startswith('<')):
+            break
+    for category, _ in CATEGORIES:
+        if category in found:
+            return category
+    return 'python'
+
+
+class Sampler:
+    """Samples one thread's stack at a fixed interval from a helper thread"""
+
+    # Sampling only happens when the request thread lets go of the GIL, which
+    # it otherwise does every 5ms; while any sampler runs, make that switch
+    # interval as short as the sampling interval so pure Python isn't undercounted.
+    _lock = threading.Lock()
+    _intervals = []  # one entry per sampler (or other helper thread) running
+    _switch_interval = None
+
+    def __init__(self, thread_id, interval=0.001, root=None):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.root = root  # code object of the outermost frame to keep
+        self.stacks = {}  # tuple of (label, filename), root first -> samples
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    @classmethod
+    def enter(cls, interval):
+        """Shorten the switch interval to at most interval until the matching exit()"""
+        with cls._lock:
+            if not cls._intervals:
+                cls._switch_interval = sys.getswitchinterval()
+            cls._intervals.append(interval)
+            sys.setswitchinterval(min(min(cls._intervals), cls._switch_interval))
+
+    @classmethod
+    def exit(cls, interval):
+        """Undo one enter(); the last one out restores the original switch interval"""
+        with cls._lock:
+            cls._intervals.remove(interval)
+            if cls._intervals:
+                sys.setswitchinterval(min(min(cls._intervals), cls._switch_interval))
+            else:
+                sys.setswitchinterval(cls._switch_interval)
+
+    def start(self):
+        Sampler.enter(self.interval)
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self.elapsed = time.perf_counter() - self.started
+        self._stop.set()
+        self._thread.join()
+        Sampler.exit(self.interval)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and frame.f_code is not self.root:
+                code = frame.f_code
+                stack.append((frame_label(code), code.co_filename.replace('\\', '/')))
+                frame = frame.f_back
+            # Frames above the root belong to the server, and samples outside it to the profiler
+            if stack and (frame is not None or self.root is None):
+                key = tuple(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def collapsed(self):
+        """Folded stacks, one "root;...;leaf count" line each"""
+        return ''.join(f"{';'.join(label for label, _ in stack)} {count}\n"
+                       for stack, count in sorted(self.stacks.items()))
+
+    def summary(self, title, top=30):
+        total = sum(self.stacks.values())
+        self_counts, inclusive, categories = {}, {}, {}
+        for stack, count in self.stacks.items():
+            leaf = stack[-1][0]
+            self_counts[leaf] = self_counts.get(leaf, 0) + count
+            for label in {label for label, _ in stack}:
+                inclusive[label] = inclusive.get(label, 0) + count
+            category = classify([filename for _, filename in reversed(stack)])
+            categories[category] = categories.get(category, 0) + count
+
+        def pct(count):
+            return f"{count / total * 100:5.1f}%" if total else '    -'
+
+        lines = [title, f"{total} samples every {self.interval * 1000:g}ms over {self.elapsed * 1000:.1f}ms", '',
+                 'Time by category:']
+        for category, count in sorted(categories.items(), key=lambda item: -item[1]):
+            lines.append(f"  {pct(count)}  {category}")
+        lines += ['', f'Top {top} functions by own time (self / inclusive):']
+        for label, count in sorted(self_counts.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"  {pct(count)} / {pct(inclusive[label])}  {label}")
+        lines += ['', f'Top {top} functions by inclusive time:']
+        for label, count in sorted(inclusive.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"  {pct(count)}  {label}")
+        return '\n'.join(lines) + '\n'
+
+
+class ProfilerMiddleware:
+    """WSGI middleware that profiles requests carrying the profiler token"""
+
+    def __init__(self, wsgi_app, config):
+        self.wsgi_app = wsgi_app
+        self.config = config
+
+    def requested(self, environ):
+        token = self.config.get('PROFILER_TOKEN')
+        if not token:
+            return False
+        supplied = environ.get(HEADER)
+        if supplied is None and QUERY_FLAG in environ.get('QUERY_STRING', ''):
+            supplied = parse_qs(environ['QUERY_STRING']).get(QUERY_FLAG, [None])[0]
+        return supplied is not None and hmac.compare_digest(supplied.encode(), token.encode())
+
+    def __call__(self, environ, start_response):
+        if not self.requested(environ):
+            return self.wsgi_app(environ, start_response)
+
+        slug = environ.get('PATH_INFO', '/').strip('/').replace('/', '_') or 'index'
+        profile_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{slug[:40]}-{uuid.uuid4().hex[:6]}"
+
+        def profiled_start_response(status, headers, exc_info=None):
+            return start_response(status, headers + [('X-Profile-Id', profile_id)], exc_info)
+
+        def run():
+            # The whole body is produced inside the profile, so streamed responses are buffered
+            result = self.wsgi_app(environ, profiled_start_response)
+            try:
+                return [b''.join(result)]
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+
+        title = f"{environ.get('REQUEST_METHOD')} {environ.get('PATH_INFO')}"
+        mode = environ.get(MODE_HEADER, '').lower()
+        if mode not in MODES:
+            mode = self.config.get('PROFILER_MODE', 'sample')
+        if mode == 'cprofile':
+            profile = cProfile.Profile()
+            body = profile.runcall(run)
+            self.write_cprofile(profile_id, title, profile)
+        else:
+            sampler = Sampler(threading.get_ident(), self.config.get('PROFILER_INTERVAL_MS', 1) / 1000, run.__code__)
+            sampler.start()
+            try:
+                body = run()
+            finally:
+                sampler.stop()
+            self.write(profile_id, {'.collapsed': sampler.collapsed(),
+                                    '.txt': sampler.summary(title, self.config.get('PROFILER_TOP', 30))})
+        return body
+
+    def write(self, profile_id, files):
+        directory = self.config['PROFILE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        for extension, text in files.items():
+            with open(os.path.join(directory, profile_id + extension), 'w') as f:
+                f.write(text)
+
+    def write_cprofile(self, profile_id, title, profile):
+        directory = self.config['PROFILE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        profile.dump_stats(os.path.join(directory, profile_id + '.prof'))
+        output = io.StringIO()
+        output.write(title + '\n\n')
+        pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(self.config.get('PROFILER_TOP', 30))
+        self.write(profile_id, {'.txt': output.getvalue()})
+
+
+def init_app(app):
+    """Wrap the WSGI app so requests carrying PROFILER_TOKEN are profiled"""
+    app.config.setdefault('PROFILER_TOKEN', None)
+    app.config.setdefault('PROFILER_MODE', 'sample')
+    app.config.setdefault('PROFILER_INTERVAL_MS', 1)
+    app.config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+    app.config.setdefault('PROFILER_TOP', 30)
+    app.wsgi_app = ProfilerMiddleware(app.wsgi_app, app.config)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Request Profiler Testing Suite
+Checks that only requests carrying PROFILER_TOKEN are profiled, that the
+collapsed stacks and summary land in PROFILE_DIR without changing the
+response, and that samples are split into SQL, ORM, Jinja and Python time.
+
+Runs against a throwaway SQLite database (never mentorship.db).
+"""
+
+import os
+import sys
+
+from suite_support import SuiteLogger, scratch_environment
+
+# Point the app at a scratch database before it is imported
+WORK_DIR = scratch_environment('profiler')
+os.environ['PROFILE_DIR'] = os.path.join(WORK_DIR, 'profiles')
+
+import app as flask_app
+import profiler
+
+TOKEN = 'profile-secret'
+PROFILE_DIR = os.environ['PROFILE_DIR']
+
+
+logger = SuiteLogger()
+client = flask_app.app.test_client()
+
+
+def seed_database():
+    with flask_app.app.app_context():
+        flask_app.db.drop_all()
+        flask_app.db.create_all()
+        for i in range(60):
+            flask_app.db.session.add(flask_app.Mentor(name=f'Mentor {i}', roll_call='12/7',
+                                                      subjects='English, Maths', max_mentees=3))
+        for i in range(120):
+            flask_app.db.session.add(flask_app.Mentee(name=f'Student {i}', roll_call='7A',
+                                                      subject='English', lessons_remaining=5))
+        flask_app.db.session.commit()
+
+
+def profile_files(profile_id):
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    return sorted(name for name in os.listdir(PROFILE_DIR) if name.startswith(profile_id or '\0'))
+
+
+def read_profile(profile_id, extension):
+    with open(os.path.join(PROFILE_DIR, profile_id + extension)) as f:
+        return f.read()
+
+
+def test_gating():
+    flask_app.app.config['PROFILER_TOKEN'] = None
+    response = client.get('/mentors', headers={'X-Profile': TOKEN})
+    logger.log_result("Nothing is profiled while PROFILER_TOKEN is unset",
+                      'X-Profile-Id' not in response.headers and not os.path.isdir(PROFILE_DIR))
+
+    flask_app.app.config['PROFILER_TOKEN'] = TOKEN
+    wrong_header = client.get('/mentors', headers={'X-Profile': 'guess'})
+    wrong_query = client.get('/mentors?_profile=guess')
+    logger.log_result("A wrong token is ignored",
+                      wrong_header.status_code == wrong_query.status_code == 200
+                      and 'X-Profile-Id' not in wrong_header.headers and 'X-Profile-Id' not in wrong_query.headers
+                      and not os.path.isdir(PROFILE_DIR))
+
+
+def test_sampling():
+    plain = client.get('/mentors')
+    response = client.get('/mentors', headers={'X-Profile': TOKEN})
+    profile_id = response.headers.get('X-Profile-Id', '')
+    files = profile_files(profile_id)
+    logger.log_result("A profiled request writes its collapsed stacks and summary",
+                      '-mentors-' in profile_id
+                      and files == [profile_id + '.collapsed', profile_id + '.txt'], f"{profile_id}: {files}")
+    logger.log_result("The profiled response is unchanged",
+                      response.status_code == 200 and response.get_data() == plain.get_data())
+
+    collapsed = read_profile(profile_id, '.collapsed') if files else ''
+    lines = collapsed.splitlines()
+    well_formed = bool(lines) and all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+    logger.log_result("Collapsed stacks are in flamegraph format and reach the view function",
+                      well_formed and any('app.py:mentors' in line.split(' ')[0].split(';') for line in lines),
+                      f"{len(lines)} distinct stacks")
+
+    summary = read_profile(profile_id, '.txt') if files else ''
+    logger.log_result("The summary splits time by category and lists the top functions",
+                      summary.startswith('GET /mentors') and 'Time by category:' in summary
+                      and ('  sql' in summary or '  orm hydration' in summary) and 'Top 30 functions' in summary,
+                      ' / '.join(line.strip() for line in summary.splitlines()[4:7]))
+
+    response = client.get(f'/schedule_session?_profile={TOKEN}')
+    profile_id = response.headers.get('X-Profile-Id', '')
+    logger.log_result("The query flag works too", response.status_code == 200
+                      and '-schedule_session-' in profile_id and len(profile_files(profile_id)) == 2, profile_id)
+
+
+def test_cprofile():
+    response = client.get('/mentors', headers={'X-Profile': TOKEN, 'X-Profile-Mode': 'cprofile'})
+    profile_id = response.headers.get('X-Profile-Id', '')
+    files = profile_files(profile_id)
+    summary = read_profile(profile_id, '.txt') if profile_id + '.txt' in files else ''
+    logger.log_result("X-Profile-Mode: cprofile writes a pstats dump and its top functions",
+                      files == [profile_id + '.prof', profile_id + '.txt'] and 'cumulative' in summary
+                      and 'mentors' in summary, f"{files}")
+
+
+def test_classify():
+    leaf_first = ['/venv/sqlite3/dbapi2.py', '/venv/sqlalchemy/engine/default.py', '/srv/app.py']
+    logger.log_result("Samples are attributed by the innermost library frame",
+                      profiler.classify(leaf_first) == 'sql'
+                      and profiler.classify(['/venv/sqlalchemy/orm/loading.py', '/srv/app.py']) == 'orm hydration'
+                      and profiler.classify(['/srv/templates/mentors.html', '/venv/jinja2/environment.py']) == 'jinja'
+                      and profiler.classify(['/venv/werkzeug/routing/map.py', '/venv/flask/app.py']) == 'framework'
+                      and profiler.classify(['/srv/app.py', '/venv/flask/app.py']) == 'python')
+
+
+def main():
+    logger.log_header("REQUEST PROFILER TESTS")
+    print(f"📂 Scratch database: {os.environ['DATABASE_URL']}")
+    seed_database()
+
+    test_gating()
+    test_sampling()
+    test_cprofile()
+    test_classify()
+
+    return logger.finish("requests are profiled on demand", "request profiler is off")
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Query budgets: catch N+1 queries before they reach production.
+
+Every route in ROUTES is requested through the Flask test client against a
+small and a large seeded database (each in a fresh interpreter with a
+throwaway SQLite file, never mentorship.db), and every SQL statement it runs
+is recorded. A route is then
+
+    flagged  when it runs more statements on the large dataset than on the
+             small one - the N+1 signature - listing the statements that grew
+    failed   when it runs more statements on the large dataset than its
+             budget in BUDGETS (DEFAULT_BUDGET for routes not listed), or
+             when it errors (HTTP 5xx, or a different status on the two
+             datasets) - an error usually cuts the statements short, so
+             its count says nothing about the budget
+
+    python query_budget.py [--json] [--route /mentors ...]
+
+exits with status 1 when any route fails. comprehensive_testing_suite.py
+and button_interaction_testing_suite.py run the same check through run().
+
+The budgets for routes that are N+1 today are their current counts, so they
+can only go down: lower a budget in the same change that fixes the route.
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+# Add the current directory to the path so we can import from app.py
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# (mentors, mentees, sessions) per dataset; large is three times small
+SCALES = {
+    'small': (4, 20, 50),
+    'large': (12, 60, 150),
+}
+
+ROUTES = [
+    '/',
+    '/mentors',
+    '/mentees',
+    '/calendar',
+    '/statistics',
+    '/schedule_session',
+    '/assign_mentor',
+    '/bulk_assign_mentors',
+    '/reassign_mentees',
+    '/delete_mentor/1',
+    '/delete_mentee/1',
+    '/user_guide',
+    '/api/sessions',
+    '/api/statistics',
+    '/api/subjects',
+    '/search_subjects?q=Eng',
+    '/export_data/mentors',
+    '/export_data/mentees',
+    '/export_data/sessions',
+]
+# /mentor/<id>, /mentee/<id> and /reassign_mentees/<id> are left out while
+# their templates fail to render (they return 500 before running their queries)
+
+DEFAULT_BUDGET = 10
+
+# Statements allowed on the large dataset, for routes that need more than
+# DEFAULT_BUDGET. Entries marked N+1 grow with the data and should shrink.
+BUDGETS = {
+    '/': 41,                      # N+1: per-mentor session counts and mentee lists
+    '/mentors': 25,               # N+1: per-mentor completed-session count and mentees
+    '/mentees': 13,               # N+1: mentor of each mentee
+    '/calendar': 68,              # N+1: mentor and mentee of each session
+    '/statistics': 21,            # N+1: mentor of each recent session
+    '/schedule_session': 18,      # N+1: per-mentor session count
+    '/assign_mentor': 14,         # N+1: mentees of each mentor
+    '/api/sessions': 68,          # N+1: mentor and mentee of each session
+    '/export_data/mentors': 14,   # N+1: mentees of each mentor
+    '/export_data/mentees': 14,   # N+1: mentor of each mentee
+    '/export_data/sessions': 69,  # N+1: mentor and mentee of each session
+}
+
+
+_COLUMN_LIST = re.compile(r"SELECT (?:(?!SELECT |FROM ).)+?FROM ")
+
+
+def brief(sql, width=150):
+    """Normalized SQL with column lists elided, so the FROM and WHERE show"""
+    sql = _COLUMN_LIST.sub('SELECT ... FROM ', sql)
+    return sql if len(sql) <= width else sql[:width - 4] + ' ...'
+
+
+def budget_for(route):
+    return BUDGETS.get(route, DEFAULT_BUDGET)
+
+
+def probe(routes, scale):
+    """Request each route on a freshly seeded database: {route: {status, queries, statements}}
+
+    Runs in the probe interpreter, where app.py is bound to a scratch database.
+    """
+    from flask import has_request_context
+    from sqlalchemy import text
+
+    from performance_benchmark import load_app, seed_database
+    import query_stats
+    import slow_queries
+
+    app_module = load_app(TEMPLATE_WARMUP='False', QUERY_STATS_LOG='False', SLOW_QUERY_ENABLED='False',
+                          METRICS_ENABLED='False')
+    mentors, mentees, sessions = SCALES[scale]
+    seed_database(app_module, mentors, mentees, sessions)
+    # Rows seeded in the same microsecond tie on created_at, which would make the
+    # "recent activity" rows (and the lookups they trigger) differ between runs
+    with app_module.app.app_context():
+        for table in ('mentor', 'mentee', 'session'):
+            app_module.db.session.execute(text(f"UPDATE {table} SET created_at = datetime('2025-01-01', '+' || id || ' minutes')"))
+        app_module.db.session.commit()
+    app_module.app.config['EXPORT_BACKGROUND_ROWS'] = 10 ** 9
+
+    recorded = []
+
+    def observe(statement, elapsed, conn, parameters, executemany):
+        if has_request_context():
+            recorded.append(slow_queries.normalize(statement))
+
+    query_stats.add_observer(observe)
+    client = app_module.app.test_client()
+    result = {}
+    for route in routes:
+        # Cold cache every time, so the count doesn't depend on the routes before it
+        app_module.cache.clear()
+        del recorded[:]
+        response = client.get(route)
+        statements = {}
+        for sql in recorded:
+            statements[sql] = statements.get(sql, 0) + 1
+        result[route] = {'status': response.status_code, 'queries': len(recorded), 'statements': statements}
+    app_module.job_runner.stop()
+    return result
+
+
+def run_probe(routes, scale):
+    """probe() in a fresh interpreter, so the caller's app (if any) is untouched"""
+    workdir = tempfile.mkdtemp(prefix='mentorship-budget-')
+    env = dict(os.environ, CACHE_DIR=workdir, JOBS_DB=os.path.join(workdir, 'jobs.sqlite3'),
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'budget.db')}")
+    command = [sys.executable, os.path.abspath(__file__), '--probe', scale, '--route', *routes]
+    output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def grown_statements(small, large):
+    """[(small count, large count, sql)] for statements that ran more often on the large dataset"""
+    grown = [(small.get(sql, 0), count, sql) for sql, count in large.items() if count > small.get(sql, 0)]
+    return sorted(grown, key=lambda item: item[0] - item[1])
+
+
+def analyse(small, large):
+    """Per-route verdicts from the small and large probe results"""
+    results = []
+    for route, measured in large.items():
+        before = small.get(route, {'status': None, 'queries': 0, 'statements': {}})
+        budget = budget_for(route)
+        over_budget = measured['queries'] > budget
+        errored = measured['status'] >= 500 or measured['status'] != before['status']
+        results.append({
+            'route': route,
+            'status': measured['status'],
+            'small_status': before['status'],
+            'small': before['queries'],
+            'large': measured['queries'],
+            'budget': budget,
+            'n_plus_one': measured['queries'] > before['queries'],
+            'over_budget': over_budget,
+            'errored': errored,
+            'failed': over_budget or errored,
+            'grown': grown_statements(before['statements'], measured['statements'])[:3],
+        })
+    return results
+
+
+def run(routes=None):
+    """Measure every route on both datasets and return analyse()'s verdicts"""
+    routes = routes or ROUTES
+    return analyse(run_probe(routes, 'small'), run_probe(routes, 'large'))
+
+
+def print_report(results):
+    print("="*78)
+    print(f"📏 SQL statements per route (small {SCALES['small']} vs large {SCALES['large']} "
+          f"mentors, mentees, sessions)")
+    print("="*78)
+    width = max(len(result['route']) for result in results)
+    for result in results:
+        icon = '❌' if result['failed'] else ('⚠️ ' if result['n_plus_one'] else '✅')
+        status = result['status'] if result['status'] == result['small_status'] \
+            else f"{result['small_status']} -> {result['status']}"
+        print(f"{icon} {result['route'].ljust(width)}  {result['small']:>4} -> {result['large']:>4}  "
+              f"budget {result['budget']:>4}  HTTP {status}")
+        if result['n_plus_one']:
+            for small, large, sql in result['grown']:
+                print(f"      {small:>4} -> {large:>4} x {brief(sql)}")
+    flagged = sum(result['n_plus_one'] for result in results)
+    failed = sum(result['failed'] for result in results)
+    errored = sum(result['errored'] for result in results)
+    print(f"\nTotal Tests: {len(results)}, Passed: {len(results) - failed}, Failed: {failed}")
+    print(f"⚠️  {flagged} route(s) run more queries as the data grows (N+1)")
+    if errored:
+        print(f"❌ {errored} route(s) returned an error, so their query counts can't be trusted")
+    print("🎉 SUCCESS: every route is within its query budget" if not failed
+          else "❌ FAIL: routes over their query budget or erroring")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Per-route SQL query budgets and N+1 detection')
+    parser.add_argument('--route', nargs='+', default=None, help='routes to check (default: ROUTES)')
+    parser.add_argument('--json', action='store_true', help='print the verdicts as JSON')
+    parser.add_argument('--probe', choices=sorted(SCALES), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.probe:
+        print(json.dumps(probe(args.route or ROUTES, args.probe)))
+        return 0
+    results = run(args.route)
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print_report(results)
+    return 1 if any(result['failed'] for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Per-request SQL query counting and timing.
+
+init_app(app) listens to before_cursor_execute/after_cursor_execute on every
+SQLAlchemy engine (primary, replica and each school's shard) and, for each
+request, records how many statements ran, the total time spent in the
+database and the slowest statement. The figures are returned as headers
+
+    Server-Timing: db;dur=12.4;desc="37 queries", db-slowest;dur=3.1, app;dur=48.0
+    X-Query-Count: 37
+
+and, with QUERY_STATS_LOG on, written as one JSON log line on the
+"mentorship.queries" logger (to stderr unless logging has been configured
+for it, through the access log's queue so requests never wait on the write):
+
+    {"method": "GET", "path": "/mentors", "endpoint": "mentors", "status": 200,
+     "queries": 37, "db_ms": 12.4, "slowest_ms": 3.1, "slowest_sql": "SELECT ...", "total_ms": 48.0}
+
+The hooks only take a timestamp and add to three counters per statement, so
+they are cheap enough to leave on in production. Statements run outside a
+request (background jobs, init_db) are not recorded. For streamed responses
+the figures cover the work done before the first chunk.
+
+Other modules can see every statement, in or out of a request, through
+add_observer(func), which is called with (statement, elapsed seconds,
+connection, parameters, executemany).
+
+Settings (app.config):
+    QUERY_STATS_ENABLED - master switch (default True)
+    QUERY_STATS_HEADERS - add Server-Timing and X-Query-Count (default True)
+    QUERY_STATS_LOG     - write the per-request log line (default False; the
+                          access log already records queries and db_ms)
+"""
+
+import json
+import logging
+import time
+from contextvars import ContextVar
+
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('mentorship.queries')
+
+SLOWEST_SQL_LENGTH = 300
+
+_current = ContextVar('query_stats', default=None)
+_observers = []
+
+
+class QueryStats:
+    """Statements run while handling one request"""
+
+    __slots__ = ('started', 'count', 'db_time', 'slowest_time', 'slowest_sql')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql = None
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.db_time += elapsed
+        if elapsed > self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_sql = statement
+
+    def server_timing(self, total):
+        return (f'db;dur={self.db_time * 1000:.1f};desc="{self.count} queries", '
+                f'db-slowest;dur={self.slowest_time * 1000:.1f}, app;dur={total * 1000:.1f}')
+
+
+def current():
+    """QueryStats for the request being handled, or None"""
+    return _current.get()
+
+
+def start():
+    """Begin recording statements in the current context"""
+    stats = QueryStats()
+    _current.set(stats)
+    return stats
+
+
+def stop():
+    _current.set(None)
+
+
+def add_observer(func):
+    """Call func(statement, elapsed, conn, parameters, executemany) after every statement on every engine"""
+    install()
+    _observers.append(func)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # The start time lives on the statement's own execution context, so a
+    # statement that raises (and never reaches after_cursor_execute) leaves
+    # nothing behind on the pooled connection
+    if context is not None and (_observers or _current.get() is not None):
+        context.query_stats_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'query_stats_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    for observer in _observers:
+        observer(statement, elapsed, conn, parameters, executemany)
+
+
+def install():
+    """Listen on every engine, including ones created later"""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def init_app(app):
+    """Register the query recording hooks"""
+    app.config.setdefault('QUERY_STATS_ENABLED', True)
+    app.config.setdefault('QUERY_STATS_HEADERS', True)
+    app.config.setdefault('QUERY_STATS_LOG', False)
+    if not app.config['QUERY_STATS_ENABLED']:
+        return
+    install()
+    if app.config['QUERY_STATS_LOG'] and not logger.handlers:
+        from access_log import AsyncQueueHandler  # access_log imports this module
+        stream = logging.StreamHandler()
+        stream.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(AsyncQueueHandler(stream))
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    @app.before_request
+    def start_query_stats():
+        start()
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = current()
+        if stats is None:
+            return response
+        total = time.perf_counter() - stats.started
+        if app.config['QUERY_STATS_HEADERS']:
+            response.headers['X-Query-Count'] = str(stats.count)
+            response.headers.add('Server-Timing', stats.server_timing(total))
+        if app.config['QUERY_STATS_LOG'] and logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'queries': stats.count,
+                'db_ms': round(stats.db_time * 1000, 2),
+                'slowest_ms': round(stats.slowest_time * 1000, 2),
+                'slowest_sql': stats.slowest_sql[:SLOWEST_SQL_LENGTH] if stats.slowest_sql else None,
+                'total_ms': round(total * 1000, 2),
+            }))
+        return response
+
+    @app.teardown_request
+    def stop_query_stats(exc):
+        stop()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Query Instrumentation Testing Suite
+Checks that every response reports the SQL statements it ran in
+X-Query-Count and Server-Timing, and logs one JSON line per request.
+
+Runs against a throwaway SQLite database (never mentorship.db).
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+
+from suite_support import SuiteLogger, scratch_environment
+
+# Point the app at a scratch database before it is imported
+scratch_environment('queries')
+os.environ['QUERY_STATS_LOG'] = 'True'
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import access_log
+import app as flask_app
+import query_stats
+
+
+class CapturingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(record.getMessage())
+
+
+logger = SuiteLogger()
+client = flask_app.app.test_client()
+executed = []
+
+
+def seed_database():
+    with flask_app.app.app_context():
+        flask_app.db.drop_all()
+        flask_app.db.create_all()
+        for i in range(5):
+            flask_app.db.session.add(flask_app.Mentor(name=f'Mentor {i}', roll_call='12/7',
+                                                      subjects='English', max_mentees=3))
+        flask_app.db.session.commit()
+
+
+def parse_server_timing(header):
+    metrics = {}
+    for part in header.split(','):
+        name, *params = [piece.strip() for piece in part.split(';')]
+        metrics[name] = dict(param.split('=', 1) for param in params)
+    return metrics
+
+
+def test_headers():
+    executed.clear()
+    response = client.get('/mentors')
+    count = response.headers.get('X-Query-Count')
+    logger.log_result("X-Query-Count matches the statements executed",
+                      count is not None and int(count) == len(executed) and len(executed) > 0,
+                      f"header={count}, executed={len(executed)}")
+    timing = parse_server_timing(response.headers.get('Server-Timing', ''))
+    logger.log_result("Server-Timing reports db, db-slowest and app durations",
+                      {'db', 'db-slowest', 'app'} <= set(timing)
+                      and float(timing['db']['dur']) <= float(timing['app']['dur'])
+                      and timing['db']['desc'] == f'"{count} queries"',
+                      f"{response.headers.get('Server-Timing')}")
+    cached = client.get('/search_subjects?q=eng')
+    logger.log_result("Requests without SQL report zero queries", cached.headers.get('X-Query-Count') == '0',
+                      f"header={cached.headers.get('X-Query-Count')}")
+
+
+def test_log_line():
+    handler = CapturingHandler()
+    query_stats.logger.addHandler(handler)
+    try:
+        client.get('/mentors?sort=name')
+    finally:
+        query_stats.logger.removeHandler(handler)
+    entry = json.loads(handler.lines[-1]) if handler.lines else {}
+    logger.log_result("Each request writes one JSON log line",
+                      len(handler.lines) == 1 and entry.get('endpoint') == 'mentors' and entry.get('status') == 200
+                      and entry.get('queries', 0) > 0 and entry.get('slowest_sql'),
+                      f"{ {key: entry.get(key) for key in ('path', 'queries', 'db_ms', 'slowest_ms')} }")
+    logger.log_result("The log line is written through a queue, off the request thread",
+                      any(isinstance(h, access_log.AsyncQueueHandler) for h in query_stats.logger.handlers))
+
+
+def test_outside_requests():
+    with flask_app.app.app_context():
+        flask_app.Mentor.query.count()
+    logger.log_result("Statements outside a request are not recorded", query_stats.current() is None)
+
+
+def test_failed_statements():
+    recorded = []
+    query_stats.add_observer(lambda statement, elapsed, *args: recorded.append(elapsed))
+    try:
+        with flask_app.app.app_context():
+            with flask_app.db.engine.connect() as conn:
+                for _ in range(3):
+                    try:
+                        conn.exec_driver_sql('SELECT * FROM no_such_table')
+                    except Exception:
+                        conn.rollback()
+                time.sleep(0.05)
+                conn.exec_driver_sql('SELECT 1')
+                leftover = [key for key in conn.connection.info if key.startswith('query_stats')]
+    finally:
+        query_stats._observers.pop()
+    logger.log_result("A statement that fails leaves no start time behind for the next one",
+                      len(recorded) == 1 and recorded[0] < 0.05 and leftover == [],
+                      f"{[round(e * 1000, 2) for e in recorded]}ms, connection info {leftover}")
+
+
+def test_headers_switch():
+    flask_app.app.config['QUERY_STATS_HEADERS'] = False
+    try:
+        response = client.get('/mentors')
+    finally:
+        flask_app.app.config['QUERY_STATS_HEADERS'] = True
+    logger.log_result("QUERY_STATS_HEADERS=False leaves the headers off",
+                      'X-Query-Count' not in response.headers and 'Server-Timing' not in response.headers)
+
+
+def main():
+    logger.log_header("QUERY INSTRUMENTATION TESTS")
+    print(f"📂 Scratch database: {os.environ['DATABASE_URL']}")
+    seed_database()
+    event.listen(Engine, 'after_cursor_execute', lambda conn, cursor, statement, *args: executed.append(statement))
+
+    test_headers()
+    test_log_line()
+    test_outside_requests()
+    test_failed_statements()
+    test_headers_switch()
+
+    return logger.finish("query instrumentation works", "query instrumentation is off")
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Read/Write Routing Testing Suite
+Checks that GET requests read from the replica bind, that writes always reach
+the primary, and that a browser reads its own writes straight after a POST.
+
+Runs against a throwaway SQLite database (never mentorship.db).
+"""
+
+import asyncio
+import os
+import sys
+
+from suite_support import SuiteLogger, scratch_environment
+
+# Point the app at a scratch database before it is imported
+scratch_environment('routing')
+os.environ['DB_READ_ROUTING'] = 'True'
+
+from sqlalchemy import event
+
+import app as flask_app
+import asgi
+import db_routing
+
+
+logger = SuiteLogger()
+statements = []
+
+
+def record_statements():
+    """Log which engine ran each statement"""
+    with flask_app.app.app_context():
+        engines = {'primary': flask_app.db.engines[None], 'replica': flask_app.db.engines[db_routing.REPLICA_BIND],
+                   'async replica': asgi.app.engine.sync_engine, 'async primary': asgi.app.primary_engine.sync_engine}
+    for name, engine in engines.items():
+        event.listen(engine, 'before_cursor_execute',
+                     lambda conn, cursor, sql, *args, name=name: statements.append((name, sql.split()[0].upper())))
+
+
+def engines_used():
+    used = {name for name, _ in statements}
+    statements.clear()
+    return used
+
+
+def add_mentor(client, name):
+    return client.post('/add_mentor', data={'first_name': name, 'last_name': 'Routing', 'roll_call': '12/7',
+                                            'subjects': 'English', 'max_mentees': '2'})
+
+
+def test_reads_and_writes():
+    client = flask_app.app.test_client()
+    engines_used()
+    client.get('/mentors')
+    used = engines_used()
+    logger.log_result("GET requests read from the replica", used == {'replica'}, f"engines={used}")
+
+    response = add_mentor(client, 'Primary')
+    writes = {sql for name, sql in statements if name == 'replica' and sql in ('INSERT', 'UPDATE', 'DELETE')}
+    used = engines_used()
+    logger.log_result("POST requests write to the primary", 'primary' in used and not writes, f"engines={used}")
+    logger.log_result("A write sets the read-your-writes cookie",
+                      db_routing.STICKY_COOKIE in response.headers.get('Set-Cookie', ''))
+
+    page = client.get('/mentors')
+    used = engines_used()
+    logger.log_result("The next GET from the same browser reads from the primary",
+                      used == {'primary'} and b'Primary Routing' in page.data, f"engines={used}")
+
+    flask_app.app.test_client().get('/mentors')
+    used = engines_used()
+    logger.log_result("Other browsers keep reading from the replica", used == {'replica'}, f"engines={used}")
+
+
+def asgi_get(path, cookie=None):
+    """GET path from the async tier and return its status"""
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+             'headers': [(b'cookie', cookie.encode())] if cookie else [], 'http_version': '1.1', 'scheme': 'http',
+             'root_path': '', 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234)}
+    response = {}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+
+    async def call():
+        await asgi.app(scope, receive, send)
+        await asgi.app.dispose()
+
+    asyncio.run(call())
+    return response.get('status')
+
+
+def test_async_tier_sticky_cookie():
+    engines_used()
+    status = asgi_get('/api/sessions')
+    used = engines_used()
+    logger.log_result("The async tier answers reads itself from the replica",
+                      status == 200 and used == {'async replica'}, f"engines={used}")
+    status = asgi_get('/api/sessions', cookie=f'{db_routing.STICKY_COOKIE}=1')
+    used = engines_used()
+    logger.log_result("The async tier sends browsers with the read-your-writes cookie to the primary",
+                      status == 200 and used == {'primary'}, f"engines={used}")
+
+
+def test_shared_cache_filled_from_primary():
+    flask_app.cache.clear()
+    engines_used()
+    flask_app.app.test_client().get('/api/statistics')
+    used = engines_used()
+    logger.log_result("A GET that misses the shared cache fills it from the primary", used == {'primary'},
+                      f"engines={used}")
+
+    flask_app.cache.clear()
+    status = asgi_get('/api/statistics')
+    used = engines_used()
+    logger.log_result("The async tier fills the shared cache from the primary too",
+                      status == 200 and used == {'async primary'}, f"engines={used}")
+
+    flask_app.job_runner.run_inline('rebuild_statistics')
+    used = engines_used()
+    logger.log_result("The statistics rebuild job reads from the primary", used == {'primary'}, f"engines={used}")
+
+
+def test_write_inside_get():
+    with flask_app.app.test_request_context('/mentors', method='GET'):
+        flask_app.app.preprocess_request()
+        before = db_routing.current_route()
+        flask_app.db.session.add(flask_app.Mentor(name='Inline Write', roll_call='12/7', subjects='English',
+                                                  max_mentees=1))
+        flask_app.db.session.commit()
+        after = db_routing.current_route()
+        found = flask_app.Mentor.query.filter_by(name='Inline Write').count()
+    logger.log_result("A write during a GET succeeds and pins the request to the primary",
+                      before == 'replica' and after == 'primary' and found == 1,
+                      f"route {before} -> {after}, rows={found}")
+
+
+def test_replica_is_read_only():
+    with flask_app.app.app_context():
+        replica = flask_app.db.engines[db_routing.REPLICA_BIND]
+        try:
+            with replica.begin() as conn:
+                conn.exec_driver_sql("DELETE FROM mentor")
+            rejected = False
+        except Exception as e:
+            rejected = 'readonly' in str(e).lower().replace(' ', '')
+    logger.log_result("The SQLite replica connection rejects writes", rejected)
+
+
+def main():
+    logger.log_header("READ/WRITE ROUTING TESTS")
+    print(f"📂 Scratch database: {os.environ['DATABASE_URL']}")
+    flask_app.init_db()
+    record_statements()
+
+    test_reads_and_writes()
+    test_async_tier_sticky_cookie()
+    test_shared_cache_filled_from_primary()
+    test_write_inside_get()
+    test_replica_is_read_only()
+
+    return logger.finish("reads and writes are routed correctly", "routing checks failed")
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -2,19 +2,37 @@
 """
 Launcher script for Mentorship System
 This script starts the Flask application for online hosting
+
+    python run_online.py               # Werkzeug development server
+    python run_online.py --production  # gunicorn with gunicorn.conf.py
+                                       # (or set SERVER_MODE=production)
 """
 import os
 import sys
 import threading
 import time
 import webbrowser
-from app import app, init_db
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def run_production():
+    """Replace this process with gunicorn using the tuned gunicorn.conf.py"""
+    print("🚀 Starting gunicorn (production mode)...")
+    sys.stdout.flush()
+    os.chdir(BASE_DIR)
+    os.execv(sys.executable, [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'])
 
 def main():
     """Main launcher function"""
     print("="*60)
     print("🎓 MENTORSHIP MANAGEMENT SYSTEM")
     print("="*60)
+    
+    if '--production' in sys.argv[1:] or os.environ.get('SERVER_MODE') == 'production':
+        # gunicorn.conf.py initializes the database once in the master
+        run_production()
+    
+    from app import app, init_db, job_runner
     print("🔧 Initializing database...")
     
     try:
@@ -24,6 +42,11 @@ def main():
         print(f"❌ Database initialization failed: {e}")
         sys.exit(1)
     
+    if app.config['JOBS_MODE'] == 'thread':
+        # Pick up jobs left queued by a previous run
+        job_runner.start()
+        print(f"⚙️  Background job workers: {app.config['JOBS_WORKERS']}")
+    
     print("🌐 Starting web server...")
     
     # Get port from environment or use 5000
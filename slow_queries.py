@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Slow-query log with query plans, and a report that ranks them.
+
+init_app(app) watches every SQL statement (through query_stats) and, when
+one takes at least SLOW_QUERY_MS milliseconds, appends a JSON line to
+SLOW_QUERY_LOG:
+
+    {"ts": "2025-07-01T09:30:12", "ms": 182.4, "fingerprint": "3f9a0c1b7e2d",
+     "sql": "SELECT count(*) ... WHERE session.mentor_id = ? AND session.status = ?",
+     "params": ["int", "str"], "method": "GET", "path": "/mentors", "endpoint": "mentors",
+     "request_id": "5f0c2e...", "plan": ["SCAN session"]}
+
+The SQL is normalized (literals become ?, IN lists and multi-row VALUES are
+collapsed) so the same query from different requests shares a fingerprint.
+Parameters are logged by type only, never by value. The plan comes from
+EXPLAIN QUERY PLAN on SQLite, or EXPLAIN on PostgreSQL, run on the same
+connection; each fingerprint is explained once per process. request_id
+matches the request's line in the access log (access_log.py).
+
+Rank the logged queries by the total time they cost:
+
+    python slow_queries.py [instance/slow_queries.log ...] [--top 20] [--sort total|count|max|mean]
+
+Settings (app.config):
+    SLOW_QUERY_ENABLED - master switch (default True)
+    SLOW_QUERY_MS      - threshold in milliseconds (default 100)
+    SLOW_QUERY_LOG     - log file, or "-" for stderr (default instance/slow_queries.log)
+    SLOW_QUERY_EXPLAIN - capture query plans (default True)
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import re
+import sys
+import threading
+from datetime import datetime
+
+logger = logging.getLogger('mentorship.slow_queries')
+
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+MAX_PLANS = 1000
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<!:):\w+")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_ROWS = re.compile(r"(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+_plans = {}
+_plans_lock = threading.Lock()
+
+
+def normalize(statement):
+    """SQL with literals and placeholders replaced by ?, lists collapsed"""
+    sql = _STRING.sub('?', statement)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _VALUES_ROWS.sub(r'\1, ...', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()[:12]
+
+
+def _type_runs(values):
+    """['int', 'int', 'str'] -> ['int*2', 'str']"""
+    runs = []
+    for value in values:
+        name = type(value).__name__
+        if runs and runs[-1][0] == name:
+            runs[-1][1] += 1
+        else:
+            runs.append([name, 1])
+    return [name if count == 1 else f'{name}*{count}' for name, count in runs]
+
+
+def parameter_shape(parameters, executemany=False):
+    """Types of the bound parameters, without their values"""
+    if executemany:
+        rows = list(parameters or ())
+        return {'rows': len(rows), 'row': parameter_shape(rows[0]) if rows else []}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    return _type_runs(parameters or ())
+
+
+def explain(conn, statement, parameters, executemany=False):
+    """Query plan lines for a statement, run on the same connection"""
+    if not statement.lstrip()[:6].upper().startswith(EXPLAINABLE):
+        return None
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+    dialect = conn.dialect.name
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect == 'sqlite' else 'EXPLAIN '
+    # A raw DB-API cursor, so the EXPLAIN doesn't go through the engine events again
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        rows = cursor.fetchall()
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    finally:
+        cursor.close()
+    if dialect == 'sqlite':
+        # (id, parent, notused, detail): indent by depth in the plan tree
+        depth = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append('  ' * depth[node_id] + detail)
+        return lines
+    return [row[0] for row in rows]
+
+
+def record(statement, elapsed, conn, parameters, executemany, capture_plan=True):
+    """Write one slow statement to the log"""
+    from flask import has_request_context, request
+
+    import access_log
+
+    normalized = normalize(statement)
+    key = fingerprint(normalized)
+    entry = {
+        'ts': datetime.now().isoformat(timespec='seconds'),
+        'ms': round(elapsed * 1000, 2),
+        'fingerprint': key,
+        'sql': normalized,
+        'params': parameter_shape(parameters, executemany),
+        'method': None,
+        'path': None,
+        'endpoint': 'background',
+        'request_id': access_log.request_id(),
+    }
+    if has_request_context():
+        entry.update(method=request.method, path=request.path, endpoint=request.endpoint or 'unmatched')
+    if capture_plan:
+        plan = _plans.get(key)
+        if plan is None:
+            plan = explain(conn, statement, parameters, executemany)
+            with _plans_lock:
+                if len(_plans) < MAX_PLANS:
+                    _plans[key] = plan
+        entry['plan'] = plan
+    logger.warning(json.dumps(entry))
+
+
+def init_app(app):
+    """Log statements slower than SLOW_QUERY_MS"""
+    import query_stats
+
+    app.config.setdefault('SLOW_QUERY_ENABLED', True)
+    app.config.setdefault('SLOW_QUERY_MS', 100)
+    app.config.setdefault('SLOW_QUERY_LOG', os.path.join(app.instance_path, 'slow_queries.log'))
+    app.config.setdefault('SLOW_QUERY_EXPLAIN', True)
+    if not app.config['SLOW_QUERY_ENABLED']:
+        return
+
+    if not logger.handlers:
+        path = app.config['SLOW_QUERY_LOG']
+        if path == '-':
+            handler = logging.StreamHandler()
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            # Lines are appended with O_APPEND, so every worker can share the file
+            handler = logging.handlers.WatchedFileHandler(path)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.WARNING)
+        logger.propagate = False
+
+    def observe(statement, elapsed, conn, parameters, executemany):
+        if elapsed * 1000 >= app.config['SLOW_QUERY_MS']:
+            record(statement, elapsed, conn, parameters, executemany, app.config['SLOW_QUERY_EXPLAIN'])
+
+    query_stats.add_observer(observe)
+
+
+# -- report -------------------------------------------------------------------
+
+def read_entries(paths):
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith('{'):
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+
+def summarize(entries):
+    """Per-fingerprint totals, as a list of dicts"""
+    groups = {}
+    for entry in entries:
+        group = groups.get(entry['fingerprint'])
+        if group is None:
+            group = groups[entry['fingerprint']] = {
+                'fingerprint': entry['fingerprint'], 'sql': entry['sql'], 'count': 0, 'total_ms': 0.0,
+                'max_ms': 0.0, 'endpoints': {}, 'params': entry.get('params'), 'plan': entry.get('plan'),
+            }
+        group['count'] += 1
+        group['total_ms'] += entry['ms']
+        group['max_ms'] = max(group['max_ms'], entry['ms'])
+        endpoint = entry.get('endpoint') or 'background'
+        group['endpoints'][endpoint] = group['endpoints'].get(endpoint, 0) + 1
+        if entry.get('plan'):
+            group['plan'] = entry['plan']
+    for group in groups.values():
+        group['mean_ms'] = group['total_ms'] / group['count']
+    return list(groups.values())
+
+
+def full_scans(plan):
+    """Tables read without an index, from a SQLite or PostgreSQL plan"""
+    tables = []
+    for line in plan or ():
+        line = line.strip()
+        sqlite_scan = re.match(r'SCAN (?:TABLE )?(\w+)', line)
+        postgres_scan = re.search(r'Seq Scan on (\w+)', line)
+        if sqlite_scan and 'USING' not in line:
+            tables.append(sqlite_scan.group(1))
+        elif postgres_scan:
+            tables.append(postgres_scan.group(1))
+    return tables
+
+
+def shorten(sql, width=300):
+    """Trim long SQL from the middle, keeping the WHERE clause visible"""
+    if len(sql) <= width:
+        return sql
+    where = sql.rfind(' WHERE ')
+    if where < 0:
+        return sql[:width - 4] + ' ...'
+    head = sql[:min(120, where)]
+    return head + ' ...' + sql[where:where + width - len(head)]
+
+
+def print_report(groups, top=20, sort='total'):
+    key = {'total': 'total_ms', 'count': 'count', 'max': 'max_ms', 'mean': 'mean_ms'}[sort]
+    groups = sorted(groups, key=lambda group: group[key], reverse=True)[:top]
+    print("="*78)
+    print(f"🐢 Slow queries by {sort} time ({len(groups)} fingerprints shown)")
+    print("="*78)
+    for rank, group in enumerate(groups, 1):
+        endpoints = ', '.join(f'{name} ({count})' for name, count in
+                              sorted(group['endpoints'].items(), key=lambda item: -item[1])[:3])
+        print(f"\n#{rank} {group['fingerprint']}  calls={group['count']}  total={group['total_ms']:.1f}ms  "
+              f"mean={group['mean_ms']:.1f}ms  max={group['max_ms']:.1f}ms")
+        print(f"   routes: {endpoints}")
+        print(f"   params: {json.dumps(group['params'])}")
+        print(f"   sql:    {shorten(group['sql'])}")
+        if group['plan']:
+            for line in group['plan'][:8]:
+                print(f"   plan:   {line}")
+        scans = full_scans(group['plan'])
+        if scans:
+            print(f"   ⚠️  full table scan on {', '.join(sorted(set(scans)))} - consider an index")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rank slow-query log entries by fingerprint')
+    parser.add_argument('logs', nargs='*', default=[os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                 'instance', 'slow_queries.log')])
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--sort', choices=['total', 'count', 'max', 'mean'], default='total')
+    args = parser.parse_args(argv)
+    missing = [path for path in args.logs if not os.path.exists(path)]
+    if missing:
+        print(f"❌ No slow-query log at {', '.join(missing)}")
+        return 1
+    groups = summarize(read_entries(args.logs))
+    if not groups:
+        print("✅ No slow queries logged")
+        return 0
+    print_report(groups, args.top, args.sort)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
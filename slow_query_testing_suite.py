@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Slow-Query Log Testing Suite
+Checks SQL normalization, that slow statements are logged with their route,
+parameter types and query plan, and that the report ranks fingerprints by
+total time.
+
+Runs against a throwaway SQLite database (never mentorship.db).
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+
+from suite_support import SuiteLogger, scratch_environment
+
+# Point the app at a scratch database before it is imported
+scratch_environment('slowlog')
+
+import app as flask_app
+import slow_queries
+
+
+logger = SuiteLogger()
+client = flask_app.app.test_client()
+LOG_PATH = os.environ['SLOW_QUERY_LOG']
+
+
+def seed_database():
+    with flask_app.app.app_context():
+        flask_app.db.drop_all()
+        flask_app.db.create_all()
+        for i in range(3):
+            flask_app.db.session.add(flask_app.Mentor(name=f'Mentor {i}', roll_call='12/7',
+                                                      subjects='English', max_mentees=3))
+        flask_app.db.session.commit()
+
+
+def log_entries():
+    with open(LOG_PATH) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_normalize():
+    sql = slow_queries.normalize("SELECT * FROM session WHERE mentor_id = 42 AND status = 'completed' "
+                                 "AND id IN (?, ?, ?)   AND anon_1.x = 1.5")
+    logger.log_result("Literals become ? and IN lists collapse",
+                      sql == "SELECT * FROM session WHERE mentor_id = ? AND status = ? AND id IN (...) AND anon_1.x = ?",
+                      sql)
+    same = slow_queries.fingerprint(slow_queries.normalize("SELECT a FROM t WHERE id IN (?, ?)")) == \
+        slow_queries.fingerprint(slow_queries.normalize("SELECT a FROM t WHERE id IN (?, ?, ?, ?)"))
+    values = slow_queries.normalize("INSERT INTO t (a, b) VALUES (%(a_1)s, %(b_1)s), (%(a_2)s, %(b_2)s)")
+    logger.log_result("Fingerprints ignore list lengths and placeholder styles",
+                      same and values == "INSERT INTO t (a, b) VALUES (?, ?), ...", values)
+    shape = slow_queries.parameter_shape((7, 8, 'x', None))
+    many = slow_queries.parameter_shape([(1, 'a'), (2, 'b')], executemany=True)
+    logger.log_result("Parameters are logged by type, never by value",
+                      shape == ['int*2', 'str', 'NoneType'] and many == {'rows': 2, 'row': ['int', 'str']},
+                      f"{shape}, {many}")
+
+
+def test_logging():
+    flask_app.app.config['SLOW_QUERY_MS'] = 10 ** 6
+    client.get('/mentors')
+    quiet = not os.path.exists(LOG_PATH) or not log_entries()
+    logger.log_result("Statements under the threshold are not logged", quiet)
+
+    flask_app.app.config['SLOW_QUERY_MS'] = 0
+    try:
+        client.get('/mentors')
+    finally:
+        flask_app.app.config['SLOW_QUERY_MS'] = 10 ** 6
+    entries = log_entries()
+    counts = [e for e in entries if 'session.mentor_id = ?' in e['sql'] and e['sql'].startswith('SELECT count')]
+    entry = counts[0] if counts else {}
+    logger.log_result("Slow statements are logged with their route and parameter types",
+                      entry.get('endpoint') == 'mentors' and entry.get('path') == '/mentors'
+                      and entry.get('params') == ['int', 'str'] and entry.get('ms', -1) >= 0,
+                      f"{len(entries)} entries; {entry.get('endpoint')} {entry.get('params')}")
+    logger.log_result("The EXPLAIN QUERY PLAN output is captured",
+                      entry.get('plan') and slow_queries.full_scans(entry['plan']) == ['session'],
+                      f"plan={entry.get('plan')}")
+
+
+def test_report():
+    entries = [
+        {'fingerprint': 'a', 'sql': 'SELECT 1', 'ms': 5, 'endpoint': 'mentors', 'plan': ['SCAN session']},
+        {'fingerprint': 'a', 'sql': 'SELECT 1', 'ms': 5, 'endpoint': 'dashboard', 'plan': ['SCAN session']},
+        {'fingerprint': 'b', 'sql': 'SELECT 2', 'ms': 8, 'endpoint': 'mentors',
+         'plan': ['SEARCH mentor USING INTEGER PRIMARY KEY (rowid=?)']},
+    ]
+    groups = sorted(slow_queries.summarize(entries), key=lambda group: -group['total_ms'])
+    logger.log_result("Fingerprints are ranked by total time",
+                      [(g['fingerprint'], g['count'], g['total_ms']) for g in groups] == [('a', 2, 10), ('b', 1, 8)]
+                      and slow_queries.full_scans(groups[1]['plan']) == [])
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        status = slow_queries.main([LOG_PATH, '--top', '3'])
+    logger.log_result("The report CLI reads the log", status == 0 and '#1 ' in output.getvalue()
+                      and 'full table scan on session' in output.getvalue())
+
+
+def main():
+    logger.log_header("SLOW-QUERY LOG TESTS")
+    print(f"📂 Scratch database: {os.environ['DATABASE_URL']}")
+    seed_database()
+
+    test_normalize()
+    test_logging()
+    test_report()
+
+    return logger.finish("slow queries are logged and ranked", "slow-query log is off")
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Fingerprinted, precompressed static assets.
+
+Build step (run on deploy, after any CSS/JS change):
+
+    python static_assets.py
+
+copies every file under static/ (except static/dist/) to
+static/dist/<path>.<hash>.<ext>, writes .gz (and .br when the optional
+`brotli` package is installed) variants next to it, and records the mapping
+in static/dist/manifest.json.
+
+At runtime init_app() makes url_for('static', filename='css/style.css')
+resolve to the fingerprinted copy and serves those copies with immutable
+far-future cache headers, picking a precompressed variant from
+Accept-Encoding. Without a manifest the plain files are served as before.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import sys
+
+from flask import send_from_directory
+
+from compression import accepted_encodings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map'}
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Preferred order when the client accepts several encodings
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def fingerprint_name(relative_path, content):
+    """Return css/style.css -> css/style.<hash>.css"""
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    root, ext = os.path.splitext(relative_path)
+    return f'{root}.{digest}{ext}'
+
+
+def build_assets(static_dir):
+    """Write hashed and precompressed copies of static assets plus a manifest"""
+    dist_dir = os.path.join(static_dir, DIST_DIR)
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    os.makedirs(dist_dir)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        if os.path.abspath(root) == os.path.abspath(static_dir) and DIST_DIR in dirs:
+            dirs.remove(DIST_DIR)
+        for filename in sorted(files):
+            source = os.path.join(root, filename)
+            relative = os.path.relpath(source, static_dir).replace(os.sep, '/')
+            with open(source, 'rb') as handle:
+                content = handle.read()
+
+            hashed = fingerprint_name(relative, content)
+            target = os.path.join(dist_dir, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as handle:
+                handle.write(content)
+
+            if os.path.splitext(relative)[1] in COMPRESSIBLE_EXTENSIONS:
+                # mtime=0 keeps the .gz output byte-identical across builds
+                with open(target + '.gz', 'wb') as handle:
+                    handle.write(gzip.compress(content, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    with open(target + '.br', 'wb') as handle:
+                        handle.write(brotli.compress(content, quality=11))
+
+            manifest[relative] = f'{DIST_DIR}/{hashed}'
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_dir):
+    """Return the asset manifest, or an empty mapping if assets were not built"""
+    path = os.path.join(static_dir, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+
+def init_app(app):
+    """Resolve static URLs through the manifest and serve hashed files immutably"""
+    static_dir = app.static_folder
+    manifest = load_manifest(static_dir)
+    hashed_files = set(manifest.values())
+    app.extensions['static_manifest'] = manifest
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = manifest.get(values['filename'], values['filename'])
+
+    def send_static_file(filename):
+        if filename not in hashed_files:
+            return app.send_static_file(filename)
+
+        accepted = accepted_encodings()
+        response = None
+        for encoding, suffix in ENCODINGS:
+            if encoding in accepted and os.path.exists(os.path.join(static_dir, filename + suffix)):
+                mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                response = send_from_directory(static_dir, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        if response is None:
+            response = send_from_directory(static_dir, filename)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
+
+    if app.has_static_folder:
+        app.view_functions['static'] = send_static_file
+
+
+if __name__ == '__main__':
+    static_root = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'static')
+    built = build_assets(static_root)
+    print(f"✅ Built {len(built)} fingerprinted asset(s) into {os.path.join(static_root, DIST_DIR)}")
+    for source, target in sorted(built.items()):
+        print(f"   {source} -> {target}")
@@ -0,0 +1,52 @@
+"""
+Shared set-up for the *_testing_suite.py scripts.
+
+scratch_environment() points the app at files in a new temporary directory,
+so a suite never touches mentorship.db; call it before importing app.
+SuiteLogger collects the pass/fail results and prints the summary line the
+master runner reads.
+"""
+
+import os
+import tempfile
+
+
+def scratch_environment(name, database=None):
+    """Point the database, job queue, slow-query log and cache at a new temp directory and return it"""
+    work_dir = tempfile.mkdtemp(prefix=f'mentorship-{name}-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(work_dir, database or f'{name}_test.db')}"
+    os.environ['JOBS_DB'] = os.path.join(work_dir, 'jobs.sqlite3')
+    os.environ['SLOW_QUERY_LOG'] = os.path.join(work_dir, 'slow_queries.log')
+    os.environ['QUERY_STATS_LOG'] = 'False'
+    os.environ.setdefault('CACHE_DIR', work_dir)
+    os.environ.setdefault('TEMPLATE_WARMUP', 'False')
+    return work_dir
+
+
+class SuiteLogger:
+    """Collects pass/fail results"""
+
+    def __init__(self):
+        self.total_tests = 0
+        self.passed_tests = 0
+
+    def log_header(self, title):
+        print("\n" + "="*70)
+        print(f"🧪 {title}")
+        print("="*70)
+
+    def log_result(self, test_name, passed, details=""):
+        self.total_tests += 1
+        if passed:
+            self.passed_tests += 1
+        print(f"{'✅ PASS' if passed else '❌ FAIL'} {test_name}")
+        if details:
+            print(f"    📝 {details}")
+
+    def finish(self, success_message, failure_message):
+        """Print the totals and the verdict; True when every check passed"""
+        print(f"\nTotal Tests: {self.total_tests}, Passed: {self.passed_tests}, "
+              f"Failed: {self.total_tests - self.passed_tests}")
+        success = self.passed_tests == self.total_tests
+        print(f"🎉 SUCCESS: {success_message}" if success else f"❌ FAIL: {failure_message}")
+        return success
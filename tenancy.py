@@ -0,0 +1,239 @@
+"""
+Multi-school tenancy: each school's data lives in its own database shard.
+
+Schools are listed in the SCHOOLS setting, a JSON object (or the path to a
+JSON file) keyed by school_id:
+
+    {"northside": {"name": "Northside High", "hosts": ["northside.example.org"]},
+     "southside": {"database_url": "postgresql://db/mentorship", "schema": "southside",
+                   "pool_size": 20}}
+
+A school without a database_url gets its own SQLite file under
+SCHOOL_DATABASE_DIR; PostgreSQL schools can share a server and be separated
+by schema. The default school (DEFAULT_SCHOOL) is the existing DATABASE_URL,
+so a single-school deployment behaves exactly as before.
+
+Every request is mapped to a school by host (a school's "hosts", or
+<school_id>.SCHOOL_BASE_DOMAIN). The SCHOOL_HEADER header is only believed
+with SCHOOL_HEADER_TRUSTED on, for a proxy that sets it and strips the
+client's; otherwise a header naming another school than the host's gets a
+404, so a client can't reach another school's shard through its host. Each school
+gets its own lazily created engine, connection pool, read replica engine
+and cache, so one large school can't exhaust the pool or evict the cache
+entries of the others. RoutingSession (db_routing) picks the school's
+engines up from flask.g.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+from flask import abort, g, has_app_context, request
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.schema import CreateSchema
+
+from database_profiles import engine_options_from_env, normalize_database_url, read_only_sqlite_url
+from db_routing import REPLICA_BIND
+
+
+class School:
+    """A tenant and where its data lives"""
+
+    def __init__(self, school_id, name=None, database_url=None, replica_url=None, schema=None, hosts=(),
+                 pool_size=None, max_overflow=None):
+        self.school_id = school_id
+        self.name = name or school_id
+        self.database_url = database_url
+        self.replica_url = replica_url
+        self.schema = schema
+        self.hosts = tuple(host.lower() for host in hosts)
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+
+    def __repr__(self):
+        return f'<School {self.school_id}>'
+
+
+def load_schools(setting, database_dir):
+    """Parse the SCHOOLS setting (JSON text or a JSON file path) into School objects"""
+    if not setting:
+        return {}
+    if not setting.lstrip().startswith('{'):
+        with open(setting) as f:
+            setting = f.read()
+    schools = {}
+    for school_id, options in json.loads(setting).items():
+        options = dict(options)
+        url = normalize_database_url(options.pop('database_url', None))
+        if url is None:
+            os.makedirs(database_dir, exist_ok=True)
+            url = f"sqlite:///{os.path.join(database_dir, f'{school_id}.db')}"
+        schools[school_id] = School(school_id, database_url=url, **options)
+    return schools
+
+
+class TenantCache:
+    """Cache proxy that keeps a separate cache per school"""
+
+    def __init__(self, factory, current_school):
+        self._factory = factory
+        self._current_school = current_school
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def for_school(self, school_id):
+        cache = self._caches.get(school_id)
+        if cache is None:
+            with self._lock:
+                cache = self._caches.get(school_id)
+                if cache is None:
+                    cache = self._caches[school_id] = self._factory(school_id)
+        return cache
+
+    def caches(self):
+        """(school_id, cache) for every school that has used its cache"""
+        return list(self._caches.items())
+
+    def __getattr__(self, name):
+        return getattr(self.for_school(self._current_school()), name)
+
+
+class TenantRouter:
+    """Maps requests and jobs to a school and hands out that school's engines"""
+
+    def __init__(self, app, db, schools):
+        self.app = app
+        self.db = db
+        self.schools = schools
+        self.default_school = app.config['DEFAULT_SCHOOL']
+        self._engines = {}
+        self._lock = threading.Lock()
+
+    def school_ids(self):
+        return [self.default_school] + [s for s in self.schools if s != self.default_school]
+
+    def current_school_id(self):
+        """The school selected for this app context (the default outside one)"""
+        if has_app_context():
+            return g.get('_school_id', self.default_school)
+        return self.default_school
+
+    def resolve(self, host, header_value=None):
+        """school_id for a request, or None if it names a school it may not use"""
+        school_id = self.host_school(host)
+        if not header_value or header_value == school_id:
+            return school_id
+        if self.app.config['SCHOOL_HEADER_TRUSTED'] and \
+                (header_value in self.schools or header_value == self.default_school):
+            return header_value
+        return None
+
+    def host_school(self, host):
+        """school_id for a Host header; the default school unless a school claims the host"""
+        host = (host or '').split(':')[0].lower()
+        for school in self.schools.values():
+            if host in school.hosts:
+                return school.school_id
+        base_domain = self.app.config['SCHOOL_BASE_DOMAIN']
+        if base_domain and host.endswith('.' + base_domain):
+            label = host[:-len(base_domain) - 1]
+            if label in self.schools:
+                return label
+        return self.default_school
+
+    def engines(self, school_id):
+        """{None: primary, 'replica': replica} for a school; None for the default school"""
+        if school_id == self.default_school:
+            return None
+        engines = self._engines.get(school_id)
+        if engines is None:
+            with self._lock:
+                engines = self._engines.get(school_id)
+                if engines is None:
+                    engines = self._engines[school_id] = self._create_engines(self.schools[school_id])
+        return engines
+
+    def _create_engines(self, school):
+        engines = {None: self._create_engine(school, school.database_url)}
+        replica_url = school.replica_url
+        if replica_url is None and school.database_url.startswith('sqlite'):
+            replica_url = read_only_sqlite_url(school.database_url)
+        if self.app.config['DB_READ_ROUTING'] and replica_url:
+            engines[REPLICA_BIND] = self._create_engine(school, replica_url)
+        return engines
+
+    def _create_engine(self, school, url):
+        environ = dict(os.environ)
+        if school.pool_size is not None:
+            environ['DB_POOL_SIZE'] = str(school.pool_size)
+        if school.max_overflow is not None:
+            environ['DB_MAX_OVERFLOW'] = str(school.max_overflow)
+        options = engine_options_from_env(url, environ)
+        if 'application_name' in options.get('connect_args', {}):
+            options['connect_args']['application_name'] += f'-{school.school_id}'
+        engine = create_engine(url, **options)
+        if school.schema:
+            engine = engine.execution_options(schema_translate_map={None: school.schema})
+        return engine
+
+    def primary_engine(self, school_id):
+        engines = self.engines(school_id)
+        return self.db.engine if engines is None else engines[None]
+
+    def activate(self, school_id):
+        """Select a school for the rest of this app context"""
+        g._school_id = school_id
+        g._tenant_engines = self.engines(school_id)
+
+    @contextmanager
+    def activated(self, school_id):
+        """Temporarily select a school inside the current app context"""
+        previous = g.get('_school_id', self.default_school)
+        self.activate(school_id)
+        try:
+            yield
+        finally:
+            self.activate(previous)
+
+    def create_schema(self, school_id):
+        """Create a PostgreSQL schema for a school that is separated by schema"""
+        school = self.schools.get(school_id)
+        if school is not None and school.schema:
+            engine = self.primary_engine(school_id)
+            with engine.begin() as conn:
+                if not inspect(conn).has_schema(school.schema):
+                    conn.execute(CreateSchema(school.schema))
+
+    def all_engines(self):
+        """Every engine created so far in this process, default school included"""
+        engines = list(self.db.engines.values())
+        for school_engines in self._engines.values():
+            engines.extend(school_engines.values())
+        return engines
+
+    def pool_stats(self, stats_func):
+        return {school_id: {bind or 'primary': stats_func(engine) for bind, engine in engines.items()}
+                for school_id, engines in self._engines.items()}
+
+
+def init_app(app, db):
+    """Load the school list and select a school for every request"""
+    app.config.setdefault('SCHOOLS', '')
+    app.config.setdefault('DEFAULT_SCHOOL', 'default')
+    app.config.setdefault('SCHOOL_HEADER', 'X-School-ID')
+    app.config.setdefault('SCHOOL_HEADER_TRUSTED', False)
+    app.config.setdefault('SCHOOL_BASE_DOMAIN', '')
+    app.config.setdefault('SCHOOL_DATABASE_DIR', os.path.join(app.instance_path, 'schools'))
+
+    router = TenantRouter(app, db, load_schools(app.config['SCHOOLS'], app.config['SCHOOL_DATABASE_DIR']))
+    app.extensions['tenancy'] = router
+
+    @app.before_request
+    def select_school():
+        school_id = router.resolve(request.host, request.headers.get(app.config['SCHOOL_HEADER']))
+        if school_id is None:
+            abort(404)
+        router.activate(school_id)
+
+    return router
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Multi-School Tenancy Testing Suite
+Checks that each school's requests, connection pool, cache and background
+jobs stay on that school's own database shard.
+
+Runs against throwaway SQLite databases (never mentorship.db).
+"""
+
+import json
+import os
+import sys
+
+from suite_support import SuiteLogger, scratch_environment
+
+# Point the app at scratch databases before it is imported
+WORK_DIR = scratch_environment('tenancy', 'default.db')
+os.environ['JOBS_EXPORT_DIR'] = os.path.join(WORK_DIR, 'exports')
+os.environ['JOBS_MODE'] = 'thread'
+os.environ['EXPORT_BACKGROUND_ROWS'] = '10'
+os.environ['SCHOOLS'] = json.dumps({'northside': {'name': 'Northside High', 'hosts': ['northside.example.org']},
+                                    'southside': {'pool_size': 2}})
+os.environ['SCHOOL_DATABASE_DIR'] = os.path.join(WORK_DIR, 'schools')
+os.environ['SCHOOL_BASE_DOMAIN'] = 'mentoring.example.org'
+# The suite plays a proxy that sets X-School-ID; test_untrusted_header turns that off
+os.environ['SCHOOL_HEADER_TRUSTED'] = 'True'
+
+import app as flask_app
+
+
+logger = SuiteLogger()
+client = flask_app.app.test_client()
+tenants = flask_app.tenants
+
+
+def school(school_id):
+    return {'X-School-ID': school_id}
+
+
+def mentor_names(school_id):
+    with flask_app.app.app_context():
+        with tenants.activated(school_id):
+            return sorted(mentor.name for mentor in flask_app.Mentor.query.all())
+
+
+def seed_school(school_id, mentees=0):
+    client.post('/add_mentor', headers=school(school_id), follow_redirects=True,
+                data={'first_name': school_id.title(), 'last_name': 'Mentor', 'roll_call': '12/7',
+                      'subjects': 'English', 'max_mentees': '5'})
+    with flask_app.app.app_context():
+        with tenants.activated(school_id):
+            for i in range(mentees):
+                flask_app.db.session.add(flask_app.Mentee(name=f'{school_id} Student {i}', roll_call='7A',
+                                                          subject='English', lessons_remaining=5))
+            flask_app.db.session.commit()
+
+
+def test_data_isolation():
+    seed_school('northside', mentees=25)
+    seed_school('southside')
+    names = {school_id: mentor_names(school_id) for school_id in tenants.school_ids()}
+    logger.log_result("Writes land only in the requesting school's shard",
+                      names == {'default': [], 'northside': ['Northside Mentor'], 'southside': ['Southside Mentor']},
+                      f"{names}")
+    page = client.get('/mentors', headers=school('southside'))
+    logger.log_result("Pages show only the requesting school's rows",
+                      b'Southside Mentor' in page.data and b'Northside Mentor' not in page.data,
+                      f"status={page.status_code}")
+    files = sorted(name for name in os.listdir(os.environ['SCHOOL_DATABASE_DIR']) if name.endswith('.db'))
+    logger.log_result("Each school gets its own SQLite file", files == ['northside.db', 'southside.db'],
+                      f"{files}")
+
+
+def test_school_selection():
+    by_host = client.get('/mentors', headers={'Host': 'northside.example.org'})
+    by_subdomain = client.get('/mentors', headers={'Host': 'southside.mentoring.example.org'})
+    logger.log_result("Schools are selected by host and by subdomain",
+                      b'Northside Mentor' in by_host.data and b'Southside Mentor' in by_subdomain.data)
+    default = client.get('/mentors')
+    logger.log_result("Requests without a school use the default database",
+                      default.status_code == 200 and b'Northside Mentor' not in default.data)
+    unknown = client.get('/mentors', headers=school('nowhere'))
+    logger.log_result("Unknown schools get 404", unknown.status_code == 404, f"status={unknown.status_code}")
+
+
+def test_untrusted_header():
+    flask_app.app.config['SCHOOL_HEADER_TRUSTED'] = False
+    try:
+        foreign = client.get('/mentors', headers={'Host': 'northside.example.org', 'X-School-ID': 'southside'})
+        default_host = client.get('/api/statistics', headers=school('southside'))
+        matching = client.get('/mentors', headers={'Host': 'northside.example.org', 'X-School-ID': 'northside'})
+        write = client.post('/add_mentor', headers={'Host': 'northside.example.org', 'X-School-ID': 'southside'},
+                            data={'first_name': 'Sneaky', 'last_name': 'Write', 'roll_call': '12/7',
+                                  'subjects': 'English', 'max_mentees': '2'})
+    finally:
+        flask_app.app.config['SCHOOL_HEADER_TRUSTED'] = True
+    logger.log_result("Without a trusted proxy a header naming another school than the host gets 404",
+                      foreign.status_code == 404 and default_host.status_code == 404 and write.status_code == 404
+                      and b'Southside Mentor' not in foreign.data,
+                      f"foreign host {foreign.status_code}, default host {default_host.status_code}, write {write.status_code}")
+    logger.log_result("A header that matches the host's school is accepted",
+                      matching.status_code == 200 and b'Northside Mentor' in matching.data)
+    with flask_app.app.app_context():
+        tenants.activate('southside')
+        sneaked = flask_app.Mentor.query.filter_by(name='Sneaky Write').count()
+    logger.log_result("The refused write never reaches the other school's shard", sneaked == 0)
+
+
+def test_pools_and_caches():
+    with flask_app.app.app_context():
+        north, south = tenants.primary_engine('northside'), tenants.primary_engine('southside')
+        separate_pools = north.pool is not south.pool and north.pool is not flask_app.db.engine.pool
+        logger.log_result("Each school has its own connection pool", separate_pools)
+        logger.log_result("Per-school pool_size is honoured", south.pool.size() == 2, f"size={south.pool.size()}")
+
+    stats = client.get('/api/pool_stats').get_json()
+    logger.log_result("/api/pool_stats reports every school's pool",
+                      set(stats.get('schools', {})) == {'northside', 'southside'}, f"{sorted(stats.get('schools', {}))}")
+
+    north_stats = client.get('/api/statistics', headers=school('northside')).get_json()
+    south_stats = client.get('/api/statistics', headers=school('southside')).get_json()
+    logger.log_result("Cached statistics are kept per school",
+                      north_stats['totals']['mentees'] == 25 and south_stats['totals']['mentees'] == 0,
+                      f"northside={north_stats['totals']['mentees']}, southside={south_stats['totals']['mentees']}")
+    logger.log_result("Each school has its own cache",
+                      flask_app.cache.for_school('northside') is not flask_app.cache.for_school('southside'))
+
+
+def test_jobs_follow_school():
+    response = client.get('/export_data/mentees', headers=school('northside'))
+    job_id = response.headers['Location'].split('/jobs/')[1].split('?')[0]
+    job = flask_app.job_queue.wait(job_id)
+    download = client.get(f'/api/jobs/{job_id}/download', headers=school('northside'))
+    lines = download.data.decode().strip().splitlines()
+    logger.log_result("Background jobs run against the school that queued them",
+                      job['status'] == 'succeeded' and len(lines) == 26 and 'northside Student 0' in download.data.decode(),
+                      f"status={job['status']}, csv lines={len(lines)}")
+    other = client.get(f'/api/jobs/{job_id}', headers=school('southside'))
+    logger.log_result("Other schools can't see the job", other.status_code == 404, f"status={other.status_code}")
+
+    # Fill the newest slots with another school's jobs; the list must still find northside's
+    for _ in range(5):
+        flask_app.job_queue.enqueue('noop', {'school_id': 'southside'})
+    north = client.get('/api/jobs?limit=3', headers=school('northside')).get_json()
+    south = client.get('/api/jobs', headers=school('southside')).get_json()
+    logger.log_result("/api/jobs lists and counts only the school's own jobs",
+                      job_id in [j['id'] for j in north['jobs']] and all(j['school_id'] == 'northside' for j in north['jobs'])
+                      and north['counts'].get('succeeded') == 1 and 'succeeded' not in south['counts']
+                      and south['counts'].get('queued', 0) >= 5 and all(j['school_id'] == 'southside' for j in south['jobs']),
+                      f"northside={north['counts']}, southside={south['counts']}")
+
+
+def main():
+    logger.log_header("MULTI-SCHOOL TENANCY TESTS")
+    print(f"📂 Scratch directory: {WORK_DIR}")
+    flask_app.init_db()
+    flask_app.job_runner.start()
+    try:
+        test_data_isolation()
+        test_school_selection()
+        test_untrusted_header()
+        test_pools_and_caches()
+        test_jobs_follow_school()
+    finally:
+        flask_app.job_runner.stop()
+
+    return logger.finish("schools are isolated", "data leaked between schools")
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,650 @@
+#!/usr/bin/env python3
+"""
+Phase-level timing spans for every request.
+
+init_app(app) splits each request's wall time into phases that add up to
+the whole request:
+
+    routing   WSGI entry, URL matching and before_request hooks, up to the view
+    python    the view's own code (business logic, loops, serialization)
+    db        executing SQL statements (cursor execute, on any engine)
+    orm       fetching result rows and hydrating them into ORM objects
+    render    render_template, i.e. Jinja executing the template
+    response  after_request hooks (compression, headers) and teardown
+
+Time is charged to the innermost phase, so a lazy load inside a template
+counts as db/orm rather than render, and the phases never overlap. Each
+request becomes an OpenTelemetry trace: a server span with the phase totals
+as attributes, and child spans for routing, the view, each template render,
+each SQL statement (the first MAX_DB_SPANS) and the response.
+
+Traces can be exported as OTLP/JSON, batched on a background thread:
+
+    TRACING_EXPORT=instance/traces.jsonl             one ExportTraceServiceRequest per line
+    TRACING_EXPORT=http://localhost:4318/v1/traces   POSTed to an OTLP/HTTP collector
+
+A stand-in collector that writes what it receives to a file:
+
+    python tracing.py collector [--port 4318] [--output traces.jsonl]
+
+/admin/traces (and /api/traces as JSON) shows the per-route averages. With
+METRICS_DIR set (several gunicorn workers, see metrics.py) each worker writes
+its summary there at most every METRICS_FLUSH_SECONDS and the page merges the
+running workers' files; otherwise it covers the process that serves it.
+
+ORM hydration has no SQLAlchemy event, so install() wraps the row generator
+that sqlalchemy.orm.loading hands to ChunkedIteratorResult. That relies on
+loading internals, so it is only done on the SQLAlchemy series it was
+written against (HYDRATION_HOOK_VERSIONS) and raises otherwise; set
+TRACING_ENABLED=False to run an untested SQLAlchemy without tracing.
+
+Settings (app.config):
+    TRACING_ENABLED      - master switch (default True)
+    TRACING_EXPORT       - file path or http(s) URL, empty for no export (default)
+    TRACING_SAMPLE_RATE  - share of requests exported (default 1.0; all are summarized)
+    TRACING_SERVICE_NAME - service.name resource attribute (default mentorship)
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import urllib.request
+from collections import deque
+from contextvars import ContextVar
+
+logger = logging.getLogger('mentorship.tracing')
+
+PHASES = ('routing', 'python', 'db', 'orm', 'render', 'response')
+MAX_DB_SPANS = 50
+MAX_SQL_LENGTH = 300
+RECENT_DURATIONS = 500
+# SQLAlchemy series whose orm.loading internals the hydration timing relies on
+HYDRATION_HOOK_VERSIONS = ('2.0.',)
+
+# OTLP span kinds
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+
+_current = ContextVar('trace', default=None)
+_installed = False
+
+
+class Trace:
+    """Phase totals and child spans for one request"""
+
+    def __init__(self, method, path):
+        self.trace_id = os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.method = method
+        self.path = path
+        self.endpoint = None
+        self.route = None
+        self.status = None
+        self.started = self.last = time.perf_counter()
+        self.started_ns = time.time_ns()
+        self.ended = None
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.stack = ['routing']
+        self.spans = []  # (name, kind, start, end, attributes)
+        self.view_started = None
+        self.view_ended = None
+        self.open_renders = []
+        self.db_started = None
+        self.db_count = 0
+
+    def _charge(self):
+        now = time.perf_counter()
+        self.phases[self.stack[-1]] += now - self.last
+        self.last = now
+        return now
+
+    def enter(self, phase):
+        now = self._charge()
+        self.stack.append(phase)
+        return now
+
+    def exit(self, phase):
+        now = self._charge()
+        # A phase left by an exception may still be open above this one
+        while len(self.stack) > 1:
+            if self.stack.pop() == phase:
+                break
+        return now
+
+    def switch(self, phase):
+        """Change the bottom phase (routing -> python -> response)"""
+        now = self._charge()
+        self.stack[:] = [phase]
+        return now
+
+    def span(self, name, kind, start, end, **attributes):
+        self.spans.append((name, kind, start, end, attributes))
+
+    def finish(self):
+        self.ended = self.switch('response')
+        if self.view_started is not None:
+            self.span('view ' + (self.endpoint or 'unmatched'), KIND_INTERNAL, self.view_started,
+                      self.view_ended or self.ended)
+            self.span('routing', KIND_INTERNAL, self.started, self.view_started)
+            self.span('response', KIND_INTERNAL, self.view_ended or self.ended, self.ended)
+        else:
+            self.span('routing', KIND_INTERNAL, self.started, self.ended)
+
+    @property
+    def duration(self):
+        return (self.ended or time.perf_counter()) - self.started
+
+    def _ns(self, moment):
+        return str(self.started_ns + int((moment - self.started) * 1e9))
+
+    def to_otlp(self):
+        """The server span and its children as OTLP/JSON span dicts"""
+        name = f"{self.method} {self.route or self.path}"
+        attributes = {
+            'http.request.method': self.method,
+            'url.path': self.path,
+            'http.route': self.route or '',
+            'http.response.status_code': self.status or 0,
+            'mentorship.endpoint': self.endpoint or 'unmatched',
+            'db.statements': self.db_count,
+        }
+        for phase, seconds in self.phases.items():
+            attributes[f'mentorship.phase.{phase}_ms'] = round(seconds * 1000, 3)
+        spans = [_span(self.trace_id, self.span_id, None, name, KIND_SERVER, self._ns(self.started),
+                       self._ns(self.ended), attributes, error=(self.status or 0) >= 500)]
+        for child_name, kind, start, end, child_attributes in self.spans:
+            spans.append(_span(self.trace_id, os.urandom(8).hex(), self.span_id, child_name, kind,
+                               self._ns(start), self._ns(end), child_attributes))
+        return spans
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+def _span(trace_id, span_id, parent_id, name, kind, start_ns, end_ns, attributes, error=False):
+    span = {
+        'traceId': trace_id,
+        'spanId': span_id,
+        'name': name,
+        'kind': kind,
+        'startTimeUnixNano': start_ns,
+        'endTimeUnixNano': end_ns,
+        'attributes': [_attribute(key, value) for key, value in attributes.items()],
+        'status': {'code': 2} if error else {},
+    }
+    if parent_id:
+        span['parentSpanId'] = parent_id
+    return span
+
+
+def otlp_request(spans, service_name):
+    """An OTLP ExportTraceServiceRequest holding spans"""
+    return {'resourceSpans': [{
+        'resource': {'attributes': [_attribute('service.name', service_name),
+                                    _attribute('process.pid', os.getpid())]},
+        'scopeSpans': [{'scope': {'name': 'mentorship.tracing'}, 'spans': spans}],
+    }]}
+
+
+def current():
+    """Trace for the request being handled, or None"""
+    return _current.get()
+
+
+# -- hooks ----------------------------------------------------------------------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = _current.get()
+    if trace is not None:
+        trace.db_started = trace.enter('db')
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = _current.get()
+    if trace is None or trace.db_started is None:
+        return
+    end = trace.exit('db')
+    trace.db_count += 1
+    if trace.db_count <= MAX_DB_SPANS:
+        trace.span('db ' + statement.split(None, 1)[0].upper(), KIND_CLIENT, trace.db_started, end,
+                   **{'db.system': conn.dialect.name, 'db.statement': statement[:MAX_SQL_LENGTH]})
+    trace.db_started = None
+
+
+def _handle_error(exception_context):
+    trace = _current.get()
+    if trace is not None and trace.db_started is not None:
+        trace.exit('db')
+        trace.db_started = None
+
+
+def _timed_chunks(chunks):
+    """Charge the ORM's row fetching and object hydration to the orm phase"""
+    def timed(size):
+        iterator = chunks(size)
+        while True:
+            trace = _current.get()
+            if trace is not None:
+                trace.enter('orm')
+            try:
+                rows = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                if trace is not None:
+                    trace.exit('orm')
+            yield rows
+    return timed
+
+
+def check_hydration_hook():
+    """Raise unless sqlalchemy.orm.loading is laid out the way install() expects"""
+    import inspect
+
+    import sqlalchemy
+    from sqlalchemy.orm import loading
+
+    problem = None
+    if not sqlalchemy.__version__.startswith(HYDRATION_HOOK_VERSIONS):
+        problem = f'SQLAlchemy {sqlalchemy.__version__} is not one of {HYDRATION_HOOK_VERSIONS}'
+    elif 'ChunkedIteratorResult' not in loading.instances.__code__.co_names:
+        problem = 'orm.loading.instances() no longer builds a ChunkedIteratorResult'
+    elif list(inspect.signature(loading.ChunkedIteratorResult.__init__).parameters)[1:3] != ['cursor_metadata', 'chunks']:
+        problem = 'ChunkedIteratorResult no longer takes (cursor_metadata, chunks)'
+    if problem:
+        raise RuntimeError(f'Request tracing cannot time ORM hydration: {problem}. '
+                           'Update tracing.install() for this version or set TRACING_ENABLED=False.')
+
+
+def install():
+    """Listen on every engine and time ORM result loading"""
+    global _installed
+    if _installed:
+        return
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from sqlalchemy.orm import loading
+
+    check_hydration_hook()
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+
+    # loading.instances() hands its row generator to ChunkedIteratorResult;
+    # SQLAlchemy has no event around hydration, so wrap the generator there
+    class TimedChunkedIteratorResult(loading.ChunkedIteratorResult):
+        def __init__(self, cursor_metadata, chunks, *args, **kwargs):
+            super().__init__(cursor_metadata, _timed_chunks(chunks), *args, **kwargs)
+
+    loading.ChunkedIteratorResult = TimedChunkedIteratorResult
+    _installed = True
+
+
+# -- summary and export ---------------------------------------------------------------
+
+class RouteSummary:
+    """Per-route request counts and phase totals for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def add(self, trace):
+        key = (trace.method, trace.endpoint or 'unmatched')
+        with self._lock:
+            route = self._routes.get(key)
+            if route is None:
+                route = self._routes[key] = {
+                    'method': trace.method, 'endpoint': key[1], 'route': trace.route or trace.path,
+                    'count': 0, 'errors': 0, 'total': 0.0, 'max': 0.0, 'queries': 0,
+                    'phases': dict.fromkeys(PHASES, 0.0), 'recent': deque(maxlen=RECENT_DURATIONS),
+                }
+            route['count'] += 1
+            route['errors'] += (trace.status or 0) >= 500
+            route['total'] += trace.duration
+            route['max'] = max(route['max'], trace.duration)
+            route['queries'] += trace.db_count
+            route['recent'].append(trace.duration)
+            for phase, seconds in trace.phases.items():
+                route['phases'][phase] += seconds
+
+    def routes(self):
+        """A copy of the raw per-route figures, as plain JSON-friendly dicts"""
+        with self._lock:
+            return [dict(route, phases=dict(route['phases']), recent=list(route['recent']))
+                    for route in self._routes.values()]
+
+    @staticmethod
+    def merge(route_lists):
+        """Add up the raw figures several processes recorded for the same routes"""
+        merged = {}
+        for routes in route_lists:
+            for route in routes:
+                key = (route['method'], route['endpoint'])
+                total = merged.get(key)
+                if total is None:
+                    merged[key] = dict(route, phases=dict(route['phases']), recent=list(route['recent']))
+                    continue
+                for field in ('count', 'errors', 'total', 'queries'):
+                    total[field] += route[field]
+                total['max'] = max(total['max'], route['max'])
+                total['recent'] += route['recent']
+                for phase, seconds in route['phases'].items():
+                    total['phases'][phase] += seconds
+        return list(merged.values())
+
+    def rows(self, routes=None):
+        """One dict per route (this process's unless routes is given), slowest total time first, in ms"""
+        if routes is None:
+            routes = self.routes()
+        rows = []
+        for route in sorted(routes, key=lambda route: -route['total']):
+            route = dict(route, recent=sorted(route['recent']))
+            count, recent = route['count'], route['recent']
+            rows.append({
+                'method': route['method'],
+                'endpoint': route['endpoint'],
+                'route': route['route'],
+                'requests': count,
+                'errors': route['errors'],
+                'mean_ms': round(route['total'] / count * 1000, 2),
+                'p95_ms': round(recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000, 2),
+                'max_ms': round(route['max'] * 1000, 2),
+                'total_ms': round(route['total'] * 1000, 2),
+                'queries': round(route['queries'] / count, 1),
+                'phases_ms': {phase: round(seconds / count * 1000, 2) for phase, seconds in route['phases'].items()},
+                'phases_pct': {phase: round(seconds / route['total'] * 100, 1) if route['total'] else 0.0
+                               for phase, seconds in route['phases'].items()},
+            })
+        return rows
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+
+class Exporter:
+    """Writes OTLP/JSON batches to a file or POSTs them to a collector, off the request path"""
+
+    def __init__(self, target, service_name, max_queue=2000, batch_size=100):
+        self.target = target
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, spans):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Block until everything submitted so far has been exported"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.export([span for spans in batch for span in spans])
+            except Exception as e:
+                logger.warning(f"Trace export to {self.target} failed: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def export(self, spans):
+        body = json.dumps(otlp_request(spans, self.service_name), separators=(',', ':'))
+        if self.target.startswith(('http://', 'https://')):
+            request = urllib.request.Request(self.target, data=body.encode(), method='POST',
+                                             headers={'Content-Type': 'application/json'})
+            with urllib.request.urlopen(request, timeout=5) as response:
+                response.read()
+        else:
+            with open(self.target, 'a') as f:
+                f.write(body + '\n')
+
+
+class TraceMiddleware:
+    """Starts each request's trace at WSGI entry and finishes it once the app returns"""
+
+    def __init__(self, wsgi_app, tracer):
+        self.wsgi_app = wsgi_app
+        self.tracer = tracer
+
+    def __call__(self, environ, start_response):
+        trace = Trace(environ.get('REQUEST_METHOD', 'GET'), environ.get('PATH_INFO', '/'))
+        token = _current.set(trace)
+
+        def traced_start_response(status, headers, exc_info=None):
+            trace.status = int(status.split(None, 1)[0])
+            return start_response(status, headers, exc_info)
+
+        try:
+            return self.wsgi_app(environ, traced_start_response)
+        finally:
+            _current.reset(token)
+            trace.finish()
+            self.tracer.record(trace)
+
+
+class Tracer:
+    def __init__(self, config):
+        self.config = config
+        self.summary = RouteSummary()
+        self.directory = config.get('METRICS_DIR')
+        self.flush_interval = config.get('METRICS_FLUSH_SECONDS', 1.0)
+        self._last_flush = 0.0
+        self._timer = None
+        self.exporter = None
+        if config.get('TRACING_EXPORT'):
+            target = config['TRACING_EXPORT']
+            if not target.startswith(('http://', 'https://')):
+                os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+            self.exporter = Exporter(target, config.get('TRACING_SERVICE_NAME', 'mentorship'))
+
+    def record(self, trace):
+        self.summary.add(trace)
+        if self.exporter is not None and random.random() < self.config.get('TRACING_SAMPLE_RATE', 1.0):
+            self.exporter.submit(trace.to_otlp())
+        if self.directory:
+            self.maybe_flush()
+
+    # -- sharing the summary between worker processes (METRICS_DIR) ----------------
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'traces-{pid}.json')
+
+    def maybe_flush(self):
+        """Write this process's summary if the last write is older than flush_interval"""
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+        elif self._timer is None:
+            # Make sure the last requests before a quiet spell are written too
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        self._timer = None
+        self._last_flush = time.monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(os.getpid())
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'pid': os.getpid(), 'routes': self.summary.routes()}, f)
+        os.replace(temp_path, path)
+
+    def worker_routes(self):
+        """{pid: raw routes} for every running worker sharing the directory, this one included"""
+        from metrics import pid_alive
+
+        self.flush()
+        workers = {}
+        for name in os.listdir(self.directory):
+            if not (name.startswith('traces-') and name.endswith('.json')):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not pid_alive(data['pid']):
+                os.remove(path)
+                continue
+            workers[data['pid']] = data['routes']
+        return workers
+
+    def rows(self):
+        """(summary rows, pids of the workers they cover)"""
+        if not self.directory:
+            return self.summary.rows(), [os.getpid()]
+        workers = self.worker_routes()
+        return self.summary.rows(RouteSummary.merge(workers.values())), sorted(workers)
+
+
+def init_app(app):
+    """Trace every request; call after the other modules' request hooks are registered"""
+    from flask import before_render_template, jsonify, render_template, request, template_rendered
+
+    app.config.setdefault('TRACING_ENABLED', True)
+    app.config.setdefault('TRACING_EXPORT', '')
+    app.config.setdefault('TRACING_SAMPLE_RATE', 1.0)
+    app.config.setdefault('TRACING_SERVICE_NAME', 'mentorship')
+    if not app.config['TRACING_ENABLED']:
+        return None
+    install()
+    tracer = Tracer(app.config)
+    app.extensions['tracing'] = tracer
+    app.wsgi_app = TraceMiddleware(app.wsgi_app, tracer)
+
+    # Registered last, so this runs after every other before_request hook and
+    # the after_request hook runs before the others: the gap is the view
+    @app.before_request
+    def start_view_span():
+        trace = _current.get()
+        if trace is not None:
+            trace.endpoint = request.endpoint or 'unmatched'
+            trace.route = request.url_rule.rule if request.url_rule else None
+            trace.view_started = trace.switch('python')
+
+    @app.after_request
+    def end_view_span(response):
+        trace = _current.get()
+        if trace is not None and trace.view_started is not None:
+            trace.view_ended = trace.switch('response')
+        return response
+
+    def render_started(sender, template, context, **extra):
+        trace = _current.get()
+        if trace is not None:
+            trace.open_renders.append(trace.enter('render'))
+
+    def render_finished(sender, template, context, **extra):
+        trace = _current.get()
+        if trace is not None and trace.open_renders:
+            start = trace.open_renders.pop()
+            trace.span(f'render_template {template.name}', KIND_INTERNAL, start, trace.exit('render'),
+                       **{'template.name': template.name or ''})
+
+    before_render_template.connect(render_started, app, weak=False)
+    template_rendered.connect(render_finished, app, weak=False)
+
+    @app.route('/api/traces')
+    def api_traces():
+        """Per-route phase timings across the running workers"""
+        rows, pids = tracer.rows()
+        return jsonify({'pid': os.getpid(), 'pids': pids, 'phases': list(PHASES), 'routes': rows})
+
+    @app.route('/admin/traces')
+    def admin_traces():
+        """Where each route's time goes, by phase"""
+        rows, pids = tracer.rows()
+        return render_template('traces.html', rows=rows, phases=PHASES, pid=os.getpid(), pids=pids,
+                               shared=bool(tracer.directory), export=app.config['TRACING_EXPORT'])
+
+    return tracer
+
+
+# -- collector stand-in -------------------------------------------------------------
+
+def run_collector(port, output):
+    """Accept OTLP/JSON POSTs on /v1/traces and append each body to output"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.path != '/v1/traces':
+                self.send_error(404)
+                return
+            try:
+                spans = sum(len(scope['spans']) for resource in json.loads(body)['resourceSpans']
+                            for scope in resource['scopeSpans'])
+            except (ValueError, KeyError, TypeError):
+                self.send_error(400, 'expected an OTLP/JSON ExportTraceServiceRequest')
+                return
+            with lock, open(output, 'ab') as f:
+                f.write(body.rstrip() + b'\n')
+            print(f"📥 {spans} spans from {self.client_address[0]}")
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(b'{}')
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    print(f"🛰️  Collecting traces on http://127.0.0.1:{port}/v1/traces into {output}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Request tracing tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+    collector = commands.add_parser('collector', help='stand-in OTLP/HTTP collector that writes to a file')
+    collector.add_argument('--port', type=int, default=4318)
+    collector.add_argument('--output', default='traces.jsonl')
+    args = parser.parse_args(argv)
+    if args.command == 'collector':
+        run_collector(args.port, args.output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
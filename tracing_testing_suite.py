@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Request Tracing Testing Suite
+Checks that every request is split into phases that add up to its duration,
+that SQL, ORM loading and template rendering land in the right phase, that
+traces are exported as valid OTLP/JSON (to a file and to the stand-in
+collector), the per-route summary at /api/traces and /admin/traces and its
+merge across workers, and that the ORM loading hook is pinned to SQLAlchemy 2.0.
+
+Runs against a throwaway SQLite database (never mentorship.db).
+"""
+
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from suite_support import SuiteLogger, scratch_environment
+
+# Point the app at a scratch database before it is imported
+WORK_DIR = scratch_environment('tracing')
+os.environ['TRACING_EXPORT'] = os.path.join(WORK_DIR, 'traces.jsonl')
+
+import app as flask_app
+import sqlalchemy
+import tracing
+
+
+logger = SuiteLogger()
+client = flask_app.app.test_client()
+tracer = flask_app.app.extensions['tracing']
+
+
+def seed_database():
+    with flask_app.app.app_context():
+        flask_app.db.drop_all()
+        flask_app.db.create_all()
+        for i in range(8):
+            flask_app.db.session.add(flask_app.Mentor(name=f'Mentor {i}', roll_call='12/7',
+                                                      subjects='English', max_mentees=3))
+        for i in range(24):
+            flask_app.db.session.add(flask_app.Mentee(name=f'Student {i}', roll_call='7A', subject='English',
+                                                      lessons_remaining=5, mentor_id=i % 8 + 1))
+        flask_app.db.session.commit()
+
+
+def traced(path):
+    """Request path and return (response, the span dicts exported for it)"""
+    before = len(exported())
+    response = client.get(path)
+    tracer.exporter.flush()
+    spans = [span for request in exported()[before:] for resource in request['resourceSpans']
+             for scope in resource['scopeSpans'] for span in scope['spans']]
+    return response, spans
+
+
+def exported():
+    if not os.path.exists(os.environ['TRACING_EXPORT']):
+        return []
+    with open(os.environ['TRACING_EXPORT']) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def attributes(span):
+    return {item['key']: next(iter(item['value'].values())) for item in span['attributes']}
+
+
+def test_phases():
+    response, spans = traced('/mentors')
+    root = next((span for span in spans if 'parentSpanId' not in span), None)
+    attrs = attributes(root) if root else {}
+    phases = {phase: attrs.get(f'mentorship.phase.{phase}_ms', 0) for phase in tracing.PHASES}
+    duration = (int(root['endTimeUnixNano']) - int(root['startTimeUnixNano'])) / 1e6 if root else 0
+    logger.log_result("The phases add up to the request's duration",
+                      root is not None and abs(sum(phases.values()) - duration) < 0.05,
+                      f"{ {k: round(v, 2) for k, v in phases.items()} } vs {duration:.2f}ms")
+    logger.log_result("SQL, ORM loading and rendering are each measured on an HTML page",
+                      phases['db'] > 0 and phases['orm'] > 0 and phases['render'] > 0 and phases['python'] > 0
+                      and phases['routing'] > 0 and phases['response'] > 0)
+    logger.log_result("The statement count matches X-Query-Count",
+                      int(attrs.get('db.statements', -1)) == int(response.headers.get('X-Query-Count', -2)),
+                      f"{attrs.get('db.statements')} statements")
+
+    _, spans = traced('/api/statistics')
+    attrs = attributes(next(span for span in spans if 'parentSpanId' not in span))
+    logger.log_result("A JSON endpoint spends no time rendering templates",
+                      attrs['mentorship.phase.render_ms'] == 0 and attrs['mentorship.endpoint'] == 'api_statistics')
+
+
+def test_exclusive_time():
+    trace = tracing.Trace('GET', '/')
+    trace.switch('python')
+    time.sleep(0.01)
+    trace.enter('render')
+    time.sleep(0.01)
+    trace.enter('db')
+    time.sleep(0.02)
+    trace.exit('db')
+    trace.exit('render')
+    trace.finish()
+    ms = {phase: seconds * 1000 for phase, seconds in trace.phases.items()}
+    logger.log_result("Time is charged to the innermost phase only (a lazy load in a template is db)",
+                      15 <= ms['db'] < 40 and 5 <= ms['render'] < 25 and 5 <= ms['python'] < 25,
+                      f"python={ms['python']:.1f} render={ms['render']:.1f} db={ms['db']:.1f}")
+
+
+def test_otlp_export():
+    _, spans = traced('/mentors')
+    root = next((span for span in spans if 'parentSpanId' not in span), {})
+    children = [span for span in spans if span.get('parentSpanId') == root.get('spanId')]
+    names = {span['name'] for span in children}
+    logger.log_result("Exported traces are OTLP/JSON with a server span and child spans",
+                      len(root.get('traceId', '')) == 32 and len(root.get('spanId', '')) == 16
+                      and root.get('kind') == tracing.KIND_SERVER and root.get('name') == 'GET /mentors'
+                      and len(children) == len(spans) - 1 and all(s['traceId'] == root['traceId'] for s in spans),
+                      f"{len(spans)} spans")
+    logger.log_result("Child spans cover routing, the view, Jinja rendering, SQL and the response",
+                      {'routing', 'view mentors', 'render_template mentors.html', 'db SELECT', 'response'} <= names,
+                      ', '.join(sorted(names)))
+    resource = exported()[-1]['resourceSpans'][0]['resource']
+    logger.log_result("The service name is set on the resource",
+                      {'key': 'service.name', 'value': {'stringValue': 'mentorship'}} in resource['attributes'])
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_collector():
+    port = free_port()
+    output = os.path.join(WORK_DIR, 'collected.jsonl')
+    collector = subprocess.Popen([sys.executable, os.path.abspath(tracing.__file__), 'collector',
+                                  '--port', str(port), '--output', output], stdout=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+        exporter = tracing.Exporter(f'http://127.0.0.1:{port}/v1/traces', 'mentorship')
+        trace = tracing.Trace('GET', '/calendar')
+        trace.finish()
+        exporter.submit(trace.to_otlp())
+        exporter.submit(trace.to_otlp())
+        exporter.flush()
+        with open(output) as f:
+            received = [json.loads(line) for line in f if line.strip()]
+    except OSError as e:
+        received = str(e)
+    finally:
+        collector.terminate()
+        collector.wait()
+    spans = [span for request in received for span in request['resourceSpans'][0]['scopeSpans'][0]['spans']] \
+        if isinstance(received, list) else []
+    logger.log_result("Traces are POSTed to an OTLP/HTTP collector",
+                      1 <= len(received) <= 2 and len(spans) == 4, f"{len(received)} requests, {len(spans)} spans")
+
+
+def test_summary():
+    tracer.summary.clear()
+    for _ in range(3):
+        client.get('/mentors')
+    client.get('/no-such-page')
+    rows = {row['endpoint']: row for row in client.get('/api/traces').get_json()['routes']}
+    mentors = rows.get('mentors', {})
+    logger.log_result("/api/traces summarizes every request per route",
+                      mentors.get('requests') == 3 and rows.get('unmatched', {}).get('requests') == 1
+                      and abs(sum(mentors['phases_ms'].values()) - mentors['mean_ms']) < 0.05
+                      and mentors['queries'] > 0, f"mentors: {mentors.get('phases_ms')}")
+    page = client.get('/admin/traces')
+    logger.log_result("/admin/traces shows the per-route phase split",
+                      page.status_code == 200 and b'GET /mentors' in page.data and b'progress-bar' in page.data)
+
+    flask_app.app.config['TRACING_SAMPLE_RATE'] = 0.0
+    try:
+        _, spans = traced('/mentors')
+    finally:
+        flask_app.app.config['TRACING_SAMPLE_RATE'] = 1.0
+    summarized = {row['endpoint']: row for row in tracer.summary.rows()}['mentors']['requests']
+    logger.log_result("Unsampled requests are summarized but not exported", spans == [] and summarized == 4)
+
+
+def _record_in_child(directory, flushed, done):
+    child = tracing.Tracer({'METRICS_DIR': directory})
+    for _ in range(2):
+        trace = tracing.Trace('GET', '/mentors')
+        trace.endpoint = 'mentors'
+        trace.finish()
+        child.record(trace)
+    child.flush()
+    flushed.set()
+    done.wait(10)
+
+
+def test_workers():
+    directory = os.path.join(WORK_DIR, 'metrics')
+    shared = tracing.Tracer({'METRICS_DIR': directory})
+    trace = tracing.Trace('GET', '/mentors')
+    trace.endpoint = 'mentors'
+    trace.finish()
+    shared.record(trace)
+    context = multiprocessing.get_context('fork')
+    flushed, done = context.Event(), context.Event()
+    child = context.Process(target=_record_in_child, args=(directory, flushed, done))
+    child.start()
+    try:
+        flushed.wait(10)
+        with open(os.path.join(directory, 'traces-999999999.json'), 'w') as f:
+            json.dump({'pid': 999999999, 'routes': []}, f)
+        rows, pids = shared.rows()
+    finally:
+        done.set()
+        child.join(10)
+    mentors = {row['endpoint']: row for row in rows}.get('mentors', {})
+    logger.log_result("With METRICS_DIR the summary covers every running worker and drops dead ones",
+                      pids == sorted([os.getpid(), child.pid]) and mentors.get('requests') == 3
+                      and not os.path.exists(os.path.join(directory, 'traces-999999999.json')), f"workers {pids}")
+
+    page = flask_app.app.test_client().get('/admin/traces')
+    logger.log_result("Without METRICS_DIR /admin/traces says it only covers this process",
+                      b'this process' in page.data, f"pid {os.getpid()}")
+
+    version = sqlalchemy.__version__
+    sqlalchemy.__version__ = '3.0.0'
+    try:
+        tracing.check_hydration_hook()
+        raised = None
+    except RuntimeError as e:
+        raised = str(e)
+    finally:
+        sqlalchemy.__version__ = version
+    logger.log_result("Tracing refuses to patch ORM loading on an untested SQLAlchemy",
+                      raised is not None and '3.0.0' in raised and 'TRACING_ENABLED=False' in raised, raised)
+
+
+def main():
+    logger.log_header("REQUEST TRACING TESTS")
+    print(f"📂 Scratch database: {os.environ['DATABASE_URL']}")
+    seed_database()
+
+    test_phases()
+    test_exclusive_time()
+    test_otlp_export()
+    test_collector()
+    test_summary()
+    if sys.platform != 'win32':
+        test_workers()
+
+    return logger.finish("requests are traced by phase", "request tracing is off")
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)